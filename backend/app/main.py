@@ -7,8 +7,20 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.database import connect_to_mongo, close_mongo_connection
-from app.routers import auth, logs, alerts, monitoring, suricata, ml
+from app.routers import auth, logs, alerts, alert_rules, monitoring, suricata, ml
 from app.utils.ml_model_loader import initialize_models
+from app.services.ml_service import start_model_version_sync, stop_model_version_sync
+from app.services.scoring_pipeline import start_scoring_pipeline, stop_scoring_pipeline
+from app.services.backfill_service import resume_backfill_jobs, shutdown_backfill_jobs
+from app.services.pcap_service import shutdown_pcap_executor
+from app.services.baseline_service import start_baselines, stop_baselines
+from app.services.shadow_service import start_shadow_evaluation, stop_shadow_evaluation
+from app.services.training_service import fail_interrupted_training_jobs, shutdown_training_executor
+from app.services.correlation_service import start_correlation, stop_correlation
+from app.services.rule_service import start_rule_engine, stop_rule_engine
+from app.services.sigma_service import start_sigma_rules, stop_sigma_rules
+from app.services.notification_service import start_notifications, stop_notifications
+from app.services.alert_service import ensure_alert_indexes
 
 app = FastAPI(
     title="Cloud Shield API",
@@ -30,13 +42,44 @@ app.add_middleware(
 async def startup_event():
     """Initialize database connections on startup."""
     await connect_to_mongo()
+    await ensure_alert_indexes()
+    # Forward new alerts to webhook/SIEM destinations (if NOTIFY_DESTINATIONS is set)
+    await start_notifications()
     # Initialize ML models
     initialize_models()
+    # Follow model versions activated through other workers
+    await start_model_version_sync()
+    # Start background auto-scoring of ingested data (if enabled)
+    await start_scoring_pipeline()
+    # Shadow a challenger model on live traffic (if ML_SHADOW_MODEL is set)
+    await start_shadow_evaluation()
+    # Resume ML backfill jobs interrupted by the last shutdown
+    await resume_backfill_jobs()
+    # Training jobs cannot resume; mark those cut off by the last shutdown
+    await fail_interrupted_training_jobs()
+    # Restore anomaly baselines and start their maintenance (if enabled)
+    await start_baselines()
+    # Group matching alerts into incidents (if ALERT_CORRELATION is enabled)
+    await start_correlation()
+    # Compile alert rules evaluated on ingest
+    await start_rule_engine()
+    await start_sigma_rules()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connections on shutdown."""
+    await shutdown_backfill_jobs()
+    await stop_model_version_sync()
+    shutdown_pcap_executor()
+    shutdown_training_executor()
+    await stop_scoring_pipeline()
+    await stop_shadow_evaluation()
+    await stop_baselines()
+    await stop_rule_engine()
+    await stop_sigma_rules()
+    await stop_correlation()
+    await stop_notifications()
     await close_mongo_connection()
 
 
@@ -63,6 +106,7 @@ async def health_check():
 app.include_router(auth.router)
 app.include_router(logs.router)
 app.include_router(alerts.router)
+app.include_router(alert_rules.router)
 app.include_router(monitoring.router)
 app.include_router(suricata.router)
 app.include_router(ml.router)
@@ -25,6 +25,29 @@ class AlertUpdate(BaseModel):
     notes: Optional[str] = None
     assigned_to: Optional[str] = None
 
+class AlertFilter(BaseModel):
+    """Filter selecting alerts for a bulk change."""
+    status: Optional[str] = None
+    severity: Optional[str] = None
+    alert_type: Optional[str] = None
+    source: Optional[str] = None
+    assigned_to: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+
+class AlertBulkUpdate(AlertUpdate):
+    """Schema for applying one change to many alerts (by ids and/or filter)."""
+    alert_ids: Optional[List[str]] = Field(default=None, max_length=10000)
+    filter: Optional[AlertFilter] = None
+
+class AlertBulkItem(AlertUpdate):
+    """One alert's change in a per-alert bulk update."""
+    id: str
+
+class AlertBulkItemsUpdate(BaseModel):
+    """Schema for applying a different change to each listed alert."""
+    items: List[AlertBulkItem] = Field(..., min_length=1, max_length=10000)
+
 class AlertResponse(BaseModel):
     """Schema for alert response."""
     id: str = Field(alias="_id")
@@ -39,8 +62,14 @@ class AlertResponse(BaseModel):
     created_by: Optional[str] = None
     assigned_to: Optional[str] = None
     notes: Optional[str] = None
+    occurrences: int = 1
+    last_seen: Optional[datetime] = None
     created_at: datetime
     updated_at: datetime
+    # Only set with ?expand=true
+    related_logs: Optional[List[Dict[str, Any]]] = None
+    detections: Optional[List[Dict[str, Any]]] = None
+    suricata_events: Optional[List[Dict[str, Any]]] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -48,6 +77,25 @@ class AlertResponse(BaseModel):
         json_encoders={ObjectId: str}
     )
 
+class IncidentResponse(BaseModel):
+    """Schema for a correlated incident (a group of matching alerts)."""
+    id: str
+    title: str
+    alert_type: str
+    source: Optional[str] = None
+    severity: str
+    status: str
+    source_ip: Optional[str] = None
+    target: Optional[str] = None
+    signature: str
+    alert_id: str
+    alert_count: int
+    related_log_ids: List[str] = []
+    first_seen: datetime
+    last_seen: datetime
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 # --- Database Model ---
 
 class AlertInDB:
@@ -79,8 +127,10 @@ class AlertInDB:
         self.status = "open"
         self.assigned_to = None
         self.notes = None
+        self.occurrences = 1
         self.created_at = datetime.utcnow()
         self.updated_at = datetime.utcnow()
+        self.last_seen = self.created_at
 
     def to_dict(self):
         """Convert object to dictionary for MongoDB insertion."""
@@ -96,6 +146,8 @@ class AlertInDB:
             "status": self.status,
             "assigned_to": self.assigned_to,
             "notes": self.notes,
+            "occurrences": self.occurrences,
+            "last_seen": self.last_seen,
             "created_at": self.created_at,
             "updated_at": self.updated_at,
         }
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Alert rule schemas for the streaming rule engine.
+"""
+from datetime import datetime
+from typing import Optional, List, Any
+from pydantic import BaseModel, Field
+
+
+class RuleCondition(BaseModel):
+    """A condition on one (dotted) field of the ingested record."""
+    field: str = Field(..., min_length=1, description="Field path, e.g. 'severity' or 'metadata.user'")
+    op: str = Field(
+        default="eq",
+        pattern="^(eq|ne|in|not_in|contains|regex|exists|gt|gte|lt|lte)$",
+        description="Comparison operator"
+    )
+    value: Any = Field(
+        default=None,
+        description="Value to compare with (a list for in/not_in; regex patterns are length-limited "
+                    "and may not nest quantifiers)"
+    )
+
+
+class RuleThreshold(BaseModel):
+    """Fire when `count` matches arrive within `window_seconds` (per group_by value)."""
+    count: int = Field(..., ge=1, le=100000, description="Matches needed within the window")
+    window_seconds: float = Field(default=60.0, gt=0, le=86400, description="Sliding window length")
+    group_by: Optional[str] = Field(default=None, description="Field to count per value of, e.g. 'source'")
+
+
+class AlertRuleCreate(BaseModel):
+    """Schema for creating an alert rule."""
+    name: str = Field(..., min_length=1, max_length=200)
+    description: Optional[str] = None
+    record_type: str = Field(default="log", pattern="^(log|suricata_event|any)$", description="Records the rule sees")
+    conditions: List[RuleCondition] = Field(..., min_length=1, description="All must match")
+    threshold: Optional[RuleThreshold] = Field(default=None, description="Windowed count (omit to fire on every match)")
+    severity: str = Field(default="medium", description="Severity of raised alerts")
+    alert_type: str = Field(default="rule", description="Type of raised alerts")
+    title: Optional[str] = Field(default=None, description="Title of raised alerts (default: 'Rule: <name>')")
+    enabled: bool = True
+
+
+class AlertRuleUpdate(BaseModel):
+    """Schema for updating an alert rule."""
+    name: Optional[str] = Field(default=None, min_length=1, max_length=200)
+    description: Optional[str] = None
+    record_type: Optional[str] = Field(default=None, pattern="^(log|suricata_event|any)$")
+    conditions: Optional[List[RuleCondition]] = Field(default=None, min_length=1)
+    threshold: Optional[RuleThreshold] = None
+    severity: Optional[str] = None
+    alert_type: Optional[str] = None
+    title: Optional[str] = None
+    enabled: Optional[bool] = None
+
+
+class AlertRuleResponse(BaseModel):
+    """Schema for alert rule response."""
+    id: str
+    name: str
+    description: Optional[str] = None
+    record_type: str
+    conditions: List[RuleCondition]
+    threshold: Optional[RuleThreshold] = None
+    severity: str
+    alert_type: str
+    title: Optional[str] = None
+    enabled: bool
+    created_by: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+
+class SigmaRuleUpdate(BaseModel):
+    """Schema for enabling or disabling an imported Sigma rule."""
+    enabled: bool
@@ -28,6 +28,7 @@ class MLDetectionResponse(MLDetectionBase):
     id: str
     related_log_id: Optional[str]
     related_alert_id: Optional[str]
+    label: Optional[str] = None
     created_at: datetime
 
     class Config:
@@ -52,6 +53,37 @@ class MLInferenceResponse(BaseModel):
     alert_id: Optional[str] = None
 
 
+class MLEnsembleRequest(BaseModel):
+    """Schema for multi-model ensemble inference."""
+    data: Dict[str, Any] = Field(..., description="Input data for feature extraction")
+    models: List[str] = Field(..., min_length=1, max_length=16, description="Models to evaluate ('name' or 'name@version')")
+    strategy: str = Field(default="vote", pattern="^(vote|weighted)$", description="'vote' (majority) or 'weighted' (weighted confidence average)")
+    weights: Optional[Dict[str, float]] = Field(default=None, description="Per-model weights for 'weighted' (default 1.0)")
+    auto_create_alert: bool = Field(default=False, description="Automatically create alert if threat detected")
+
+
+class MLModelScore(BaseModel):
+    """Score of one ensemble member."""
+    model_name: str
+    prediction: Optional[str] = None
+    confidence: Optional[float] = None
+    detection_type: Optional[str] = None
+    weight: float = 1.0
+    error: Optional[str] = None
+
+
+class MLEnsembleResponse(BaseModel):
+    """Schema for ensemble inference response."""
+    prediction: str
+    confidence: float
+    detection_type: str
+    strategy: str
+    model_scores: List[MLModelScore]
+    features: Dict[str, Any]
+    detection_id: Optional[str] = None
+    alert_id: Optional[str] = None
+
+
 class MLDetectionInDB:
     """ML detection document structure in MongoDB."""
     def __init__(
@@ -59,11 +91,12 @@ class MLDetectionInDB:
         detection_type: str,
         confidence: float,
         prediction: str,
-        features: Dict[str, Any],
+        features: Optional[Dict[str, Any]],
         model_name: str,
         metadata: Optional[Dict[str, Any]] = None,
         related_log_id: Optional[str] = None,
-        related_alert_id: Optional[str] = None
+        related_alert_id: Optional[str] = None,
+        feature_id: Optional[str] = None
     ):
         self._id = ObjectId()
         self.detection_type = detection_type
@@ -74,6 +107,8 @@ class MLDetectionInDB:
         self.metadata = metadata or {}
         self.related_log_id = related_log_id
         self.related_alert_id = related_alert_id
+        # Features stored in the feature store are referenced, not copied
+        self.feature_id = feature_id
         self.created_at = datetime.utcnow()
 
     def to_dict(self):
@@ -88,6 +123,7 @@ class MLDetectionInDB:
             "metadata": self.metadata,
             "related_log_id": self.related_log_id,
             "related_alert_id": self.related_alert_id,
+            "feature_id": self.feature_id,
             "created_at": self.created_at
         }
 
@@ -99,11 +135,68 @@ class MLDetectionInDB:
         detection.detection_type = data["detection_type"]
         detection.confidence = data["confidence"]
         detection.prediction = data["prediction"]
-        detection.features = data["features"]
+        detection.features = data.get("features")
         detection.model_name = data["model_name"]
         detection.metadata = data.get("metadata", {})
         detection.related_log_id = data.get("related_log_id")
         detection.related_alert_id = data.get("related_alert_id")
+        detection.feature_id = data.get("feature_id")
         detection.created_at = data.get("created_at", datetime.utcnow())
         return detection
 
+
+
+class MLBackfillRequest(BaseModel):
+    """Schema for starting a historical scoring (backfill) job."""
+    start_time: datetime = Field(..., description="Score records with timestamp >= start_time")
+    end_time: Optional[datetime] = Field(default=None, description="Score records with timestamp < end_time (default: now)")
+    collections: List[str] = Field(default=["logs", "suricata_events"], description="Collections to score")
+    model_name: Optional[str] = Field(default=None, description="Model to score with (default model if omitted)")
+    chunk_size: Optional[int] = Field(default=None, ge=1, le=50000, description="Records read per cursor page")
+    workers: Optional[int] = Field(default=None, ge=1, le=32, description="Parallel scoring slices per chunk")
+    max_rows_per_second: Optional[float] = Field(default=None, ge=0.0, description="Throttle (0 = unlimited)")
+
+
+class MLShadowConfigRequest(BaseModel):
+    """Schema for configuring shadow / canary evaluation of a challenger model."""
+    challenger_model: str = Field(..., description="Challenger model, 'name' (latest version) or 'name@version'")
+    sample_rate: float = Field(default=1.0, gt=0.0, le=1.0, description="Share of live batches also scored by the challenger")
+    canary_percent: float = Field(default=0.0, ge=0.0, le=100.0, description="Percent of default-model inference requests served by the challenger")
+
+
+class MLFeatureBulkRequest(BaseModel):
+    """Schema for bulk feature store lookups."""
+    record_type: str = Field(..., pattern="^(log|suricata_event)$", description="Record type")
+    record_ids: List[str] = Field(..., min_length=1, max_length=10000, description="Record IDs")
+    compute_missing: bool = Field(default=False, description="Extract and store features that are not stored yet")
+
+
+class MLDetectionLabelRequest(BaseModel):
+    """Schema for labeling a detection (ground truth for training)."""
+    label: Optional[str] = Field(..., max_length=100, description="True class of the record, or null to clear")
+
+
+class MLTrainingRequest(BaseModel):
+    """Schema for starting an incremental training job."""
+    model_name: str = Field(..., description="Name of the model to produce (a new version is created)")
+    estimator: str = Field(default="sgd", pattern="^(sgd|naive_bayes|mini_batch_kmeans)$", description="partial_fit estimator")
+    start_time: Optional[datetime] = Field(default=None, description="Use detections created at or after this time")
+    end_time: Optional[datetime] = Field(default=None, description="Use detections created before this time")
+    detection_type: Optional[str] = Field(default=None, description="Only detections of this type")
+    source_model: Optional[str] = Field(default=None, description="Only detections produced by this model ('name' for any version, or 'name@version')")
+    feature_names: Optional[List[str]] = Field(default=None, description="Feature columns (default: those of the first chunk, sorted)")
+    chunk_size: Optional[int] = Field(default=None, ge=10, le=100000, description="Detections per training chunk")
+    epochs: int = Field(default=1, ge=1, le=50, description="Passes over the data")
+    n_clusters: int = Field(default=8, ge=2, le=1000, description="Clusters for mini_batch_kmeans")
+    activate: bool = Field(default=False, description="Activate the trained version when done")
+
+
+class MLExportRequest(BaseModel):
+    """Schema for exporting a training set to memory-mapped NumPy files."""
+    source: str = Field(..., pattern="^(logs|suricata_events|detections)$", description="Records to export")
+    start_time: Optional[datetime] = Field(default=None, description="Export records at or after this time")
+    end_time: Optional[datetime] = Field(default=None, description="Export records before this time (default: now)")
+    match: Dict[str, str] = Field(default_factory=dict, description="Equality filters, e.g. {\"severity\": \"high\"}")
+    target_field: Optional[str] = Field(default=None, max_length=100, description="Field encoded into y (default: label, severity or event_type)")
+    feature_names: Optional[List[str]] = Field(default=None, description="Feature columns (default: those of the first chunk, sorted)")
+    chunk_size: Optional[int] = Field(default=None, ge=100, le=100000, description="Records per chunk")
@@ -44,6 +44,12 @@ class SuricataRuleCreate(SuricataRuleBase):
 class SuricataRuleResponse(SuricataRuleBase):
     """Schema for Suricata rule response."""
     id: str
+    # Set on rules imported from a ruleset
+    sid: Optional[int] = None
+    gid: Optional[int] = None
+    rev: Optional[int] = None
+    classtype: Optional[str] = None
+    ruleset: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -0,0 +1,213 @@
+"""
+Alert rule management routes: threshold rules and imported Sigma rules.
+"""
+from typing import Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
+
+from app.models.alert_rule import AlertRuleCreate, AlertRuleUpdate, AlertRuleResponse, SigmaRuleUpdate
+from app.services.rule_service import (
+    create_alert_rule,
+    get_alert_rules,
+    get_alert_rule,
+    update_alert_rule,
+    delete_alert_rule
+)
+from app.services.sigma_service import (
+    import_sigma_rules,
+    get_sigma_rules,
+    get_sigma_rule,
+    set_sigma_rule_enabled,
+    delete_sigma_rule
+)
+from app.utils.rule_engine import get_rule_engine
+from app.utils.sigma import SigmaError, get_sigma_index
+from app.middleware.auth import get_current_user
+
+router = APIRouter(prefix="/alert-rules", tags=["alert-rules"])
+
+# Largest Sigma YAML upload accepted
+SIGMA_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+
+@router.post("", response_model=AlertRuleResponse, status_code=status.HTTP_201_CREATED)
+async def create_rule(
+    rule_data: AlertRuleCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Create an alert rule.
+
+    Conditions are ANDed. Without a threshold the rule raises an alert for
+    every matching record; with one, it raises an alert when ``count``
+    matches (per ``group_by`` value) arrive within ``window_seconds``.
+    """
+    try:
+        return await create_alert_rule(rule_data.model_dump(), created_by=current_user["id"])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get("", response_model=list[AlertRuleResponse])
+async def list_rules(
+    enabled_only: bool = Query(default=False),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get alert rules."""
+    return await get_alert_rules(enabled_only=enabled_only)
+
+
+@router.get("/stats")
+async def get_rule_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Get per-rule evaluation counts and cost, most expensive first."""
+    return get_rule_engine().stats()
+
+
+@router.post("/sigma", status_code=status.HTTP_201_CREATED)
+async def upload_sigma_rules(
+    file: UploadFile = File(..., description="Sigma YAML, one or more rules separated by ---"),
+    enabled: bool = Query(default=True),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import Sigma rules.
+
+    Rules are compiled on import; rules with an ``id`` replace the stored
+    rule with the same id. Rules using unsupported Sigma features are
+    reported in ``errors`` and skipped.
+    """
+    content = await file.read(SIGMA_MAX_UPLOAD_BYTES + 1)
+    if len(content) > SIGMA_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail="Sigma upload too large"
+        )
+    try:
+        return await import_sigma_rules(content.decode("utf-8"), enabled=enabled, created_by=current_user["id"])
+    except (SigmaError, UnicodeDecodeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get("/sigma")
+async def list_sigma_rules(
+    limit: int = Query(default=100, ge=1, le=1000),
+    skip: int = Query(default=0, ge=0),
+    enabled_only: bool = Query(default=False),
+    level: Optional[str] = Query(default=None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get imported Sigma rules."""
+    return await get_sigma_rules(limit=limit, skip=skip, enabled_only=enabled_only, level=level)
+
+
+@router.get("/sigma/stats")
+async def get_sigma_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Get Sigma index size, candidate counts per log and matching cost."""
+    return get_sigma_index().stats()
+
+
+@router.get("/sigma/{rule_id}")
+async def get_sigma(
+    rule_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a specific Sigma rule by ID."""
+    rule = await get_sigma_rule(rule_id)
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sigma rule not found"
+        )
+    return rule
+
+
+@router.patch("/sigma/{rule_id}")
+async def update_sigma(
+    rule_id: str,
+    rule_update: SigmaRuleUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Enable or disable a Sigma rule."""
+    rule = await set_sigma_rule_enabled(rule_id, rule_update.enabled)
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sigma rule not found"
+        )
+    return rule
+
+
+@router.delete("/sigma/{rule_id}")
+async def delete_sigma(
+    rule_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete a Sigma rule."""
+    deleted = await delete_sigma_rule(rule_id)
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sigma rule not found"
+        )
+    return {"status": "success", "message": "Sigma rule deleted"}
+
+
+@router.get("/{rule_id}", response_model=AlertRuleResponse)
+async def get_rule(
+    rule_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a specific alert rule by ID."""
+    rule = await get_alert_rule(rule_id)
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Alert rule not found"
+        )
+    return rule
+
+
+@router.patch("/{rule_id}", response_model=AlertRuleResponse)
+async def update_rule(
+    rule_id: str,
+    rule_update: AlertRuleUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Update an alert rule (window state of a changed rule starts over)."""
+    try:
+        rule = await update_alert_rule(rule_id, rule_update.model_dump(exclude_unset=True))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if not rule:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Alert rule not found"
+        )
+    return rule
+
+
+@router.delete("/{rule_id}")
+async def delete_rule(
+    rule_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delete an alert rule."""
+    deleted = await delete_alert_rule(rule_id)
+    if not deleted:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Alert rule not found"
+        )
+    return {"status": "success", "message": "Alert rule deleted"}
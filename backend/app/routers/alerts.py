@@ -4,14 +4,32 @@ Alert creation and querying routes.
 from typing import Optional
 from fastapi import APIRouter, HTTPException, status, Depends, Query
 
-from app.models.alert import AlertCreate, AlertUpdate, AlertResponse
+from app.models.alert import (
+    AlertCreate,
+    AlertUpdate,
+    AlertBulkUpdate,
+    AlertBulkItemsUpdate,
+    AlertResponse,
+    IncidentResponse
+)
 from app.services.alert_service import (
     create_alert,
     get_alerts,
+    get_alerts_expanded,
     get_alert_by_id,
+    get_alert_expanded,
     update_alert,
+    bulk_update_alerts,
+    bulk_update_alert_items,
     get_alert_count
 )
+from app.services.correlation_service import (
+    get_incidents,
+    get_incident_by_id,
+    correlation_stats
+)
+from app.services.notification_service import get_notification_dispatcher, retry_dead_notifications
+from app.utils.alert_dedup import get_alert_deduplicator
 from app.middleware.auth import get_current_user
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
@@ -47,11 +65,15 @@ async def create_new_alert(
         created_by=alert["created_by"],
         assigned_to=alert["assigned_to"],
         notes=alert["notes"],
+        occurrences=alert["occurrences"],
+        last_seen=alert["last_seen"],
         created_at=alert["created_at"],
         updated_at=alert["updated_at"]
     )
     
-    # Broadcast to WebSocket clients
+    # Broadcast to WebSocket clients (merged or suppressed repeats were already broadcast)
+    if alert.get("correlated") or alert.get("suppressed"):
+        return alert_response
     try:
         from app.routers.monitoring import broadcast_new_alert
         await broadcast_new_alert(alert_response.dict())
@@ -61,16 +83,29 @@ async def create_new_alert(
     return alert_response
 
 
-@router.get("", response_model=list[AlertResponse])
+@router.get("", response_model=list[AlertResponse], response_model_exclude_unset=True)
 async def list_alerts(
     limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of alerts to return"),
     skip: int = Query(default=0, ge=0, description="Number of alerts to skip"),
     status: Optional[str] = Query(default=None, description="Filter by status"),
     severity: Optional[str] = Query(default=None, description="Filter by severity"),
     alert_type: Optional[str] = Query(default=None, description="Filter by alert type"),
+    expand: bool = Query(default=False, description="Embed related logs, ML detections and Suricata events"),
+    related_limit: int = Query(default=20, ge=1, le=500, description="Maximum embedded items of each kind per alert"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get list of alerts with optional filtering."""
+    if expand:
+        alerts = await get_alerts_expanded(
+            limit=limit,
+            skip=skip,
+            status=status,
+            severity=severity,
+            alert_type=alert_type,
+            related_limit=related_limit
+        )
+        return [AlertResponse(**alert) for alert in alerts]
+
     alerts = await get_alerts(
         limit=limit,
         skip=skip,
@@ -93,6 +128,8 @@ async def list_alerts(
             created_by=alert["created_by"],
             assigned_to=alert["assigned_to"],
             notes=alert["notes"],
+            occurrences=alert["occurrences"],
+            last_seen=alert["last_seen"],
             created_at=alert["created_at"],
             updated_at=alert["updated_at"]
         )
@@ -100,13 +137,127 @@ async def list_alerts(
     ]
 
 
-@router.get("/{alert_id}", response_model=AlertResponse)
+@router.get("/incidents", response_model=list[IncidentResponse])
+async def list_incidents(
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of incidents to return"),
+    skip: int = Query(default=0, ge=0, description="Number of incidents to skip"),
+    status: Optional[str] = Query(default=None, description="Filter by status"),
+    severity: Optional[str] = Query(default=None, description="Filter by severity"),
+    alert_type: Optional[str] = Query(default=None, description="Filter by alert type"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get correlated incidents, most recently active first."""
+    incidents = await get_incidents(
+        limit=limit,
+        skip=skip,
+        status=status,
+        severity=severity,
+        alert_type=alert_type
+    )
+    return [IncidentResponse(**incident) for incident in incidents]
+
+
+@router.get("/incidents/{incident_id}", response_model=IncidentResponse)
+async def get_incident(
+    incident_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a specific incident by ID."""
+    incident = await get_incident_by_id(incident_id)
+    
+    if not incident:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Incident not found"
+        )
+    
+    return IncidentResponse(**incident)
+
+
+@router.get("/correlation/stats")
+async def get_correlation_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Get alert correlation counters."""
+    return correlation_stats()
+
+
+@router.get("/dedup/stats")
+async def get_dedup_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Get alert deduplication (suppression) counters."""
+    deduplicator = get_alert_deduplicator()
+    return deduplicator.stats() if deduplicator is not None else {"enabled": False}
+
+
+@router.get("/notifications/stats")
+async def get_notification_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """Get notification outbox depth, delivery counters, latency and circuit breaker states."""
+    dispatcher = get_notification_dispatcher()
+    return await dispatcher.stats() if dispatcher is not None else {"enabled": False}
+
+
+@router.post("/notifications/retry")
+async def retry_notifications(
+    destination: Optional[str] = Query(default=None, description="Only requeue this destination's entries"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Requeue notifications that ran out of delivery attempts."""
+    requeued = await retry_dead_notifications(destination)
+    return {"status": "success", "requeued": requeued}
+
+
+@router.patch("/bulk")
+async def bulk_update_alert_status(
+    bulk_update: AlertBulkUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Set status, notes or assignment on every alert selected by ids and/or filter."""
+    try:
+        return await bulk_update_alerts(
+            alert_ids=bulk_update.alert_ids,
+            filters=bulk_update.filter.model_dump() if bulk_update.filter else None,
+            status=bulk_update.status,
+            notes=bulk_update.notes,
+            assigned_to=bulk_update.assigned_to
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.patch("/bulk/items")
+async def bulk_update_alert_item_status(
+    bulk_update: AlertBulkItemsUpdate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Apply a separate status, notes or assignment change to each listed alert."""
+    try:
+        return await bulk_update_alert_items([item.model_dump() for item in bulk_update.items])
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get("/{alert_id}", response_model=AlertResponse, response_model_exclude_unset=True)
 async def get_alert(
     alert_id: str,
+    expand: bool = Query(default=False, description="Embed related logs, ML detections and Suricata events"),
+    related_limit: int = Query(default=100, ge=1, le=500, description="Maximum embedded items of each kind"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get a specific alert by ID."""
-    alert = await get_alert_by_id(alert_id)
+    if expand:
+        alert = await get_alert_expanded(alert_id, related_limit=related_limit)
+    else:
+        alert = await get_alert_by_id(alert_id)
     
     if not alert:
         raise HTTPException(
@@ -114,6 +265,9 @@ async def get_alert(
             detail="Alert not found"
         )
     
+    if expand:
+        return AlertResponse(**alert)
+    
     return AlertResponse(
         id=alert["id"],
         title=alert["title"],
@@ -127,6 +281,8 @@ async def get_alert(
         created_by=alert["created_by"],
         assigned_to=alert["assigned_to"],
         notes=alert["notes"],
+        occurrences=alert["occurrences"],
+        last_seen=alert["last_seen"],
         created_at=alert["created_at"],
         updated_at=alert["updated_at"]
     )
@@ -165,6 +321,8 @@ async def update_alert_status(
         created_by=alert["created_by"],
         assigned_to=alert["assigned_to"],
         notes=alert["notes"],
+        occurrences=alert["occurrences"],
+        last_seen=alert["last_seen"],
         created_at=alert["created_at"],
         updated_at=alert["updated_at"]
     )
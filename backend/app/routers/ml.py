@@ -2,12 +2,94 @@
 ML inference and detection routes.
 """
 from typing import Optional
-from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File
+from fastapi import APIRouter, HTTPException, status, Depends, Query, UploadFile, File, Form, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 import os 
-from app.models.ml_detection import MLInferenceRequest, MLInferenceResponse, MLDetectionResponse
-from app.services.ml_service import run_inference, get_detections, get_detection_by_id
+from app.models.ml_detection import (
+    MLInferenceRequest,
+    MLInferenceResponse,
+    MLEnsembleRequest,
+    MLEnsembleResponse,
+    MLDetectionResponse,
+    MLBackfillRequest,
+    MLShadowConfigRequest,
+    MLFeatureBulkRequest,
+    MLDetectionLabelRequest,
+    MLTrainingRequest,
+    MLExportRequest
+)
+from app.services.ml_service import (
+    run_inference,
+    run_ensemble_inference,
+    get_detections,
+    get_detection_by_id,
+    set_detection_label
+)
+from app.services.training_service import (
+    create_training_job,
+    get_training_jobs,
+    get_training_job,
+    cancel_training_job
+)
+from app.services.export_service import (
+    EXPORT_FILES,
+    create_export,
+    get_exports,
+    get_export,
+    process_export
+)
+from app.services.scoring_pipeline import get_scoring_pipeline
+from app.services.feature_store import (
+    ensure_features_bulk,
+    get_features_bulk as get_stored_features_bulk,
+    get_or_compute_features
+)
+from app.utils.feature_extractor import FEATURE_EXTRACTOR_VERSION
+from app.services.shadow_service import (
+    get_shadow_evaluator,
+    get_comparisons,
+    resolve_challenger,
+    deploy_challenger
+)
+from app.utils.baseline_engine import get_baseline_engine
+from app.utils.flow_features import get_flow_feature_engine
+from app.utils.pcap_reader import sniff_format
+from app.services.pcap_service import (
+    create_capture,
+    get_captures,
+    get_capture,
+    process_capture,
+    PCAP_UPLOAD_DIR,
+    PCAP_MAX_BYTES
+)
+from app.services.flow_import_service import (
+    create_flow_import,
+    get_flow_imports,
+    get_flow_import,
+    process_flow_import,
+    detect_format,
+    parse_column_overrides,
+    FLOW_UPLOAD_DIR,
+    FLOW_IMPORT_MAX_BYTES
+)
+from app.services.backfill_service import (
+    create_backfill_job,
+    get_backfill_jobs,
+    get_backfill_job,
+    stop_backfill_job,
+    resume_backfill_job,
+    PAUSED,
+    CANCELLED
+)
 from app.middleware.auth import get_current_user
-from app.utils.ml_model_loader import get_model_loader, initialize_models
+from app.utils.ml_model_loader import (
+    get_model_loader,
+    initialize_models,
+    parse_model_ref,
+    format_model_ref,
+    is_valid_model_part
+)
 
 router = APIRouter(prefix="/ml", tags=["machine learning"])
 
@@ -43,6 +125,33 @@ async def ml_inference(
         )
 
 
+@router.post("/inference/ensemble", response_model=MLEnsembleResponse)
+async def ml_ensemble_inference(
+    request: MLEnsembleRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Score input data with several models in one request.
+    
+    Features are extracted once and all models run concurrently; the
+    combined verdict is stored as a single detection with per-model scores.
+    """
+    try:
+        result = await run_ensemble_inference(
+            data=request.data,
+            models=request.models,
+            strategy=request.strategy,
+            weights=request.weights,
+            auto_create_alert=request.auto_create_alert
+        )
+        return MLEnsembleResponse(**result)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"ML inference failed: {str(e)}"
+        )
+
+
 @router.post("/inference/from-log/{log_id}", response_model=MLInferenceResponse)
 async def ml_inference_from_log(
     log_id: str,
@@ -52,21 +161,23 @@ async def ml_inference_from_log(
 ):
     """
     Run ML inference on a log entry.
+    Features come from the feature store (extracted and stored on first use).
     """
-    from app.services.log_service import get_log_by_id
-    
-    log = await get_log_by_id(log_id)
-    if not log:
+    stored = await get_or_compute_features("log", log_id)
+    if stored is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Log not found"
         )
+    feature_id, features = stored
     
     try:
         result = await run_inference(
-            data=log,
+            data=None,
             model_name=model_name,
-            auto_create_alert=auto_create_alert
+            auto_create_alert=auto_create_alert,
+            features=features,
+            feature_id=feature_id
         )
         
         # Update detection with log ID
@@ -91,6 +202,36 @@ async def ml_inference_from_log(
         )
 
 
+@router.post("/features/bulk")
+async def get_features_bulk(
+    request: MLFeatureBulkRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Bulk fetch stored features for logs or Suricata events.
+    
+    With ``compute_missing`` records without stored features (for the current
+    extractor version) are extracted and stored first.
+    """
+    try:
+        if request.compute_missing:
+            features = await ensure_features_bulk(request.record_type, request.record_ids)
+        else:
+            features = await get_stored_features_bulk(request.record_type, request.record_ids)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return {
+        "record_type": request.record_type,
+        "extractor_version": FEATURE_EXTRACTOR_VERSION,
+        "features": features,
+        "missing": [record_id for record_id in request.record_ids if record_id not in features]
+    }
+
+
 @router.get("/detections", response_model=list[MLDetectionResponse])
 async def list_detections(
     limit: int = Query(default=100, ge=1, le=1000),
@@ -120,6 +261,7 @@ async def list_detections(
             metadata=det.get("metadata"),
             related_log_id=det.get("related_log_id"),
             related_alert_id=det.get("related_alert_id"),
+            label=det.get("label"),
             created_at=det["created_at"]
         )
         for det in detections
@@ -150,30 +292,238 @@ async def get_detection(
         metadata=detection.get("metadata"),
         related_log_id=detection.get("related_log_id"),
         related_alert_id=detection.get("related_alert_id"),
+        label=detection.get("label"),
         created_at=detection["created_at"]
     )
 
 
+@router.put("/detections/{detection_id}/label")
+async def label_detection(
+    detection_id: str,
+    request: MLDetectionLabelRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Set the ground-truth label of a detection (used by training jobs)."""
+    if not await set_detection_label(detection_id, request.label, current_user["id"]):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Detection not found"
+        )
+    return {"status": "success", "detection_id": detection_id, "label": request.label}
+
+
+@router.post("/training", status_code=status.HTTP_202_ACCEPTED)
+async def start_training(
+    request: MLTrainingRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Train a new model version incrementally from labeled detections.
+    
+    Detections are streamed in chunks into a partial_fit estimator in a
+    separate process; the result is saved as the next version of
+    ``model_name``.
+    """
+    if not is_valid_model_part(request.model_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model name may only contain letters, digits, '.', '_' and '-'"
+        )
+    try:
+        return await create_training_job(
+            model_name=request.model_name,
+            estimator=request.estimator,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            detection_type=request.detection_type,
+            source_model=request.source_model,
+            feature_names=request.feature_names,
+            chunk_size=request.chunk_size,
+            epochs=request.epochs,
+            n_clusters=request.n_clusters,
+            activate=request.activate,
+            created_by=current_user["id"]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get("/training")
+async def list_training_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List training jobs, newest first."""
+    return await get_training_jobs(limit=limit)
+
+
+@router.get("/training/{job_id}")
+async def get_training_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a training job with its progress."""
+    job = await get_training_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training job not found"
+        )
+    return job
+
+
+@router.post("/training/{job_id}/cancel")
+async def cancel_training(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Cancel a training job; a running job stops after its current chunk without saving a model."""
+    try:
+        job = await cancel_training_job(job_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training job not found"
+        )
+    return job
+
+
+@router.post("/exports", status_code=status.HTTP_202_ACCEPTED)
+async def start_export(
+    request: MLExportRequest,
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Export a training set to memory-mapped NumPy files.
+    
+    Matching records are streamed in chunks through the feature store into
+    preallocated ``X.npy`` / ``y.npy`` files plus a ``schema.json``
+    sidecar; load them with ``np.load(path, mmap_mode="r")``.
+    """
+    try:
+        export = await create_export(
+            source=request.source,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            match=request.match,
+            target_field=request.target_field,
+            feature_names=request.feature_names,
+            chunk_size=request.chunk_size,
+            created_by=current_user["id"]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    background_tasks.add_task(process_export, export["id"])
+    return export
+
+
+@router.get("/exports")
+async def list_exports(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List training-set exports, newest first."""
+    return await get_exports(limit=limit)
+
+
+@router.get("/exports/{export_id}")
+async def get_export_status(
+    export_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a training-set export with its progress."""
+    export = await get_export(export_id)
+    if not export:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export not found"
+        )
+    return export
+
+
+@router.get("/exports/{export_id}/files/{filename}")
+async def download_export_file(
+    export_id: str,
+    filename: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Download X.npy, y.npy or schema.json of a completed export."""
+    export = await get_export(export_id)
+    if not export:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export not found"
+        )
+    if filename not in EXPORT_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Unknown export file (available: {', '.join(EXPORT_FILES)})"
+        )
+    if export["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export is {export['status']}"
+        )
+    path = os.path.join(export["directory"], filename)
+    if not os.path.exists(path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export file was removed"
+        )
+    return FileResponse(path, filename=filename)
+
+
 @router.get("/models")
 async def list_models(current_user: dict = Depends(get_current_user)):
-    """List available ML models."""
+    """
+    List available ML models.
+    Reports versions, loaded state, size, last-used time and deployments.
+    """
     loader = get_model_loader()
     models = loader.list_models()
     
     return {
         "models": models,
-        "default_model": loader.default_model_name
+        "default_model": loader.default_model_name,
+        "resident_bytes": loader.resident_bytes(),
+        "memory_budget_bytes": loader.memory_budget_bytes,
+        "details": loader.describe_models(),
+        "deployments": {
+            ref: deployment for ref, deployment in loader.deployments.items()
+        }
     }
 
 
-@router.post("/models/upload")
+@router.post("/models/upload", status_code=status.HTTP_202_ACCEPTED)
 async def upload_model(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     model_name: str = None,
+    version: Optional[str] = None,
+    shadow: bool = False,
+    canary_percent: float = Query(0.0, ge=0.0, le=100.0),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Upload a new ML model file.
+    Upload a new version of an ML model.
+    
+    The file is stored as ``<model_name>@<version>.joblib`` and deployed in the
+    background: it is loaded, warmed up and then atomically swapped in, while
+    the currently active version keeps serving requests.
+    With ``shadow=true`` (or a ``canary_percent``) the version is loaded but
+    not activated; it becomes the shadow challenger instead.
     Note: In production, this should have additional security checks.
     """
     if not file.filename.endswith(('.joblib', '.pkl')):
@@ -185,30 +535,478 @@ async def upload_model(
     # Use provided name or filename without extension
     if not model_name:
         model_name = os.path.splitext(file.filename)[0]
+    model_name, ref_version = parse_model_ref(model_name)
+    version = version or ref_version
     
-    # Save model file
-    models_dir = os.getenv("ML_MODELS_DIR", "models")
-    os.makedirs(models_dir, exist_ok=True)
+    loader = get_model_loader()
+    if version is None:
+        version = loader.next_version(model_name)
     
-    model_path = os.path.join(models_dir, f"{model_name}.joblib")
+    if not is_valid_model_part(model_name) or not is_valid_model_part(version):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Model name and version may only contain letters, digits, '.', '_' and '-'"
+        )
     
+    # Save model file
+    os.makedirs(loader.models_dir, exist_ok=True)
+    model_path = loader.model_path(model_name, version)
+    # Any existing file of this version (.joblib, .pkl or a legacy unversioned file)
+    if loader.find_model_file(model_name, version) is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Model {format_model_ref(model_name, version)} already exists"
+        )
+    
+    tmp_path = model_path.with_suffix(".upload")
     try:
-        with open(model_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Load the model
-        loader = get_model_loader()
-        loader.load_model(model_name, model_path)
-        
-        return {
-            "status": "success",
-            "message": f"Model {model_name} uploaded and loaded successfully",
-            "model_name": model_name
-        }
+        with open(tmp_path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                f.write(chunk)
+        os.replace(tmp_path, model_path)
     except Exception as e:
+        if tmp_path.exists():
+            tmp_path.unlink()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload model: {str(e)}"
         )
+    
+    # Load, warm up and swap in off the request path
+    model_ref = format_model_ref(model_name, version)
+    loader.deployments[model_ref] = {"status": "pending", "error": None}
+    challenger = shadow or canary_percent > 0
+    if challenger:
+        background_tasks.add_task(deploy_challenger, model_name, version, str(model_path), 1.0, canary_percent)
+    else:
+        background_tasks.add_task(loader.deploy_model, model_name, version, str(model_path))
+    
+    return {
+        "status": "accepted",
+        "message": f"Model {model_ref} uploaded; {'shadow deployment' if challenger else 'deployment'} started",
+        "model_name": model_name,
+        "version": version,
+        "model_ref": model_ref,
+        "shadow": challenger
+    }
+
+
+@router.post("/models/{model_name}/rollback")
+async def rollback_model(
+    model_name: str,
+    version: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Roll a model back to a previous version.
+    Defaults to the version that was active before the current one.
+    """
+    loader = get_model_loader()
+    
+    try:
+        # Rolling back to a non-resident version loads it from disk
+        active_version = await run_in_threadpool(loader.rollback, model_name, version)
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Rollback failed: {str(e)}"
+        )
+    
+    name, _ = parse_model_ref(model_name)
+    return {
+        "status": "success",
+        "model_name": name,
+        "active_version": active_version,
+        "model_ref": format_model_ref(name, active_version)
+    }
+
+
+@router.get("/shadow")
+async def get_shadow_status(current_user: dict = Depends(get_current_user)):
+    """Get the shadow challenger configuration and its live comparison with the primary."""
+    return get_shadow_evaluator().stats()
+
+
+@router.put("/shadow")
+async def configure_shadow(
+    request: MLShadowConfigRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Shadow a challenger model on live traffic.
+    
+    The challenger is loaded without being activated. It scores the same
+    feature batches as the primary model on a separate thread; optionally a
+    percentage of default-model inference requests is served by it (canary).
+    """
+    try:
+        # Loading the challenger may read it from disk
+        challenger_ref = await run_in_threadpool(resolve_challenger, request.challenger_model)
+    except (ValueError, FileNotFoundError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to load challenger: {str(e)}"
+        )
+    
+    evaluator = get_shadow_evaluator()
+    evaluator.configure(challenger_ref, request.sample_rate, request.canary_percent)
+    return evaluator.stats()
+
+
+@router.delete("/shadow")
+async def disable_shadow(current_user: dict = Depends(get_current_user)):
+    """Stop shadow evaluation and canary routing."""
+    evaluator = get_shadow_evaluator()
+    evaluator.disable()
+    return evaluator.stats()
+
+
+@router.get("/shadow/comparisons")
+async def list_shadow_comparisons(
+    challenger_model: Optional[str] = None,
+    limit: int = Query(48, ge=1, le=1000),
+    current_user: dict = Depends(get_current_user)
+):
+    """List stored hourly primary/challenger comparisons, newest first."""
+    return await get_comparisons(challenger_model=challenger_model, limit=limit)
+
+
+@router.get("/cache")
+async def get_prediction_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Get prediction cache hit/miss/eviction counters."""
+    loader = get_model_loader()
+    if loader.prediction_cache is None:
+        return {"enabled": False}
+    return loader.prediction_cache.stats()
+
+
+@router.delete("/cache")
+async def clear_prediction_cache(current_user: dict = Depends(get_current_user)):
+    """Drop all cached predictions."""
+    loader = get_model_loader()
+    if loader.prediction_cache is not None:
+        loader.prediction_cache.clear()
+    return {"status": "success", "message": "Prediction cache cleared"}
+
+
+@router.get("/scoring/stats")
+async def get_scoring_stats(current_user: dict = Depends(get_current_user)):
+    """Get auto-scoring throughput, queue depth and ingest-to-score lag."""
+    pipeline = get_scoring_pipeline()
+    if pipeline is None:
+        return {"enabled": False}
+    return pipeline.stats()
+
+
+@router.get("/flow-features/stats")
+async def get_flow_feature_stats(current_user: dict = Depends(get_current_user)):
+    """Get sliding-window flow feature state sizes and expiry counters."""
+    engine = get_flow_feature_engine()
+    if engine is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.stats()}
+
+
+@router.get("/baselines/stats")
+async def get_baseline_stats(current_user: dict = Depends(get_current_user)):
+    """Get anomaly baseline table sizes and counters."""
+    engine = get_baseline_engine()
+    if engine is None:
+        return {"enabled": False}
+    return {"enabled": True, **engine.stats()}
+
+
+@router.post("/backfill", status_code=status.HTTP_202_ACCEPTED)
+async def start_backfill(
+    request: MLBackfillRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Start a background job that scores historical logs and Suricata events.
+    
+    The job checkpoints after every chunk and resumes after a restart.
+    Poll GET /ml/backfill/{job_id} for progress, rows per second and ETA.
+    """
+    try:
+        return await create_backfill_job(
+            start_time=request.start_time,
+            end_time=request.end_time,
+            collections=request.collections,
+            model_name=request.model_name,
+            chunk_size=request.chunk_size,
+            workers=request.workers,
+            max_rows_per_second=request.max_rows_per_second,
+            created_by=current_user["id"]
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+@router.get("/backfill")
+async def list_backfill_jobs(
+    limit: int = Query(default=50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List backfill jobs, newest first."""
+    return await get_backfill_jobs(limit=limit)
+
+
+@router.get("/backfill/{job_id}")
+async def get_backfill_status(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a backfill job's status and progress."""
+    job = await get_backfill_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backfill job not found"
+        )
+    return job
+
+
+async def _stop_backfill(job_id: str, reason: str):
+    """Pause or cancel a backfill job, mapping errors to HTTP responses."""
+    try:
+        job = await stop_backfill_job(job_id, reason)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backfill job not found"
+        )
+    return job
+
+
+@router.post("/backfill/{job_id}/pause")
+async def pause_backfill(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Pause a backfill job after its current chunk."""
+    return await _stop_backfill(job_id, PAUSED)
+
+
+@router.post("/backfill/{job_id}/cancel")
+async def cancel_backfill(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Cancel a backfill job. Detections already written are kept."""
+    return await _stop_backfill(job_id, CANCELLED)
 
+
+@router.post("/backfill/{job_id}/resume")
+async def resume_backfill(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Resume a paused or failed backfill job from its last checkpoint."""
+    try:
+        job = await resume_backfill_job(job_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backfill job not found"
+        )
+    return job
+
+
+@router.post("/pcap/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_pcap(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    model_name: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload a .pcap/.pcapng capture for flow reconstruction and scoring.
+    
+    The file is streamed to disk, then parsed in the background. Poll
+    GET /ml/pcap/{capture_id} for progress.
+    """
+    if not file.filename.endswith(('.pcap', '.pcapng', '.cap')):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only .pcap, .pcapng and .cap files are supported"
+        )
+    
+    os.makedirs(PCAP_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(PCAP_UPLOAD_DIR, f"{os.urandom(8).hex()}.capture")
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                if size == 0 and sniff_format(chunk[:4]) is None:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail="File is not a pcap or pcapng capture"
+                    )
+                size += len(chunk)
+                if size > PCAP_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Capture exceeds {PCAP_MAX_BYTES // (1024 * 1024)} MB"
+                    )
+                f.write(chunk)
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload capture: {str(e)}"
+        )
+    
+    capture = await create_capture(
+        filename=file.filename,
+        path=path,
+        size_bytes=size,
+        model_name=model_name,
+        created_by=current_user["id"]
+    )
+    background_tasks.add_task(process_capture, capture["id"])
+    return capture
+
+
+@router.get("/pcap")
+async def list_pcap_captures(
+    limit: int = Query(default=50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List uploaded captures, newest first."""
+    return await get_captures(limit=limit)
+
+
+@router.get("/pcap/{capture_id}")
+async def get_pcap_capture(
+    capture_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a capture's processing status and packet/flow/detection counts."""
+    capture = await get_capture(capture_id)
+    if not capture:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Capture not found"
+        )
+    return capture
+
+
+@router.post("/flows/upload", status_code=status.HTTP_202_ACCEPTED)
+async def upload_flow_export(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    model_name: Optional[str] = Query(default=None),
+    column_mapping: Optional[str] = Form(default=None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Upload a CSV or NDJSON flow export (NetFlow/CICFlowMeter-style columns) for scoring.
+    
+    Columns are matched to the model's features automatically; column_mapping
+    may override it with a JSON object such as {"dest_port": "Dst Port"}
+    (form field). model_name is a query parameter, as for PCAP uploads.
+    Poll GET /ml/flows/imports/{import_id} for progress.
+    """
+    fmt = detect_format(file.filename)
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only .csv, .json, .ndjson and .jsonl files are supported"
+        )
+    try:
+        overrides = parse_column_overrides(column_mapping)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid column_mapping: {str(e)}"
+        )
+    
+    os.makedirs(FLOW_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(FLOW_UPLOAD_DIR, f"{os.urandom(8).hex()}.{fmt}")
+    size = 0
+    try:
+        with open(path, "wb") as f:
+            while chunk := await file.read(1024 * 1024):
+                size += len(chunk)
+                if size > FLOW_IMPORT_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Flow export exceeds {FLOW_IMPORT_MAX_BYTES // (1024 * 1024)} MB"
+                    )
+                f.write(chunk)
+    except Exception as e:
+        if os.path.exists(path):
+            os.remove(path)
+        if isinstance(e, HTTPException):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload flow export: {str(e)}"
+        )
+    
+    flow_import = await create_flow_import(
+        filename=file.filename,
+        path=path,
+        size_bytes=size,
+        fmt=fmt,
+        model_name=model_name,
+        column_overrides=overrides,
+        created_by=current_user["id"]
+    )
+    background_tasks.add_task(process_flow_import, flow_import["id"])
+    return flow_import
+
+
+@router.get("/flows/imports")
+async def list_flow_imports(
+    limit: int = Query(default=50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """List flow export imports, newest first."""
+    return await get_flow_imports(limit=limit)
+
+
+@router.get("/flows/imports/{import_id}")
+async def get_flow_import_status(
+    import_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a flow import's progress, column mapping and counts."""
+    flow_import = await get_flow_import(import_id)
+    if not flow_import:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Flow import not found"
+        )
+    return flow_import
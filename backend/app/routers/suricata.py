@@ -2,7 +2,7 @@
 Suricata integration routes.
 """
 from typing import Optional, List
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Form, Query
 import json
 
 from app.models.suricata import (
@@ -18,6 +18,7 @@ from app.services.suricata_service import (
     get_suricata_events,
     create_suricata_rule,
     get_suricata_rules,
+    import_suricata_rules,
     update_suricata_rule,
     delete_suricata_rule,
     create_suricata_config,
@@ -121,26 +122,61 @@ async def create_rule(
     )
 
 
+@router.post("/rules/import")
+async def import_rules(
+    file: UploadFile = File(..., description="Suricata ruleset (.rules or .rules.gz)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Import a Suricata ruleset such as ET Open.
+    
+    Rules are parsed as the upload streams in and upserted by sid; rules
+    already stored with the same text are left untouched. Commented-out
+    rules are imported disabled. Returns inserted, updated and unchanged
+    counts plus the rules that failed to parse.
+    """
+    filename = file.filename or "upload.rules"
+    if not filename.lower().endswith((".rules", ".rules.gz")):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a .rules or .rules.gz file"
+        )
+    
+    async def read_chunks():
+        while chunk := await file.read(1024 * 1024):
+            yield chunk
+    
+    ruleset = filename[:-3] if filename.lower().endswith(".gz") else filename
+    try:
+        return await import_suricata_rules(read_chunks(), ruleset=ruleset)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
 @router.get("/rules", response_model=List[SuricataRuleResponse])
 async def list_rules(
     enabled_only: bool = False,
+    sid: Optional[int] = Query(default=None, description="Filter by signature ID"),
+    classtype: Optional[str] = Query(default=None, description="Filter by classtype"),
+    ruleset: Optional[str] = Query(default=None, description="Filter by imported ruleset"),
+    limit: Optional[int] = Query(default=None, ge=1, le=10000, description="Maximum number of rules to return"),
+    skip: int = Query(default=0, ge=0, description="Number of rules to skip"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get Suricata rules."""
-    rules = await get_suricata_rules(enabled_only=enabled_only)
+    rules = await get_suricata_rules(
+        enabled_only=enabled_only,
+        sid=sid,
+        classtype=classtype,
+        ruleset=ruleset,
+        limit=limit,
+        skip=skip
+    )
     
-    return [
-        SuricataRuleResponse(
-            id=rule["id"],
-            name=rule["name"],
-            rule_content=rule["rule_content"],
-            description=rule["description"],
-            enabled=rule["enabled"],
-            created_at=rule["created_at"],
-            updated_at=rule["updated_at"]
-        )
-        for rule in rules
-    ]
+    return [SuricataRuleResponse(**rule) for rule in rules]
 
 
 @router.patch("/rules/{rule_id}", response_model=SuricataRuleResponse)
@@ -1,12 +1,45 @@
 """
 Alert service for database operations.
 """
+import asyncio
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 
 from app.database import get_database
 from app.models.alert import AlertInDB
+from app.services.notification_service import enqueue_alert_notification
+from app.utils.alert_dedup import get_alert_deduplicator
+from app.utils.correlation_engine import correlation_key, get_correlation_engine
+
+# Statuses of alerts an analyst has finished with; repeats are not folded into them
+CLOSED_ALERT_STATUSES = ("resolved", "false_positive", "closed")
+
+# Fingerprint -> future resolved once the alert stored for it has been inserted
+_pending_inserts: Dict[str, asyncio.Future] = {}
+
+
+def _alert_to_response(alert: Dict[str, Any]) -> dict:
+    """Convert an alert document to a response dict."""
+    return {
+        "id": str(alert["_id"]),
+        "title": alert["title"],
+        "description": alert["description"],
+        "severity": alert["severity"],
+        "alert_type": alert["alert_type"],
+        "source": alert.get("source"),
+        "metadata": alert.get("metadata", {}),
+        "related_log_ids": alert.get("related_log_ids", []),
+        "status": alert.get("status", "open"),
+        "created_by": alert.get("created_by"),
+        "assigned_to": alert.get("assigned_to"),
+        "notes": alert.get("notes"),
+        "occurrences": alert.get("occurrences", 1),
+        "last_seen": alert.get("last_seen", alert.get("created_at")),
+        "created_at": alert.get("created_at"),
+        "updated_at": alert.get("updated_at")
+    }
 
 
 async def create_alert(
@@ -19,9 +52,52 @@ async def create_alert(
     related_log_ids: Optional[List[str]] = None,
     created_by: Optional[str] = None
 ) -> dict:
-    """Create a new alert in the database."""
+    """
+    Create a new alert in the database.
+    
+    With alert correlation enabled, an alert matching an open incident is
+    merged into it instead of being stored; the incident's first alert is
+    returned with ``correlated`` set.
+    
+    With deduplication enabled, a repeat of a recent alert (same
+    fingerprint, within the suppression window) increments that alert's
+    ``occurrences`` and ``last_seen`` instead of inserting a new one; the
+    updated alert is returned with ``suppressed`` set. A repeat of an alert
+    that has since been resolved or marked a false positive is stored as a
+    new alert.
+    
+    Stored alerts are queued for the configured notification destinations;
+    merged and suppressed ones are not.
+    """
     db = get_database()
     
+    engine = get_correlation_engine()
+    now = datetime.utcnow()
+    if engine is not None:
+        key = correlation_key(title, alert_type, source, metadata)
+        incident = engine.merge(key, severity, related_log_ids, now)
+        if incident is not None:
+            return {**incident.alert, "correlated": True}
+    
+    deduplicator = get_alert_deduplicator()
+    if deduplicator is not None:
+        fingerprint = deduplicator.fingerprint(title, alert_type, source, metadata)
+        pending = _pending_inserts.get(fingerprint)
+        if pending is not None:
+            # The first alert of this fingerprint is still being inserted
+            await asyncio.shield(pending)
+        existing_id = deduplicator.lookup(fingerprint, now)
+        if existing_id is not None:
+            existing = await db.alerts.find_one_and_update(
+                {"_id": ObjectId(existing_id), "status": {"$nin": list(CLOSED_ALERT_STATUSES)}},
+                {"$inc": {"occurrences": 1}, "$max": {"last_seen": now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if existing is not None:
+                return {**_alert_to_response(existing), "suppressed": True}
+            # The alert was closed or deleted; store this one instead
+            deduplicator.forget(fingerprint)
+    
     alert = AlertInDB(
         title=title,
         description=description,
@@ -33,28 +109,48 @@ async def create_alert(
         created_by=created_by
     )
     
-    # Insert into database
-    result = await db.alerts.insert_one(alert.to_dict())
-    
-    # Return alert data
     alert_dict = alert.to_dict()
-    alert_dict["_id"] = result.inserted_id
-    return {
-        "id": str(alert_dict["_id"]),
-        "title": alert_dict["title"],
-        "description": alert_dict["description"],
-        "severity": alert_dict["severity"],
-        "alert_type": alert_dict["alert_type"],
-        "source": alert_dict["source"],
-        "metadata": alert_dict["metadata"],
-        "related_log_ids": alert_dict["related_log_ids"],
-        "status": alert_dict["status"],
-        "created_by": alert_dict["created_by"],
-        "assigned_to": alert_dict["assigned_to"],
-        "notes": alert_dict["notes"],
-        "created_at": alert_dict["created_at"],
-        "updated_at": alert_dict["updated_at"]
-    }
+    alert_dict["_id"] = ObjectId()
+    
+    incident_id = None
+    if engine is not None:
+        incident_id = ObjectId()
+        alert_dict["metadata"] = {**alert_dict["metadata"], "incident_id": str(incident_id)}
+    if deduplicator is not None:
+        inserted = asyncio.get_running_loop().create_future()
+        _pending_inserts[fingerprint] = inserted
+    
+    # Insert into database; repeats are only folded into an alert that exists
+    try:
+        await db.alerts.insert_one(alert_dict)
+        if deduplicator is not None:
+            deduplicator.remember(fingerprint, str(alert_dict["_id"]), alert_dict["created_at"])
+    finally:
+        if deduplicator is not None:
+            if _pending_inserts.get(fingerprint) is inserted:
+                del _pending_inserts[fingerprint]
+            inserted.set_result(None)
+    
+    # The incident is only opened for a stored alert
+    if engine is not None:
+        incident = engine.merge(key, severity, related_log_ids, now)
+        if incident is None:
+            engine.open(key, _alert_to_response(alert_dict), now, incident_id)
+        else:
+            # A concurrent alert with the same key opened one while this insert awaited
+            alert_dict["metadata"] = {**alert_dict["metadata"], "incident_id": str(incident.id)}
+            await db.alerts.update_one(
+                {"_id": alert_dict["_id"]},
+                {"$set": {"metadata.incident_id": str(incident.id)}}
+            )
+    response = _alert_to_response(alert_dict)
+    
+    # Delivered to the notification destinations in the background
+    try:
+        await enqueue_alert_notification(response)
+    except Exception as e:
+        print(f"⚠ Could not queue notifications for alert {response['id']}: {e}")
+    return response
 
 
 async def get_alerts(
@@ -81,25 +177,127 @@ async def get_alerts(
     alerts = await cursor.to_list(length=limit)
     
     # Convert to response format
+    return [_alert_to_response(alert) for alert in alerts]
+
+
+# Fields embedded per related item by the expanded alert views
+_RELATED_LOG_FIELDS = {"source": 1, "log_type": 1, "severity": 1, "message": 1, "metadata": 1, "timestamp": 1}
+_RELATED_DETECTION_FIELDS = {
+    "detection_type": 1, "confidence": 1, "prediction": 1, "model_name": 1, "related_log_id": 1, "created_at": 1
+}
+_RELATED_SURICATA_FIELDS = {"event_type": 1, "timestamp": 1, "raw_event": 1}
+
+
+async def ensure_alert_indexes():
+    """Create the indexes the alert expansion joins rely on (called at startup)."""
+    await get_database().ml_detections.create_index([("related_alert_id", 1), ("created_at", -1)])
+
+
+def _to_object_ids(expression: Any) -> Dict[str, Any]:
+    """Aggregation expression converting an array of id strings to ObjectIds (invalid ids dropped)."""
+    return {"$filter": {
+        "input": {"$map": {
+            "input": expression,
+            "as": "id",
+            "in": {"$convert": {"input": "$$id", "to": "objectId", "onError": None, "onNull": None}}
+        }},
+        "as": "oid",
+        "cond": {"$ne": ["$$oid", None]}
+    }}
+
+
+def _expand_stages(related_limit: int) -> List[Dict[str, Any]]:
+    """
+    $lookup stages embedding an alert's related logs, the ML detections
+    linked to it and the Suricata events behind its related logs.
+
+    Uses the localField + pipeline form of $lookup (MongoDB 5.0+) so the
+    joins use the _id indexes and the (related_alert_id, created_at) index
+    created by ensure_alert_indexes() while projecting and capping the
+    embedded documents.
+    """
     return [
-        {
-            "id": str(alert["_id"]),
-            "title": alert["title"],
-            "description": alert["description"],
-            "severity": alert["severity"],
-            "alert_type": alert["alert_type"],
-            "source": alert.get("source"),
-            "metadata": alert.get("metadata", {}),
-            "related_log_ids": alert.get("related_log_ids", []),
-            "status": alert.get("status", "open"),
-            "created_by": alert.get("created_by"),
-            "assigned_to": alert.get("assigned_to"),
-            "notes": alert.get("notes"),
-            "created_at": alert.get("created_at"),
-            "updated_at": alert.get("updated_at")
-        }
-        for alert in alerts
+        {"$addFields": {
+            "_alert_key": {"$toString": "$_id"},
+            "_log_oids": _to_object_ids({"$slice": [{"$ifNull": ["$related_log_ids", []]}, related_limit]})
+        }},
+        {"$lookup": {
+            "from": "logs",
+            "localField": "_log_oids",
+            "foreignField": "_id",
+            "pipeline": [{"$project": _RELATED_LOG_FIELDS}, {"$limit": related_limit}],
+            "as": "related_logs"
+        }},
+        {"$lookup": {
+            "from": "ml_detections",
+            "localField": "_alert_key",
+            "foreignField": "related_alert_id",
+            "pipeline": [{"$sort": {"created_at": -1}}, {"$limit": related_limit}, {"$project": _RELATED_DETECTION_FIELDS}],
+            "as": "detections"
+        }},
+        {"$addFields": {
+            "_event_oids": _to_object_ids({"$ifNull": ["$related_logs.metadata.suricata_event_id", []]})
+        }},
+        {"$lookup": {
+            "from": "suricata_events",
+            "localField": "_event_oids",
+            "foreignField": "_id",
+            "pipeline": [{"$project": _RELATED_SURICATA_FIELDS}, {"$limit": related_limit}],
+            "as": "suricata_events"
+        }},
+        {"$project": {"_alert_key": 0, "_log_oids": 0, "_event_oids": 0}}
+    ]
+
+
+def _expanded_alert_to_response(alert: Dict[str, Any]) -> dict:
+    """Convert an expanded alert document (with embedded related items) to a response dict."""
+    response = _alert_to_response(alert)
+    for field in ("related_logs", "detections", "suricata_events"):
+        response[field] = [
+            {"id": str(item["_id"]), **{k: v for k, v in item.items() if k != "_id"}}
+            for item in alert.get(field, [])
+        ]
+    return response
+
+
+async def get_alerts_expanded(
+    limit: int = 100,
+    skip: int = 0,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    alert_type: Optional[str] = None,
+    related_limit: int = 20
+) -> List[dict]:
+    """Get alerts with their related logs, ML detections and Suricata events in one aggregation."""
+    db = get_database()
+    
+    query = {}
+    if status:
+        query["status"] = status
+    if severity:
+        query["severity"] = severity
+    if alert_type:
+        query["alert_type"] = alert_type
+    
+    pipeline = [
+        {"$match": query},
+        {"$sort": {"created_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        *_expand_stages(related_limit)
     ]
+    alerts = await db.alerts.aggregate(pipeline).to_list(length=limit)
+    return [_expanded_alert_to_response(alert) for alert in alerts]
+
+
+async def get_alert_expanded(alert_id: str, related_limit: int = 100) -> Optional[dict]:
+    """Get an alert with its related logs, ML detections and Suricata events in one aggregation."""
+    if not ObjectId.is_valid(alert_id):
+        return None
+    db = get_database()
+    pipeline = [{"$match": {"_id": ObjectId(alert_id)}}, *_expand_stages(related_limit)]
+    alerts = await db.alerts.aggregate(pipeline).to_list(length=1)
+    return _expanded_alert_to_response(alerts[0]) if alerts else None
 
 
 async def get_alert_by_id(alert_id: str) -> Optional[dict]:
@@ -111,56 +309,122 @@ async def get_alert_by_id(alert_id: str) -> Optional[dict]:
         if not alert_doc:
             return None
         
-        return {
-            "id": str(alert_doc["_id"]),
-            "title": alert_doc["title"],
-            "description": alert_doc["description"],
-            "severity": alert_doc["severity"],
-            "alert_type": alert_doc["alert_type"],
-            "source": alert_doc.get("source"),
-            "metadata": alert_doc.get("metadata", {}),
-            "related_log_ids": alert_doc.get("related_log_ids", []),
-            "status": alert_doc.get("status", "open"),
-            "created_by": alert_doc.get("created_by"),
-            "assigned_to": alert_doc.get("assigned_to"),
-            "notes": alert_doc.get("notes"),
-            "created_at": alert_doc.get("created_at"),
-            "updated_at": alert_doc.get("updated_at")
-        }
+        return _alert_to_response(alert_doc)
     except Exception:
         return None
 
 
+def _update_fields(
+    status: Optional[str] = None,
+    notes: Optional[str] = None,
+    assigned_to: Optional[str] = None
+) -> Dict[str, Any]:
+    """$set document for an alert triage change."""
+    update_data = {"updated_at": datetime.utcnow()}
+    if status is not None:
+        update_data["status"] = status
+    if notes is not None:
+        update_data["notes"] = notes
+    if assigned_to is not None:
+        update_data["assigned_to"] = assigned_to
+    return update_data
+
+
 async def update_alert(
     alert_id: str,
     status: Optional[str] = None,
     notes: Optional[str] = None,
     assigned_to: Optional[str] = None
 ) -> Optional[dict]:
-    """Update an alert."""
+    """Update an alert and return it (one round trip)."""
     db = get_database()
     
-    try:
-        update_data = {"updated_at": datetime.utcnow()}
-        if status is not None:
-            update_data["status"] = status
-        if notes is not None:
-            update_data["notes"] = notes
-        if assigned_to is not None:
-            update_data["assigned_to"] = assigned_to
-        
-        result = await db.alerts.update_one(
-            {"_id": ObjectId(alert_id)},
-            {"$set": update_data}
-        )
-        
-        if result.modified_count == 0:
-            return None
-        
-        # Return updated alert
-        return await get_alert_by_id(alert_id)
-    except Exception:
+    if not ObjectId.is_valid(alert_id):
         return None
+    
+    alert_doc = await db.alerts.find_one_and_update(
+        {"_id": ObjectId(alert_id)},
+        {"$set": _update_fields(status, notes, assigned_to)},
+        return_document=ReturnDocument.AFTER
+    )
+    return _alert_to_response(alert_doc) if alert_doc else None
+
+
+def _bulk_query(alert_ids: Optional[List[str]], filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Query selecting the alerts of a bulk change.
+    
+    Raises:
+        ValueError: If neither ids nor filters are given, or an id is invalid
+    """
+    query: Dict[str, Any] = {}
+    if alert_ids is not None:
+        invalid = [alert_id for alert_id in alert_ids if not ObjectId.is_valid(alert_id)]
+        if invalid:
+            raise ValueError(f"Invalid alert IDs: {', '.join(invalid[:10])}")
+        query["_id"] = {"$in": [ObjectId(alert_id) for alert_id in alert_ids]}
+    for field in ("status", "severity", "alert_type", "source", "assigned_to"):
+        if filters and filters.get(field) is not None:
+            query[field] = filters[field]
+    created = {}
+    if filters and filters.get("created_after") is not None:
+        created["$gte"] = filters["created_after"]
+    if filters and filters.get("created_before") is not None:
+        created["$lt"] = filters["created_before"]
+    if created:
+        query["created_at"] = created
+    if not query:
+        raise ValueError("Select alerts by alert_ids or at least one filter")
+    return query
+
+
+async def bulk_update_alerts(
+    alert_ids: Optional[List[str]] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    status: Optional[str] = None,
+    notes: Optional[str] = None,
+    assigned_to: Optional[str] = None
+) -> Dict[str, int]:
+    """
+    Apply one triage change to every selected alert with a single update_many.
+    
+    Raises:
+        ValueError: If no alerts are selected or nothing is changed
+    """
+    if status is None and notes is None and assigned_to is None:
+        raise ValueError("Nothing to update: set status, notes or assigned_to")
+    db = get_database()
+    result = await db.alerts.update_many(
+        _bulk_query(alert_ids, filters),
+        {"$set": _update_fields(status, notes, assigned_to)}
+    )
+    return {"matched": result.matched_count, "modified": result.modified_count}
+
+
+async def bulk_update_alert_items(items: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Apply a different triage change per alert with a single bulk_write.
+    
+    Raises:
+        ValueError: If an id is invalid
+    """
+    invalid = [item["id"] for item in items if not ObjectId.is_valid(item["id"])]
+    if invalid:
+        raise ValueError(f"Invalid alert IDs: {', '.join(invalid[:10])}")
+    if not items:
+        return {"matched": 0, "modified": 0}
+    db = get_database()
+    result = await db.alerts.bulk_write(
+        [
+            UpdateOne(
+                {"_id": ObjectId(item["id"])},
+                {"$set": _update_fields(item.get("status"), item.get("notes"), item.get("assigned_to"))}
+            )
+            for item in items
+        ],
+        ordered=False
+    )
+    return {"matched": result.matched_count, "modified": result.modified_count}
 
 
 async def get_alert_count(
@@ -0,0 +1,645 @@
+"""
+Resumable backfill jobs that score historical logs and Suricata events.
+
+A job walks each collection over a time range with a keyset cursor ordered
+by (timestamp, _id), so every page is an index range scan and the position
+can be saved as a checkpoint. Each chunk is featurized and scored in
+parallel slices in the inference pool and its detections are bulk-inserted
+before the checkpoint advances. Features already in the feature store are
+reused rather than extracted again.
+
+Detections are tagged with the job id and chunk number. When a job resumes
+after a restart, detections of chunks past the last checkpoint (written
+just before the crash) are deleted first, so no record is scored twice.
+
+Jobs are throttled by an optional rows-per-second limit and back off while
+the live auto-scoring queue is busy.
+
+A job runs in one worker at a time: the worker claims it atomically with
+its owner id and a lease it renews after every chunk. Other workers only
+take over a job whose lease has expired, and the owner renews its lease
+right before inserting a chunk's detections, so a new owner's cleanup of
+uncheckpointed chunks cannot race an insert still in flight. Pause and
+cancel requests are written to the job document, and the owning runner
+picks them up when it re-reads its status between chunks.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.database import get_database
+from app.models.ml_detection import MLDetectionInDB
+from app.services.ml_service import (
+    classify_prediction,
+    featurize_and_predict_batch,
+    run_in_inference_pool
+)
+from app.services.feature_store import (
+    RECORD_SOURCES,
+    feature_id,
+    feature_store_enabled,
+    get_features_bulk,
+    store_features_bulk
+)
+from app.services.scoring_pipeline import get_scoring_pipeline
+from app.utils.ml_model_loader import get_model_loader
+
+JOBS_COLLECTION = "ml_backfill_jobs"
+
+# Job states; "running" jobs are resumed on startup
+PENDING = "pending"
+RUNNING = "running"
+PAUSED = "paused"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# Fraction of the auto-scoring queue above which backfill yields to live traffic
+LIVE_QUEUE_HIGH_WATER = 0.5
+LIVE_BACKOFF_SECONDS = 0.5
+
+# Identifies this process as the owner of the jobs it runs
+WORKER_ID = uuid.uuid4().hex
+
+
+# Collection name -> (record_type, scoring input builder)
+BACKFILL_SOURCES = {
+    collection: (record_type, build_input)
+    for record_type, (collection, build_input) in RECORD_SOURCES.items()
+}
+
+
+def _lease_seconds() -> float:
+    """How long a claimed job stays owned without a renewal."""
+    return float(os.getenv("ML_BACKFILL_LEASE_SECONDS", "120"))
+
+
+def _lease_fields() -> Dict[str, Any]:
+    """Owner and lease expiry fields for a job this worker holds."""
+    return {"owner": WORKER_ID, "lease_until": datetime.utcnow() + timedelta(seconds=_lease_seconds())}
+
+
+def _job_to_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a job document to an API response with progress figures."""
+    processed = job.get("processed", 0)
+    total = job.get("total_estimate", 0)
+    return {
+        "id": str(job["_id"]),
+        "status": job["status"],
+        "model_name": job["model_name"],
+        "collections": job["collections"],
+        "start_time": job["start_time"],
+        "end_time": job["end_time"],
+        "chunk_size": job["chunk_size"],
+        "workers": job["workers"],
+        "max_rows_per_second": job["max_rows_per_second"],
+        "processed": processed,
+        "total_estimate": total,
+        "progress": min(processed / total, 1.0) if total else (1.0 if job["status"] == COMPLETED else 0.0),
+        "detections": job.get("detections", 0),
+        "errors": job.get("errors", 0),
+        "rows_per_second": job.get("rows_per_second", 0.0),
+        "eta_seconds": job.get("eta_seconds"),
+        "checkpoint": {
+            name: {
+                "last_timestamp": cp.get("last_timestamp"),
+                "last_id": str(cp["last_id"]) if cp.get("last_id") else None,
+                "done": cp.get("done", False)
+            }
+            for name, cp in job.get("checkpoint", {}).items()
+        },
+        "error": job.get("error"),
+        "created_by": job.get("created_by"),
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "completed_at": job.get("completed_at")
+    }
+
+
+class BackfillRunner:
+    """Runs one backfill job as an asyncio task."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job_id = job["_id"]
+        self.job = job
+        self.stop_reason: Optional[str] = None
+        self.lease_lost = False
+        self._stop_event = asyncio.Event()
+        self._run_started = 0.0
+        self._run_rows = 0
+        self._lease_renewed = time.monotonic()
+
+    def request_stop(self, reason: str):
+        """Ask the job to stop after the current chunk (PAUSED or CANCELLED)."""
+        self.stop_reason = reason
+        self._stop_event.set()
+
+    def _apply_status(self, job: Optional[Dict[str, Any]]):
+        """Pick up a pause/cancel written by any worker, or a lease taken over by another."""
+        self._lease_renewed = time.monotonic()
+        if job is None:
+            self.lease_lost = True
+            self._stop_event.set()
+        elif job["status"] in (PAUSED, CANCELLED) and not self.stop_reason:
+            self.request_stop(job["status"])
+
+    async def _renew_lease(self):
+        """Extend the lease and re-read the job status."""
+        job = await get_database()[JOBS_COLLECTION].find_one_and_update(
+            {"_id": self.job_id, "owner": WORKER_ID},
+            {"$set": _lease_fields()},
+            projection={"status": 1}
+        )
+        self._apply_status(job)
+
+    async def _finish(self, update: Dict[str, Any]):
+        """Write the final status (only while this worker still owns the job) and release it."""
+        await get_database()[JOBS_COLLECTION].update_one(
+            {"_id": self.job_id, "owner": WORKER_ID},
+            {"$set": {**update, "updated_at": datetime.utcnow()}, "$unset": {"owner": "", "lease_until": ""}}
+        )
+
+    async def run(self):
+        """Run (or resume) the job until it completes, is stopped or fails."""
+        db = get_database()
+        jobs = db[JOBS_COLLECTION]
+        job = self.job
+
+        try:
+            # Drop detections of a chunk that was written but not checkpointed
+            await db.ml_detections.create_index(
+                [("metadata.backfill_job_id", 1), ("metadata.backfill_chunk", 1)],
+                sparse=True
+            )
+            await db.ml_detections.delete_many({
+                "metadata.backfill_job_id": str(self.job_id),
+                "metadata.backfill_chunk": {"$gt": job.get("chunks_done", 0)}
+            })
+            await jobs.update_one(
+                {"_id": self.job_id, "owner": WORKER_ID, "status": PENDING},
+                {"$set": {"status": RUNNING, "updated_at": datetime.utcnow()}}
+            )
+
+            self._run_started = time.monotonic()
+            for collection in job["collections"]:
+                if job["checkpoint"][collection].get("done"):
+                    continue
+                await db[collection].create_index([("timestamp", 1), ("_id", 1)])
+                if not await self._run_collection(collection):
+                    if self.lease_lost:
+                        print(f"⚠ Backfill job {self.job_id} was taken over by another worker")
+                        return
+                    await self._finish({"status": self.stop_reason, "eta_seconds": None})
+                    print(f"✓ Backfill job {self.job_id} {self.stop_reason}")
+                    return
+
+            # A pause or cancel that arrived during the last chunk wins
+            finished = await jobs.update_one(
+                {"_id": self.job_id, "owner": WORKER_ID, "status": RUNNING},
+                {
+                    "$set": {
+                        "status": COMPLETED,
+                        "eta_seconds": 0.0,
+                        "updated_at": datetime.utcnow(),
+                        "completed_at": datetime.utcnow()
+                    },
+                    "$unset": {"owner": "", "lease_until": ""}
+                }
+            )
+            if finished.modified_count == 0:
+                await self._renew_lease()
+                if not self.lease_lost:
+                    await self._finish({"status": self.stop_reason or PAUSED, "eta_seconds": None})
+                print(f"✓ Backfill job {self.job_id} stopped after its last chunk")
+                return
+            print(f"✓ Backfill job {self.job_id} completed ({job.get('processed', 0)} records)")
+        except asyncio.CancelledError:
+            # Shutdown: leave the job RUNNING so it resumes on next startup
+            raise
+        except Exception as e:
+            await self._finish({"status": FAILED, "error": str(e)})
+            print(f"⚠ Backfill job {self.job_id} failed: {e}")
+
+    def _page_query(self, collection: str) -> Dict[str, Any]:
+        """Time-range filter continuing after the collection's checkpoint."""
+        job = self.job
+        query: Dict[str, Any] = {"timestamp": {"$gte": job["start_time"], "$lt": job["end_time"]}}
+        checkpoint = job["checkpoint"][collection]
+        if checkpoint.get("last_id") is not None:
+            last_ts, last_id = checkpoint["last_timestamp"], checkpoint["last_id"]
+            query = {"$and": [query, {"$or": [
+                {"timestamp": {"$gt": last_ts}},
+                {"timestamp": last_ts, "_id": {"$gt": last_id}}
+            ]}]}
+        return query
+
+    async def _fetch_page(self, collection: str) -> List[Dict[str, Any]]:
+        """Read the next page of a collection in (timestamp, _id) order."""
+        cursor = get_database()[collection].find(self._page_query(collection)).sort(
+            [("timestamp", 1), ("_id", 1)]
+        ).limit(self.job["chunk_size"])
+        return await cursor.to_list(length=self.job["chunk_size"])
+
+    async def _run_collection(self, collection: str) -> bool:
+        """
+        Score one collection from its checkpoint to the end of the range.
+
+        Returns:
+            False if the job was asked to stop before finishing
+        """
+        record_type, build_input = BACKFILL_SOURCES[collection]
+        checkpoint = self.job["checkpoint"][collection]
+        page = await self._fetch_page(collection)
+
+        while page:
+            if self.stop_reason or self.lease_lost:
+                return False
+
+            # Advance the in-memory position and prefetch the next page
+            # while this one is being scored
+            checkpoint["last_timestamp"] = page[-1]["timestamp"]
+            checkpoint["last_id"] = page[-1]["_id"]
+            next_page = asyncio.create_task(self._fetch_page(collection))
+            try:
+                detections, errors = await self._score_chunk(page, record_type, build_input)
+                await self._checkpoint(collection, len(page), detections, errors)
+            except BaseException:
+                next_page.cancel()
+                raise
+            await self._throttle()
+            page = await next_page
+
+        checkpoint["done"] = True
+        await get_database()[JOBS_COLLECTION].update_one(
+            {"_id": self.job_id, "owner": WORKER_ID},
+            {"$set": {f"checkpoint.{collection}.done": True, "updated_at": datetime.utcnow()}}
+        )
+        return True
+
+    async def _score_chunk(self, page: List[Dict[str, Any]], record_type: str, build_input) -> Tuple[int, int]:
+        """
+        Score a chunk in parallel slices and bulk-insert its detections.
+
+        Returns:
+            (detections_written, failed_records)
+        """
+        job = self.job
+        chunk_number = job.get("chunks_done", 0) + 1
+        records = [build_input(doc) for doc in page]
+        record_ids = [str(doc["_id"]) for doc in page]
+
+        # Reuse features stored at ingest or by earlier jobs
+        use_store = feature_store_enabled()
+        stored = await get_features_bulk(record_type, record_ids) if use_store else {}
+        precomputed = [stored.get(record_id) for record_id in record_ids]
+
+        workers = max(1, min(job["workers"], len(records)))
+        step = -(-len(records) // workers)
+        slices = [(offset, offset + step) for offset in range(0, len(records), step)]
+        slice_results = await asyncio.gather(*[
+            run_in_inference_pool(
+                featurize_and_predict_batch, records[start:end], job["model_name"], False, precomputed[start:end]
+            )
+            for start, end in slices
+        ])
+
+        detections = []
+        new_features = []
+        failed = 0
+        for (offset, _), (results, slice_failed) in zip(slices, slice_results):
+            failed += slice_failed
+            for idx, features, prediction, confidence in results:
+                record_id = record_ids[offset + idx]
+                if use_store and record_id not in stored:
+                    new_features.append((record_id, features))
+                prediction_str = str(prediction)
+                detections.append(MLDetectionInDB(
+                    detection_type=classify_prediction(prediction_str),
+                    confidence=confidence,
+                    prediction=prediction_str,
+                    features=None if use_store else features,
+                    feature_id=feature_id(record_type, record_id) if use_store else None,
+                    model_name=job["model_name"],
+                    metadata={
+                        "source": "backfill",
+                        "record_type": record_type,
+                        "record_id": record_id,
+                        "backfill_job_id": str(self.job_id),
+                        "backfill_chunk": chunk_number
+                    },
+                    related_log_id=record_id if record_type == "log" else None
+                ).to_dict())
+
+        if new_features:
+            await store_features_bulk(record_type, new_features)
+        if detections:
+            # A worker that took over the job deletes uncheckpointed chunks; renewing
+            # the lease first means it cannot take over until this insert is done
+            await self._renew_lease()
+            if self.lease_lost:
+                return 0, failed
+            await get_database().ml_detections.insert_many(detections, ordered=False)
+        return len(detections), failed
+
+    async def _checkpoint(self, collection: str, rows: int, detections: int, errors: int):
+        """Persist the cursor position, counters and throughput after a chunk."""
+        job = self.job
+        checkpoint = job["checkpoint"][collection]
+        job["chunks_done"] = job.get("chunks_done", 0) + 1
+        job["processed"] = job.get("processed", 0) + rows
+        job["detections"] = job.get("detections", 0) + detections
+        job["errors"] = job.get("errors", 0) + errors
+
+        self._run_rows += rows
+        elapsed = time.monotonic() - self._run_started
+        rate = self._run_rows / elapsed if elapsed > 0 else 0.0
+        remaining = max(job.get("total_estimate", 0) - job["processed"], 0)
+        job["rows_per_second"] = rate
+        job["eta_seconds"] = remaining / rate if rate > 0 else None
+
+        # Renew the lease and read back the status in the same round trip
+        status = await get_database()[JOBS_COLLECTION].find_one_and_update(
+            {"_id": self.job_id, "owner": WORKER_ID},
+            {"$set": {
+                **_lease_fields(),
+                f"checkpoint.{collection}.last_timestamp": checkpoint["last_timestamp"],
+                f"checkpoint.{collection}.last_id": checkpoint["last_id"],
+                "chunks_done": job["chunks_done"],
+                "processed": job["processed"],
+                "detections": job["detections"],
+                "errors": job["errors"],
+                "rows_per_second": job["rows_per_second"],
+                "eta_seconds": job["eta_seconds"],
+                "updated_at": datetime.utcnow()
+            }},
+            projection={"status": 1}
+        )
+        self._apply_status(status)
+
+    async def _throttle(self):
+        """Respect the rows-per-second limit and yield to live auto-scoring."""
+        max_rate = self.job["max_rows_per_second"]
+        if max_rate > 0:
+            ahead = self._run_rows / max_rate - (time.monotonic() - self._run_started)
+            if ahead > 0:
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), timeout=ahead)
+                except asyncio.TimeoutError:
+                    pass
+
+        pipeline = get_scoring_pipeline()
+        while (
+            pipeline is not None
+            and not self.stop_reason
+            and not self.lease_lost
+            and pipeline.queue.qsize() > pipeline.queue.maxsize * LIVE_QUEUE_HIGH_WATER
+        ):
+            await asyncio.sleep(LIVE_BACKOFF_SECONDS)
+            if time.monotonic() - self._lease_renewed > _lease_seconds() / 3:
+                await self._renew_lease()
+
+        # Always give other coroutines a turn between chunks
+        await asyncio.sleep(0)
+
+
+# Jobs running in this process
+_runners: Dict[str, BackfillRunner] = {}
+_tasks: Dict[str, asyncio.Task] = {}
+_reclaim_task: Optional[asyncio.Task] = None
+
+
+def _start_runner(job: Dict[str, Any]):
+    """Start a runner task for a job document."""
+    job_id = str(job["_id"])
+    runner = BackfillRunner(job)
+    task = asyncio.create_task(runner.run())
+    _runners[job_id] = runner
+    _tasks[job_id] = task
+
+    def _forget(_task, job_id=job_id):
+        if _tasks.get(job_id) is _task:
+            _tasks.pop(job_id, None)
+            _runners.pop(job_id, None)
+
+    task.add_done_callback(_forget)
+
+
+async def create_backfill_job(
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+    collections: Optional[List[str]] = None,
+    model_name: Optional[str] = None,
+    chunk_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    max_rows_per_second: Optional[float] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Create and start a backfill job.
+
+    The model version is resolved once and pinned for the whole job, so a
+    hot-swap during the run does not mix versions.
+
+    Raises:
+        ValueError: If the range or collections are invalid
+    """
+    collections = collections or list(BACKFILL_SOURCES)
+    unknown = [name for name in collections if name not in BACKFILL_SOURCES]
+    if unknown:
+        raise ValueError(f"Unsupported collections: {', '.join(unknown)}")
+    end_time = end_time or datetime.utcnow()
+    if end_time <= start_time:
+        raise ValueError("end_time must be after start_time")
+
+    loader = get_model_loader()
+    model_ref = (await run_in_inference_pool(loader.get_model_version, model_name)).ref
+
+    db = get_database()
+    time_range = {"timestamp": {"$gte": start_time, "$lt": end_time}}
+    total = 0
+    for name in collections:
+        total += await db[name].count_documents(time_range)
+
+    now = datetime.utcnow()
+    job = {
+        "_id": ObjectId(),
+        "status": PENDING,
+        "model_name": model_ref,
+        "collections": list(dict.fromkeys(collections)),
+        "start_time": start_time,
+        "end_time": end_time,
+        "chunk_size": chunk_size or int(os.getenv("ML_BACKFILL_CHUNK_SIZE", "1000")),
+        "workers": workers or int(os.getenv("ML_BACKFILL_WORKERS", "2")),
+        "max_rows_per_second": (
+            max_rows_per_second if max_rows_per_second is not None
+            else float(os.getenv("ML_BACKFILL_MAX_ROWS_PER_SECOND", "0"))
+        ),
+        "checkpoint": {name: {"last_timestamp": None, "last_id": None, "done": False} for name in collections},
+        "chunks_done": 0,
+        "processed": 0,
+        "total_estimate": total,
+        "detections": 0,
+        "errors": 0,
+        "rows_per_second": 0.0,
+        "eta_seconds": None,
+        "error": None,
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+        "completed_at": None,
+        **_lease_fields()
+    }
+    await db[JOBS_COLLECTION].insert_one(job)
+    _start_runner(job)
+    return _job_to_response(job)
+
+
+async def get_backfill_jobs(limit: int = 50) -> List[Dict[str, Any]]:
+    """List backfill jobs, newest first."""
+    cursor = get_database()[JOBS_COLLECTION].find().sort("created_at", -1).limit(limit)
+    return [_job_to_response(job) for job in await cursor.to_list(length=limit)]
+
+
+async def get_backfill_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get a backfill job with its progress."""
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await get_database()[JOBS_COLLECTION].find_one({"_id": ObjectId(job_id)})
+    return _job_to_response(job) if job else None
+
+
+async def stop_backfill_job(job_id: str, reason: str) -> Optional[Dict[str, Any]]:
+    """
+    Pause or cancel a job.
+
+    A running job stops after its current chunk; its checkpoint is kept so a
+    paused job can be resumed. A job running in another worker is stopped by
+    writing the new status, which its runner reads after the chunk.
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    jobs = get_database()[JOBS_COLLECTION]
+    job = await jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        return None
+    stoppable = (PENDING, RUNNING) if reason == PAUSED else (PENDING, RUNNING, PAUSED, FAILED)
+    if job["status"] not in stoppable:
+        raise ValueError(f"Cannot {'pause' if reason == PAUSED else 'cancel'} a {job['status']} job")
+
+    runner = _runners.get(job_id)
+    if runner is not None:
+        runner.request_stop(reason)
+        await asyncio.shield(_tasks[job_id])
+    else:
+        updated = await jobs.update_one(
+            {"_id": job["_id"], "status": {"$in": list(stoppable)}},
+            {"$set": {"status": reason, "eta_seconds": None, "updated_at": datetime.utcnow()}}
+        )
+        if updated.modified_count == 0:
+            raise ValueError("Job status changed, try again")
+    return await get_backfill_job(job_id)
+
+
+async def resume_backfill_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Resume a paused or failed job from its last checkpoint."""
+    if not ObjectId.is_valid(job_id):
+        return None
+    jobs = get_database()[JOBS_COLLECTION]
+    job = await jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        return None
+    if job_id in _tasks:
+        raise ValueError("Job is already running")
+    if job["status"] not in (PAUSED, FAILED):
+        raise ValueError(f"Cannot resume a {job['status']} job")
+
+    # The runner that paused it may still be finishing its chunk elsewhere
+    job = await jobs.find_one_and_update(
+        {
+            "_id": job["_id"],
+            "status": {"$in": [PAUSED, FAILED]},
+            "$or": [{"owner": None}, {"lease_until": {"$lt": datetime.utcnow()}}]
+        },
+        {"$set": {"status": RUNNING, "error": None, "updated_at": datetime.utcnow(), **_lease_fields()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if job is None:
+        raise ValueError("Job is still stopping, try again")
+    _start_runner(job)
+    return _job_to_response(job)
+
+
+async def claim_orphaned_jobs() -> int:
+    """
+    Claim and restart running jobs that no live worker holds.
+
+    Each job is claimed with one atomic update, so when several workers
+    look at the same time exactly one of them gets it.
+
+    Returns:
+        Number of jobs started
+    """
+    jobs = get_database()[JOBS_COLLECTION]
+    resumed = 0
+    while True:
+        job = await jobs.find_one_and_update(
+            {
+                "status": {"$in": [PENDING, RUNNING]},
+                "$or": [{"owner": None}, {"lease_until": {"$lt": datetime.utcnow()}}]
+            },
+            {"$set": {"status": RUNNING, "updated_at": datetime.utcnow(), **_lease_fields()}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None:
+            return resumed
+        if str(job["_id"]) not in _tasks:
+            _start_runner(job)
+            resumed += 1
+
+
+async def _reclaim_loop():
+    """Periodically take over jobs whose owner stopped renewing its lease."""
+    while True:
+        await asyncio.sleep(_lease_seconds())
+        try:
+            resumed = await claim_orphaned_jobs()
+            if resumed:
+                print(f"✓ Took over {resumed} ML backfill job(s) with an expired lease")
+        except Exception as e:
+            print(f"⚠ Error claiming ML backfill jobs: {e}")
+
+
+async def resume_backfill_jobs():
+    """Restart jobs that were running when the server stopped, and watch for orphaned jobs."""
+    global _reclaim_task
+    await get_database()[JOBS_COLLECTION].create_index([("status", 1), ("lease_until", 1)])
+    resumed = await claim_orphaned_jobs()
+    if resumed:
+        print(f"✓ Resumed {resumed} ML backfill job(s)")
+    if _reclaim_task is None:
+        _reclaim_task = asyncio.create_task(_reclaim_loop())
+
+
+async def shutdown_backfill_jobs():
+    """Cancel running jobs on shutdown and release them; any worker resumes them from their checkpoint."""
+    global _reclaim_task
+    if _reclaim_task is not None:
+        _reclaim_task.cancel()
+        await asyncio.gather(_reclaim_task, return_exceptions=True)
+        _reclaim_task = None
+    job_ids = [runner.job_id for runner in _runners.values()]
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if job_ids:
+        await get_database()[JOBS_COLLECTION].update_many(
+            {"_id": {"$in": job_ids}, "owner": WORKER_ID},
+            {"$unset": {"owner": "", "lease_until": ""}}
+        )
@@ -0,0 +1,151 @@
+"""
+Online anomaly baselines for the log and Suricata ingest paths.
+
+Every ingested log is counted against its source, and every Suricata event
+against its source host. Closed intervals that deviate from the entity's
+hour-of-day baseline are stored as ``ml_detections`` with
+``detection_type="anomaly"``. A background task closes intervals of
+entities that went quiet and snapshots the baseline tables to disk.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.models.ml_detection import MLDetectionInDB
+from app.services.ml_service import store_detections_bulk
+from app.utils.baseline_engine import BaselineEngine, get_baseline_engine
+
+BASELINE_MODEL_NAME = "baseline-ewma"
+ERROR_SEVERITIES = ("error", "critical")
+
+_baseline_task: Optional[asyncio.Task] = None
+
+
+def _snapshot_path() -> str:
+    return os.getenv("ML_BASELINE_SNAPSHOT_PATH", "data/baselines.npz")
+
+
+def _epoch(timestamp: Optional[datetime]) -> float:
+    """Epoch seconds of a (naive UTC or aware) timestamp; now if missing."""
+    if timestamp is None:
+        return time.time()
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+async def _store_anomalies(anomalies: List[Dict[str, Any]]):
+    """Store baseline anomalies as ML detections."""
+    if not anomalies:
+        return
+    detections = []
+    for anomaly in anomalies:
+        direction = "spike" if anomaly["z_score"] > 0 else "drop"
+        detections.append(MLDetectionInDB(
+            detection_type="anomaly",
+            confidence=BaselineEngine.confidence(anomaly["z_score"]),
+            prediction=f"{anomaly['metric']}_{direction}",
+            features=anomaly,
+            model_name=BASELINE_MODEL_NAME,
+            metadata={
+                "source": "baselines",
+                "record_type": "baseline_interval",
+                "entity_kind": anomaly["entity_kind"],
+                "entity": anomaly["entity"]
+            }
+        ))
+    try:
+        await store_detections_bulk(detections)
+    except Exception as e:
+        print(f"⚠ Failed to store baseline anomalies: {e}")
+
+
+async def observe_log(log: Dict[str, Any]):
+    """Count a created log against its source baseline (no-op unless enabled)."""
+    engine = get_baseline_engine()
+    if engine is None:
+        return
+    anomalies = engine.observe(
+        "source",
+        log["source"],
+        _epoch(log.get("timestamp")),
+        bytes_count=len(log.get("message") or ""),
+        is_error=log.get("severity") in ERROR_SEVERITIES
+    )
+    await _store_anomalies(anomalies)
+
+
+async def observe_suricata_event(eve_json: Dict[str, Any], timestamp: Optional[datetime]):
+    """Count a Suricata event against its source host baseline (no-op unless enabled)."""
+    engine = get_baseline_engine()
+    if engine is None:
+        return
+    host = eve_json.get("src_ip")
+    if not host:
+        return
+    flow = eve_json.get("flow") or eve_json.get("netflow") or {}
+    if "bytes" in flow:
+        bytes_count = flow.get("bytes") or 0
+    else:
+        bytes_count = (flow.get("bytes_toserver") or 0) + (flow.get("bytes_toclient") or 0)
+    anomalies = engine.observe(
+        "host",
+        str(host),
+        _epoch(timestamp),
+        bytes_count=float(bytes_count),
+        is_error=eve_json.get("event_type") == "alert"
+    )
+    await _store_anomalies(anomalies)
+
+
+async def _baseline_loop(engine: BaselineEngine):
+    """Close quiet intervals each interval and snapshot periodically."""
+    snapshot_interval = float(os.getenv("ML_BASELINE_SNAPSHOT_INTERVAL", "300"))
+    last_snapshot = time.monotonic()
+    while True:
+        await asyncio.sleep(engine.interval_seconds)
+        try:
+            await _store_anomalies(engine.flush(time.time()))
+            if time.monotonic() - last_snapshot >= snapshot_interval:
+                await run_in_threadpool(engine.snapshot, _snapshot_path())
+                last_snapshot = time.monotonic()
+        except Exception as e:
+            print(f"⚠ Baseline maintenance failed: {e}")
+
+
+async def start_baselines():
+    """Load the last baseline snapshot and start the maintenance task."""
+    global _baseline_task
+    engine = get_baseline_engine()
+    if engine is None or _baseline_task is not None:
+        return
+    path = _snapshot_path()
+    try:
+        if await run_in_threadpool(engine.load, path):
+            print(f"✓ Loaded anomaly baselines for {engine.stats()['entities']} entities")
+    except Exception as e:
+        print(f"⚠ Could not load baseline snapshot {path}: {e}")
+    _baseline_task = asyncio.create_task(_baseline_loop(engine))
+
+
+async def stop_baselines():
+    """Stop the maintenance task and write a final snapshot."""
+    global _baseline_task
+    if _baseline_task is not None:
+        _baseline_task.cancel()
+        try:
+            await _baseline_task
+        except asyncio.CancelledError:
+            pass
+        _baseline_task = None
+    engine = get_baseline_engine()
+    if engine is not None:
+        try:
+            await run_in_threadpool(engine.snapshot, _snapshot_path())
+            print("✓ Saved anomaly baseline snapshot")
+        except Exception as e:
+            print(f"⚠ Could not save baseline snapshot: {e}")
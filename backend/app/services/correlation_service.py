@@ -0,0 +1,153 @@
+"""
+Incident persistence for alert correlation.
+
+create_alert merges alerts into incidents held by the in-memory
+CorrelationEngine. A background task writes the incidents that changed to
+the ``incidents`` collection in one bulk write per flush interval, so a
+burst of thousands of matching alerts costs one alert insert plus a
+handful of incident updates.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.database import get_database
+from app.utils.correlation_engine import CorrelationEngine, get_correlation_engine
+
+INCIDENTS_COLLECTION = "incidents"
+
+_correlation_task: Optional[asyncio.Task] = None
+
+
+def _incident_to_response(incident: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an incident document to an API response."""
+    return {
+        "id": str(incident["_id"]),
+        "title": incident["title"],
+        "alert_type": incident["alert_type"],
+        "source": incident.get("source"),
+        "severity": incident["severity"],
+        "status": incident.get("status", "open"),
+        "source_ip": incident.get("source_ip"),
+        "target": incident.get("target"),
+        "signature": incident["signature"],
+        "alert_id": incident["alert_id"],
+        "alert_count": incident["alert_count"],
+        "related_log_ids": incident.get("related_log_ids", []),
+        "first_seen": incident["first_seen"],
+        "last_seen": incident["last_seen"],
+        "created_at": incident.get("created_at"),
+        "updated_at": incident.get("updated_at")
+    }
+
+
+async def flush_incidents() -> int:
+    """
+    Persist incidents changed since the last flush in one bulk write.
+
+    If the write fails, the changes are handed back to the engine and
+    written by the next flush.
+
+    Returns:
+        Number of incidents written
+    """
+    engine = get_correlation_engine()
+    if engine is None:
+        return 0
+    now = datetime.utcnow()
+    documents = engine.take_dirty(now)
+    if not documents:
+        return 0
+    operations = [
+        UpdateOne(
+            {"_id": document["_id"]},
+            {
+                "$set": {**{k: v for k, v in document.items() if k != "_id"}, "updated_at": now},
+                "$setOnInsert": {"status": "open", "created_at": document["first_seen"]}
+            },
+            upsert=True
+        )
+        for document in documents
+    ]
+    try:
+        await get_database()[INCIDENTS_COLLECTION].bulk_write(operations, ordered=False)
+    except Exception:
+        engine.restore_dirty(documents)
+        raise
+    return len(documents)
+
+
+async def _correlation_loop(interval: float):
+    """Flush changed incidents every interval."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_incidents()
+        except Exception as e:
+            print(f"⚠ Incident flush failed: {e}")
+
+
+async def start_correlation():
+    """Start the incident flush task if alert correlation is enabled."""
+    global _correlation_task
+    if get_correlation_engine() is None or _correlation_task is not None:
+        return
+    interval = float(os.getenv("ALERT_CORRELATION_FLUSH_INTERVAL", "5"))
+    _correlation_task = asyncio.create_task(_correlation_loop(interval))
+    print("✓ Alert correlation started")
+
+
+async def stop_correlation():
+    """Stop the flush task and persist the remaining incident changes."""
+    global _correlation_task
+    if _correlation_task is not None:
+        _correlation_task.cancel()
+        try:
+            await _correlation_task
+        except asyncio.CancelledError:
+            pass
+        _correlation_task = None
+    try:
+        await flush_incidents()
+    except Exception as e:
+        print(f"⚠ Could not persist incidents on shutdown: {e}")
+
+
+async def get_incidents(
+    limit: int = 100,
+    skip: int = 0,
+    status: Optional[str] = None,
+    severity: Optional[str] = None,
+    alert_type: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Get incidents with optional filtering, most recently active first."""
+    # Pending merges are written first so counts are current
+    await flush_incidents()
+    query = {}
+    if status:
+        query["status"] = status
+    if severity:
+        query["severity"] = severity
+    if alert_type:
+        query["alert_type"] = alert_type
+    cursor = get_database()[INCIDENTS_COLLECTION].find(query).sort("last_seen", -1).skip(skip).limit(limit)
+    return [_incident_to_response(incident) for incident in await cursor.to_list(length=limit)]
+
+
+async def get_incident_by_id(incident_id: str) -> Optional[Dict[str, Any]]:
+    """Get an incident by ID."""
+    if not ObjectId.is_valid(incident_id):
+        return None
+    await flush_incidents()
+    incident = await get_database()[INCIDENTS_COLLECTION].find_one({"_id": ObjectId(incident_id)})
+    return _incident_to_response(incident) if incident else None
+
+
+def correlation_stats() -> Dict[str, Any]:
+    """Correlation engine counters (enabled=False when disabled)."""
+    engine: Optional[CorrelationEngine] = get_correlation_engine()
+    return engine.stats() if engine is not None else {"enabled": False}
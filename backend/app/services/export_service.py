@@ -0,0 +1,311 @@
+"""
+Training-set export to memory-mapped NumPy files.
+
+An export job counts the matching records, preallocates ``X.npy``
+(float32, rows x features) and ``y.npy`` (int32 class codes) with
+``np.lib.format.open_memmap`` and fills them chunk by chunk while a cursor
+streams the records, so only one chunk of records and features is ever in
+memory. Features come from the feature store (extracted and stored on a
+miss). ``schema.json`` describes the columns, the class codes and the
+source. If fewer rows arrive than were counted, the files are shrunk in
+place. The result loads with ``np.load(path, mmap_mode="r")``.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_database
+from app.services.feature_store import (
+    RECORD_SOURCES,
+    extract_features_bulk,
+    feature_store_enabled,
+    get_features_bulk,
+    hydrate_features,
+    store_features_bulk
+)
+from app.utils.feature_extractor import FEATURE_EXTRACTOR_VERSION
+
+EXPORTS_COLLECTION = "ml_export_jobs"
+EXPORT_DIR = os.getenv("ML_EXPORT_DIR", "exports")
+EXPORT_FILES = ("X.npy", "y.npy", "schema.json")
+
+# Source -> (collection, record_type for the feature store, time field,
+#            default target field, fields allowed in equality filters)
+EXPORT_SOURCES = {
+    "logs": ("logs", "log", "timestamp", "severity", ("source", "severity", "log_type")),
+    "suricata_events": ("suricata_events", "suricata_event", "timestamp", "event_type", ("event_type",)),
+    "detections": ("ml_detections", None, "created_at", "label", ("detection_type", "model_name", "label", "prediction")),
+}
+
+# y code of rows whose target is missing
+MISSING_TARGET = -1
+
+
+def _export_to_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an export job document to an API response."""
+    total = job.get("total_rows") or 0
+    return {
+        "id": str(job["_id"]),
+        "source": job["source"],
+        "status": job["status"],
+        "filters": job.get("filters", {}),
+        "target_field": job["target_field"],
+        "feature_names": job.get("feature_names"),
+        "total_rows": total,
+        "rows": job.get("rows", 0),
+        "progress": min(job.get("rows", 0) / total, 1.0) if total else 0.0,
+        "classes": job.get("classes"),
+        "directory": job.get("directory"),
+        "files": list(EXPORT_FILES) if job["status"] == "completed" else [],
+        "error": job.get("error"),
+        "created_by": job.get("created_by"),
+        "created_at": job["created_at"],
+        "completed_at": job.get("completed_at")
+    }
+
+
+def _build_query(source: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """MongoDB filter for an export's time range and equality filters."""
+    _, _, time_field, _, _ = EXPORT_SOURCES[source]
+    query: Dict[str, Any] = dict(filters.get("match") or {})
+    time_range = {}
+    if filters.get("start_time"):
+        time_range["$gte"] = filters["start_time"]
+    if filters.get("end_time"):
+        time_range["$lt"] = filters["end_time"]
+    if time_range:
+        query[time_field] = time_range
+    return query
+
+
+async def create_export(
+    source: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    match: Optional[Dict[str, str]] = None,
+    target_field: Optional[str] = None,
+    feature_names: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Register an export job.
+
+    Raises:
+        ValueError: If the source is unknown or a filter field is not allowed
+    """
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Unknown export source: {source}")
+    _, _, _, default_target, allowed = EXPORT_SOURCES[source]
+    unknown = [field for field in (match or {}) if field not in allowed]
+    if unknown:
+        raise ValueError(f"Cannot filter {source} by {', '.join(unknown)} (allowed: {', '.join(allowed)})")
+
+    job_id = ObjectId()
+    job = {
+        "_id": job_id,
+        "source": source,
+        "status": "pending",
+        # Default end: job creation, so the row count stays stable while exporting
+        "filters": {"start_time": start_time, "end_time": end_time or datetime.utcnow(), "match": match or {}},
+        "target_field": target_field or default_target,
+        "feature_names": feature_names,
+        "chunk_size": chunk_size or int(os.getenv("ML_EXPORT_CHUNK_SIZE", "10000")),
+        "directory": os.path.join(EXPORT_DIR, str(job_id)),
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "completed_at": None
+    }
+    await get_database()[EXPORTS_COLLECTION].insert_one(job)
+    return _export_to_response(job)
+
+
+async def get_exports(limit: int = 50) -> List[Dict[str, Any]]:
+    """List export jobs, newest first."""
+    cursor = get_database()[EXPORTS_COLLECTION].find().sort("created_at", -1).limit(limit)
+    return [_export_to_response(job) for job in await cursor.to_list(length=limit)]
+
+
+async def get_export(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get an export job with its progress."""
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await get_database()[EXPORTS_COLLECTION].find_one({"_id": ObjectId(job_id)})
+    return _export_to_response(job) if job else None
+
+
+def _target_value(doc: Dict[str, Any], field: str) -> Any:
+    """Read a (dotted) field from a document."""
+    value: Any = doc
+    for part in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+async def _chunk_features(record_type: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Features of a chunk of records: stored ones, plus the rest extracted and stored."""
+    _, build_input = RECORD_SOURCES[record_type]
+    ids = [str(doc["_id"]) for doc in docs]
+    stored = await get_features_bulk(record_type, ids) if feature_store_enabled() else {}
+    missing = [doc for doc, record_id in zip(docs, ids) if record_id not in stored]
+    if missing:
+        computed = await run_in_threadpool(extract_features_bulk, build_input, missing)
+        items = [(str(doc["_id"]), features) for doc, features in zip(missing, computed)]
+        if feature_store_enabled():
+            await store_features_bulk(record_type, items)
+        stored.update(items)
+    return [stored[record_id] for record_id in ids]
+
+
+def _fill_chunk(X, y, offset: int, features_list: List[Dict[str, Any]], feature_names: List[str], codes: List[int]):
+    """Write one chunk into the memory-mapped arrays (blocking)."""
+    block = np.zeros((len(features_list), len(feature_names)), dtype=np.float32)
+    for column, name in enumerate(feature_names):
+        block[:, column] = [features.get(name, 0.0) for features in features_list]
+    end = offset + len(features_list)
+    X[offset:end] = block
+    y[offset:end] = codes
+
+
+def shrink_npy(path: str, rows: int):
+    """
+    Truncate a C-ordered .npy file to its first ``rows`` rows in place.
+
+    The header is rewritten with the new shape, padded to its original
+    length so the data offset does not move.
+    """
+    with open(path, "r+b") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        data_offset = f.tell()
+        new_shape = (rows,) + tuple(shape[1:])
+        header = repr({"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": fortran_order, "shape": new_shape})
+        prefix_len = 10 if version == (1, 0) else 12
+        header_len = data_offset - prefix_len
+        header = header.ljust(header_len - 1) + "\n"
+        f.seek(prefix_len)
+        f.write(header.encode("latin1"))
+        f.truncate(data_offset + rows * int(np.prod(shape[1:], dtype=np.int64)) * dtype.itemsize)
+
+
+async def process_export(job_id: str):
+    """Stream records through the feature store into X.npy / y.npy (background task)."""
+    db = get_database()
+    jobs = db[EXPORTS_COLLECTION]
+    job = await jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        return
+
+    collection, record_type, _, _, _ = EXPORT_SOURCES[job["source"]]
+    query = _build_query(job["source"], job["filters"])
+    directory = job["directory"]
+    X = y = None
+    rows = 0
+    try:
+        total = await db[collection].count_documents(query)
+        await jobs.update_one({"_id": job["_id"]}, {"$set": {"status": "processing", "total_rows": total}})
+        os.makedirs(directory, exist_ok=True)
+
+        feature_names = job.get("feature_names")
+        classes: Dict[str, int] = {}
+        cursor = db[collection].find(query).sort("_id", 1).batch_size(job["chunk_size"])
+        while rows < total:
+            docs = []
+            async for doc in cursor:
+                docs.append(doc)
+                if len(docs) >= job["chunk_size"]:
+                    break
+            if not docs:
+                break
+            docs = docs[:total - rows]
+
+            if record_type is None:
+                await hydrate_features(docs)
+                features_list = [doc.get("features") or {} for doc in docs]
+            else:
+                features_list = await _chunk_features(record_type, docs)
+
+            if X is None:
+                if feature_names is None:
+                    # Fixed from the first chunk, in the sorted order live inference uses
+                    feature_names = sorted({name for features in features_list for name in features})
+                X = np.lib.format.open_memmap(
+                    os.path.join(directory, "X.npy"), mode="w+", dtype=np.float32, shape=(total, len(feature_names))
+                )
+                y = np.lib.format.open_memmap(
+                    os.path.join(directory, "y.npy"), mode="w+", dtype=np.int32, shape=(total,)
+                )
+                await jobs.update_one({"_id": job["_id"]}, {"$set": {"feature_names": feature_names}})
+
+            codes = []
+            for doc in docs:
+                target = _target_value(doc, job["target_field"])
+                if target is None:
+                    codes.append(MISSING_TARGET)
+                else:
+                    codes.append(classes.setdefault(str(target), len(classes)))
+
+            await run_in_threadpool(_fill_chunk, X, y, rows, features_list, feature_names, codes)
+            rows += len(docs)
+            await jobs.update_one({"_id": job["_id"]}, {"$set": {"rows": rows}})
+
+        if X is None:
+            # Nothing matched: write empty, still loadable files
+            feature_names = feature_names or []
+            np.save(os.path.join(directory, "X.npy"), np.zeros((0, len(feature_names)), dtype=np.float32))
+            np.save(os.path.join(directory, "y.npy"), np.zeros((0,), dtype=np.int32))
+        else:
+            X.flush()
+            y.flush()
+            del X, y
+            X = y = None
+            if rows < total:
+                # Records deleted since counting
+                shrink_npy(os.path.join(directory, "X.npy"), rows)
+                shrink_npy(os.path.join(directory, "y.npy"), rows)
+
+        class_list = sorted(classes, key=classes.get)
+        schema = {
+            "export_id": str(job["_id"]),
+            "source": job["source"],
+            "filters": {
+                key: value.isoformat() if isinstance(value, datetime) else value
+                for key, value in job["filters"].items()
+            },
+            "rows": rows,
+            "X": {"file": "X.npy", "dtype": "float32", "shape": [rows, len(feature_names)], "columns": feature_names},
+            "y": {
+                "file": "y.npy",
+                "dtype": "int32",
+                "shape": [rows],
+                "target_field": job["target_field"],
+                "classes": class_list,
+                "missing_code": MISSING_TARGET
+            },
+            "extractor_version": FEATURE_EXTRACTOR_VERSION,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        with open(os.path.join(directory, "schema.json"), "w") as f:
+            json.dump(schema, f, indent=2)
+
+        await jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "completed", "rows": rows, "classes": class_list, "completed_at": datetime.utcnow()}}
+        )
+        print(f"✓ Exported {rows} {job['source']} rows to {directory}")
+    except Exception as e:
+        await jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "failed", "rows": rows, "error": str(e)}}
+        )
+        print(f"⚠ Export {job_id} failed: {e}")
@@ -0,0 +1,226 @@
+"""
+Feature store: extracted features persisted per record and extractor version.
+
+Features are computed once per (record, FEATURE_EXTRACTOR_VERSION) and kept
+in ``ml_features`` as a float32 byte string plus a layout id. The layout
+(sorted feature names) is stored once in ``ml_feature_layouts`` and cached
+in memory, so a document holds only its values. float32 is what models are
+fed anyway (FeatureExtractor.to_feature_matrix), so nothing is lost.
+
+Document ids are "<record_type>:<record_id>:v<version>", which makes
+lookups and bulk fetches plain ``_id`` queries and duplicate writes
+harmless. Detections store this id as ``feature_id`` instead of a copy of
+the features; readers hydrate them with ``hydrate_features``.
+"""
+import hashlib
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from bson import Binary, ObjectId
+from fastapi.concurrency import run_in_threadpool
+from pymongo.errors import BulkWriteError
+
+from app.database import get_database
+from app.utils.feature_extractor import FEATURE_EXTRACTOR_VERSION, FeatureExtractor
+
+FEATURES_COLLECTION = "ml_features"
+LAYOUTS_COLLECTION = "ml_feature_layouts"
+
+# Layout id -> sorted feature names
+_layouts: Dict[str, Tuple[str, ...]] = {}
+
+
+def _log_input(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape a stored log like the record create_log submits for live scoring."""
+    return {
+        "id": str(doc["_id"]),
+        "source": doc.get("source"),
+        "log_type": doc.get("log_type"),
+        "severity": doc.get("severity"),
+        "message": doc.get("message"),
+        "metadata": doc.get("metadata"),
+        "timestamp": doc.get("timestamp"),
+        "created_at": doc.get("created_at")
+    }
+
+
+def _suricata_input(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Live scoring uses the raw EVE event plus its ingest-time window features."""
+    record = doc.get("raw_event") or {}
+    if "window_features" in doc:
+        record = {**record, "window_features": doc["window_features"]}
+    return record
+
+
+# Record type -> (collection, scoring input builder)
+RECORD_SOURCES: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = {
+    "log": ("logs", _log_input),
+    "suricata_event": ("suricata_events", _suricata_input),
+}
+
+
+def feature_store_enabled() -> bool:
+    """Check whether features are persisted and referenced by detections (ML_FEATURE_STORE)."""
+    return os.getenv("ML_FEATURE_STORE", "true").lower() in ("1", "true", "yes")
+
+
+def feature_id(record_type: str, record_id: str, version: str = FEATURE_EXTRACTOR_VERSION) -> str:
+    """Feature document id of a record for an extractor version."""
+    return f"{record_type}:{record_id}:v{version}"
+
+
+def _layout_id(names: Tuple[str, ...]) -> str:
+    return hashlib.sha1("\x1f".join(names).encode("utf-8")).hexdigest()[:16]
+
+
+def encode_features(features: Dict[str, Any]) -> Tuple[str, Tuple[str, ...], bytes]:
+    """Split a feature dict into (layout id, sorted names, float32 bytes)."""
+    names = tuple(sorted(features))
+    values = np.array([features[name] for name in names], dtype="<f4")
+    return _layout_id(names), names, values.tobytes()
+
+
+def decode_features(names: Tuple[str, ...], blob: bytes) -> Dict[str, float]:
+    """Rebuild a feature dict from its layout and float32 bytes."""
+    return dict(zip(names, np.frombuffer(blob, dtype="<f4").tolist()))
+
+
+async def _save_layouts(layouts: Dict[str, Tuple[str, ...]]):
+    """Persist layouts not seen by this process yet."""
+    new = {layout: names for layout, names in layouts.items() if layout not in _layouts}
+    for layout, names in new.items():
+        await get_database()[LAYOUTS_COLLECTION].update_one(
+            {"_id": layout},
+            {"$setOnInsert": {"names": list(names), "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        _layouts[layout] = names
+
+
+async def _load_layouts(layout_ids: Iterable[str]):
+    """Fetch layouts missing from the in-memory cache."""
+    missing = [layout for layout in set(layout_ids) if layout not in _layouts]
+    if not missing:
+        return
+    cursor = get_database()[LAYOUTS_COLLECTION].find({"_id": {"$in": missing}})
+    for doc in await cursor.to_list(length=len(missing)):
+        _layouts[doc["_id"]] = tuple(doc["names"])
+
+
+async def store_features_bulk(record_type: str, items: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Persist features for many records.
+
+    Args:
+        record_type: "log", "suricata_event", ...
+        items: (record_id, features) pairs
+
+    Returns:
+        Feature ids, in input order
+    """
+    if not items:
+        return []
+    now = datetime.utcnow()
+    docs = []
+    layouts = {}
+    for record_id, features in items:
+        layout, names, blob = encode_features(features)
+        layouts[layout] = names
+        docs.append({
+            "_id": feature_id(record_type, record_id),
+            "record_type": record_type,
+            "record_id": record_id,
+            "extractor_version": FEATURE_EXTRACTOR_VERSION,
+            "layout": layout,
+            "values": Binary(blob),
+            "created_at": now
+        })
+    await _save_layouts(layouts)
+    try:
+        await get_database()[FEATURES_COLLECTION].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Already stored (same record and version): identical content
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+    return [doc["_id"] for doc in docs]
+
+
+async def get_features_by_ids(feature_ids: List[str]) -> Dict[str, Dict[str, float]]:
+    """Bulk fetch features by feature id (ids that are not stored are left out)."""
+    if not feature_ids:
+        return {}
+    unique = list(dict.fromkeys(feature_ids))
+    cursor = get_database()[FEATURES_COLLECTION].find(
+        {"_id": {"$in": unique}},
+        {"layout": 1, "values": 1}
+    )
+    docs = await cursor.to_list(length=len(unique))
+    await _load_layouts(doc["layout"] for doc in docs)
+    return {
+        doc["_id"]: decode_features(_layouts[doc["layout"]], bytes(doc["values"]))
+        for doc in docs
+        if doc["layout"] in _layouts
+    }
+
+
+async def get_features_bulk(
+    record_type: str,
+    record_ids: List[str],
+    version: str = FEATURE_EXTRACTOR_VERSION
+) -> Dict[str, Dict[str, float]]:
+    """Bulk fetch stored features keyed by record id."""
+    ids = {feature_id(record_type, record_id, version): record_id for record_id in record_ids}
+    stored = await get_features_by_ids(list(ids))
+    return {ids[fid]: features for fid, features in stored.items()}
+
+
+def extract_features_bulk(build_input, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [FeatureExtractor.extract_from_generic(build_input(doc)) for doc in docs]
+
+
+async def ensure_features_bulk(record_type: str, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get features for records, computing and storing the ones not stored yet.
+
+    Records that do not exist are left out of the result.
+    """
+    if record_type not in RECORD_SOURCES:
+        raise ValueError(f"Unknown record type: {record_type}")
+    collection, build_input = RECORD_SOURCES[record_type]
+    result = await get_features_bulk(record_type, record_ids) if feature_store_enabled() else {}
+
+    missing = [ObjectId(record_id) for record_id in record_ids if record_id not in result and ObjectId.is_valid(record_id)]
+    if missing:
+        cursor = get_database()[collection].find({"_id": {"$in": missing}})
+        docs = await cursor.to_list(length=len(missing))
+        # Extraction is CPU work; keep it off the event loop
+        computed = await run_in_threadpool(extract_features_bulk, build_input, docs)
+        items = [(str(doc["_id"]), features) for doc, features in zip(docs, computed)]
+        if feature_store_enabled():
+            await store_features_bulk(record_type, items)
+        result.update(items)
+    return result
+
+
+async def get_or_compute_features(record_type: str, record_id: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+    """
+    Features of one record, computed and stored on first use.
+
+    Returns:
+        (feature_id or None if the store is disabled, features), or None if the record does not exist
+    """
+    features = (await ensure_features_bulk(record_type, [record_id])).get(record_id)
+    if features is None:
+        return None
+    return (feature_id(record_type, record_id) if feature_store_enabled() else None), features
+
+
+async def hydrate_features(detections: List[Dict[str, Any]]):
+    """Fill in ``features`` of detection documents that reference the store."""
+    refs = [det["feature_id"] for det in detections if det.get("features") is None and det.get("feature_id")]
+    stored = await get_features_by_ids(refs)
+    for det in detections:
+        if det.get("features") is None:
+            det["features"] = stored.get(det.get("feature_id"), {})
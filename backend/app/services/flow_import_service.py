@@ -0,0 +1,287 @@
+"""
+Flow-export (CSV / NDJSON) import: chunked parsing, scoring and storage.
+
+Uploads are streamed to disk, then read back in fixed-size row chunks, so
+memory depends on the chunk size, not the file size. Each chunk is mapped
+to the model's input:
+- models fitted with named features (``feature_names_in_``) get a matrix
+  built column by column from matching export columns;
+- other models get Suricata-style flow records through the generic
+  feature extractor, the same path PCAP and Suricata flows take.
+Detections are bulk-inserted per chunk and progress is saved on the job.
+"""
+import io
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_database
+from app.models.ml_detection import MLDetectionInDB
+from app.services.ml_service import (
+    classify_prediction,
+    featurize_and_predict_batch,
+    run_in_inference_pool
+)
+from app.utils.flow_export import (
+    build_feature_matrix,
+    canonical_columns,
+    chunk_length,
+    iter_csv_chunks,
+    iter_json_chunks,
+    resolve_columns,
+    to_flow_records
+)
+from app.utils.flow_features import FlowWindowEngine, create_flow_feature_engine
+from app.utils.ml_model_loader import get_model_loader
+
+IMPORTS_COLLECTION = "flow_import_jobs"
+
+FLOW_UPLOAD_DIR = os.getenv("ML_FLOW_UPLOAD_DIR", "uploads/flows")
+FLOW_IMPORT_MAX_BYTES = int(os.getenv("ML_FLOW_IMPORT_MAX_MB", "2048")) * 1024 * 1024
+
+
+def detect_format(filename: str) -> Optional[str]:
+    """Export format from the file extension."""
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".json", ".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+def _import_to_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an import job document to an API response."""
+    size = job["size_bytes"]
+    return {
+        "id": str(job["_id"]),
+        "filename": job["filename"],
+        "format": job["format"],
+        "status": job["status"],
+        "model_name": job.get("model_name"),
+        "input_mode": job.get("input_mode"),
+        "column_mapping": job.get("column_mapping"),
+        "missing_features": job.get("missing_features", []),
+        "size_bytes": size,
+        "bytes_read": job.get("bytes_read", 0),
+        "progress": min(job.get("bytes_read", 0) / size, 1.0) if size else 0.0,
+        "rows": job.get("rows", 0),
+        "chunks": job.get("chunks", 0),
+        "detections": job.get("detections", 0),
+        "errors": job.get("errors", 0),
+        "rows_per_second": job.get("rows_per_second", 0.0),
+        "error": job.get("error"),
+        "created_by": job.get("created_by"),
+        "created_at": job["created_at"],
+        "completed_at": job.get("completed_at")
+    }
+
+
+async def create_flow_import(
+    filename: str,
+    path: str,
+    size_bytes: int,
+    fmt: str,
+    model_name: Optional[str] = None,
+    column_overrides: Optional[Dict[str, str]] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """Register an uploaded flow export for processing."""
+    job = {
+        "_id": ObjectId(),
+        "filename": filename,
+        "path": path,
+        "format": fmt,
+        "size_bytes": size_bytes,
+        "status": "uploaded",
+        "model_name": model_name,
+        "column_overrides": column_overrides or {},
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "completed_at": None
+    }
+    await get_database()[IMPORTS_COLLECTION].insert_one(job)
+    return _import_to_response(job)
+
+
+async def get_flow_imports(limit: int = 50) -> List[Dict[str, Any]]:
+    """List flow imports, newest first."""
+    cursor = get_database()[IMPORTS_COLLECTION].find().sort("created_at", -1).limit(limit)
+    return [_import_to_response(job) for job in await cursor.to_list(length=limit)]
+
+
+async def get_flow_import(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get a flow import with its progress."""
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await get_database()[IMPORTS_COLLECTION].find_one({"_id": ObjectId(job_id)})
+    return _import_to_response(job) if job else None
+
+
+def _score_named_chunk(chunk: Dict[str, List[Any]], mapping: Dict, feature_names: List[str], model_ref: str):
+    """Build the model matrix by feature name and score it (runs in the inference pool)."""
+    n_rows = chunk_length(chunk)
+    canonical = canonical_columns(chunk, mapping)
+    matrix, missing = build_feature_matrix(chunk, canonical, feature_names, n_rows)
+    predictions, confidences = get_model_loader().predict_batch(matrix, model_ref, feature_names)
+    results = [
+        (i, dict(zip(feature_names, row)), prediction, float(confidence))
+        for i, (row, prediction, confidence) in enumerate(zip(matrix.tolist(), predictions, confidences))
+    ]
+    return results, 0, missing
+
+
+def _score_record_chunk(
+    chunk: Dict[str, List[Any]],
+    mapping: Dict,
+    model_ref: str,
+    engine: Optional[FlowWindowEngine]
+):
+    """Turn a chunk into flow records and score them with the generic extractor."""
+    n_rows = chunk_length(chunk)
+    records = to_flow_records(canonical_columns(chunk, mapping), n_rows)
+    if engine is not None:
+        for record in records:
+            if record["src_ip"] and record["dest_ip"]:
+                record["window_features"] = engine.update(record)
+    results, failed = featurize_and_predict_batch(records, model_ref)
+    return results, failed, []
+
+
+async def process_flow_import(job_id: str):
+    """Parse, map, score and store a flow export chunk by chunk (background task)."""
+    db = get_database()
+    jobs = db[IMPORTS_COLLECTION]
+    job = await jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        return
+
+    started = datetime.utcnow()
+    chunk_rows = int(os.getenv("ML_FLOW_IMPORT_CHUNK_ROWS", "5000"))
+    totals = {"rows": 0, "chunks": 0, "detections": 0, "errors": 0, "bytes_read": 0}
+    # Window features over this import's own timeline (chunks are scored one at a time)
+    engine = create_flow_feature_engine()
+
+    raw = None
+    try:
+        raw = open(job["path"], "rb")
+        loader = get_model_loader()
+        model_version = await run_in_inference_pool(loader.get_model_version, job.get("model_name"))
+        model_ref = model_version.ref
+        feature_names = getattr(model_version.model, "feature_names_in_", None)
+        feature_names = [str(name) for name in feature_names] if feature_names is not None else None
+        input_mode = "feature_names" if feature_names else "flow_records"
+
+        text = io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+        chunks = iter_csv_chunks(text, chunk_rows) if job["format"] == "csv" else iter_json_chunks(text, chunk_rows)
+        await jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {"status": "processing", "model_name": model_ref, "input_mode": input_mode}}
+        )
+
+        mapping = None
+        missing_features: List[str] = []
+        while True:
+            # Reading and parsing a chunk is blocking file work
+            chunk = await run_in_threadpool(next, chunks, None)
+            if chunk is None:
+                break
+            n_rows = chunk_length(chunk)
+            if n_rows == 0:
+                continue
+
+            # NDJSON chunks may introduce new keys, so re-resolve per chunk
+            if mapping is None or job["format"] != "csv":
+                mapping = resolve_columns(list(chunk), job.get("column_overrides"))
+
+            if feature_names:
+                results, failed, missing = await run_in_inference_pool(
+                    _score_named_chunk, chunk, mapping, feature_names, model_ref
+                )
+                missing_features = missing
+            else:
+                results, failed, _ = await run_in_inference_pool(
+                    _score_record_chunk, chunk, mapping, model_ref, engine
+                )
+
+            row_offset = totals["rows"]
+            detections = []
+            for idx, features, prediction, confidence in results:
+                prediction_str = str(prediction)
+                detections.append(MLDetectionInDB(
+                    detection_type=classify_prediction(prediction_str),
+                    confidence=confidence,
+                    prediction=prediction_str,
+                    features=features,
+                    model_name=model_ref,
+                    metadata={
+                        "source": "flow_import",
+                        "record_type": "flow_export_row",
+                        "import_id": str(job["_id"]),
+                        "row": row_offset + idx
+                    }
+                ).to_dict())
+            if detections:
+                await db.ml_detections.insert_many(detections, ordered=False)
+
+            totals["rows"] += n_rows
+            totals["chunks"] += 1
+            totals["detections"] += len(detections)
+            totals["errors"] += failed
+            totals["bytes_read"] = raw.tell()
+            elapsed = (datetime.utcnow() - started).total_seconds()
+            await jobs.update_one(
+                {"_id": job["_id"]},
+                {"$set": {
+                    **totals,
+                    "rows_per_second": totals["rows"] / elapsed if elapsed > 0 else 0.0,
+                    "column_mapping": {field: column for field, (column, _) in mapping.items()},
+                    "missing_features": missing_features
+                }}
+            )
+
+        completed = datetime.utcnow()
+        elapsed = (completed - started).total_seconds()
+        await jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {
+                **totals,
+                "bytes_read": job["size_bytes"],
+                "rows_per_second": totals["rows"] / elapsed if elapsed > 0 else 0.0,
+                "status": "completed",
+                "completed_at": completed
+            }}
+        )
+        print(f"✓ Imported flow export {job['filename']}: {totals['rows']} rows")
+    except Exception as e:
+        await jobs.update_one(
+            {"_id": job["_id"]},
+            {"$set": {**totals, "status": "failed", "error": str(e)}}
+        )
+        print(f"⚠ Flow import failed for {job['filename']}: {e}")
+    finally:
+        if raw is not None:
+            raw.close()
+        try:
+            os.remove(job["path"])
+        except OSError:
+            pass
+
+
+def parse_column_overrides(value: Optional[str]) -> Optional[Dict[str, str]]:
+    """
+    Parse a JSON {canonical_field: column} mapping from a form field.
+
+    Raises:
+        ValueError: If the value is not a JSON object of strings
+    """
+    if not value:
+        return None
+    overrides = json.loads(value)
+    if not isinstance(overrides, dict) or not all(isinstance(v, str) for v in overrides.values()):
+        raise ValueError("column_mapping must be a JSON object of field -> column name")
+    return overrides
@@ -7,6 +7,10 @@ from bson import ObjectId
 
 from app.database import get_database
 from app.models.log import LogInDB
+from app.services.baseline_service import observe_log
+from app.services.rule_service import evaluate_record
+from app.services.sigma_service import evaluate_sigma
+from app.services.scoring_pipeline import submit_for_scoring
 
 
 async def create_log(
@@ -37,7 +41,7 @@ async def create_log(
     # Return log data
     log_dict = log.to_dict()
     log_dict["_id"] = result.inserted_id
-    return {
+    created = {
         "id": str(log_dict["_id"]),
         "source": log_dict["source"],
         "log_type": log_dict["log_type"],
@@ -47,6 +51,18 @@ async def create_log(
         "timestamp": log_dict["timestamp"],
         "created_at": log_dict["created_at"]
     }
+    
+    # Queue for ML auto-scoring (no-op unless enabled)
+    await submit_for_scoring("log", created["id"], created)
+    
+    # Update per-source anomaly baselines (no-op unless enabled)
+    await observe_log(created)
+    
+    # Evaluate alert rules
+    await evaluate_record("log", created, created["id"])
+    await evaluate_sigma(created)
+    
+    return created
 
 
 async def get_logs(
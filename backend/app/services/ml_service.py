@@ -1,57 +1,158 @@
 """
 ML service for inference and detection result storage.
 """
-from typing import Dict, Any, Optional, List
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime
 from bson import ObjectId
 import numpy as np
 
 from app.database import get_database
-from app.utils.ml_model_loader import get_model_loader
+from app.utils.ml_model_loader import get_model_loader, get_inference_executor, model_ref_query
 from app.utils.feature_extractor import FeatureExtractor
 from app.models.ml_detection import MLDetectionInDB
 from app.services.alert_service import create_alert
+from app.services.feature_store import hydrate_features
+from app.services.shadow_service import get_shadow_evaluator
+
+
+def classify_prediction(prediction_str: str) -> str:
+    """Map a model prediction label to a detection type."""
+    prediction_lower = prediction_str.lower()
+    if "malware" in prediction_lower or "virus" in prediction_lower:
+        return "malware"
+    elif "intrusion" in prediction_lower or "attack" in prediction_lower:
+        return "intrusion"
+    elif "anomaly" in prediction_lower or "suspicious" in prediction_lower:
+        return "anomaly"
+    return "unknown"
+
+
+async def run_in_inference_pool(func, *args):
+    """Run a blocking model call in the shared inference thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), func, *args)
+
+
+def _timed_call(func, *args):
+    """Call func and return (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def featurize_and_predict_batch(
+    records: List[Dict[str, Any]],
+    model_ref: str,
+    shadow: bool = False,
+    precomputed: Optional[List[Optional[Dict[str, Any]]]] = None
+) -> Tuple[list, int]:
+    """
+    Extract features and score a batch of records (blocking; run it in the inference pool).
+    
+    Records are grouped by feature layout so each group is scored as one matrix.
+    
+    Args:
+        records: Records to featurize and score
+        model_ref: Pinned model reference
+        shadow: Also hand each scored matrix to the shadow challenger (live traffic only)
+        precomputed: Features already known per record (e.g. from the feature
+            store); None entries are extracted
+    
+    Returns:
+        ([(index, features, prediction, confidence), ...], failed_count)
+    """
+    loader = get_model_loader()
+    shadow_evaluator = get_shadow_evaluator() if shadow else None
+    precomputed = precomputed or [None] * len(records)
+    features_list = [
+        features if features is not None else FeatureExtractor.extract_from_generic(record)
+        for record, features in zip(records, precomputed)
+    ]
+    results = []
+    failed = 0
+    
+    for layout, indices in FeatureExtractor.group_by_layout(features_list).items():
+        feature_order = list(layout)
+        matrix = FeatureExtractor.to_feature_matrix([features_list[i] for i in indices], feature_order)
+        try:
+            (predictions, confidences), latency = _timed_call(loader.predict_batch, matrix, model_ref, feature_order)
+        except Exception:
+            failed += len(indices)
+            continue
+        if shadow_evaluator is not None:
+            shadow_evaluator.offer(matrix, model_ref, predictions, confidences, latency, feature_order)
+        for idx, prediction, confidence in zip(indices, predictions, confidences):
+            results.append((idx, features_list[idx], prediction, float(confidence)))
+    return results, failed
 
 
 async def run_inference(
-    data: Dict[str, Any],
+    data: Optional[Dict[str, Any]],
     model_name: Optional[str] = None,
-    auto_create_alert: bool = False
+    auto_create_alert: bool = False,
+    features: Optional[Dict[str, Any]] = None,
+    feature_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Run ML inference on input data.
     
     Args:
-        data: Input data for feature extraction
+        data: Input data for feature extraction (unused if features are given)
         model_name: Specific model to use (optional)
         auto_create_alert: Automatically create alert if threat detected
+        features: Precomputed features (e.g. from the feature store)
+        feature_id: Feature store id; the detection references it instead of copying features
     
     Returns:
         Dictionary with prediction results
     """
     # Extract features
-    features = FeatureExtractor.extract_from_generic(data)
+    if features is None:
+        features = FeatureExtractor.extract_from_generic(data)
     
     # Get model and make prediction
     loader = get_model_loader()
     
+    shadow_evaluator = get_shadow_evaluator()
+    canary = False
+    if model_name is None:
+        # Route a share of default-model traffic to the canary challenger
+        canary_ref = shadow_evaluator.route()
+        if canary_ref is not None:
+            model_name = canary_ref
+            canary = True
+    
     try:
-        # Convert features to vector
-        feature_vector = FeatureExtractor.to_feature_vector(features)
+        # Pin the model version for the whole request so a concurrent
+        # hot-swap cannot change it between prediction and storage
+        # (resolving may lazily load the model, so do it in the pool too)
+        model_ref = (await run_in_inference_pool(loader.get_model_version, model_name)).ref
+        
+        # Convert features to vector (columns in sorted name order)
+        feature_order = sorted(features.keys())
+        feature_vector = FeatureExtractor.to_feature_vector(features, feature_order)
+        
+        # Make prediction off the event loop
+        (prediction, confidence), latency = await run_in_inference_pool(
+            _timed_call, loader.predict, feature_vector, model_ref, feature_order
+        )
         
-        # Make prediction
-        prediction, confidence = loader.predict(feature_vector, model_name)
+        # Compare with the shadow challenger off the request path
+        shadow_evaluator.offer(
+            np.asarray(feature_vector, dtype=np.float64).reshape(1, -1),
+            model_ref,
+            [prediction],
+            [confidence],
+            latency,
+            feature_order
+        )
         
         # Determine detection type based on prediction
         prediction_str = str(prediction)
-        if "malware" in prediction_str.lower() or "virus" in prediction_str.lower():
-            detection_type = "malware"
-        elif "intrusion" in prediction_str.lower() or "attack" in prediction_str.lower():
-            detection_type = "intrusion"
-        elif "anomaly" in prediction_str.lower() or "suspicious" in prediction_str.lower():
-            detection_type = "anomaly"
-        else:
-            detection_type = "unknown"
+        detection_type = classify_prediction(prediction_str)
         
         # Store detection result
         detection = await store_detection(
@@ -59,24 +160,20 @@ async def run_inference(
             confidence=float(confidence),
             prediction=prediction_str,
             features=features,
-            model_name=model_name or loader.default_model_name or "default"
+            model_name=model_ref,
+            metadata={"canary": True} if canary else None,
+            feature_id=feature_id
         )
         
         # Create alert if threat detected and auto_create_alert is True
         alert_id = None
         if auto_create_alert and confidence > 0.7 and detection_type != "unknown":
-            alert = await create_alert(
-                title=f"ML Detection: {prediction_str}",
-                description=f"Machine learning model detected {detection_type} with {confidence:.2%} confidence",
-                severity="high" if confidence > 0.9 else "medium",
-                alert_type=detection_type,
-                source="ml_detection",
-                metadata={
-                    "model_name": model_name or loader.default_model_name,
-                    "confidence": confidence,
-                    "features": features
-                },
-                related_log_ids=None
+            alert = await create_detection_alert(
+                prediction_str=prediction_str,
+                detection_type=detection_type,
+                confidence=float(confidence),
+                features=features,
+                model_name=model_ref
             )
             alert_id = alert["id"]
             
@@ -87,7 +184,7 @@ async def run_inference(
             "prediction": prediction_str,
             "confidence": float(confidence),
             "detection_type": detection_type,
-            "model_name": model_name or loader.default_model_name or "default",
+            "model_name": model_ref,
             "features": features,
             "detection_id": detection["id"],
             "alert_id": alert_id
@@ -97,6 +194,155 @@ async def run_inference(
         raise Exception(f"ML inference failed: {str(e)}")
 
 
+def combine_model_scores(scores: List[Dict[str, Any]], strategy: str) -> Tuple[str, float]:
+    """
+    Combine per-model predictions into one verdict.
+    
+    Args:
+        scores: Successful member scores (model_name, prediction, confidence, weight)
+        strategy: "vote" - most votes wins (ties go to the higher summed
+            confidence), confidence is the share of agreeing models;
+            "weighted" - each label scores sum(weight * confidence) / sum(weight)
+            and the highest score wins
+    
+    Returns:
+        (prediction, confidence)
+    """
+    votes: Dict[str, int] = {}
+    weighted: Dict[str, float] = {}
+    for score in scores:
+        label = score["prediction"]
+        votes[label] = votes.get(label, 0) + 1
+        weighted[label] = weighted.get(label, 0.0) + score["weight"] * score["confidence"]
+    
+    if strategy == "weighted":
+        total_weight = sum(score["weight"] for score in scores) or 1.0
+        label = max(weighted, key=weighted.get)
+        return label, weighted[label] / total_weight
+    
+    label = max(votes, key=lambda candidate: (votes[candidate], weighted[candidate]))
+    return label, votes[label] / len(scores)
+
+
+async def run_ensemble_inference(
+    data: Dict[str, Any],
+    models: List[str],
+    strategy: str = "vote",
+    weights: Optional[Dict[str, float]] = None,
+    auto_create_alert: bool = False
+) -> Dict[str, Any]:
+    """
+    Score input data with several models and store one combined detection.
+    
+    Features are extracted once; all models are resolved and evaluated
+    concurrently in the inference pool. A model that fails to load or
+    predict is reported with its error and left out of the vote.
+    
+    Args:
+        data: Input data for feature extraction
+        models: Model references to evaluate
+        strategy: "vote" or "weighted" (see combine_model_scores)
+        weights: Per-model weights keyed by the requested reference (default 1.0)
+        auto_create_alert: Automatically create alert if threat detected
+    
+    Returns:
+        Dictionary with the combined result and per-model scores
+    """
+    features = FeatureExtractor.extract_from_generic(data)
+    feature_order = sorted(features.keys())
+    feature_vector = FeatureExtractor.to_feature_vector(features, feature_order)
+    loader = get_model_loader()
+    weights = weights or {}
+    models = list(dict.fromkeys(models))
+    
+    def score_model(model_name: str) -> Dict[str, Any]:
+        # Pin the version so the stored per-model scores name what actually ran
+        model_ref = loader.get_model_version(model_name).ref
+        prediction, confidence = loader.predict(feature_vector, model_ref, feature_order)
+        return {"model_name": model_ref, "prediction": str(prediction), "confidence": float(confidence)}
+    
+    outcomes = await asyncio.gather(
+        *(run_in_inference_pool(score_model, model_name) for model_name in models),
+        return_exceptions=True
+    )
+    
+    model_scores = []
+    for model_name, outcome in zip(models, outcomes):
+        weight = float(weights.get(model_name, 1.0))
+        if isinstance(outcome, Exception):
+            model_scores.append({"model_name": model_name, "weight": weight, "error": str(outcome)})
+        else:
+            model_scores.append({
+                **outcome,
+                "detection_type": classify_prediction(outcome["prediction"]),
+                "weight": weight
+            })
+    
+    succeeded = [score for score in model_scores if "error" not in score]
+    if not succeeded:
+        raise Exception("ML inference failed: no ensemble member could be evaluated")
+    
+    prediction_str, confidence = combine_model_scores(succeeded, strategy)
+    detection_type = classify_prediction(prediction_str)
+    model_name = "ensemble:" + ",".join(score["model_name"] for score in succeeded)
+    
+    detection = await store_detection(
+        detection_type=detection_type,
+        confidence=confidence,
+        prediction=prediction_str,
+        features=features,
+        model_name=model_name,
+        metadata={"ensemble": {"strategy": strategy, "model_scores": model_scores}}
+    )
+    
+    alert_id = None
+    if auto_create_alert and confidence > 0.7 and detection_type != "unknown":
+        alert = await create_detection_alert(
+            prediction_str=prediction_str,
+            detection_type=detection_type,
+            confidence=confidence,
+            features=features,
+            model_name=model_name
+        )
+        alert_id = alert["id"]
+        await update_detection_alert(detection["id"], alert_id)
+    
+    return {
+        "prediction": prediction_str,
+        "confidence": confidence,
+        "detection_type": detection_type,
+        "strategy": strategy,
+        "model_scores": model_scores,
+        "features": features,
+        "detection_id": detection["id"],
+        "alert_id": alert_id
+    }
+
+
+async def create_detection_alert(
+    prediction_str: str,
+    detection_type: str,
+    confidence: float,
+    features: Dict[str, Any],
+    model_name: str,
+    related_log_ids: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Create an alert for an ML detection."""
+    return await create_alert(
+        title=f"ML Detection: {prediction_str}",
+        description=f"Machine learning model detected {detection_type} with {confidence:.2%} confidence",
+        severity="high" if confidence > 0.9 else "medium",
+        alert_type=detection_type,
+        source="ml_detection",
+        metadata={
+            "model_name": model_name,
+            "confidence": confidence,
+            "features": features
+        },
+        related_log_ids=related_log_ids
+    )
+
+
 async def store_detection(
     detection_type: str,
     confidence: float,
@@ -105,20 +351,22 @@ async def store_detection(
     model_name: str,
     metadata: Optional[Dict[str, Any]] = None,
     related_log_id: Optional[str] = None,
-    related_alert_id: Optional[str] = None
+    related_alert_id: Optional[str] = None,
+    feature_id: Optional[str] = None
 ) -> Dict[str, Any]:
-    """Store ML detection result in MongoDB."""
+    """Store ML detection result in MongoDB (features by reference if feature_id is given)."""
     db = get_database()
     
     detection = MLDetectionInDB(
         detection_type=detection_type,
         confidence=confidence,
         prediction=prediction,
-        features=features,
+        features=None if feature_id else features,
         model_name=model_name,
         metadata=metadata,
         related_log_id=related_log_id,
-        related_alert_id=related_alert_id
+        related_alert_id=related_alert_id,
+        feature_id=feature_id
     )
     
     result = await db.ml_detections.insert_one(detection.to_dict())
@@ -128,7 +376,7 @@ async def store_detection(
         "detection_type": detection.detection_type,
         "confidence": detection.confidence,
         "prediction": detection.prediction,
-        "features": detection.features,
+        "features": features,
         "model_name": detection.model_name,
         "metadata": detection.metadata,
         "related_log_id": detection.related_log_id,
@@ -137,6 +385,19 @@ async def store_detection(
     }
 
 
+async def store_detections_bulk(detections: List[MLDetectionInDB]) -> List[str]:
+    """Store many ML detection results with a single insert_many."""
+    if not detections:
+        return []
+    
+    db = get_database()
+    result = await db.ml_detections.insert_many(
+        [detection.to_dict() for detection in detections],
+        ordered=False
+    )
+    return [str(inserted_id) for inserted_id in result.inserted_ids]
+
+
 async def update_detection_alert(detection_id: str, alert_id: str):
     """Update detection with related alert ID."""
     db = get_database()
@@ -147,6 +408,19 @@ async def update_detection_alert(detection_id: str, alert_id: str):
     )
 
 
+async def set_detection_label(detection_id: str, label: Optional[str], labeled_by: Optional[str] = None) -> bool:
+    """Set (or clear) the ground-truth label of a detection."""
+    if not ObjectId.is_valid(detection_id):
+        return False
+    db = get_database()
+    
+    result = await db.ml_detections.update_one(
+        {"_id": ObjectId(detection_id)},
+        {"$set": {"label": label, "labeled_by": labeled_by, "labeled_at": datetime.utcnow()}}
+    )
+    return result.matched_count > 0
+
+
 async def update_detection_log(detection_id: str, log_id: str):
     """Update detection with related log ID."""
     db = get_database()
@@ -171,12 +445,13 @@ async def get_detections(
     if detection_type:
         query["detection_type"] = detection_type
     if model_name:
-        query["model_name"] = model_name
+        query["model_name"] = model_ref_query(model_name)
     if min_confidence is not None:
         query["confidence"] = {"$gte": min_confidence}
     
     cursor = db.ml_detections.find(query).sort("created_at", -1).skip(skip).limit(limit)
     detections = await cursor.to_list(length=limit)
+    await hydrate_features(detections)
     
     return [
         {
@@ -189,6 +464,7 @@ async def get_detections(
             "metadata": det.get("metadata", {}),
             "related_log_id": det.get("related_log_id"),
             "related_alert_id": det.get("related_alert_id"),
+            "label": det.get("label"),
             "created_at": det.get("created_at")
         }
         for det in detections
@@ -203,6 +479,7 @@ async def get_detection_by_id(detection_id: str) -> Optional[Dict[str, Any]]:
         det_doc = await db.ml_detections.find_one({"_id": ObjectId(detection_id)})
         if not det_doc:
             return None
+        await hydrate_features([det_doc])
         
         return {
             "id": str(det_doc["_id"]),
@@ -214,8 +491,45 @@ async def get_detection_by_id(detection_id: str) -> Optional[Dict[str, Any]]:
             "metadata": det_doc.get("metadata", {}),
             "related_log_id": det_doc.get("related_log_id"),
             "related_alert_id": det_doc.get("related_alert_id"),
+            "label": det_doc.get("label"),
             "created_at": det_doc.get("created_at")
         }
     except Exception:
         return None
 
+
+
+# Background task applying model versions activated by other worker processes
+_version_sync_task: Optional[asyncio.Task] = None
+
+
+async def _version_sync_loop(interval: float):
+    """Periodically re-read the shared active version pointers."""
+    loader = get_model_loader()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for ref in await run_in_inference_pool(loader.sync_active_versions):
+                print(f"✓ Activated ML model {ref} (switched by another worker)")
+        except Exception as e:
+            print(f"⚠ ML model version sync failed: {e}")
+
+
+async def start_model_version_sync():
+    """Start following active version switches made by other workers (ML_ACTIVE_VERSION_REFRESH_SECONDS)."""
+    global _version_sync_task
+    interval = float(os.getenv("ML_ACTIVE_VERSION_REFRESH_SECONDS", "10"))
+    if interval > 0 and _version_sync_task is None:
+        _version_sync_task = asyncio.create_task(_version_sync_loop(interval))
+
+
+async def stop_model_version_sync():
+    """Stop the active version sync task."""
+    global _version_sync_task
+    if _version_sync_task is not None:
+        _version_sync_task.cancel()
+        try:
+            await _version_sync_task
+        except asyncio.CancelledError:
+            pass
+        _version_sync_task = None
@@ -0,0 +1,515 @@
+"""
+Alert notifications: a persistent outbox plus a background dispatcher.
+
+When notification destinations are configured (NOTIFY_DESTINATIONS),
+create_alert writes one ``notification_outbox`` entry per destination
+right after storing the alert; it does not wait on the network. The
+dispatcher claims pending entries in batches, POSTs each batch as
+``{"alerts": [...]}`` over a pooled HTTP client with a bounded number of
+requests in flight, and deletes the delivered entries.
+
+Failed batches are retried with exponential backoff (with jitter, and at
+least the destination's Retry-After) until NOTIFY_MAX_ATTEMPTS, after
+which the entries are marked ``dead`` and kept for inspection or retry.
+Each destination has a circuit breaker, so one that keeps failing is
+probed every NOTIFY_BREAKER_RESET_SECONDS instead of being sent every
+batch. Claims are leased, so an entry claimed by a worker that died is
+picked up again once the lease ends.
+"""
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from pymongo import UpdateOne
+
+from app.database import get_database
+from app.utils.circuit_breaker import CircuitBreaker, HALF_OPEN
+from app.utils.correlation_engine import SEVERITY_RANK
+
+OUTBOX_COLLECTION = "notification_outbox"
+
+# Statuses that are worth retrying; other 4xx responses will not change on retry
+RETRYABLE_STATUS_CODES = (408, 425, 429)
+
+
+class Destination:
+    """A notification endpoint with its circuit breaker and delivery counters."""
+
+    def __init__(self, name: str, url: str, breaker: CircuitBreaker):
+        self.name = name
+        self.url = url
+        self.breaker = breaker
+
+        self.batches = 0
+        self.delivered = 0
+        self.failed_batches = 0
+        self.retried = 0
+        self.dead = 0
+        self.last_error: Optional[str] = None
+        self.last_delivered_at: Optional[datetime] = None
+        # Seconds per HTTP request, and from alert creation to delivery
+        self.request_latencies: deque = deque(maxlen=1000)
+        self.delivery_latencies: deque = deque(maxlen=1000)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return delivery counters, latency percentiles and breaker state."""
+        return {
+            "name": self.name,
+            "url": self.url,
+            "batches": self.batches,
+            "delivered": self.delivered,
+            "failed_batches": self.failed_batches,
+            "retried": self.retried,
+            "dead": self.dead,
+            "last_error": self.last_error,
+            "last_delivered_at": self.last_delivered_at,
+            "request_latency_seconds": _latency_summary(self.request_latencies),
+            "delivery_latency_seconds": _latency_summary(self.delivery_latencies),
+            "circuit_breaker": self.breaker.stats(),
+        }
+
+
+def _latency_summary(latencies: deque) -> Dict[str, float]:
+    """p50/p95/max of recent latencies."""
+    if not latencies:
+        return {"p50_recent": 0.0, "p95_recent": 0.0, "max_recent": 0.0}
+    recent = np.fromiter(latencies, dtype=np.float64)
+    return {
+        "p50_recent": float(np.percentile(recent, 50)),
+        "p95_recent": float(np.percentile(recent, 95)),
+        "max_recent": float(recent.max()),
+    }
+
+
+def parse_destinations(value: str) -> List[Tuple[str, str]]:
+    """
+    Parse NOTIFY_DESTINATIONS.
+
+    Args:
+        value: Comma-separated ``name=url`` entries (a bare URL is named after its host)
+
+    Returns:
+        (name, url) pairs
+
+    Raises:
+        ValueError: If an entry is not an http(s) URL or a name repeats
+    """
+    destinations = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, url = entry.partition("=")
+        if not sep or "://" in name:
+            name, url = "", entry
+        name, url = name.strip(), url.strip()
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            raise ValueError(f"Invalid notification destination URL: {url}")
+        name = name or parsed.netloc
+        if any(name == existing for existing, _ in destinations):
+            raise ValueError(f"Duplicate notification destination: {name}")
+        destinations.append((name, url))
+    return destinations
+
+
+class NotificationDispatcher:
+    """Outbox writer and batching, retrying background sender."""
+
+    def __init__(
+        self,
+        destinations: List[Tuple[str, str]],
+        batch_size: int = 100,
+        concurrency: int = 4,
+        max_attempts: int = 8,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+        timeout: float = 10.0,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+        min_severity: Optional[str] = None,
+        breaker_threshold: int = 5,
+        breaker_reset_seconds: float = 30.0,
+        headers: Optional[Dict[str, str]] = None
+    ):
+        """
+        Initialize the dispatcher.
+
+        Args:
+            destinations: (name, url) pairs alerts are sent to
+            batch_size: Maximum alerts per request
+            concurrency: Maximum requests in flight (and batches claimed per destination per round)
+            max_attempts: Attempts before an entry is marked dead
+            backoff_base: Delay (seconds) before the first retry; doubles per attempt
+            backoff_max: Upper bound of the retry delay
+            timeout: Seconds per request
+            poll_interval: Seconds between outbox polls when idle
+            lease_seconds: How long a claim is held before other workers may retry it
+            min_severity: Only alerts at or above this severity are sent (None = all)
+            breaker_threshold: Consecutive failed batches that open a destination's breaker
+            breaker_reset_seconds: Seconds an open breaker waits before a probe batch
+            headers: Extra request headers (e.g. an Authorization token)
+        """
+        self.destinations = {
+            name: Destination(name, url, CircuitBreaker(breaker_threshold, breaker_reset_seconds))
+            for name, url in destinations
+        }
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.min_severity = min_severity
+        self.headers = headers or {}
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+        self.enqueued = 0
+        self.skipped = 0
+        self.rounds = 0
+        self.errors = 0
+
+    async def start(self):
+        """Open the HTTP client and start the background sender."""
+        if self._task is not None:
+            return
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            headers=self.headers,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        )
+        await get_database()[OUTBOX_COLLECTION].create_index(
+            [("status", 1), ("destination", 1), ("next_attempt_at", 1)]
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sender and close the HTTP client (pending entries stay in the outbox)."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def wants(self, alert: Dict[str, Any]) -> bool:
+        """Check whether an alert meets the severity floor."""
+        if self.min_severity is None:
+            return True
+        return SEVERITY_RANK.get(alert.get("severity"), -1) >= SEVERITY_RANK.get(self.min_severity, -1)
+
+    async def enqueue(self, alert: Dict[str, Any]):
+        """Write outbox entries for a stored alert (one per destination) and wake the sender."""
+        if not self.wants(alert):
+            self.skipped += 1
+            return
+        now = datetime.utcnow()
+        entries = [
+            {
+                "alert_id": alert["id"],
+                "destination": name,
+                "payload": alert,
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt_at": now,
+                "alert_created_at": alert.get("created_at") or now,
+                "created_at": now
+            }
+            for name in self.destinations
+        ]
+        if not entries:
+            return
+        await get_database()[OUTBOX_COLLECTION].insert_many(entries, ordered=False)
+        self.enqueued += len(entries)
+        self.wake()
+
+    def wake(self):
+        """Start a dispatch round now instead of at the next poll."""
+        self._wakeup.set()
+
+    async def _run(self):
+        """Dispatch until cancelled, polling the outbox when idle."""
+        while True:
+            try:
+                sent = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                sent = 0
+                print(f"⚠ Notification dispatch failed: {e}")
+            if sent:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """
+        Run one dispatch round over all destinations.
+
+        Returns:
+            Number of outbox entries attempted
+        """
+        db = get_database()
+        now = datetime.utcnow()
+        # Entries claimed by a worker that stopped before finishing
+        await db[OUTBOX_COLLECTION].update_many(
+            {"status": "sending", "lease_until": {"$lt": now}},
+            {"$set": {"status": "pending"}, "$unset": {"claim": "", "lease_until": ""}}
+        )
+        self.rounds += 1
+        results = await asyncio.gather(*(
+            self._dispatch_destination(destination, now)
+            for destination in self.destinations.values()
+        ))
+        return sum(results)
+
+    async def _dispatch_destination(self, destination: Destination, now: datetime) -> int:
+        """Claim and send due batches for one destination."""
+        breaker = destination.breaker
+        if not breaker.allow():
+            return 0
+        probing = breaker.state == HALF_OPEN
+        entries = await self._claim(destination.name, self.batch_size * (1 if probing else self.concurrency), now)
+        if not entries:
+            if probing:
+                # Nothing to probe with; probe on a later round
+                breaker.release()
+            return 0
+        batches = [entries[i:i + self.batch_size] for i in range(0, len(entries), self.batch_size)]
+        await asyncio.gather(*(self._deliver(destination, batch) for batch in batches))
+        return len(entries)
+
+    async def _claim(self, destination: str, limit: int, now: datetime) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` due entries for a destination, oldest first."""
+        collection = get_database()[OUTBOX_COLLECTION]
+        due = await collection.find(
+            {"destination": destination, "status": "pending", "next_attempt_at": {"$lte": now}},
+            {"_id": 1}
+        ).sort("next_attempt_at", 1).limit(limit).to_list(length=limit)
+        if not due:
+            return []
+        due_ids = [entry["_id"] for entry in due]
+        claim = uuid.uuid4().hex
+        await collection.update_many(
+            {"_id": {"$in": due_ids}, "status": "pending"},
+            {"$set": {
+                "status": "sending",
+                "claim": claim,
+                "lease_until": now + timedelta(seconds=self.lease_seconds)
+            }}
+        )
+        # Entries another worker claimed first are not returned; the lookup
+        # goes through the _id index rather than scanning for the claim token
+        cursor = collection.find({"_id": {"$in": due_ids}, "claim": claim}).sort("next_attempt_at", 1)
+        return await cursor.to_list(length=limit)
+
+    async def _deliver(self, destination: Destination, entries: List[Dict[str, Any]]):
+        """POST one batch and record the outcome on its entries."""
+        body = jsonable_encoder({"alerts": [entry["payload"] for entry in entries]})
+        retry_after = None
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                response = await self._client.post(destination.url, json=body)
+            destination.request_latencies.append(time.perf_counter() - started)
+            if response.is_success:
+                error, retryable = None, False
+            else:
+                error = f"HTTP {response.status_code}"
+                retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+        except httpx.HTTPError as e:
+            destination.request_latencies.append(time.perf_counter() - started)
+            error, retryable = str(e) or type(e).__name__, True
+
+        destination.batches += 1
+        collection = get_database()[OUTBOX_COLLECTION]
+        ids = [entry["_id"] for entry in entries]
+        now = datetime.utcnow()
+
+        if error is None:
+            destination.breaker.record_success()
+            await collection.delete_many({"_id": {"$in": ids}})
+            destination.delivered += len(entries)
+            destination.last_delivered_at = now
+            destination.delivery_latencies.extend(
+                (now - entry["alert_created_at"]).total_seconds() for entry in entries
+            )
+            return
+
+        destination.failed_batches += 1
+        destination.last_error = error
+        if retryable:
+            destination.breaker.record_failure()
+        else:
+            # The destination answered; rejecting the payload says nothing about its health
+            destination.breaker.record_success()
+        operations = []
+        for entry in entries:
+            attempts = entry.get("attempts", 0) + 1
+            update = {"attempts": attempts, "last_error": error, "last_attempt_at": now}
+            if retryable and attempts < self.max_attempts:
+                delay = max(self.backoff_delay(attempts), retry_after or 0.0)
+                update.update({"status": "pending", "next_attempt_at": now + timedelta(seconds=delay)})
+                destination.retried += 1
+            else:
+                update["status"] = "dead"
+                destination.dead += 1
+            operations.append(UpdateOne(
+                {"_id": entry["_id"]},
+                {"$set": update, "$unset": {"claim": "", "lease_until": ""}}
+            ))
+        await collection.bulk_write(operations, ordered=False)
+
+    def backoff_delay(self, attempts: int) -> float:
+        """Seconds before retry number ``attempts``: exponential, capped, with jitter."""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def outbox_counts(self) -> Dict[str, Dict[str, int]]:
+        """Outbox entries per destination and status."""
+        pipeline = [{"$group": {"_id": {"destination": "$destination", "status": "$status"}, "count": {"$sum": 1}}}]
+        counts: Dict[str, Dict[str, int]] = {name: {} for name in self.destinations}
+        async for row in get_database()[OUTBOX_COLLECTION].aggregate(pipeline):
+            counts.setdefault(row["_id"]["destination"], {})[row["_id"]["status"]] = row["count"]
+        return counts
+
+    async def stats(self) -> Dict[str, Any]:
+        """Return dispatcher counters, outbox depth and per-destination metrics."""
+        counts = await self.outbox_counts()
+        destinations = []
+        for destination in self.destinations.values():
+            destination_stats = destination.stats()
+            destination_stats["outbox"] = counts.get(destination.name, {})
+            destinations.append(destination_stats)
+        return {
+            "enabled": True,
+            "running": self._task is not None and not self._task.done(),
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "max_attempts": self.max_attempts,
+            "min_severity": self.min_severity,
+            "enqueued": self.enqueued,
+            "skipped": self.skipped,
+            "rounds": self.rounds,
+            "errors": self.errors,
+            "destinations": destinations,
+        }
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP-date values are ignored)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _parse_headers(value: str) -> Dict[str, str]:
+    """Parse NOTIFY_HEADERS (``Name: value`` entries separated by ``;``)."""
+    headers = {}
+    for entry in value.split(";"):
+        name, sep, header_value = entry.partition(":")
+        if sep and name.strip():
+            headers[name.strip()] = header_value.strip()
+    return headers
+
+
+# Global dispatcher instance (only set when destinations are configured)
+_notification_dispatcher: Optional[NotificationDispatcher] = None
+
+
+def get_notification_dispatcher() -> Optional[NotificationDispatcher]:
+    """Get the running notification dispatcher, or None if notifications are disabled."""
+    return _notification_dispatcher
+
+
+async def start_notifications():
+    """Start the notification dispatcher on startup if NOTIFY_DESTINATIONS is set."""
+    global _notification_dispatcher
+    if _notification_dispatcher is not None:
+        return
+    try:
+        destinations = parse_destinations(os.getenv("NOTIFY_DESTINATIONS", ""))
+    except ValueError as e:
+        print(f"⚠ Alert notifications disabled: {e}")
+        return
+    if not destinations:
+        return
+
+    dispatcher = NotificationDispatcher(
+        destinations,
+        batch_size=int(os.getenv("NOTIFY_BATCH_SIZE", "100")),
+        concurrency=int(os.getenv("NOTIFY_CONCURRENCY", "4")),
+        max_attempts=int(os.getenv("NOTIFY_MAX_ATTEMPTS", "8")),
+        backoff_base=float(os.getenv("NOTIFY_BACKOFF_BASE_SECONDS", "2")),
+        backoff_max=float(os.getenv("NOTIFY_BACKOFF_MAX_SECONDS", "300")),
+        timeout=float(os.getenv("NOTIFY_TIMEOUT_SECONDS", "10")),
+        poll_interval=float(os.getenv("NOTIFY_POLL_INTERVAL", "1")),
+        lease_seconds=float(os.getenv("NOTIFY_LEASE_SECONDS", "60")),
+        min_severity=os.getenv("NOTIFY_MIN_SEVERITY") or None,
+        breaker_threshold=int(os.getenv("NOTIFY_BREAKER_THRESHOLD", "5")),
+        breaker_reset_seconds=float(os.getenv("NOTIFY_BREAKER_RESET_SECONDS", "30")),
+        headers=_parse_headers(os.getenv("NOTIFY_HEADERS", ""))
+    )
+    await dispatcher.start()
+    _notification_dispatcher = dispatcher
+    print(f"✓ Alert notifications started ({len(destinations)} destinations)")
+
+
+async def stop_notifications():
+    """Stop the notification dispatcher on shutdown."""
+    global _notification_dispatcher
+    if _notification_dispatcher is not None:
+        await _notification_dispatcher.stop()
+        _notification_dispatcher = None
+
+
+async def enqueue_alert_notification(alert: Dict[str, Any]):
+    """Queue a newly stored alert for delivery (no-op when notifications are disabled)."""
+    if _notification_dispatcher is not None:
+        await _notification_dispatcher.enqueue(alert)
+
+
+async def retry_dead_notifications(destination: Optional[str] = None) -> int:
+    """
+    Move dead outbox entries back to pending with a fresh attempt budget.
+
+    Returns:
+        Number of entries requeued
+    """
+    query: Dict[str, Any] = {"status": "dead"}
+    if destination:
+        query["destination"] = destination
+    result = await get_database()[OUTBOX_COLLECTION].update_many(
+        query,
+        {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": datetime.utcnow()}}
+    )
+    if _notification_dispatcher is not None and result.modified_count:
+        _notification_dispatcher.wake()
+    return result.modified_count
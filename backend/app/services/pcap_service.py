@@ -0,0 +1,264 @@
+"""
+PCAP capture ingestion: flow reconstruction, feature extraction and scoring.
+
+Uploaded captures are parsed in a process pool, one chunk per task, with a
+bounded number of chunks in flight. Chunk results are merged in file order
+into a FlowTable. Flows that can no longer grow are released in batches,
+folded into the sliding-window flow features (if enabled), scored with a
+pinned model version in the inference pool, and stored in ``pcap_flows``
+with their detections in ``ml_detections``.
+"""
+import asyncio
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_database
+from app.models.ml_detection import MLDetectionInDB
+from app.services.ml_service import (
+    classify_prediction,
+    featurize_and_predict_batch,
+    run_in_inference_pool
+)
+from app.utils.flow_features import FlowWindowEngine, create_flow_feature_engine
+from app.utils.ml_model_loader import get_model_loader
+from app.utils.pcap_reader import FlowTable, flow_record, parse_chunk, plan_chunks
+
+CAPTURES_COLLECTION = "pcap_captures"
+FLOWS_COLLECTION = "pcap_flows"
+
+PCAP_UPLOAD_DIR = os.getenv("ML_PCAP_UPLOAD_DIR", "uploads/pcap")
+PCAP_MAX_BYTES = int(os.getenv("ML_PCAP_MAX_MB", "500")) * 1024 * 1024
+
+# Global process pool for capture parsing
+_pcap_executor: Optional[ProcessPoolExecutor] = None
+_pcap_workers = 0
+
+
+def get_pcap_executor() -> ProcessPoolExecutor:
+    """Get or create the process pool used to parse capture chunks."""
+    global _pcap_executor, _pcap_workers
+    if _pcap_executor is None:
+        _pcap_workers = int(os.getenv("ML_PCAP_WORKERS", "0")) or os.cpu_count() or 1
+        _pcap_executor = ProcessPoolExecutor(max_workers=_pcap_workers)
+    return _pcap_executor
+
+
+def shutdown_pcap_executor():
+    """Stop the capture parsing pool."""
+    global _pcap_executor
+    if _pcap_executor is not None:
+        _pcap_executor.shutdown(wait=False, cancel_futures=True)
+        _pcap_executor = None
+
+
+def _capture_to_response(capture: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a capture document to an API response."""
+    return {
+        "id": str(capture["_id"]),
+        "filename": capture["filename"],
+        "format": capture.get("format"),
+        "size_bytes": capture["size_bytes"],
+        "status": capture["status"],
+        "model_name": capture.get("model_name"),
+        "chunks": capture.get("chunks", 0),
+        "chunks_done": capture.get("chunks_done", 0),
+        "packets": capture.get("packets", 0),
+        "undecoded_packets": capture.get("undecoded_packets", 0),
+        "flows": capture.get("flows", 0),
+        "detections": capture.get("detections", 0),
+        "errors": capture.get("errors", 0),
+        "error": capture.get("error"),
+        "duration_seconds": capture.get("duration_seconds"),
+        "created_by": capture.get("created_by"),
+        "created_at": capture["created_at"],
+        "completed_at": capture.get("completed_at")
+    }
+
+
+async def create_capture(
+    filename: str,
+    path: str,
+    size_bytes: int,
+    model_name: Optional[str] = None,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """Register an uploaded capture for processing."""
+    capture = {
+        "_id": ObjectId(),
+        "filename": filename,
+        "path": path,
+        "format": None,
+        "size_bytes": size_bytes,
+        "status": "uploaded",
+        "model_name": model_name,
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "completed_at": None
+    }
+    await get_database()[CAPTURES_COLLECTION].insert_one(capture)
+    return _capture_to_response(capture)
+
+
+async def get_captures(limit: int = 50) -> List[Dict[str, Any]]:
+    """List captures, newest first."""
+    cursor = get_database()[CAPTURES_COLLECTION].find().sort("created_at", -1).limit(limit)
+    return [_capture_to_response(capture) for capture in await cursor.to_list(length=limit)]
+
+
+async def get_capture(capture_id: str) -> Optional[Dict[str, Any]]:
+    """Get a capture with its processing progress."""
+    if not ObjectId.is_valid(capture_id):
+        return None
+    capture = await get_database()[CAPTURES_COLLECTION].find_one({"_id": ObjectId(capture_id)})
+    return _capture_to_response(capture) if capture else None
+
+
+async def _score_flows(
+    capture_id: ObjectId,
+    model_ref: str,
+    released: list,
+    batch_size: int,
+    engine: Optional[FlowWindowEngine]
+) -> Dict[str, int]:
+    """Build flow records, score them in batches and store flows and detections."""
+    db = get_database()
+    records = [flow_record(key, seg) for key, seg in released]
+    records.sort(key=lambda record: record["flow"]["end"])
+    counts = {"flows": 0, "detections": 0, "errors": 0}
+
+    for offset in range(0, len(records), batch_size):
+        batch = records[offset:offset + batch_size]
+        if engine is not None:
+            for record in batch:
+                record["window_features"] = engine.update(record)
+
+        results, failed = await run_in_inference_pool(featurize_and_predict_batch, batch, model_ref)
+
+        flow_docs = [{"_id": ObjectId(), "capture_id": str(capture_id), **record} for record in batch]
+        await db[FLOWS_COLLECTION].insert_many(flow_docs, ordered=False)
+
+        detections = []
+        for idx, features, prediction, confidence in results:
+            prediction_str = str(prediction)
+            detections.append(MLDetectionInDB(
+                detection_type=classify_prediction(prediction_str),
+                confidence=confidence,
+                prediction=prediction_str,
+                features=features,
+                model_name=model_ref,
+                metadata={
+                    "source": "pcap",
+                    "record_type": "pcap_flow",
+                    "record_id": str(flow_docs[idx]["_id"]),
+                    "capture_id": str(capture_id)
+                }
+            ).to_dict())
+        if detections:
+            await db.ml_detections.insert_many(detections, ordered=False)
+
+        counts["flows"] += len(batch)
+        counts["detections"] += len(detections)
+        counts["errors"] += failed
+    return counts
+
+
+async def process_capture(capture_id: str):
+    """
+    Parse, reconstruct flows and score an uploaded capture (background task).
+
+    At most two chunks per worker are in flight, and flows are released as
+    soon as the capture has moved more than the idle timeout past them, so
+    memory is bounded by chunk size and active flow count.
+    """
+    db = get_database()
+    captures = db[CAPTURES_COLLECTION]
+    capture = await captures.find_one({"_id": ObjectId(capture_id)})
+    if not capture:
+        return
+
+    started = datetime.utcnow()
+    chunk_bytes = int(os.getenv("ML_PCAP_CHUNK_MB", "16")) * 1024 * 1024
+    idle_timeout = float(os.getenv("ML_PCAP_FLOW_IDLE_TIMEOUT", "120"))
+    batch_size = int(os.getenv("ML_PCAP_BATCH_SIZE", "1000"))
+    table = FlowTable(
+        idle_timeout=idle_timeout,
+        max_active_flows=int(os.getenv("ML_PCAP_MAX_ACTIVE_FLOWS", "500000"))
+    )
+    totals = {"packets": 0, "undecoded_packets": 0, "flows": 0, "detections": 0, "errors": 0}
+    # Window features over this capture's own timeline
+    engine = create_flow_feature_engine()
+
+    try:
+        loader = get_model_loader()
+        model_ref = (await run_in_inference_pool(loader.get_model_version, capture.get("model_name"))).ref
+
+        fmt, chunks = await run_in_threadpool(plan_chunks, capture["path"], chunk_bytes)
+        await captures.update_one(
+            {"_id": capture["_id"]},
+            {"$set": {"status": "processing", "format": fmt, "chunks": len(chunks), "chunks_done": 0, "model_name": model_ref}}
+        )
+
+        loop = asyncio.get_running_loop()
+        executor = get_pcap_executor()
+        max_in_flight = 2 * _pcap_workers
+        pending: deque = deque()
+        next_chunk = 0
+
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < max_in_flight:
+                pending.append(loop.run_in_executor(
+                    executor, parse_chunk, capture["path"], fmt, chunks[next_chunk], idle_timeout
+                ))
+                next_chunk += 1
+
+            result = await pending.popleft()
+            table.merge(result["flows"])
+            totals["packets"] += result["packets"]
+            totals["undecoded_packets"] += result["undecoded"]
+
+            released = table.pop_idle(result["first_ts"]) if result["first_ts"] is not None else []
+            if released:
+                counts = await _score_flows(capture["_id"], model_ref, released, batch_size, engine)
+                for key, value in counts.items():
+                    totals[key] += value
+
+            await captures.update_one(
+                {"_id": capture["_id"]},
+                {"$inc": {"chunks_done": 1}, "$set": totals}
+            )
+
+        released = table.drain()
+        if released:
+            counts = await _score_flows(capture["_id"], model_ref, released, batch_size, engine)
+            for key, value in counts.items():
+                totals[key] += value
+
+        completed = datetime.utcnow()
+        await captures.update_one(
+            {"_id": capture["_id"]},
+            {"$set": {
+                **totals,
+                "status": "completed",
+                "completed_at": completed,
+                "duration_seconds": (completed - started).total_seconds()
+            }}
+        )
+        print(f"✓ Processed capture {capture['filename']}: {totals['packets']} packets, {totals['flows']} flows")
+    except Exception as e:
+        await captures.update_one(
+            {"_id": capture["_id"]},
+            {"$set": {**totals, "status": "failed", "error": str(e)}}
+        )
+        print(f"⚠ Capture processing failed for {capture['filename']}: {e}")
+    finally:
+        if os.getenv("ML_PCAP_KEEP_FILES", "false").lower() not in ("1", "true", "yes"):
+            try:
+                os.remove(capture["path"])
+            except OSError:
+                pass
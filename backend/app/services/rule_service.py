@@ -0,0 +1,191 @@
+"""
+Alert rules: storage and evaluation on ingest.
+
+Rules live in the ``alert_rules`` collection. Enabled rules are compiled
+into the in-memory RuleEngine at startup, after every change made through
+the API, and every ALERT_RULES_REFRESH_SECONDS (to pick up changes made by
+other workers). create_log and parse_and_store_suricata_event run each new
+record through the engine, and every firing raises an alert.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from app.database import get_database
+from app.services.alert_service import create_alert
+from app.utils.rule_engine import CompiledRule, get_rule_engine
+
+RULES_COLLECTION = "alert_rules"
+
+# Record fields copied into raised alerts so correlation and dedup can key on them
+_ALERT_CONTEXT_FIELDS = ("src_ip", "dest_ip", "dest_port", "source")
+
+_rule_refresh_task: Optional[asyncio.Task] = None
+
+
+def _rule_to_response(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert an alert rule document to an API response."""
+    return {
+        "id": str(rule["_id"]),
+        "name": rule["name"],
+        "description": rule.get("description"),
+        "record_type": rule.get("record_type", "log"),
+        "conditions": rule.get("conditions", []),
+        "threshold": rule.get("threshold"),
+        "severity": rule.get("severity", "medium"),
+        "alert_type": rule.get("alert_type", "rule"),
+        "title": rule.get("title"),
+        "enabled": rule.get("enabled", True),
+        "created_by": rule.get("created_by"),
+        "created_at": rule.get("created_at"),
+        "updated_at": rule.get("updated_at")
+    }
+
+
+async def load_alert_rules():
+    """Compile the enabled rules into the engine."""
+    cursor = get_database()[RULES_COLLECTION].find({"enabled": True})
+    rules = await cursor.to_list(length=None)
+    engine = get_rule_engine()
+    engine.load(rules)
+    for rule_id, error in engine.load_errors.items():
+        print(f"⚠ Alert rule {rule_id} skipped: {error}")
+
+
+async def create_alert_rule(rule: Dict[str, Any], created_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Store a new alert rule and activate it.
+
+    Raises:
+        ValueError: If the rule does not compile
+    """
+    now = datetime.utcnow()
+    rule_doc = {"_id": ObjectId(), **rule, "created_by": created_by, "created_at": now, "updated_at": now}
+    CompiledRule(rule_doc)
+    await get_database()[RULES_COLLECTION].insert_one(rule_doc)
+    await load_alert_rules()
+    return _rule_to_response(rule_doc)
+
+
+async def get_alert_rules(enabled_only: bool = False) -> List[Dict[str, Any]]:
+    """Get alert rules."""
+    query = {"enabled": True} if enabled_only else {}
+    cursor = get_database()[RULES_COLLECTION].find(query).sort("created_at", -1)
+    return [_rule_to_response(rule) for rule in await cursor.to_list(length=None)]
+
+
+async def get_alert_rule(rule_id: str) -> Optional[Dict[str, Any]]:
+    """Get an alert rule by ID."""
+    if not ObjectId.is_valid(rule_id):
+        return None
+    rule = await get_database()[RULES_COLLECTION].find_one({"_id": ObjectId(rule_id)})
+    return _rule_to_response(rule) if rule else None
+
+
+async def update_alert_rule(rule_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Update an alert rule and reload the engine.
+
+    Raises:
+        ValueError: If the updated rule does not compile
+    """
+    if not ObjectId.is_valid(rule_id):
+        return None
+    db = get_database()
+    rule = await db[RULES_COLLECTION].find_one({"_id": ObjectId(rule_id)})
+    if not rule:
+        return None
+    updates = {**updates, "updated_at": datetime.utcnow()}
+    CompiledRule({**rule, **updates})
+    await db[RULES_COLLECTION].update_one({"_id": rule["_id"]}, {"$set": updates})
+    await load_alert_rules()
+    return _rule_to_response({**rule, **updates})
+
+
+async def delete_alert_rule(rule_id: str) -> bool:
+    """Delete an alert rule."""
+    if not ObjectId.is_valid(rule_id):
+        return False
+    result = await get_database()[RULES_COLLECTION].delete_one({"_id": ObjectId(rule_id)})
+    if result.deleted_count:
+        await load_alert_rules()
+    return result.deleted_count > 0
+
+
+async def evaluate_record(record_type: str, record: Dict[str, Any], record_id: Optional[str] = None):
+    """Run an ingested record through the alert rules and raise alerts for firings."""
+    firings = get_rule_engine().evaluate(record_type, record, record_id)
+    for rule, firing in firings:
+        group = firing["group"]
+        if rule.group_by:
+            description = (
+                f"{firing['count']} {record_type} records matched rule '{rule.name}' "
+                f"for {rule.group_by}={group} within {rule.window_seconds:g}s"
+            )
+        elif rule.count > 1:
+            description = f"{firing['count']} {record_type} records matched rule '{rule.name}' within {rule.window_seconds:g}s"
+        else:
+            description = f"A {record_type} record matched rule '{rule.name}'"
+        metadata = {field: record[field] for field in _ALERT_CONTEXT_FIELDS if record.get(field) is not None}
+        metadata.update({
+            "rule_id": rule.id,
+            "rule_name": rule.name,
+            "record_type": record_type,
+            "group_by": rule.group_by,
+            "group": group,
+            "count": firing["count"],
+            "window_seconds": rule.window_seconds,
+            "signature": f"rule:{rule.id}:{group}"
+        })
+        try:
+            await create_alert(
+                title=rule.title,
+                description=description,
+                severity=rule.severity,
+                alert_type=rule.alert_type,
+                source="rule_engine",
+                metadata=metadata,
+                related_log_ids=firing["record_ids"][-100:] if record_type == "log" else None
+            )
+        except Exception as e:
+            print(f"⚠ Alert rule {rule.name} could not raise an alert: {e}")
+
+
+async def _rule_refresh_loop(interval: float):
+    """Reload rules periodically."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_alert_rules()
+        except Exception as e:
+            print(f"⚠ Alert rule refresh failed: {e}")
+
+
+async def start_rule_engine():
+    """Load alert rules and start the refresh task."""
+    global _rule_refresh_task
+    try:
+        await load_alert_rules()
+    except Exception as e:
+        print(f"⚠ Could not load alert rules: {e}")
+    stats = get_rule_engine().stats()
+    if stats["rules"]:
+        print(f"✓ Loaded {stats['rules']} alert rules")
+    interval = float(os.getenv("ALERT_RULES_REFRESH_SECONDS", "30"))
+    if interval > 0 and _rule_refresh_task is None:
+        _rule_refresh_task = asyncio.create_task(_rule_refresh_loop(interval))
+
+
+async def stop_rule_engine():
+    """Stop the refresh task."""
+    global _rule_refresh_task
+    if _rule_refresh_task is not None:
+        _rule_refresh_task.cancel()
+        try:
+            await _rule_refresh_task
+        except asyncio.CancelledError:
+            pass
+        _rule_refresh_task = None
@@ -0,0 +1,294 @@
+"""
+Streaming auto-scoring pipeline for ingested logs and Suricata events.
+
+When enabled (ML_AUTO_SCORING=true), create_log and
+parse_and_store_suricata_event submit every new record to a bounded
+in-memory queue. A background consumer drains the queue in batches,
+extracts features, scores each batch with the default model in the
+inference pool, bulk-writes ml_detections and raises alerts for
+detections above the configured confidence threshold.
+
+A full queue blocks producers (backpressure) for up to
+ML_AUTO_SCORING_ENQUEUE_TIMEOUT seconds before the record is dropped from
+scoring. The time from ingest to score is tracked as the pipeline lag.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from app.models.ml_detection import MLDetectionInDB
+from app.services.feature_store import feature_id, feature_store_enabled, store_features_bulk
+from app.services.ml_service import (
+    classify_prediction,
+    create_detection_alert,
+    featurize_and_predict_batch,
+    run_in_inference_pool,
+    store_detections_bulk
+)
+from app.utils.ml_model_loader import get_model_loader
+
+
+class ScoringItem:
+    """A record waiting to be scored."""
+    __slots__ = ("record_type", "record_id", "data", "ingested_at")
+
+    def __init__(self, record_type: str, record_id: str, data: Dict[str, Any], ingested_at: float):
+        self.record_type = record_type
+        self.record_id = record_id
+        self.data = data
+        self.ingested_at = ingested_at
+
+
+class ScoringPipeline:
+    """Bounded queue plus a batching background consumer."""
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        alert_threshold: float = 0.7,
+        enqueue_timeout: float = 5.0
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            model_name: Model to score with (None = default model)
+            max_queue_size: Queue capacity; producers wait when it is full
+            batch_size: Maximum records scored together
+            flush_interval: Maximum seconds to wait while filling a batch
+            alert_threshold: Confidence above which a detection raises an alert
+            enqueue_timeout: Seconds a producer waits on a full queue before dropping
+        """
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.alert_threshold = alert_threshold
+        self.enqueue_timeout = enqueue_timeout
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.batches = 0
+        self.alerts = 0
+        self.errors = 0
+        self.lag_last = 0.0
+        self.lag_max = 0.0
+        self._lag_total = 0.0
+        self._recent_lags: deque = deque(maxlen=1000)
+
+    async def start(self):
+        """Start the background consumer."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Score what is already queued (up to drain_timeout), then stop."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def submit(self, record_type: str, record_id: str, data: Dict[str, Any]) -> bool:
+        """
+        Queue a record for scoring.
+
+        Returns:
+            False if the queue stayed full for enqueue_timeout and the record was dropped
+        """
+        item = ScoringItem(record_type, record_id, data, time.time())
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(item), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                return False
+        self.submitted += 1
+        return True
+
+    async def _next_batch(self) -> List[ScoringItem]:
+        """Wait for one record, then fill the batch until full or flush_interval elapses."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        """Consumer loop."""
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._score_batch(batch)
+            except Exception as e:
+                self.errors += len(batch)
+                print(f"⚠ Auto-scoring batch failed: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _score_batch(self, batch: List[ScoringItem]):
+        """Score one batch and persist detections and alerts."""
+        loader = get_model_loader()
+        model_version = await run_in_inference_pool(loader.get_model_version, self.model_name)
+        results, failed = await run_in_inference_pool(
+            featurize_and_predict_batch, [item.data for item in batch], model_version.ref, True
+        )
+        self.errors += failed
+
+        # Persist features once so re-scoring and exports can reuse them
+        use_store = feature_store_enabled()
+        if use_store:
+            by_type: Dict[str, list] = {}
+            for idx, features, _, _ in results:
+                by_type.setdefault(batch[idx].record_type, []).append((batch[idx].record_id, features))
+            for record_type, items in by_type.items():
+                await store_features_bulk(record_type, items)
+
+        detections = []
+        alerting = []
+        for idx, features, prediction, confidence in results:
+            item = batch[idx]
+            prediction_str = str(prediction)
+            detection_type = classify_prediction(prediction_str)
+            detection = MLDetectionInDB(
+                detection_type=detection_type,
+                confidence=confidence,
+                prediction=prediction_str,
+                features=None if use_store else features,
+                feature_id=feature_id(item.record_type, item.record_id) if use_store else None,
+                model_name=model_version.ref,
+                metadata={
+                    "source": "auto_scoring",
+                    "record_type": item.record_type,
+                    "record_id": item.record_id
+                },
+                related_log_id=item.record_id if item.record_type == "log" else None
+            )
+            detections.append(detection)
+            if confidence > self.alert_threshold and detection_type != "unknown":
+                alerting.append((item, detection, features))
+
+        # Alerts are raised first so detections are inserted already linked
+        for item, detection, features in alerting:
+            alert = await create_detection_alert(
+                prediction_str=detection.prediction,
+                detection_type=detection.detection_type,
+                confidence=detection.confidence,
+                features=features,
+                model_name=detection.model_name,
+                related_log_ids=[item.record_id] if item.record_type == "log" else None
+            )
+            detection.related_alert_id = alert["id"]
+
+        await store_detections_bulk(detections)
+
+        scored_at = time.time()
+        self._record_lags([scored_at - batch[idx].ingested_at for idx, *_ in results])
+        self.scored += len(results)
+        self.alerts += len(alerting)
+        self.batches += 1
+
+    def _record_lags(self, lags: List[float]):
+        """Update ingest-to-score lag statistics."""
+        if not lags:
+            return
+        self.lag_last = lags[-1]
+        self.lag_max = max(self.lag_max, max(lags))
+        self._lag_total += sum(lags)
+        self._recent_lags.extend(lags)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return throughput, queue depth and lag metrics."""
+        recent = np.fromiter(self._recent_lags, dtype=np.float64) if self._recent_lags else None
+        return {
+            "enabled": True,
+            "running": self._task is not None and not self._task.done(),
+            "model_name": self.model_name,
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "scored": self.scored,
+            "batches": self.batches,
+            "alerts": self.alerts,
+            "errors": self.errors,
+            "lag_seconds": {
+                "last": self.lag_last,
+                "mean": self._lag_total / self.scored if self.scored else 0.0,
+                "max": self.lag_max,
+                "p50_recent": float(np.percentile(recent, 50)) if recent is not None else 0.0,
+                "p95_recent": float(np.percentile(recent, 95)) if recent is not None else 0.0,
+            }
+        }
+
+
+# Global pipeline instance (only set when auto-scoring is enabled)
+_scoring_pipeline: Optional[ScoringPipeline] = None
+
+
+def get_scoring_pipeline() -> Optional[ScoringPipeline]:
+    """Get the running scoring pipeline, or None if auto-scoring is disabled."""
+    return _scoring_pipeline
+
+
+async def start_scoring_pipeline():
+    """Start auto-scoring on startup if ML_AUTO_SCORING is enabled."""
+    global _scoring_pipeline
+    if os.getenv("ML_AUTO_SCORING", "false").lower() not in ("1", "true", "yes"):
+        return
+
+    _scoring_pipeline = ScoringPipeline(
+        model_name=os.getenv("ML_AUTO_SCORING_MODEL") or None,
+        max_queue_size=int(os.getenv("ML_AUTO_SCORING_QUEUE_SIZE", "10000")),
+        batch_size=int(os.getenv("ML_AUTO_SCORING_BATCH_SIZE", "256")),
+        flush_interval=float(os.getenv("ML_AUTO_SCORING_FLUSH_INTERVAL", "0.5")),
+        alert_threshold=float(os.getenv("ML_AUTO_SCORING_ALERT_THRESHOLD", "0.7")),
+        enqueue_timeout=float(os.getenv("ML_AUTO_SCORING_ENQUEUE_TIMEOUT", "5"))
+    )
+    await _scoring_pipeline.start()
+    print("✓ ML auto-scoring pipeline started")
+
+
+async def stop_scoring_pipeline():
+    """Drain and stop auto-scoring on shutdown."""
+    global _scoring_pipeline
+    if _scoring_pipeline is not None:
+        await _scoring_pipeline.stop()
+        _scoring_pipeline = None
+
+
+async def submit_for_scoring(record_type: str, record_id: str, data: Dict[str, Any]):
+    """Queue a newly ingested record for auto-scoring (no-op when disabled)."""
+    if _scoring_pipeline is not None:
+        await _scoring_pipeline.submit(record_type, record_id, data)
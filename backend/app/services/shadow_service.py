@@ -0,0 +1,407 @@
+"""
+Shadow and canary evaluation of a challenger model on live traffic.
+
+Live scoring paths hand each feature batch, with the primary model's
+predictions and latency, to ``offer()``. That is a non-blocking queue put:
+a dedicated shadow thread scores the batch with the challenger, so neither
+the request path nor the shared inference pool waits for it. Full queues
+drop batches instead of applying backpressure.
+
+Comparisons are kept as counters per (primary, challenger) pair - rows,
+agreements, confidence deltas and latency histograms - and flushed
+periodically to ``ml_shadow_comparisons`` as one document per pair and
+hour. Optionally a percentage of default-model requests is served by the
+challenger (canary).
+"""
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_database
+from app.utils.ml_model_loader import format_model_ref, get_model_loader, parse_model_ref
+
+COMPARISONS_COLLECTION = "ml_shadow_comparisons"
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open.
+# Keys avoid "." since they are used in dotted $inc paths.
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+LATENCY_BUCKET_KEYS = [f"le_{bound:g}ms".replace(".", "_") for bound in LATENCY_BUCKETS_MS] + ["inf"]
+
+
+class _Comparison:
+    """Counters comparing a primary and a challenger model."""
+
+    def __init__(self):
+        self.batches = 0
+        self.rows = 0
+        self.agreements = 0
+        self.errors = 0
+        self.confidence_delta_sum = 0.0
+        self.confidence_delta_abs_sum = 0.0
+        self.primary_latency_ms_sum = 0.0
+        self.challenger_latency_ms_sum = 0.0
+        self.primary_latency_buckets = np.zeros(len(LATENCY_BUCKET_KEYS), dtype=np.int64)
+        self.challenger_latency_buckets = np.zeros(len(LATENCY_BUCKET_KEYS), dtype=np.int64)
+
+    def add(self, other: "_Comparison"):
+        """Add another comparison's counters to this one."""
+        for name, value in vars(other).items():
+            setattr(self, name, getattr(self, name) + value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Counters plus derived rates."""
+        batches = max(self.batches, 1)
+        rows = max(self.rows, 1)
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "errors": self.errors,
+            "agreement_rate": self.agreements / rows if self.rows else None,
+            "mean_confidence_delta": self.confidence_delta_sum / rows if self.rows else None,
+            "mean_abs_confidence_delta": self.confidence_delta_abs_sum / rows if self.rows else None,
+            "primary_latency_ms_mean": self.primary_latency_ms_sum / batches if self.batches else None,
+            "challenger_latency_ms_mean": self.challenger_latency_ms_sum / batches if self.batches else None,
+            "primary_latency_buckets": dict(zip(LATENCY_BUCKET_KEYS, self.primary_latency_buckets.tolist())),
+            "challenger_latency_buckets": dict(zip(LATENCY_BUCKET_KEYS, self.challenger_latency_buckets.tolist()))
+        }
+
+
+def _latency_bucket(latency_ms: float) -> int:
+    return int(np.searchsorted(LATENCY_BUCKETS_MS, latency_ms))
+
+
+class ShadowEvaluator:
+    """Scores sampled live batches with a challenger model on a separate thread."""
+
+    def __init__(self, queue_size: int = 256):
+        """
+        Initialize the evaluator (disabled until a challenger is configured).
+
+        Args:
+            queue_size: Batches waiting for the shadow thread before new ones are dropped
+        """
+        self.challenger_ref: Optional[str] = None
+        self.sample_rate = 1.0
+        self.canary_percent = 0.0
+        self.configured_at: Optional[datetime] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Counters not yet flushed, and all counters since the challenger was set
+        self._pending: Dict[Tuple[str, str], _Comparison] = {}
+        self._totals: Dict[Tuple[str, str], _Comparison] = {}
+        self.offered = 0
+        self.dropped = 0
+        self.canary_requests = 0
+
+    def configure(self, challenger_ref: str, sample_rate: float = 1.0, canary_percent: float = 0.0):
+        """Set the challenger and traffic shares, and start the shadow thread."""
+        with self._lock:
+            if challenger_ref != self.challenger_ref:
+                self._totals = {}
+            self.challenger_ref = challenger_ref
+            self.sample_rate = sample_rate
+            self.canary_percent = canary_percent
+            self.configured_at = datetime.utcnow()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name="ml-shadow", daemon=True)
+                self._thread.start()
+
+    def disable(self):
+        """Stop shadowing and canary routing; queued batches are discarded."""
+        with self._lock:
+            self.challenger_ref = None
+            self.canary_percent = 0.0
+
+    def route(self) -> Optional[str]:
+        """Challenger reference for a canary request, or None to use the default model."""
+        challenger = self.challenger_ref
+        if challenger is None or self.canary_percent <= 0:
+            return None
+        if random.random() * 100.0 < self.canary_percent:
+            self.canary_requests += 1
+            return challenger
+        return None
+
+    def offer(
+        self,
+        matrix: np.ndarray,
+        model_ref: str,
+        predictions: Any,
+        confidences: Any,
+        latency_seconds: float,
+        feature_order: Optional[List[str]] = None
+    ):
+        """
+        Queue a scored batch for the challenger without blocking.
+
+        Args:
+            matrix: Feature matrix the primary model scored
+            model_ref: Pinned primary model reference
+            predictions: Primary predictions
+            confidences: Primary confidences
+            latency_seconds: Primary model latency for the batch
+            feature_order: Feature names of the matrix columns
+        """
+        challenger = self.challenger_ref
+        if challenger is None or model_ref == challenger:
+            return
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        self.offered += 1
+        try:
+            self._queue.put_nowait((model_ref, challenger, matrix, predictions, confidences, latency_seconds, feature_order))
+        except queue.Full:
+            self.dropped += 1
+
+    def _worker(self):
+        """Shadow thread: score queued batches with the challenger."""
+        loader = get_model_loader()
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            primary_ref, challenger, matrix, predictions, confidences, latency_seconds, feature_order = item
+            if challenger != self.challenger_ref:
+                continue
+
+            comparison = _Comparison()
+            comparison.batches = 1
+            primary_ms = latency_seconds * 1000.0
+            comparison.primary_latency_ms_sum = primary_ms
+            comparison.primary_latency_buckets[_latency_bucket(primary_ms)] += 1
+            try:
+                started = time.perf_counter()
+                shadow_predictions, shadow_confidences = loader.predict_batch(matrix, challenger, feature_order)
+                challenger_ms = (time.perf_counter() - started) * 1000.0
+
+                primary = np.asarray(predictions).astype(str)
+                delta = np.asarray(shadow_confidences, dtype=np.float64) - np.asarray(confidences, dtype=np.float64)
+                comparison.rows = len(primary)
+                comparison.agreements = int(np.count_nonzero(primary == np.asarray(shadow_predictions).astype(str)))
+                comparison.confidence_delta_sum = float(delta.sum())
+                comparison.confidence_delta_abs_sum = float(np.abs(delta).sum())
+                comparison.challenger_latency_ms_sum = challenger_ms
+                comparison.challenger_latency_buckets[_latency_bucket(challenger_ms)] += 1
+            except Exception:
+                comparison.errors = 1
+
+            key = (primary_ref, challenger)
+            with self._lock:
+                self._pending.setdefault(key, _Comparison()).add(comparison)
+                if challenger == self.challenger_ref:
+                    self._totals.setdefault(key, _Comparison()).add(comparison)
+
+    def take_pending(self) -> Dict[Tuple[str, str], _Comparison]:
+        """Return and reset the counters gathered since the last flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def stop(self):
+        """Stop the shadow thread."""
+        if self._thread is not None and self._thread.is_alive():
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Configuration, queue counters and comparisons for the current challenger."""
+        with self._lock:
+            totals = [
+                {"primary_model": primary, "challenger_model": challenger, **comparison.to_dict()}
+                for (primary, challenger), comparison in self._totals.items()
+            ]
+        return {
+            "enabled": self.challenger_ref is not None,
+            "challenger_model": self.challenger_ref,
+            "sample_rate": self.sample_rate,
+            "canary_percent": self.canary_percent,
+            "configured_at": self.configured_at,
+            "queued": self._queue.qsize(),
+            "offered": self.offered,
+            "dropped": self.dropped,
+            "canary_requests": self.canary_requests,
+            "comparisons": totals
+        }
+
+
+# Global evaluator instance and its flush task
+_shadow_evaluator: Optional[ShadowEvaluator] = None
+_flush_task: Optional[asyncio.Task] = None
+
+
+def get_shadow_evaluator() -> ShadowEvaluator:
+    """Get or create the global shadow evaluator."""
+    global _shadow_evaluator
+    if _shadow_evaluator is None:
+        _shadow_evaluator = ShadowEvaluator(queue_size=int(os.getenv("ML_SHADOW_QUEUE_SIZE", "256")))
+    return _shadow_evaluator
+
+
+def _keep_primary_active(model_name: str, challenger_version: str):
+    """
+    Make sure loading a challenger version does not activate it.
+
+    Until a version of a model is active, unversioned lookups serve the latest
+    file on disk and the first loaded version is activated - either could be
+    the challenger. Activate the latest other version first.
+    """
+    loader = get_model_loader()
+    if model_name in loader.active_versions:
+        return
+    previous = [v for v in loader.available_versions(model_name) if v != challenger_version]
+    if previous:
+        loader.get_model_version(format_model_ref(model_name, previous[-1]))
+
+
+def resolve_challenger(model_name: str) -> str:
+    """
+    Load a challenger without activating it and return its pinned reference.
+
+    Raises:
+        ValueError / FileNotFoundError: If the model cannot be resolved or loaded
+    """
+    loader = get_model_loader()
+    name, version = parse_model_ref(model_name)
+    if version is None:
+        versions = loader.available_versions(name)
+        if not versions:
+            raise ValueError(f"Model {name} not found")
+        version = versions[-1]
+    _keep_primary_active(name, version)
+    return loader.get_model_version(format_model_ref(name, version)).ref
+
+
+def deploy_challenger(model_name: str, version: str, model_path: str, sample_rate: float, canary_percent: float):
+    """Load an uploaded version without activating it, then shadow it (background task)."""
+    loader = get_model_loader()
+    ref = format_model_ref(model_name, version)
+    _keep_primary_active(model_name, version)
+    loader.deploy_model(model_name, version, model_path, activate=False)
+    if loader.deployments[ref]["status"] == "loaded":
+        get_shadow_evaluator().configure(ref, sample_rate, canary_percent)
+        loader.deployments[ref]["status"] = "shadow"
+        print(f"✓ Shadowing ML model {ref} (canary {canary_percent:g}%)")
+
+
+async def flush_comparisons():
+    """Add pending comparison counters to the hourly documents."""
+    pending = get_shadow_evaluator().take_pending()
+    if not pending:
+        return
+    db = get_database()
+    now = datetime.utcnow()
+    period_start = now.replace(minute=0, second=0, microsecond=0)
+    for (primary, challenger), comparison in pending.items():
+        increments = {
+            "batches": comparison.batches,
+            "rows": comparison.rows,
+            "agreements": comparison.agreements,
+            "errors": comparison.errors,
+            "confidence_delta_sum": comparison.confidence_delta_sum,
+            "confidence_delta_abs_sum": comparison.confidence_delta_abs_sum,
+            "primary_latency_ms_sum": comparison.primary_latency_ms_sum,
+            "challenger_latency_ms_sum": comparison.challenger_latency_ms_sum
+        }
+        for key, primary_count, challenger_count in zip(
+            LATENCY_BUCKET_KEYS,
+            comparison.primary_latency_buckets.tolist(),
+            comparison.challenger_latency_buckets.tolist()
+        ):
+            if primary_count:
+                increments[f"primary_latency_buckets.{key}"] = primary_count
+            if challenger_count:
+                increments[f"challenger_latency_buckets.{key}"] = challenger_count
+        await db[COMPARISONS_COLLECTION].update_one(
+            {"primary_model": primary, "challenger_model": challenger, "period_start": period_start},
+            {"$inc": increments, "$set": {"updated_at": now}},
+            upsert=True
+        )
+
+
+def _comparison_to_response(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored hourly comparison to an API response."""
+    comparison = _Comparison()
+    for name in ("batches", "rows", "agreements", "errors", "confidence_delta_sum",
+                 "confidence_delta_abs_sum", "primary_latency_ms_sum", "challenger_latency_ms_sum"):
+        setattr(comparison, name, doc.get(name, 0))
+    for name in ("primary_latency_buckets", "challenger_latency_buckets"):
+        buckets = doc.get(name) or {}
+        setattr(comparison, name, np.array([buckets.get(key, 0) for key in LATENCY_BUCKET_KEYS], dtype=np.int64))
+    return {
+        "id": str(doc["_id"]),
+        "primary_model": doc["primary_model"],
+        "challenger_model": doc["challenger_model"],
+        "period_start": doc["period_start"],
+        **comparison.to_dict(),
+        "updated_at": doc.get("updated_at")
+    }
+
+
+async def get_comparisons(challenger_model: Optional[str] = None, limit: int = 48) -> List[Dict[str, Any]]:
+    """List hourly comparisons, newest first."""
+    query = {"challenger_model": challenger_model} if challenger_model else {}
+    cursor = get_database()[COMPARISONS_COLLECTION].find(query).sort("period_start", -1).limit(limit)
+    return [_comparison_to_response(doc) for doc in await cursor.to_list(length=limit)]
+
+
+async def _flush_loop():
+    """Flush comparison counters periodically."""
+    interval = float(os.getenv("ML_SHADOW_FLUSH_SECONDS", "30"))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await flush_comparisons()
+        except Exception as e:
+            print(f"⚠ Failed to store shadow comparisons: {e}")
+
+
+async def start_shadow_evaluation():
+    """Configure the challenger from ML_SHADOW_MODEL (if set) and start flushing."""
+    global _flush_task
+    challenger = os.getenv("ML_SHADOW_MODEL")
+    if challenger:
+        try:
+            challenger_ref = await run_in_threadpool(resolve_challenger, challenger)
+            get_shadow_evaluator().configure(
+                challenger_ref,
+                sample_rate=float(os.getenv("ML_SHADOW_SAMPLE_RATE", "1.0")),
+                canary_percent=float(os.getenv("ML_CANARY_PERCENT", "0"))
+            )
+            print(f"✓ Shadowing ML model {challenger_ref}")
+        except Exception as e:
+            print(f"⚠ Failed to load shadow ML model {challenger}: {e}")
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_shadow_evaluation():
+    """Stop the shadow thread and flush the remaining counters."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        try:
+            await _flush_task
+        except asyncio.CancelledError:
+            pass
+        _flush_task = None
+    if _shadow_evaluator is not None:
+        _shadow_evaluator.stop()
+        try:
+            await flush_comparisons()
+        except Exception as e:
+            print(f"⚠ Failed to store shadow comparisons: {e}")
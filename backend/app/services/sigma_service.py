@@ -0,0 +1,232 @@
+"""
+Sigma rules: import, storage and matching on log ingest.
+
+Imported rules are stored in ``sigma_rules`` with their original YAML.
+Enabled rules are compiled into the global SigmaIndex at startup, after
+every change made through the API, and every SIGMA_REFRESH_SECONDS (only
+rules whose updated_at changed are recompiled). create_log matches every
+new log against the index and raises an alert per matching rule.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import yaml
+from bson import ObjectId
+
+from app.database import get_database
+from app.services.alert_service import create_alert
+from app.utils.sigma import SigmaError, SigmaRule, get_sigma_index, parse_sigma_yaml
+
+SIGMA_COLLECTION = "sigma_rules"
+
+# Log metadata copied into raised alerts so correlation and dedup can key on them
+_ALERT_CONTEXT_FIELDS = ("src_ip", "dest_ip", "dest_port")
+
+_sigma_refresh_task: Optional[asyncio.Task] = None
+
+
+def _sigma_to_response(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a stored Sigma rule to an API response."""
+    return {
+        "id": str(rule["_id"]),
+        "sigma_id": rule.get("sigma_id"),
+        "title": rule["title"],
+        "description": rule.get("description"),
+        "level": rule.get("level"),
+        "status": rule.get("status"),
+        "logsource": rule.get("logsource", {}),
+        "tags": rule.get("tags", []),
+        "enabled": rule.get("enabled", True),
+        "yaml": rule["yaml"],
+        "created_by": rule.get("created_by"),
+        "created_at": rule.get("created_at"),
+        "updated_at": rule.get("updated_at")
+    }
+
+
+async def load_sigma_rules():
+    """Compile enabled Sigma rules into the index, reusing unchanged ones."""
+    cursor = get_database()[SIGMA_COLLECTION].find({"enabled": True}, {"yaml": 1, "updated_at": 1})
+    index = get_sigma_index()
+    compiled = []
+    for doc in await cursor.to_list(length=None):
+        key = str(doc["_id"])
+        previous = index.rules.get(key)
+        if previous is not None and previous.version == doc.get("updated_at"):
+            compiled.append(previous)
+            continue
+        try:
+            compiled.append(SigmaRule(yaml.safe_load(doc["yaml"]), key=key, version=doc.get("updated_at")))
+        except (SigmaError, yaml.YAMLError) as e:
+            print(f"⚠ Sigma rule {key} skipped: {e}")
+    index.build(compiled)
+
+
+async def import_sigma_rules(text: str, enabled: bool = True, created_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Import Sigma rules from YAML (one or more documents).
+
+    Rules with an ``id`` replace the stored rule with the same id; the others
+    are added. Rules that fail to compile are reported and not stored.
+
+    Raises:
+        SigmaError: If the YAML cannot be parsed
+    """
+    db = get_database()
+    documents = parse_sigma_yaml(text)
+    imported = updated = 0
+    errors = []
+    now = datetime.utcnow()
+    for position, document in enumerate(documents):
+        try:
+            rule = SigmaRule(document)
+        except SigmaError as e:
+            title = document.get("title") if isinstance(document, dict) else None
+            errors.append({"index": position, "title": title, "error": str(e)})
+            continue
+        logsource = document.get("logsource") or {}
+        fields = {
+            "sigma_id": str(rule.sigma_id) if rule.sigma_id is not None else None,
+            "title": rule.title,
+            "description": rule.description,
+            "level": rule.level,
+            "status": document.get("status"),
+            "logsource": {k: str(v) for k, v in logsource.items() if isinstance(v, (str, int, float))},
+            "tags": [str(tag) for tag in rule.tags],
+            "yaml": yaml.safe_dump(document, sort_keys=False, allow_unicode=True),
+            "enabled": enabled,
+            "updated_at": now
+        }
+        if fields["sigma_id"] is not None:
+            result = await db[SIGMA_COLLECTION].update_one(
+                {"sigma_id": fields["sigma_id"]},
+                {"$set": fields, "$setOnInsert": {"created_by": created_by, "created_at": now}},
+                upsert=True
+            )
+            if result.upserted_id is None:
+                updated += 1
+            else:
+                imported += 1
+        else:
+            await db[SIGMA_COLLECTION].insert_one({**fields, "created_by": created_by, "created_at": now})
+            imported += 1
+    if imported or updated:
+        await load_sigma_rules()
+    return {"imported": imported, "updated": updated, "errors": errors}
+
+
+async def get_sigma_rules(
+    limit: int = 100,
+    skip: int = 0,
+    enabled_only: bool = False,
+    level: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Get Sigma rules with optional filtering."""
+    query: Dict[str, Any] = {}
+    if enabled_only:
+        query["enabled"] = True
+    if level:
+        query["level"] = level
+    cursor = get_database()[SIGMA_COLLECTION].find(query).sort("title", 1).skip(skip).limit(limit)
+    return [_sigma_to_response(rule) for rule in await cursor.to_list(length=limit)]
+
+
+async def get_sigma_rule(rule_id: str) -> Optional[Dict[str, Any]]:
+    """Get a Sigma rule by ID."""
+    if not ObjectId.is_valid(rule_id):
+        return None
+    rule = await get_database()[SIGMA_COLLECTION].find_one({"_id": ObjectId(rule_id)})
+    return _sigma_to_response(rule) if rule else None
+
+
+async def set_sigma_rule_enabled(rule_id: str, enabled: bool) -> Optional[Dict[str, Any]]:
+    """Enable or disable a Sigma rule."""
+    if not ObjectId.is_valid(rule_id):
+        return None
+    db = get_database()
+    result = await db[SIGMA_COLLECTION].update_one(
+        {"_id": ObjectId(rule_id)},
+        {"$set": {"enabled": enabled, "updated_at": datetime.utcnow()}}
+    )
+    if result.matched_count == 0:
+        return None
+    await load_sigma_rules()
+    return await get_sigma_rule(rule_id)
+
+
+async def delete_sigma_rule(rule_id: str) -> bool:
+    """Delete a Sigma rule."""
+    if not ObjectId.is_valid(rule_id):
+        return False
+    result = await get_database()[SIGMA_COLLECTION].delete_one({"_id": ObjectId(rule_id)})
+    if result.deleted_count:
+        await load_sigma_rules()
+    return result.deleted_count > 0
+
+
+async def evaluate_sigma(log: Dict[str, Any]):
+    """Match a created log against the Sigma rules and raise an alert per match."""
+    index = get_sigma_index()
+    if not index.rules:
+        return
+    metadata = log.get("metadata") or {}
+    for rule in index.match(log):
+        alert_metadata = {field: metadata[field] for field in _ALERT_CONTEXT_FIELDS if metadata.get(field) is not None}
+        alert_metadata.update({
+            "sigma_rule_id": rule.key,
+            "sigma_id": rule.sigma_id,
+            "level": rule.level,
+            "tags": rule.tags,
+            "signature": f"sigma:{rule.sigma_id or rule.key}"
+        })
+        try:
+            await create_alert(
+                title=f"Sigma: {rule.title}",
+                description=rule.description or f"Log matched Sigma rule '{rule.title}'",
+                severity=rule.severity,
+                alert_type="sigma",
+                source=log.get("source"),
+                metadata=alert_metadata,
+                related_log_ids=[log["id"]] if log.get("id") else None
+            )
+        except Exception as e:
+            print(f"⚠ Sigma rule {rule.title} could not raise an alert: {e}")
+
+
+async def _sigma_refresh_loop(interval: float):
+    """Reload Sigma rules periodically."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await load_sigma_rules()
+        except Exception as e:
+            print(f"⚠ Sigma rule refresh failed: {e}")
+
+
+async def start_sigma_rules():
+    """Compile Sigma rules and start the refresh task."""
+    global _sigma_refresh_task
+    try:
+        await load_sigma_rules()
+    except Exception as e:
+        print(f"⚠ Could not load Sigma rules: {e}")
+    count = len(get_sigma_index().rules)
+    if count:
+        print(f"✓ Compiled {count} Sigma rules")
+    interval = float(os.getenv("SIGMA_REFRESH_SECONDS", "30"))
+    if interval > 0 and _sigma_refresh_task is None:
+        _sigma_refresh_task = asyncio.create_task(_sigma_refresh_loop(interval))
+
+
+async def stop_sigma_rules():
+    """Stop the refresh task."""
+    global _sigma_refresh_task
+    if _sigma_refresh_task is not None:
+        _sigma_refresh_task.cancel()
+        try:
+            await _sigma_refresh_task
+        except asyncio.CancelledError:
+            pass
+        _sigma_refresh_task = None
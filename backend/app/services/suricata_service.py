@@ -1,13 +1,29 @@
 """
 Suricata service for event processing and management.
 """
+import codecs
 import json
-from typing import List, Optional, Dict, Any
+import os
+import time
+import zlib
+from typing import AsyncIterator, List, Optional, Dict, Any
 from datetime import datetime
 from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+from pymongo import UpdateOne
 
 from app.database import get_database
+from app.services.baseline_service import observe_suricata_event
 from app.services.log_service import create_log
+from app.services.rule_service import evaluate_record
+from app.services.scoring_pipeline import submit_for_scoring
+from app.utils.flow_features import get_flow_feature_engine, is_flow_event
+from app.utils.suricata_rules import ParsedLine, RuleStreamParser, rule_hash
+
+RULES_IMPORT_MAX_BYTES = int(os.getenv("SURICATA_RULES_IMPORT_MAX_MB", "256")) * 1024 * 1024
+RULES_IMPORT_BATCH_SIZE = int(os.getenv("SURICATA_RULES_IMPORT_BATCH_SIZE", "2000"))
+# Parse errors listed in an import report (all are counted)
+RULES_IMPORT_MAX_ERRORS = 100
 
 
 async def parse_and_store_suricata_event(eve_json: Dict[str, Any]) -> dict:
@@ -38,8 +54,20 @@ async def parse_and_store_suricata_event(eve_json: Dict[str, Any]) -> dict:
         "created_at": datetime.utcnow()
     }
     
+    # Fold flow/netflow events into the sliding-window feature state and
+    # keep the snapshot so later scoring sees the state at ingest time
+    flow_engine = get_flow_feature_engine()
+    if flow_engine is not None and is_flow_event(eve_json):
+        event_doc["window_features"] = flow_engine.update(eve_json)
+    
     result = await db.suricata_events.insert_one(event_doc)
     
+    # Update per-host anomaly baselines (no-op unless enabled)
+    await observe_suricata_event(eve_json, timestamp)
+    
+    # Evaluate alert rules
+    await evaluate_record("suricata_event", eve_json, str(result.inserted_id))
+    
     # Create log entry for alerts
     if event_type == "alert":
         alert_data = eve_json.get("alert", {})
@@ -72,6 +100,12 @@ async def parse_and_store_suricata_event(eve_json: Dict[str, Any]) -> dict:
             },
             timestamp=timestamp
         )
+    else:
+        # Alerts are scored through the log entry created above
+        scoring_input = eve_json
+        if "window_features" in event_doc:
+            scoring_input = {**eve_json, "window_features": event_doc["window_features"]}
+        await submit_for_scoring("suricata_event", str(result.inserted_id), scoring_input)
     
     return {
         "id": str(result.inserted_id),
@@ -141,16 +175,31 @@ async def create_suricata_rule(
     }
 
 
-async def get_suricata_rules(enabled_only: bool = False) -> List[dict]:
-    """Get Suricata rules."""
+async def get_suricata_rules(
+    enabled_only: bool = False,
+    sid: Optional[int] = None,
+    classtype: Optional[str] = None,
+    ruleset: Optional[str] = None,
+    limit: Optional[int] = None,
+    skip: int = 0
+) -> List[dict]:
+    """Get Suricata rules with optional filtering."""
     db = get_database()
     
     query = {}
     if enabled_only:
         query["enabled"] = True
+    if sid is not None:
+        query["sid"] = sid
+    if classtype:
+        query["classtype"] = classtype
+    if ruleset:
+        query["ruleset"] = ruleset
     
-    cursor = db.suricata_rules.find(query).sort("created_at", -1)
-    rules = await cursor.to_list(length=None)
+    cursor = db.suricata_rules.find(query).sort("created_at", -1).skip(skip)
+    if limit:
+        cursor = cursor.limit(limit)
+    rules = await cursor.to_list(length=limit)
     
     return [
         {
@@ -159,6 +208,11 @@ async def get_suricata_rules(enabled_only: bool = False) -> List[dict]:
             "rule_content": rule["rule_content"],
             "description": rule.get("description"),
             "enabled": rule.get("enabled", True),
+            "sid": rule.get("sid"),
+            "gid": rule.get("gid"),
+            "rev": rule.get("rev"),
+            "classtype": rule.get("classtype"),
+            "ruleset": rule.get("ruleset"),
             "created_at": rule.get("created_at"),
             "updated_at": rule.get("updated_at")
         }
@@ -204,6 +258,150 @@ async def delete_suricata_rule(rule_id: str) -> bool:
     return result.deleted_count > 0
 
 
+async def _ensure_rule_indexes(db):
+    """Indexes on the parsed rule fields (sid is unique per gid among parsed rules)."""
+    await db.suricata_rules.create_index(
+        [("gid", 1), ("sid", 1)],
+        unique=True,
+        partialFilterExpression={"sid": {"$exists": True}}
+    )
+    await db.suricata_rules.create_index("classtype")
+    await db.suricata_rules.create_index("protocol")
+
+
+async def _upsert_rule_batch(db, batch: List[ParsedLine], ruleset: Optional[str], totals: Dict[str, int]):
+    """Upsert a batch of parsed rules by (gid, sid) in one bulk write, skipping unchanged ones."""
+    existing = await db.suricata_rules.find(
+        {"sid": {"$in": list({fields["sid"] for _, _, _, fields in batch})}},
+        {"gid": 1, "sid": 1, "rule_hash": 1}
+    ).to_list(length=None)
+    stored = {(rule.get("gid", 1), rule["sid"]): rule.get("rule_hash") for rule in existing}
+    
+    now = datetime.utcnow()
+    operations = []
+    for _, text, enabled, fields in batch:
+        digest = rule_hash(text, enabled)
+        if stored.get((fields["gid"], fields["sid"])) == digest:
+            totals["unchanged"] += 1
+            continue
+        operations.append(UpdateOne(
+            {"gid": fields["gid"], "sid": fields["sid"]},
+            {
+                "$set": {
+                    **fields,
+                    "name": fields["msg"] or f"sid:{fields['sid']}",
+                    "rule_content": text,
+                    "enabled": enabled,
+                    "rule_hash": digest,
+                    "ruleset": ruleset,
+                    "updated_at": now
+                },
+                "$setOnInsert": {"description": None, "created_at": now}
+            },
+            upsert=True
+        ))
+    if operations:
+        result = await db.suricata_rules.bulk_write(operations, ordered=False)
+        totals["inserted"] += result.upserted_count
+        totals["updated"] += result.modified_count
+
+
+async def import_suricata_rules(chunks: AsyncIterator[bytes], ruleset: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Import a Suricata ruleset (.rules text, optionally gzip-compressed).
+    
+    The upload is decompressed, parsed and written as it streams in:
+    rules are upserted by sid (and gid) in bulk writes of
+    SURICATA_RULES_IMPORT_BATCH_SIZE, and rules whose text and enabled
+    state are unchanged are not rewritten. Commented-out rules are
+    imported as disabled. Rules that fail to parse, and repeated sids,
+    are reported and skipped.
+    
+    Args:
+        chunks: The upload's bytes
+        ruleset: Name recorded on the imported rules (e.g. the file name)
+    
+    Returns:
+        Counts of parsed, inserted, updated and unchanged rules, and parse errors
+    
+    Raises:
+        ValueError: If the upload is too large or not valid gzip
+    """
+    db = get_database()
+    await _ensure_rule_indexes(db)
+    
+    started = time.perf_counter()
+    parser = RuleStreamParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    decompressor = None
+    size = 0
+    totals = {"rules": 0, "disabled": 0, "inserted": 0, "updated": 0, "unchanged": 0, "error_count": 0}
+    errors: List[Dict[str, Any]] = []
+    seen = set()
+    pending: List[ParsedLine] = []
+    
+    def collect(rules: List[ParsedLine], parse_errors: List[Dict[str, Any]]):
+        for rule in rules:
+            line, text, enabled, fields = rule
+            key = (fields["gid"], fields["sid"])
+            if key in seen:
+                parse_errors.append({"line": line, "error": f"Duplicate sid {fields['sid']}", "rule": text[:200]})
+                continue
+            seen.add(key)
+            pending.append(rule)
+            totals["rules"] += 1
+            totals["disabled"] += not enabled
+        totals["error_count"] += len(parse_errors)
+        parse_errors.sort(key=lambda error: error["line"])
+        errors.extend(parse_errors[:RULES_IMPORT_MAX_ERRORS - len(errors)])
+    
+    async def flush(final: bool = False):
+        while len(pending) >= RULES_IMPORT_BATCH_SIZE or (final and pending):
+            batch = pending[:RULES_IMPORT_BATCH_SIZE]
+            del pending[:RULES_IMPORT_BATCH_SIZE]
+            await _upsert_rule_batch(db, batch, ruleset, totals)
+    
+    async for chunk in chunks:
+        if size == 0 and decompressor is None and chunk[:2] == b"\x1f\x8b":
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decompressor is not None:
+            data = b""
+            compressed = chunk
+            while compressed:
+                if decompressor.eof:
+                    # Concatenated gzip members (e.g. `cat a.gz b.gz`) continue the same file
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                try:
+                    # Capped so a small archive cannot inflate past the limit
+                    data += decompressor.decompress(compressed, RULES_IMPORT_MAX_BYTES - size - len(data) + 1)
+                except zlib.error as e:
+                    raise ValueError(f"Invalid gzip data: {e}")
+                if decompressor.unconsumed_tail or size + len(data) > RULES_IMPORT_MAX_BYTES:
+                    raise ValueError("Ruleset too large")
+                compressed = decompressor.unused_data if decompressor.eof else b""
+        else:
+            data = chunk
+        size += len(data)
+        if size > RULES_IMPORT_MAX_BYTES:
+            raise ValueError("Ruleset too large")
+        # Parsing is CPU work; keep it off the event loop
+        collect(*await run_in_threadpool(parser.feed, decoder.decode(data)))
+        await flush()
+    
+    if decompressor is not None and not decompressor.eof:
+        raise ValueError("Truncated gzip data")
+    collect(*parser.feed(decoder.decode(b"", final=True)))
+    collect(*parser.close())
+    await flush(final=True)
+    
+    return {
+        "ruleset": ruleset,
+        **totals,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+
 async def create_suricata_config(
     config_name: str,
     config_content: str,
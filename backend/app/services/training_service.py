@@ -0,0 +1,512 @@
+"""
+Out-of-core incremental training from labeled detections.
+
+A training job streams labeled ``ml_detections`` in chunks (features come
+from the feature store or the detection itself), turns each chunk into a
+fixed-width float32 matrix and feeds it to a ``partial_fit`` estimator, so
+memory depends on the chunk size, not the dataset size. Estimators that
+need scaled input get a separate first pass that only fits the scaler, so
+every chunk is trained on with the same (final) statistics the saved
+pipeline applies. Supervised jobs record progressive (test-then-train)
+accuracy per chunk.
+
+Jobs run in a separate process with its own synchronous MongoDB client,
+keeping the API process responsive; progress is written to the job
+document. The fitted model is saved as the next version of
+``<model_name>`` in ML_MODELS_DIR and can optionally be activated.
+
+The API process that queued a job holds a lease on it (``lease_until``),
+renewed by a heartbeat while the job is queued or running. Jobs are only
+failed as interrupted once their lease has expired, so a restarting worker
+leaves jobs running in another worker's pool alone, and the final status
+write only applies to a job that is still running.
+"""
+import asyncio
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+from bson import ObjectId
+from fastapi.concurrency import run_in_threadpool
+
+from app.database import get_database
+from app.services.feature_store import FEATURES_COLLECTION, LAYOUTS_COLLECTION, decode_features
+from app.utils.ml_model_loader import (
+    TRAINED_FEATURES_ATTR,
+    MLModelLoader,
+    format_model_ref,
+    get_model_loader,
+    model_ref_query
+)
+
+JOBS_COLLECTION = "ml_training_jobs"
+
+# Job states; "cancelling" asks the training process to stop after its chunk
+PENDING = "pending"
+RUNNING = "running"
+CANCELLING = "cancelling"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+SUPERVISED_ESTIMATORS = ("sgd", "naive_bayes")
+ESTIMATORS = SUPERVISED_ESTIMATORS + ("mini_batch_kmeans",)
+
+# Global process pool for training jobs
+_training_executor: Optional[ProcessPoolExecutor] = None
+_training_tasks: Dict[str, asyncio.Task] = {}
+_heartbeat_task: Optional[asyncio.Task] = None
+
+# States a job is in before it finishes
+ACTIVE_STATES = (PENDING, RUNNING, CANCELLING)
+
+
+def _lease_seconds() -> float:
+    """How long a job stays owned without a heartbeat."""
+    return float(os.getenv("ML_TRAINING_LEASE_SECONDS", "120"))
+
+
+def _lease_until() -> datetime:
+    return datetime.utcnow() + timedelta(seconds=_lease_seconds())
+
+
+def get_training_executor() -> ProcessPoolExecutor:
+    """Get or create the process pool that runs training jobs."""
+    global _training_executor
+    if _training_executor is None:
+        # spawn: the child must not inherit the event loop or the motor client
+        _training_executor = ProcessPoolExecutor(
+            max_workers=int(os.getenv("ML_TRAINING_WORKERS", "1")),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _training_executor
+
+
+def shutdown_training_executor():
+    """Stop the training process pool; running jobs are marked failed once their lease expires."""
+    global _training_executor, _heartbeat_task
+    if _heartbeat_task is not None:
+        _heartbeat_task.cancel()
+        _heartbeat_task = None
+    if _training_executor is not None:
+        _training_executor.shutdown(wait=False, cancel_futures=True)
+        _training_executor = None
+
+
+def _job_to_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a training job document to an API response."""
+    return {
+        "id": str(job["_id"]),
+        "model_name": job["model_name"],
+        "estimator": job["estimator"],
+        "status": job["status"],
+        "filters": job.get("filters", {}),
+        "chunk_size": job["chunk_size"],
+        "epochs": job["epochs"],
+        "epoch": job.get("epoch", 0),
+        "rows": job.get("rows", 0),
+        "chunks": job.get("chunks", 0),
+        "classes": job.get("classes"),
+        "feature_names": job.get("feature_names"),
+        "progressive_accuracy": job.get("progressive_accuracy"),
+        "model_ref": job.get("model_ref"),
+        "activate": job.get("activate", False),
+        "error": job.get("error"),
+        "created_by": job.get("created_by"),
+        "created_at": job["created_at"],
+        "started_at": job.get("started_at"),
+        "completed_at": job.get("completed_at")
+    }
+
+
+def _build_estimator(estimator: str, params: Dict[str, Any]):
+    """Create an unfitted partial_fit estimator and, if it needs one, a scaler."""
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.preprocessing import StandardScaler
+
+    if estimator == "sgd":
+        return SGDClassifier(loss="log_loss", random_state=0), StandardScaler()
+    if estimator == "naive_bayes":
+        return GaussianNB(), None
+    if estimator == "mini_batch_kmeans":
+        return MiniBatchKMeans(n_clusters=params.get("n_clusters", 8), random_state=0, n_init=3), StandardScaler()
+    raise ValueError(f"Unknown estimator: {estimator}")
+
+
+def _detection_query(job: Dict[str, Any]) -> Dict[str, Any]:
+    """MongoDB filter selecting a job's training detections."""
+    filters = job.get("filters", {})
+    query: Dict[str, Any] = {}
+    if job["estimator"] in SUPERVISED_ESTIMATORS:
+        query["label"] = {"$ne": None}
+    created = {}
+    if filters.get("start_time"):
+        created["$gte"] = filters["start_time"]
+    if filters.get("end_time"):
+        created["$lt"] = filters["end_time"]
+    if created:
+        query["created_at"] = created
+    if filters.get("detection_type"):
+        query["detection_type"] = filters["detection_type"]
+    if filters.get("source_model"):
+        query["model_name"] = model_ref_query(filters["source_model"])
+    return query
+
+
+def _chunk_features(db, docs: List[Dict[str, Any]], layouts: Dict[str, Tuple[str, ...]]) -> List[Dict[str, Any]]:
+    """Features of a chunk of detections, read from the feature store where referenced."""
+    refs = [doc["feature_id"] for doc in docs if doc.get("features") is None and doc.get("feature_id")]
+    stored: Dict[str, Dict[str, Any]] = {}
+    if refs:
+        feature_docs = list(db[FEATURES_COLLECTION].find({"_id": {"$in": refs}}, {"layout": 1, "values": 1}))
+        missing = list({fd["layout"] for fd in feature_docs} - set(layouts))
+        for layout in db[LAYOUTS_COLLECTION].find({"_id": {"$in": missing}}):
+            layouts[layout["_id"]] = tuple(layout["names"])
+        for fd in feature_docs:
+            if fd["layout"] in layouts:
+                stored[fd["_id"]] = decode_features(layouts[fd["layout"]], bytes(fd["values"]))
+    return [doc["features"] if doc.get("features") is not None else stored.get(doc.get("feature_id"), {}) for doc in docs]
+
+
+def _to_matrix(features_list: List[Dict[str, Any]], feature_names: List[str]) -> np.ndarray:
+    """Fixed-width float32 matrix; missing features are 0, non-finite values are clamped."""
+    matrix = np.zeros((len(features_list), len(feature_names)), dtype=np.float32)
+    for column, name in enumerate(feature_names):
+        matrix[:, column] = [features.get(name, 0.0) for features in features_list]
+    return np.nan_to_num(matrix, nan=0.0, posinf=np.finfo(np.float32).max, neginf=np.finfo(np.float32).min)
+
+
+def _iter_chunks(db, query: Dict[str, Any], projection: Dict[str, int], chunk_size: int):
+    """Yield matching detections in ``_id`` order, ``chunk_size`` at a time."""
+    cursor = db.ml_detections.find(query, projection).sort("_id", 1).batch_size(chunk_size)
+    try:
+        while True:
+            docs = list(itertools.islice(cursor, chunk_size))
+            if not docs:
+                return
+            yield docs
+    finally:
+        cursor.close()
+
+
+def _stop_requested(jobs, job_id: ObjectId, status: str) -> Optional[Dict[str, Any]]:
+    """Final job fields if a running job was cancelled or failed elsewhere, else None."""
+    if status == CANCELLING:
+        result = {"status": CANCELLED, "completed_at": datetime.utcnow()}
+        jobs.update_one({"_id": job_id, "status": CANCELLING}, {"$set": result})
+        return result
+    if status != RUNNING:
+        # Failed by another worker after the lease expired
+        return {"status": status}
+    return None
+
+
+def run_training_job(db, job_id: str, models_dir: str) -> Dict[str, Any]:
+    """
+    Train a model from a job definition (blocking, synchronous MongoDB API).
+
+    Args:
+        db: Synchronous (pymongo) database
+        job_id: Training job id
+        models_dir: Directory the fitted model is written to
+
+    Returns:
+        Final job fields
+    """
+    jobs = db[JOBS_COLLECTION]
+    # Claim the job; it may have been cancelled while queued
+    job = jobs.find_one_and_update(
+        {"_id": ObjectId(job_id), "status": PENDING},
+        {"$set": {"status": RUNNING, "started_at": datetime.utcnow()}}
+    )
+    if job is None:
+        return {"status": CANCELLED}
+    supervised = job["estimator"] in SUPERVISED_ESTIMATORS
+    query = _detection_query(job)
+    chunk_size = job["chunk_size"]
+    projection = {"features": 1, "feature_id": 1, "label": 1}
+    layouts: Dict[str, Tuple[str, ...]] = {}
+
+    classes = None
+    if supervised:
+        classes = sorted(str(label) for label in db.ml_detections.distinct("label", query))
+        if len(classes) < 2:
+            raise ValueError(f"Need at least two distinct labels to train, found {len(classes)}")
+
+    model, scaler = _build_estimator(job["estimator"], job.get("params", {}))
+    feature_names = job.get("feature_names")
+    totals = {"rows": 0, "chunks": 0}
+    correct = 0
+    evaluated = 0
+
+    jobs.update_one({"_id": job["_id"]}, {"$set": {"classes": classes}})
+
+    def chunk_matrix(docs: List[Dict[str, Any]]) -> np.ndarray:
+        nonlocal feature_names
+        features_list = _chunk_features(db, docs, layouts)
+        if feature_names is None:
+            # Fixed from the first chunk; saved with the model so live inference can align to it
+            feature_names = sorted({name for features in features_list for name in features})
+            jobs.update_one({"_id": job["_id"]}, {"$set": {"feature_names": feature_names}})
+        return _to_matrix(features_list, feature_names)
+
+    if scaler is not None:
+        # Separate first pass: every chunk is trained on with the final scaling statistics
+        chunks = _iter_chunks(db, query, projection, chunk_size)
+        for docs in chunks:
+            scaler.partial_fit(chunk_matrix(docs))
+            status = jobs.find_one({"_id": job["_id"]}, {"status": 1})["status"]
+            stopped = _stop_requested(jobs, job["_id"], status)
+            if stopped is not None:
+                chunks.close()
+                return stopped
+
+    for epoch in range(1, job["epochs"] + 1):
+        chunks = _iter_chunks(db, query, projection, chunk_size)
+        for docs in chunks:
+            X = chunk_matrix(docs)
+            X_fit = scaler.transform(X) if scaler is not None else X
+
+            if supervised:
+                y = np.array([str(doc["label"]) for doc in docs])
+                if totals["chunks"] > 0:
+                    # Progressive validation: score the chunk before learning from it
+                    correct += int(np.count_nonzero(model.predict(X_fit) == y))
+                    evaluated += len(y)
+                model.partial_fit(X_fit, y, classes=classes)
+            elif len(X_fit) >= model.n_clusters:
+                model.partial_fit(X_fit)
+
+            totals["rows"] += len(docs)
+            totals["chunks"] += 1
+            # Report progress and pick up cancellation in one round trip
+            status = jobs.find_one_and_update(
+                {"_id": job["_id"]},
+                {"$set": {
+                    **totals,
+                    "epoch": epoch,
+                    "progressive_accuracy": correct / evaluated if evaluated else None,
+                    "updated_at": datetime.utcnow()
+                }},
+                projection={"status": 1}
+            )["status"]
+            stopped = _stop_requested(jobs, job["_id"], status)
+            if stopped is not None:
+                chunks.close()
+                return stopped
+
+    if totals["rows"] == 0:
+        raise ValueError("No detections matched the training filters")
+    if not supervised and not hasattr(model, "cluster_centers_"):
+        raise ValueError(f"Need at least {model.n_clusters} rows per chunk to fit clusters")
+
+    if scaler is not None:
+        from sklearn.pipeline import Pipeline
+        model = Pipeline([("scaler", scaler), ("model", model)])
+    # Inference aligns its feature vectors to these columns before predicting
+    setattr(model, TRAINED_FEATURES_ATTR, list(feature_names))
+
+    loader = MLModelLoader(models_dir=models_dir)
+    os.makedirs(models_dir, exist_ok=True)
+    version = loader.next_version(job["model_name"])
+    model_path = loader.model_path(job["model_name"], version)
+    tmp_path = model_path.with_suffix(".training")
+    joblib.dump(model, tmp_path)
+    os.replace(tmp_path, model_path)
+
+    result = {
+        "status": COMPLETED,
+        "model_ref": format_model_ref(job["model_name"], version),
+        "model_path": str(model_path),
+        "completed_at": datetime.utcnow()
+    }
+    # A cancel or lease expiry during the save wins; the model is then discarded
+    completed = jobs.update_one({"_id": job["_id"], "status": RUNNING}, {"$set": result})
+    if completed.modified_count == 0:
+        os.remove(model_path)
+        return {"status": jobs.find_one({"_id": job["_id"]}, {"status": 1})["status"]}
+    return result
+
+
+def train_model_process(job_id: str, models_dir: str) -> Dict[str, Any]:
+    """Training process entry point: connect to MongoDB and run the job."""
+    import certifi
+    from pymongo import MongoClient
+
+    from app.database import DB_NAME, MONGO_URI
+
+    client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
+    try:
+        db = client[DB_NAME]
+        try:
+            return run_training_job(db, job_id, models_dir)
+        except Exception as e:
+            result = {"status": FAILED, "error": str(e), "completed_at": datetime.utcnow()}
+            db[JOBS_COLLECTION].update_one(
+                {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATES)}},
+                {"$set": result}
+            )
+            return result
+    finally:
+        client.close()
+
+
+async def _run_job(job_id: str):
+    """Run a job in the training process pool, then optionally activate the model."""
+    jobs = get_database()[JOBS_COLLECTION]
+    loader = get_model_loader()
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            get_training_executor(), train_model_process, job_id, str(loader.models_dir)
+        )
+    except Exception as e:
+        await jobs.update_one(
+            {"_id": ObjectId(job_id), "status": {"$in": list(ACTIVE_STATES)}},
+            {"$set": {"status": FAILED, "error": str(e), "completed_at": datetime.utcnow()}}
+        )
+        print(f"⚠ Training job {job_id} failed: {e}")
+        return
+    finally:
+        _training_tasks.pop(job_id, None)
+
+    if result.get("status") == COMPLETED:
+        print(f"✓ Trained ML model {result['model_ref']}")
+        job = await jobs.find_one({"_id": ObjectId(job_id)})
+        if job.get("activate"):
+            name, version = result["model_ref"].split("@", 1)
+            await run_in_threadpool(loader.deploy_model, name, version, result["model_path"])
+    elif result.get("status") == FAILED:
+        print(f"⚠ Training job {job_id} failed: {result.get('error')}")
+
+
+async def create_training_job(
+    model_name: str,
+    estimator: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    detection_type: Optional[str] = None,
+    source_model: Optional[str] = None,
+    feature_names: Optional[List[str]] = None,
+    chunk_size: Optional[int] = None,
+    epochs: int = 1,
+    n_clusters: int = 8,
+    activate: bool = False,
+    created_by: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Register a training job and start it in the training process pool.
+
+    Raises:
+        ValueError: If the estimator is unknown
+    """
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator: {estimator}")
+    job = {
+        "_id": ObjectId(),
+        "model_name": model_name,
+        "estimator": estimator,
+        "status": PENDING,
+        "filters": {
+            "start_time": start_time,
+            "end_time": end_time,
+            "detection_type": detection_type,
+            "source_model": source_model
+        },
+        "params": {"n_clusters": n_clusters},
+        "feature_names": feature_names,
+        "chunk_size": chunk_size or int(os.getenv("ML_TRAINING_CHUNK_SIZE", "5000")),
+        "epochs": epochs,
+        "activate": activate,
+        "created_by": created_by,
+        "created_at": datetime.utcnow(),
+        "completed_at": None,
+        "lease_until": _lease_until()
+    }
+    await get_database()[JOBS_COLLECTION].insert_one(job)
+
+    job_id = str(job["_id"])
+    _training_tasks[job_id] = asyncio.create_task(_run_job(job_id))
+    return _job_to_response(job)
+
+
+async def get_training_jobs(limit: int = 50) -> List[Dict[str, Any]]:
+    """List training jobs, newest first."""
+    cursor = get_database()[JOBS_COLLECTION].find().sort("created_at", -1).limit(limit)
+    return [_job_to_response(job) for job in await cursor.to_list(length=limit)]
+
+
+async def get_training_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Get a training job with its progress."""
+    if not ObjectId.is_valid(job_id):
+        return None
+    job = await get_database()[JOBS_COLLECTION].find_one({"_id": ObjectId(job_id)})
+    return _job_to_response(job) if job else None
+
+
+async def cancel_training_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Ask a training job to stop after its current chunk.
+
+    Raises:
+        ValueError: If the job has already finished
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    jobs = get_database()[JOBS_COLLECTION]
+    job = await jobs.find_one({"_id": ObjectId(job_id)})
+    if not job:
+        return None
+    if job["status"] not in (PENDING, RUNNING):
+        raise ValueError(f"Cannot cancel a {job['status']} training job")
+
+    # Pending jobs have not reached the training process yet
+    new_status = CANCELLED if job["status"] == PENDING else CANCELLING
+    await jobs.update_one({"_id": job["_id"], "status": job["status"]}, {"$set": {"status": new_status}})
+    return await get_training_job(job_id)
+
+
+async def _fail_expired_jobs() -> int:
+    """Fail unfinished jobs whose owner stopped renewing the lease (training is not resumable)."""
+    result = await get_database()[JOBS_COLLECTION].update_many(
+        {
+            "status": {"$in": list(ACTIVE_STATES)},
+            "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.utcnow()}}]
+        },
+        {"$set": {"status": FAILED, "error": "Interrupted: the worker running it stopped", "completed_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+
+async def _heartbeat_loop():
+    """Renew the leases of this process's jobs and fail jobs abandoned by other workers."""
+    while True:
+        await asyncio.sleep(_lease_seconds() / 3)
+        try:
+            if _training_tasks:
+                await get_database()[JOBS_COLLECTION].update_many(
+                    {"_id": {"$in": [ObjectId(job_id) for job_id in _training_tasks]}, "status": {"$in": list(ACTIVE_STATES)}},
+                    {"$set": {"lease_until": _lease_until()}}
+                )
+            failed = await _fail_expired_jobs()
+            if failed:
+                print(f"⚠ Marked {failed} abandoned training job(s) as failed")
+        except Exception as e:
+            print(f"⚠ Training job heartbeat failed: {e}")
+
+
+async def fail_interrupted_training_jobs():
+    """Mark jobs whose lease expired (cut off by a shutdown) as failed and start the lease heartbeat."""
+    global _heartbeat_task
+    failed = await _fail_expired_jobs()
+    if failed:
+        print(f"⚠ Marked {failed} interrupted training job(s) as failed")
+    if _heartbeat_task is None:
+        _heartbeat_task = asyncio.create_task(_heartbeat_loop())
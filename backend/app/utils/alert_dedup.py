@@ -0,0 +1,136 @@
+"""
+Fingerprint-based alert deduplication.
+
+An alert's fingerprint is a hash of its title, alert type, source and the
+configured metadata key fields. A bounded LRU maps recent fingerprints to
+the alert stored for them. A repeat inside the suppression window (counted
+from that alert's creation) is folded into the stored alert as an
+occurrence instead of being inserted. Once the window ends, the next
+repeat is stored as a new alert, so a long storm still shows up again
+every window.
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_FINGERPRINT_FIELDS = ("src_ip", "dest_ip", "dest_port", "signature", "model_name")
+
+
+class AlertDeduplicator:
+    """LRU of recent alert fingerprints with suppression counters."""
+
+    def __init__(
+        self,
+        window_seconds: float = 600.0,
+        max_entries: int = 50000,
+        fields: Tuple[str, ...] = DEFAULT_FINGERPRINT_FIELDS
+    ):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            window_seconds: How long a stored alert absorbs repeats
+            max_entries: Fingerprints remembered (least recently used are dropped)
+            fields: Metadata fields that are part of the fingerprint
+        """
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.fields = fields
+        # fingerprint -> (alert id, alert creation time)
+        self._entries: "OrderedDict[str, Tuple[str, datetime]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def fingerprint(
+        self,
+        title: str,
+        alert_type: str,
+        source: Optional[str],
+        metadata: Optional[Dict[str, Any]]
+    ) -> str:
+        """Hash of the alert's identifying fields."""
+        metadata = metadata or {}
+        parts: List[Any] = [title, alert_type, source]
+        parts.extend(metadata.get(field) for field in self.fields)
+        encoded = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+    def lookup(self, fingerprint: str, now: datetime) -> Optional[str]:
+        """
+        Find the alert a repeat should be folded into.
+
+        Returns:
+            The stored alert's ID, or None if the alert is new or its window has ended
+        """
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            self.misses += 1
+            return None
+        alert_id, created_at = entry
+        if (now - created_at).total_seconds() > self.window_seconds:
+            del self._entries[fingerprint]
+            self.expired += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(fingerprint)
+        self.hits += 1
+        return alert_id
+
+    def remember(self, fingerprint: str, alert_id: str, created_at: datetime):
+        """Record the alert stored for a fingerprint."""
+        self._entries[fingerprint] = (alert_id, created_at)
+        self._entries.move_to_end(fingerprint)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def forget(self, fingerprint: str):
+        """Drop a fingerprint whose alert no longer exists (after lookup() returned it)."""
+        if self._entries.pop(fingerprint, None) is not None:
+            # The lookup turned out to be a miss
+            self.hits -= 1
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return suppression counters."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "window_seconds": self.window_seconds,
+            "fields": list(self.fields),
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "suppressed": self.hits,
+            "stored": self.misses,
+            "suppression_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+# Global deduplicator instance
+_alert_deduplicator: Optional[AlertDeduplicator] = None
+
+
+def dedup_enabled() -> bool:
+    """Check whether alert deduplication is enabled (ALERT_DEDUP)."""
+    return os.getenv("ALERT_DEDUP", "false").lower() in ("1", "true", "yes")
+
+
+def get_alert_deduplicator() -> Optional[AlertDeduplicator]:
+    """Get or create the global alert deduplicator, or None if disabled."""
+    global _alert_deduplicator
+    if _alert_deduplicator is None and dedup_enabled():
+        fields = os.getenv("ALERT_DEDUP_FIELDS")
+        _alert_deduplicator = AlertDeduplicator(
+            window_seconds=float(os.getenv("ALERT_DEDUP_WINDOW_SECONDS", "600")),
+            max_entries=int(os.getenv("ALERT_DEDUP_MAX_ENTRIES", "50000")),
+            fields=tuple(f.strip() for f in fields.split(",") if f.strip()) if fields is not None else DEFAULT_FINGERPRINT_FIELDS
+        )
+    return _alert_deduplicator
@@ -0,0 +1,340 @@
+"""
+Streaming per-entity anomaly baselines.
+
+Events are counted per entity (a log source or a network host) in fixed
+intervals. When an interval closes, its metrics (event count, bytes,
+error ratio) are compared against an exponentially weighted mean/variance
+kept per entity and hour of day, and z-scores beyond the threshold are
+reported as anomalies. The baseline is then updated with the interval.
+
+All state lives in NumPy tables indexed by an entity row number:
+- mean / var: float64 (entities, 24 hours, metrics)
+- count: int32 (entities, 24 hours) - intervals seen, for warm-up
+- interval accumulators and last-seen times per entity
+Tables grow by doubling up to max_entities; beyond that the longest idle
+entity is recycled. snapshot()/load() persist the tables to a single .npz
+file (no pickling) so baselines survive restarts.
+"""
+import json
+import math
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+METRICS = ("event_count", "bytes", "error_ratio")
+N_METRICS = len(METRICS)
+HOURS = 24
+
+# Minimum standard deviation per metric, so near-constant baselines do not
+# turn tiny changes into huge z-scores
+_STD_FLOOR = np.array([1.0, 64.0, 0.05])
+
+# Accumulator columns
+_EVENTS, _BYTES, _ERRORS = range(3)
+
+_KEY_SEPARATOR = "\x1f"
+
+
+class BaselineEngine:
+    """EWMA mean/variance baselines per entity and hour of day."""
+
+    def __init__(
+        self,
+        interval_seconds: float = 60.0,
+        alpha: float = 0.05,
+        z_threshold: float = 4.0,
+        min_samples: int = 10,
+        max_entities: int = 50000,
+        initial_capacity: int = 1024
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            interval_seconds: Length of the aggregation interval
+            alpha: EWMA smoothing factor (weight of the newest interval)
+            z_threshold: Absolute z-score above which an interval is anomalous
+            min_samples: Intervals a (entity, hour) baseline needs before it can alert
+            max_entities: Maximum tracked entities (longest idle is recycled)
+            initial_capacity: Initial table rows
+        """
+        self.interval_seconds = interval_seconds
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.max_entities = max_entities
+
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._keys: List[Optional[Tuple[str, str]]] = []
+        self._allocate(min(initial_capacity, max_entities))
+        self._lock = threading.Lock()
+        self.intervals_closed = 0
+        self.anomalies = 0
+        self.recycled = 0
+        self.late_events = 0
+        self.dropped_late = 0
+
+    def _allocate(self, capacity: int):
+        """Create empty tables with the given capacity."""
+        self.mean = np.zeros((capacity, HOURS, N_METRICS))
+        self.var = np.zeros((capacity, HOURS, N_METRICS))
+        self.count = np.zeros((capacity, HOURS), dtype=np.int32)
+        self.interval = np.full(capacity, -1, dtype=np.int64)
+        self.acc = np.zeros((capacity, 3))
+        self.last_seen = np.zeros(capacity)
+
+    def _grow(self, capacity: int):
+        """Resize tables, keeping existing rows."""
+        used = len(self._keys)
+        old = (self.mean, self.var, self.count, self.interval, self.acc, self.last_seen)
+        self._allocate(capacity)
+        for new, previous in zip((self.mean, self.var, self.count, self.interval, self.acc, self.last_seen), old):
+            new[:used] = previous[:used]
+
+    def _row(self, key: Tuple[str, str]) -> int:
+        """Get or assign the table row of an entity."""
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+
+        used = len(self._keys)
+        if used < self.max_entities:
+            if used == len(self.interval):
+                self._grow(min(used * 2, self.max_entities))
+            self._keys.append(key)
+            row = used
+        else:
+            # Recycle the entity that has been idle longest
+            row = int(np.argmin(self.last_seen[:used]))
+            del self._rows[self._keys[row]]
+            self._keys[row] = key
+            self.mean[row] = 0.0
+            self.var[row] = 0.0
+            self.count[row] = 0
+            self.interval[row] = -1
+            self.acc[row] = 0.0
+            self.last_seen[row] = 0.0
+            self.recycled += 1
+        self._rows[key] = row
+        return row
+
+    def observe(
+        self,
+        kind: str,
+        entity: str,
+        ts: float,
+        bytes_count: float = 0.0,
+        is_error: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Count one event for an entity.
+
+        An event older than the entity's open interval (out-of-order
+        delivery) is counted into the open interval rather than reopening a
+        past one; if the entity has no open interval it is dropped.
+
+        Args:
+            kind: Entity kind (e.g. "source", "host")
+            entity: Entity identifier
+            ts: Event time (epoch seconds)
+            bytes_count: Bytes attributed to the event
+            is_error: Whether the event counts towards the error ratio
+
+        Returns:
+            Anomalies found in the entity's previous interval, if it just closed
+        """
+        interval = int(ts // self.interval_seconds)
+        with self._lock:
+            row = self._row((kind, entity))
+            anomalies = []
+            current = self.interval[row]
+            # With no open interval, intervals up to the last event have been closed and scored
+            closed_through = int(self.last_seen[row] // self.interval_seconds) if current < 0 and self.last_seen[row] > 0 else -1
+            if interval < current or interval <= closed_through:
+                self.late_events += 1
+                if current < 0:
+                    self.dropped_late += 1
+                    return anomalies
+                interval = current
+            if current != interval:
+                if current >= 0 and self.acc[row, _EVENTS] > 0:
+                    anomalies = self._close(np.array([row]))
+                self.interval[row] = interval
+                self.acc[row] = 0.0
+
+            self.acc[row, _EVENTS] += 1
+            self.acc[row, _BYTES] += bytes_count
+            if is_error:
+                self.acc[row, _ERRORS] += 1
+            self.last_seen[row] = max(self.last_seen[row], ts)
+            return anomalies
+
+    def flush(self, now: float) -> List[Dict[str, Any]]:
+        """Close every interval that ended before ``now`` (entities that went quiet)."""
+        current = int(now // self.interval_seconds)
+        with self._lock:
+            used = len(self._keys)
+            rows = np.flatnonzero(
+                (self.interval[:used] >= 0)
+                & (self.interval[:used] < current)
+                & (self.acc[:used, _EVENTS] > 0)
+            )
+            if len(rows) == 0:
+                return []
+            anomalies = self._close(rows)
+            self.interval[rows] = -1
+            self.acc[rows] = 0.0
+            return anomalies
+
+    def _close(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Score closed intervals against their baselines, then update the baselines."""
+        hours = ((self.interval[rows] * self.interval_seconds) // 3600 % HOURS).astype(np.intp)
+        acc = self.acc[rows]
+        values = np.column_stack([
+            acc[:, _EVENTS],
+            acc[:, _BYTES],
+            acc[:, _ERRORS] / np.maximum(acc[:, _EVENTS], 1.0),
+        ])
+
+        mean = self.mean[rows, hours]
+        var = self.var[rows, hours]
+        count = self.count[rows, hours]
+        std = np.maximum(np.sqrt(var), _STD_FLOOR)
+        z = (values - mean) / std
+        alerting = (count >= self.min_samples)[:, None] & (np.abs(z) > self.z_threshold)
+
+        # EWMA update; the first interval seeds the baseline
+        first = count == 0
+        delta = values - mean
+        new_mean = np.where(first[:, None], values, mean + self.alpha * delta)
+        new_var = np.where(first[:, None], 0.0, (1.0 - self.alpha) * (var + self.alpha * delta * delta))
+        self.mean[rows, hours] = new_mean
+        self.var[rows, hours] = new_var
+        self.count[rows, hours] = count + 1
+        self.intervals_closed += len(rows)
+
+        anomalies = []
+        for i, m in zip(*np.nonzero(alerting)):
+            kind, entity = self._keys[rows[i]]
+            anomalies.append({
+                "entity_kind": kind,
+                "entity": entity,
+                "metric": METRICS[m],
+                "hour_of_day": int(hours[i]),
+                "interval_start": float(self.interval[rows[i]] * self.interval_seconds),
+                "interval_seconds": self.interval_seconds,
+                "value": float(values[i, m]),
+                "baseline_mean": float(mean[i, m]),
+                "baseline_std": float(std[i, m]),
+                "z_score": float(z[i, m]),
+                "samples": int(count[i]),
+            })
+        self.anomalies += len(anomalies)
+        return anomalies
+
+    @staticmethod
+    def confidence(z_score: float) -> float:
+        """Two-sided normal probability that a deviation is not chance."""
+        return math.erf(abs(z_score) / math.sqrt(2.0))
+
+    def snapshot(self, path: str):
+        """
+        Write the tables to ``path`` atomically.
+
+        The file has a single writer: each process keeps its own tables, so
+        processes sharing a path overwrite each other's baselines.
+        """
+        with self._lock:
+            used = len(self._keys)
+            arrays = {
+                "mean": self.mean[:used].copy(),
+                "var": self.var[:used].copy(),
+                "count": self.count[:used].copy(),
+                "interval": self.interval[:used].copy(),
+                "acc": self.acc[:used].copy(),
+                "last_seen": self.last_seen[:used].copy(),
+            }
+            keys = [_KEY_SEPARATOR.join(key) for key in self._keys]
+
+        meta = {"interval_seconds": self.interval_seconds, "metrics": list(METRICS)}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                keys=np.array(keys, dtype=np.str_),
+                meta=np.array(json.dumps(meta)),
+                **arrays
+            )
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> bool:
+        """
+        Restore tables from a snapshot.
+
+        Returns:
+            False if there is no compatible snapshot at ``path``
+        """
+        if not os.path.exists(path):
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("metrics") != list(METRICS) or meta.get("interval_seconds") != self.interval_seconds:
+                return False
+            keys = [tuple(key.split(_KEY_SEPARATOR, 1)) for key in data["keys"].tolist()]
+            used = min(len(keys), self.max_entities)
+            with self._lock:
+                self._allocate(max(used, 1))
+                self.mean[:used] = data["mean"][:used]
+                self.var[:used] = data["var"][:used]
+                self.count[:used] = data["count"][:used]
+                self.interval[:used] = data["interval"][:used]
+                self.acc[:used] = data["acc"][:used]
+                self.last_seen[:used] = data["last_seen"][:used]
+                self._keys = keys[:used]
+                self._rows = {key: row for row, key in enumerate(self._keys)}
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Return table sizes and counters."""
+        with self._lock:
+            return {
+                "entities": len(self._keys),
+                "capacity": len(self.interval),
+                "max_entities": self.max_entities,
+                "table_bytes": int(sum(a.nbytes for a in (self.mean, self.var, self.count, self.interval, self.acc, self.last_seen))),
+                "interval_seconds": self.interval_seconds,
+                "alpha": self.alpha,
+                "z_threshold": self.z_threshold,
+                "min_samples": self.min_samples,
+                "intervals_closed": self.intervals_closed,
+                "anomalies": self.anomalies,
+                "late_events": self.late_events,
+                "dropped_late_events": self.dropped_late,
+                "recycled": self.recycled,
+            }
+
+
+# Global engine instance
+_baseline_engine: Optional[BaselineEngine] = None
+
+
+def baselines_enabled() -> bool:
+    """Check whether anomaly baselines are enabled (ML_BASELINES)."""
+    return os.getenv("ML_BASELINES", "false").lower() in ("1", "true", "yes")
+
+
+def get_baseline_engine() -> Optional[BaselineEngine]:
+    """Get or create the global baseline engine, or None if disabled."""
+    global _baseline_engine
+    if _baseline_engine is None and baselines_enabled():
+        _baseline_engine = BaselineEngine(
+            interval_seconds=float(os.getenv("ML_BASELINE_INTERVAL_SECONDS", "60")),
+            alpha=float(os.getenv("ML_BASELINE_ALPHA", "0.05")),
+            z_threshold=float(os.getenv("ML_BASELINE_Z_THRESHOLD", "4.0")),
+            min_samples=int(os.getenv("ML_BASELINE_MIN_SAMPLES", "10")),
+            max_entities=int(os.getenv("ML_BASELINE_MAX_ENTITIES", "50000"))
+        )
+    return _baseline_engine
@@ -0,0 +1,92 @@
+"""
+Circuit breaker for outbound deliveries.
+
+A destination that keeps failing is not worth hammering: after
+``failure_threshold`` consecutive failures the breaker opens and callers
+skip the destination for ``reset_seconds``. The first call allowed after
+that is a probe (half-open); its success closes the breaker, its failure
+opens it for another ``reset_seconds``.
+"""
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """
+        Initialize the breaker (closed).
+
+        Args:
+            failure_threshold: Consecutive failures that open the breaker
+            reset_seconds: How long the breaker stays open before a probe
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+        self.opens = 0
+        self.rejected = 0
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """
+        Check whether a call may go out now.
+
+        Moves an open breaker whose reset time has passed to half-open and
+        lets exactly one probe through until its outcome is recorded.
+        """
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN and now - self.opened_at >= self.reset_seconds:
+            self.state = HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def release(self):
+        """Give back a half-open probe that was not used, so the next call can probe."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        """Record a successful call (closes a half-open breaker)."""
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self, now: Optional[float] = None):
+        """Record a failed call (opens the breaker at the threshold or after a failed probe)."""
+        now = time.monotonic() if now is None else now
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+            self.state = OPEN
+            self.opened_at = now
+            self._probe_in_flight = False
+            self.opens += 1
+
+    def stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Return the breaker state and counters."""
+        now = time.monotonic() if now is None else now
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            "retry_in_seconds": (
+                max(0.0, self.reset_seconds - (now - self.opened_at)) if self.state == OPEN else None
+            ),
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,232 @@
+"""
+In-memory alert correlation.
+
+Alerts are keyed by (source IP, target, signature). The first alert for a
+key opens an incident and is stored as its representative alert. Matching
+alerts that arrive within the sliding window of the incident's last-seen
+time are merged into it: the alert count, last-seen time, highest severity
+and a sample of related log IDs are updated in memory and no alert
+document is written. An incident that stays quiet for a whole window is
+closed, and the next matching alert opens a new one.
+
+Changed incidents are marked dirty. take_dirty() returns them as documents
+so the caller can persist them in batches. Incidents are kept in
+least-recently-seen order. Past max_incidents, the oldest is evicted, and
+its latest state is still returned by the next take_dirty().
+"""
+import os
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+SEVERITY_RANK = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+CorrelationKey = Tuple[Optional[str], Optional[str], str]
+
+
+def correlation_key(
+    title: str,
+    alert_type: str,
+    source: Optional[str],
+    metadata: Optional[Dict[str, Any]]
+) -> CorrelationKey:
+    """
+    Build the correlation key of an alert.
+
+    The source IP comes from ``src_ip`` / ``source_ip`` metadata. The target
+    is ``dest_ip`` / ``dst_ip`` / ``target``, falling back to the alert
+    source. The signature is ``signature`` metadata, falling back to the
+    alert type and title. Ports are not part of the key, so a port scan of
+    one host collapses into one incident.
+    """
+    metadata = metadata or {}
+    source_ip = metadata.get("src_ip") or metadata.get("source_ip")
+    target = metadata.get("dest_ip") or metadata.get("dst_ip") or metadata.get("target") or source
+    signature = metadata.get("signature") or f"{alert_type}:{title}"
+    return (
+        str(source_ip) if source_ip else None,
+        str(target) if target else None,
+        str(signature)
+    )
+
+
+class Incident:
+    """An open incident and the alert that opened it."""
+    __slots__ = (
+        "id", "key", "alert", "severity", "count", "first_seen", "last_seen",
+        "related_log_ids", "dirty"
+    )
+
+    def __init__(self, key: CorrelationKey, alert: Dict[str, Any], now: datetime, incident_id: Optional[ObjectId] = None):
+        self.id = incident_id or ObjectId()
+        self.key = key
+        self.alert = alert
+        self.severity = alert["severity"]
+        self.count = 1
+        self.first_seen = now
+        self.last_seen = now
+        self.related_log_ids: List[str] = list(alert.get("related_log_ids") or [])
+        self.dirty = True
+
+    def to_document(self) -> Dict[str, Any]:
+        """Fields of the incident document owned by the engine."""
+        source_ip, target, signature = self.key
+        return {
+            "_id": self.id,
+            "source_ip": source_ip,
+            "target": target,
+            "signature": signature,
+            "title": self.alert["title"],
+            "alert_type": self.alert["alert_type"],
+            "source": self.alert.get("source"),
+            "severity": self.severity,
+            "alert_id": self.alert["id"],
+            "alert_count": self.count,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "related_log_ids": self.related_log_ids,
+        }
+
+
+class CorrelationEngine:
+    """Sliding-window grouping of alerts into incidents."""
+
+    def __init__(self, window_seconds: float = 300.0, max_incidents: int = 10000, max_related_ids: int = 100):
+        """
+        Initialize the engine.
+
+        Args:
+            window_seconds: Quiet time after which an incident is closed
+            max_incidents: Maximum open incidents kept in memory
+            max_related_ids: Related log IDs sampled per incident
+        """
+        self.window_seconds = window_seconds
+        self.max_incidents = max_incidents
+        self.max_related_ids = max_related_ids
+        self._incidents: "OrderedDict[CorrelationKey, Incident]" = OrderedDict()
+        self._evicted: List[Dict[str, Any]] = []
+
+        self.opened = 0
+        self.merged = 0
+        self.evicted = 0
+
+    def _expired(self, incident: Incident, now: datetime) -> bool:
+        return (now - incident.last_seen).total_seconds() > self.window_seconds
+
+    def merge(
+        self,
+        key: CorrelationKey,
+        severity: str,
+        related_log_ids: Optional[List[str]],
+        now: datetime
+    ) -> Optional[Incident]:
+        """
+        Merge an alert into the open incident for its key.
+
+        Returns:
+            The updated incident, or None if no incident is open for the key
+        """
+        incident = self._incidents.get(key)
+        if incident is None or self._expired(incident, now):
+            return None
+        incident.count += 1
+        incident.last_seen = max(incident.last_seen, now)
+        if SEVERITY_RANK.get(severity, -1) > SEVERITY_RANK.get(incident.severity, -1):
+            incident.severity = severity
+        room = self.max_related_ids - len(incident.related_log_ids)
+        if room > 0 and related_log_ids:
+            incident.related_log_ids.extend(
+                [log_id for log_id in related_log_ids if log_id not in incident.related_log_ids][:room]
+            )
+        incident.dirty = True
+        self._incidents.move_to_end(key)
+        self.merged += 1
+        return incident
+
+    def open(
+        self,
+        key: CorrelationKey,
+        alert: Dict[str, Any],
+        now: datetime,
+        incident_id: Optional[ObjectId] = None
+    ) -> Incident:
+        """Open an incident for a key with its first (stored) alert, replacing a closed one."""
+        previous = self._incidents.pop(key, None)
+        if previous is not None and previous.dirty:
+            self._evicted.append(previous.to_document())
+        incident = Incident(key, alert, now, incident_id)
+        self._incidents[key] = incident
+        self.opened += 1
+        while len(self._incidents) > self.max_incidents:
+            _, oldest = self._incidents.popitem(last=False)
+            if oldest.dirty:
+                self._evicted.append(oldest.to_document())
+            self.evicted += 1
+        return incident
+
+    def take_dirty(self, now: datetime) -> List[Dict[str, Any]]:
+        """
+        Collect incidents changed since the last call and forget closed ones.
+
+        Returns:
+            Incident documents to persist
+        """
+        documents, self._evicted = self._evicted, []
+        for key in list(self._incidents):
+            incident = self._incidents[key]
+            if incident.dirty:
+                documents.append(incident.to_document())
+                incident.dirty = False
+            if self._expired(incident, now):
+                del self._incidents[key]
+        return documents
+
+    def restore_dirty(self, documents: List[Dict[str, Any]]):
+        """
+        Put back documents from a take_dirty() whose write failed.
+
+        Incidents still in memory are marked dirty again (their current state
+        is newer); the others are kept for the next take_dirty().
+        """
+        in_memory = {incident.id: incident for incident in self._incidents.values()}
+        for document in documents:
+            incident = in_memory.get(document["_id"])
+            if incident is not None:
+                incident.dirty = True
+            else:
+                self._evicted.append(document)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters and the number of open incidents."""
+        return {
+            "enabled": True,
+            "window_seconds": self.window_seconds,
+            "open_incidents": len(self._incidents),
+            "max_incidents": self.max_incidents,
+            "incidents_opened": self.opened,
+            "alerts_merged": self.merged,
+            "evicted": self.evicted,
+        }
+
+
+# Global engine instance
+_correlation_engine: Optional[CorrelationEngine] = None
+
+
+def correlation_enabled() -> bool:
+    """Check whether alert correlation is enabled (ALERT_CORRELATION)."""
+    return os.getenv("ALERT_CORRELATION", "false").lower() in ("1", "true", "yes")
+
+
+def get_correlation_engine() -> Optional[CorrelationEngine]:
+    """Get or create the global correlation engine, or None if disabled."""
+    global _correlation_engine
+    if _correlation_engine is None and correlation_enabled():
+        _correlation_engine = CorrelationEngine(
+            window_seconds=float(os.getenv("ALERT_CORRELATION_WINDOW_SECONDS", "300")),
+            max_incidents=int(os.getenv("ALERT_CORRELATION_MAX_INCIDENTS", "10000")),
+            max_related_ids=int(os.getenv("ALERT_CORRELATION_MAX_RELATED_IDS", "100"))
+        )
+    return _correlation_engine
@@ -1,9 +1,15 @@
 """
 Feature extraction pipeline for ML model input.
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 import numpy as np
 
+from app.utils.feature_hashing import get_feature_hasher
+from app.utils.flow_features import get_flow_feature_engine, is_flow_event
+
+# Bump whenever extraction changes, so stored features are recomputed
+FEATURE_EXTRACTOR_VERSION = "2"
+
 
 class FeatureExtractor:
     """Extract features from various data sources for ML inference."""
@@ -15,7 +21,7 @@ class FeatureExtractor:
         
         Features:
         - Severity level (encoded)
-        - Source type (encoded)
+        - Source type (stable hash bucket)
         - Message length
         - Has metadata flag
         - Metadata key count
@@ -26,9 +32,9 @@ class FeatureExtractor:
         severity_map = {"info": 0, "warning": 1, "error": 2, "critical": 3}
         features["severity_encoded"] = severity_map.get(log_data.get("severity", "info").lower(), 0)
         
-        # Source encoding (simple hash-based)
+        # Source encoding (stable across processes and restarts)
         source = log_data.get("source", "unknown")
-        features["source_hash"] = hash(source) % 1000  # Normalize to 0-999
+        features["source_hash"] = get_feature_hasher().hash("source", source)
         
         # Message features
         message = log_data.get("message", "")
@@ -104,12 +110,76 @@ class FeatureExtractor:
         
         return features
     
+    @staticmethod
+    def is_flow_record(data: Dict[str, Any]) -> bool:
+        """Check for a Suricata EVE-style flow record (nested ``flow`` counters)."""
+        return isinstance(data.get("flow"), dict)
+    
+    @staticmethod
+    def extract_from_flow(flow_record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Extract features from a Suricata EVE-style flow record.
+        
+        Maps ``proto``, ``flow.*`` and ``tcp.*`` (as produced by Suricata,
+        the PCAP reader and flow-export imports) onto the network features,
+        adds per-direction and TCP flag counts, then the sliding-window
+        features.
+        """
+        flow = flow_record.get("flow") or {}
+        tcp = flow_record.get("tcp") or {}
+        pkts_toserver = flow.get("pkts_toserver", 0) or 0
+        pkts_toclient = flow.get("pkts_toclient", 0) or 0
+        bytes_toserver = flow.get("bytes_toserver", 0) or 0
+        bytes_toclient = flow.get("bytes_toclient", 0) or 0
+        packet_count = pkts_toserver + pkts_toclient
+        
+        features = FeatureExtractor.extract_from_network_data({
+            "protocol": str(flow_record.get("proto", "unknown")),
+            "src_port": flow_record.get("src_port", 0) or 0,
+            "dst_port": flow_record.get("dest_port", 0) or 0,
+            "packet_size": (bytes_toserver + bytes_toclient) / packet_count if packet_count else 0,
+            "bytes_sent": bytes_toserver,
+            "bytes_received": bytes_toclient,
+            "duration": flow.get("age", 0) or 0,
+            "packet_count": packet_count,
+            "flags": tcp
+        })
+        features["pkts_toserver"] = pkts_toserver
+        features["pkts_toclient"] = pkts_toclient
+        features["syn_count"] = tcp.get("syn_count", 1 if tcp.get("syn") else 0)
+        features["rst_count"] = tcp.get("rst_count", 1 if tcp.get("rst") else 0)
+        features["fin_count"] = tcp.get("fin_count", 1 if tcp.get("fin") else 0)
+        
+        features.update(FeatureExtractor.extract_window_features(flow_record))
+        return features
+    
+    @staticmethod
+    def extract_window_features(data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get sliding-window features for a Suricata flow/netflow event.
+        
+        Uses the snapshot taken when the event was ingested ("window_features")
+        if present, otherwise reads the current window state (O(1)).
+        Returns an empty dict when flow features are disabled.
+        """
+        if "window_features" in data:
+            return dict(data["window_features"] or {})
+        
+        engine = get_flow_feature_engine()
+        if engine is None or not is_flow_event(data):
+            return {}
+        return engine.features_for(data)
+    
     @staticmethod
     def extract_from_generic(data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Extract features from generic data structure.
         Attempts to intelligently extract features based on available fields.
+        Flow records are handled by extract_from_flow.
         """
+        if FeatureExtractor.is_flow_record(data):
+            return FeatureExtractor.extract_from_flow(data)
+        
         features = {}
         
         # Try to extract log-like features
@@ -122,6 +192,9 @@ class FeatureExtractor:
             network_features = FeatureExtractor.extract_from_network_data(data)
             features.update(network_features)
         
+        # Sliding-window flow features (opt-in via ML_FLOW_FEATURES)
+        features.update(FeatureExtractor.extract_window_features(data))
+        
         # Generic numeric features
         numeric_keys = [k for k, v in data.items() if isinstance(v, (int, float))]
         for key in numeric_keys[:10]:  # Limit to first 10 numeric features
@@ -134,6 +207,39 @@ class FeatureExtractor:
         
         return features
     
+    @staticmethod
+    def group_by_layout(features_list: List[Dict[str, Any]]) -> Dict[Tuple[str, ...], List[int]]:
+        """
+        Group feature dictionaries by their (sorted) set of feature names.
+
+        Records with the same layout produce vectors of the same width and
+        can be scored together as one matrix.
+
+        Returns:
+            Mapping of feature-name tuple to the indices of matching records
+        """
+        groups: Dict[Tuple[str, ...], List[int]] = {}
+        for idx, features in enumerate(features_list):
+            groups.setdefault(tuple(sorted(features.keys())), []).append(idx)
+        return groups
+    
+    @staticmethod
+    def to_feature_matrix(features_list: List[Dict[str, Any]], feature_order: List[str]) -> np.ndarray:
+        """
+        Convert a batch of feature dictionaries to a 2-D numpy array.
+        
+        Args:
+            features_list: Feature dictionaries, one per row
+            feature_order: Column order (missing features become 0.0)
+        
+        Returns:
+            float32 array of shape (len(features_list), len(feature_order))
+        """
+        matrix = np.zeros((len(features_list), len(feature_order)), dtype=np.float32)
+        for column, name in enumerate(feature_order):
+            matrix[:, column] = [features.get(name, 0.0) for features in features_list]
+        return matrix
+    
     @staticmethod
     def to_feature_vector(features: Dict[str, Any], feature_order: List[str] = None) -> np.ndarray:
         """
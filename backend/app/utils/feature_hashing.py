@@ -0,0 +1,66 @@
+"""
+Stable hashing vectorizer for categorical feature fields.
+
+Python's built-in hash() is salted per process, so it cannot be used for
+features that must match across workers and restarts. This module hashes
+"field=value" keys with MurmurHash3 (32-bit) into a fixed number of buckets.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Optional
+
+from sklearn.utils import murmurhash3_32
+
+
+class StableFeatureHasher:
+    """Deterministic hashing of categorical values into a fixed bucket range."""
+
+    def __init__(self, n_buckets: int = 1000, seed: int = 0, cache_size: int = 4096):
+        """
+        Initialize the hasher.
+
+        Args:
+            n_buckets: Number of output buckets (values fall in 0..n_buckets-1)
+            seed: MurmurHash3 seed; changing it changes every hashed feature
+            cache_size: Maximum number of memoized (field, value) lookups
+        """
+        if n_buckets < 1:
+            raise ValueError("n_buckets must be at least 1")
+
+        self.n_buckets = n_buckets
+        self.seed = seed
+        self._cached_hash = lru_cache(maxsize=cache_size)(self._compute)
+
+    def _compute(self, field: str, value: str) -> int:
+        """Hash a single field/value pair (uncached)."""
+        key = f"{field}={value}"
+        return murmurhash3_32(key, seed=self.seed, positive=True) % self.n_buckets
+
+    def hash(self, field: str, value: Any) -> int:
+        """
+        Hash one categorical value.
+
+        The field name is part of the key, so the same value in two different
+        fields (e.g. source="dns" and protocol="dns") lands in independent buckets.
+        """
+        return self._cached_hash(field, "" if value is None else str(value))
+
+    def cache_info(self):
+        """Return LRU statistics for memoized lookups."""
+        return self._cached_hash.cache_info()
+
+
+# Global hasher instance
+_feature_hasher: Optional[StableFeatureHasher] = None
+
+
+def get_feature_hasher() -> StableFeatureHasher:
+    """Get or create the global feature hasher instance."""
+    global _feature_hasher
+    if _feature_hasher is None:
+        _feature_hasher = StableFeatureHasher(
+            n_buckets=int(os.getenv("ML_HASH_BUCKETS", "1000")),
+            seed=int(os.getenv("ML_HASH_SEED", "0")),
+            cache_size=int(os.getenv("ML_HASH_CACHE_SIZE", "4096"))
+        )
+    return _feature_hasher
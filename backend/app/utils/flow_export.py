@@ -0,0 +1,328 @@
+"""
+Chunked readers and column mapping for NetFlow/CICFlowMeter-style flow exports.
+
+Exports are read in fixed-size row chunks. Each chunk is held column-wise
+(column name -> list of raw values), and numeric columns are converted with
+one NumPy cast per column, so a chunk is parsed without per-cell Python work
+wherever the data is clean.
+
+Column names are matched after normalization (lowercase, alphanumerics
+only), either directly against a model's ``feature_names_in_`` or through
+FLOW_EXPORT_ALIASES to canonical flow fields. Canonical fields can also be
+turned into Suricata EVE-style flow records for models trained on the
+generic feature extractor.
+"""
+import csv
+import io
+import json
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+_NORMALIZE = re.compile(r"[^a-z0-9]")
+_JSON_SEPARATORS = re.compile(r"[\s,]*")
+MAX_JSON_OBJECT_CHARS = 16 * 1024 * 1024
+
+# Canonical field -> [(normalized alias, scale to canonical unit), ...]
+# Durations are converted to seconds.
+FLOW_EXPORT_ALIASES: Dict[str, List[Tuple[str, float]]] = {
+    "src_ip": [("srcip", 1), ("sourceip", 1), ("srcaddr", 1), ("ipv4srcaddr", 1), ("ipv6srcaddr", 1), ("sa", 1), ("saddr", 1)],
+    "dest_ip": [("dstip", 1), ("destip", 1), ("destinationip", 1), ("dstaddr", 1), ("ipv4dstaddr", 1), ("ipv6dstaddr", 1), ("da", 1), ("daddr", 1)],
+    "src_port": [("srcport", 1), ("sourceport", 1), ("l4srcport", 1), ("sp", 1), ("sport", 1)],
+    "dest_port": [("dstport", 1), ("destport", 1), ("destinationport", 1), ("l4dstport", 1), ("dp", 1), ("dport", 1)],
+    "proto": [("protocol", 1), ("proto", 1), ("pr", 1)],
+    "duration": [
+        ("duration", 1), ("td", 1), ("dur", 1),
+        ("flowduration", 1e-6),  # CICFlowMeter reports microseconds
+        ("flowdurationmilliseconds", 1e-3),
+    ],
+    "pkts_toserver": [("totfwdpkts", 1), ("totalfwdpackets", 1), ("fwdpkts", 1), ("inpkts", 1), ("ipkt", 1), ("spkts", 1), ("packets", 1)],
+    "pkts_toclient": [("totbwdpkts", 1), ("totalbackwardpackets", 1), ("bwdpkts", 1), ("outpkts", 1), ("opkt", 1), ("dpkts", 1)],
+    "bytes_toserver": [
+        ("totlenfwdpkts", 1), ("totallengthoffwdpackets", 1), ("fwdbytes", 1),
+        ("inbytes", 1), ("ibyt", 1), ("sbytes", 1), ("bytes", 1),
+    ],
+    "bytes_toclient": [
+        ("totlenbwdpkts", 1), ("totallengthofbwdpackets", 1), ("bwdbytes", 1),
+        ("outbytes", 1), ("obyt", 1), ("dbytes", 1),
+    ],
+    "syn_count": [("synflagcnt", 1), ("synflagcount", 1)],
+    "rst_count": [("rstflagcnt", 1), ("rstflagcount", 1)],
+    "fin_count": [("finflagcnt", 1), ("finflagcount", 1)],
+    "start": [("timestamp", 1), ("ts", 1), ("stime", 1), ("firstswitched", 1), ("flowstartmilliseconds", 1), ("starttime", 1)],
+}
+
+# Canonical fields that hold text rather than numbers
+TEXT_FIELDS = ("src_ip", "dest_ip", "start")
+PROTO_NUMBERS = {"tcp": 6, "udp": 17, "icmp": 1, "ipv6icmp": 58, "icmp6": 58, "sctp": 132, "gre": 47, "esp": 50}
+PROTO_NAMES = {6: "TCP", 17: "UDP", 1: "ICMP", 58: "IPv6-ICMP", 132: "SCTP"}
+
+
+def normalize_column(name: str) -> str:
+    """Normalize a column or feature name for matching."""
+    return _NORMALIZE.sub("", str(name).lower())
+
+
+def resolve_columns(
+    columns: List[str],
+    overrides: Optional[Dict[str, str]] = None
+) -> Dict[str, Tuple[str, float]]:
+    """
+    Map canonical flow fields to export columns.
+
+    Args:
+        columns: Column names present in the export
+        overrides: Explicit {canonical_field: column_name} mapping
+
+    Returns:
+        {canonical_field: (column_name, scale)}
+    """
+    by_normalized = {}
+    for column in columns:
+        by_normalized.setdefault(normalize_column(column), column)
+
+    mapping: Dict[str, Tuple[str, float]] = {}
+    for field, aliases in FLOW_EXPORT_ALIASES.items():
+        if overrides and field in overrides:
+            if overrides[field] in columns:
+                mapping[field] = (overrides[field], 1.0)
+            continue
+        for alias, scale in [(normalize_column(field), 1.0)] + aliases:
+            if alias in by_normalized:
+                mapping[field] = (by_normalized[alias], float(scale))
+                break
+    return mapping
+
+
+def to_float_array(values: List[Any]) -> np.ndarray:
+    """Convert raw values to float64 in one cast, falling back per value for dirty data."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        pass
+    out = np.zeros(len(values), dtype=np.float64)
+    for i, value in enumerate(values):
+        try:
+            out[i] = float(value)
+        except (TypeError, ValueError):
+            pass
+    return out
+
+
+def _proto_numbers(values: List[Any]) -> np.ndarray:
+    """Protocol column as IANA numbers (accepts numbers or names)."""
+    numbers = to_float_array(values)
+    for i, value in enumerate(values):
+        if isinstance(value, str) and not value.strip().isdigit():
+            numbers[i] = PROTO_NUMBERS.get(normalize_column(value), 0)
+    return np.nan_to_num(numbers, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def canonical_columns(chunk: Dict[str, List[Any]], mapping: Dict[str, Tuple[str, float]]) -> Dict[str, Any]:
+    """
+    Extract canonical fields from a chunk.
+
+    Returns:
+        {field: ndarray (numeric fields) or list (text fields)}
+    """
+    out: Dict[str, Any] = {}
+    for field, (column, scale) in mapping.items():
+        values = chunk[column]
+        if field in TEXT_FIELDS:
+            out[field] = values
+        elif field == "proto":
+            out[field] = _proto_numbers(values)
+        else:
+            # "Infinity"/"NaN" cells (common in CICFlowMeter output) become 0
+            array = np.nan_to_num(to_float_array(values), nan=0.0, posinf=0.0, neginf=0.0)
+            out[field] = array * scale if scale != 1.0 else array
+    return out
+
+
+def build_feature_matrix(
+    chunk: Dict[str, List[Any]],
+    canonical: Dict[str, Any],
+    feature_names: List[str],
+    n_rows: int
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Build a model input matrix by feature name.
+
+    A feature is taken from the export column with the same normalized
+    name, else from the canonical field with that name; otherwise it is 0.
+
+    Returns:
+        (float32 matrix, names of features that were missing)
+    """
+    columns_by_normalized = {}
+    for column in chunk:
+        columns_by_normalized.setdefault(normalize_column(column), column)
+    canonical_by_normalized = {normalize_column(field): field for field in canonical}
+
+    matrix = np.zeros((n_rows, len(feature_names)), dtype=np.float32)
+    missing = []
+    for j, name in enumerate(feature_names):
+        key = normalize_column(name)
+        if key in columns_by_normalized:
+            values = to_float_array(chunk[columns_by_normalized[key]])
+        elif key in canonical_by_normalized and canonical_by_normalized[key] not in TEXT_FIELDS:
+            values = canonical[canonical_by_normalized[key]]
+        else:
+            missing.append(name)
+            continue
+        matrix[:, j] = np.nan_to_num(values, nan=0.0, posinf=0.0, neginf=0.0)
+    return matrix, missing
+
+
+def _timestamp(value: Any) -> Optional[str]:
+    """Export timestamp (ISO string or epoch seconds/milliseconds) as ISO 8601."""
+    if value is None or value == "":
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if number > 1e11:  # epoch milliseconds
+        number /= 1000.0
+    return datetime.fromtimestamp(number, tz=timezone.utc).isoformat()
+
+
+def to_flow_records(canonical: Dict[str, Any], n_rows: int) -> List[Dict[str, Any]]:
+    """Build Suricata EVE-style flow records from canonical columns."""
+    zeros = np.zeros(n_rows)
+
+    def numeric(field):
+        return canonical.get(field, zeros).tolist()
+
+    src_ip = canonical.get("src_ip", [None] * n_rows)
+    dest_ip = canonical.get("dest_ip", [None] * n_rows)
+    starts = canonical.get("start", [None] * n_rows)
+    src_port, dest_port, proto = numeric("src_port"), numeric("dest_port"), numeric("proto")
+    duration = numeric("duration")
+    pkts_ts, pkts_tc = numeric("pkts_toserver"), numeric("pkts_toclient")
+    bytes_ts, bytes_tc = numeric("bytes_toserver"), numeric("bytes_toclient")
+    syn, rst, fin = numeric("syn_count"), numeric("rst_count"), numeric("fin_count")
+
+    records = []
+    for i in range(n_rows):
+        record = {
+            "event_type": "flow",
+            "src_ip": src_ip[i],
+            "src_port": int(src_port[i]),
+            "dest_ip": dest_ip[i],
+            "dest_port": int(dest_port[i]),
+            "proto": PROTO_NAMES.get(int(proto[i]), str(int(proto[i]))),
+            "flow": {
+                "pkts_toserver": int(pkts_ts[i]),
+                "pkts_toclient": int(pkts_tc[i]),
+                "bytes_toserver": int(bytes_ts[i]),
+                "bytes_toclient": int(bytes_tc[i]),
+                "age": int(duration[i]),
+            },
+        }
+        start = _timestamp(starts[i])
+        if start:
+            record["timestamp"] = start
+            record["flow"]["start"] = start
+        if int(proto[i]) == 6:
+            record["tcp"] = {
+                "syn": syn[i] > 0,
+                "rst": rst[i] > 0,
+                "fin": fin[i] > 0,
+                "syn_count": int(syn[i]),
+                "rst_count": int(rst[i]),
+                "fin_count": int(fin[i]),
+            }
+        records.append(record)
+    return records
+
+
+def _rows_to_columns(header: List[str], rows: List[List[str]]) -> Dict[str, List[Any]]:
+    """Transpose CSV rows (padding or truncating ragged rows) into columns."""
+    width = len(header)
+    rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+    if not rows:
+        return {name: [] for name in header}
+    return {name: list(values) for name, values in zip(header, zip(*rows))}
+
+
+def iter_csv_chunks(f: io.TextIOBase, chunk_rows: int) -> Iterator[Dict[str, List[Any]]]:
+    """Yield column-wise chunks of a CSV export (first row is the header)."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip() for name in header]
+    rows = []
+    for row in reader:
+        if not row:
+            continue
+        rows.append(row)
+        if len(rows) >= chunk_rows:
+            yield _rows_to_columns(header, rows)
+            rows = []
+    if rows:
+        yield _rows_to_columns(header, rows)
+
+
+def _objects_to_columns(objects: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Transpose JSON objects into columns (missing keys become None)."""
+    names: Dict[str, None] = {}
+    for obj in objects:
+        names.update(dict.fromkeys(obj))
+    return {name: [obj.get(name) for obj in objects] for name in names}
+
+
+def _iter_json_objects(f: io.TextIOBase, read_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield objects from NDJSON or from a top-level JSON array, reading incrementally."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    in_array = None
+    eof = False
+
+    while True:
+        pos = _JSON_SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer):
+            if in_array is None:
+                in_array = buffer[pos] == "["
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and buffer[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Usually an object cut off by the read boundary
+                if eof or len(buffer) - pos > MAX_JSON_OBJECT_CHARS:
+                    raise
+            else:
+                if isinstance(obj, dict):
+                    yield obj
+                continue
+        if eof:
+            return
+        data = f.read(read_size)
+        eof = not data
+        buffer = buffer[pos:] + data
+        pos = 0
+
+
+def iter_json_chunks(f: io.TextIOBase, chunk_rows: int) -> Iterator[Dict[str, List[Any]]]:
+    """Yield column-wise chunks of an NDJSON (or JSON array) export."""
+    objects = []
+    for obj in _iter_json_objects(f):
+        objects.append(obj)
+        if len(objects) >= chunk_rows:
+            yield _objects_to_columns(objects)
+            objects = []
+    if objects:
+        yield _objects_to_columns(objects)
+
+
+def chunk_length(chunk: Dict[str, List[Any]]) -> int:
+    """Number of rows in a column-wise chunk."""
+    return len(next(iter(chunk.values()))) if chunk else 0
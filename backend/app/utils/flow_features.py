@@ -0,0 +1,393 @@
+"""
+Streaming sliding-window features from Suricata flow and netflow events.
+
+Each event updates two kinds of state:
+- per host (source and destination IP): connection, byte, SYN and RST
+  counts plus distinct destination ports/hosts and distinct source hosts
+- per 5-tuple (proto, src_ip, src_port, dest_ip, dest_port): flow, byte
+  and packet counts
+
+Windows are ring buffers of fixed-width time buckets holding per-bucket
+sums alongside running totals. Advancing time zeroes expired buckets and
+subtracts them from the totals, so updates and reads cost O(1) amortized
+per event. Distinct counts keep, per bucket, the set of values first seen
+in it and a reference count per value across the window.
+
+Memory is bounded: host and flow tables are LRU-ordered with a maximum
+size, keys idle longer than idle_timeout are expired, and each bucket
+tracks at most max_distinct values (further values saturate).
+
+Time is taken from the events themselves (stream time), so replayed or
+backfilled data produce the same features as live data.
+"""
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+FLOW_EVENT_TYPES = ("flow", "netflow")
+
+# Window metric columns
+_HOST_METRICS = ("out_conns", "in_conns", "bytes_out", "bytes_in", "syn", "rst")
+_FLOW_METRICS = ("flows", "bytes", "pkts")
+_OUT_CONNS, _IN_CONNS, _BYTES_OUT, _BYTES_IN, _SYN, _RST = range(len(_HOST_METRICS))
+_FLOWS, _BYTES, _PKTS = range(len(_FLOW_METRICS))
+
+_TCP_SYN = 0x02
+_TCP_RST = 0x04
+
+WINDOW_FEATURE_NAMES = (
+    "win_src_conn_count",
+    "win_src_distinct_dst_ports",
+    "win_src_distinct_dst_hosts",
+    "win_src_bytes_out",
+    "win_src_bytes_in",
+    "win_src_byte_ratio",
+    "win_src_syn_rate",
+    "win_src_rst_rate",
+    "win_dst_conn_count",
+    "win_dst_distinct_src_hosts",
+    "win_flow_count",
+    "win_flow_bytes",
+    "win_flow_pkts",
+)
+
+
+class _Window:
+    """Ring buffer of per-bucket metric sums with running totals."""
+    __slots__ = ("n_buckets", "n_metrics", "head", "ring", "totals", "distinct", "last_seen")
+
+    def __init__(self, n_buckets: int, n_metrics: int, n_distinct: int, slot: int):
+        self.n_buckets = n_buckets
+        self.n_metrics = n_metrics
+        self.head = slot
+        self.ring = array("d", bytes(8 * n_buckets * n_metrics))
+        self.totals = [0.0] * n_metrics
+        self.distinct = [_DistinctCounter(n_buckets) for _ in range(n_distinct)]
+        self.last_seen = 0.0
+
+    def advance(self, slot: int):
+        """Move the head to ``slot``, expiring buckets that fall out of the window."""
+        steps = slot - self.head
+        if steps <= 0:
+            return
+        m = self.n_metrics
+        if steps >= self.n_buckets:
+            self.ring = array("d", bytes(8 * self.n_buckets * m))
+            self.totals = [0.0] * m
+            for counter in self.distinct:
+                counter.clear()
+        else:
+            ring, totals = self.ring, self.totals
+            for s in range(self.head + 1, slot + 1):
+                base = (s % self.n_buckets) * m
+                for i in range(m):
+                    totals[i] -= ring[base + i]
+                    ring[base + i] = 0.0
+                for counter in self.distinct:
+                    counter.expire(s % self.n_buckets)
+        self.head = slot
+
+    def add(self, slot: int, values: Tuple[float, ...]):
+        """Add metric values at ``slot``; late events count in the current bucket."""
+        self.advance(slot)
+        base = (self.head % self.n_buckets) * self.n_metrics
+        ring, totals = self.ring, self.totals
+        for i, value in enumerate(values):
+            if value:
+                ring[base + i] += value
+                totals[i] += value
+
+    def add_distinct(self, index: int, value: Any, max_distinct: int):
+        """Record a value for the index-th distinct counter in the current bucket."""
+        self.distinct[index].add(self.head % self.n_buckets, value, max_distinct)
+
+
+class _DistinctCounter:
+    """Distinct values seen within the window, reference-counted per bucket."""
+    __slots__ = ("buckets", "counts")
+
+    def __init__(self, n_buckets: int):
+        self.buckets: List[Optional[set]] = [None] * n_buckets
+        self.counts: Dict[Any, int] = {}
+
+    def add(self, bucket: int, value: Any, max_distinct: int):
+        seen = self.buckets[bucket]
+        if seen is None:
+            seen = self.buckets[bucket] = set()
+        if value in seen or len(seen) >= max_distinct:
+            return
+        seen.add(value)
+        self.counts[value] = self.counts.get(value, 0) + 1
+
+    def expire(self, bucket: int):
+        seen = self.buckets[bucket]
+        if not seen:
+            return
+        counts = self.counts
+        for value in seen:
+            remaining = counts[value] - 1
+            if remaining:
+                counts[value] = remaining
+            else:
+                del counts[value]
+        self.buckets[bucket] = None
+
+    def clear(self):
+        self.buckets = [None] * len(self.buckets)
+        self.counts = {}
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+
+def _event_time(event: Dict[str, Any]) -> float:
+    """Event time in epoch seconds (flow end, then event timestamp, then now)."""
+    flow = event.get("flow") or event.get("netflow") or {}
+    for value in (flow.get("end"), event.get("timestamp")):
+        if isinstance(value, datetime):
+            return value.timestamp()
+        if isinstance(value, str):
+            try:
+                return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+            except ValueError:
+                continue
+    return time.time()
+
+
+def _tcp_flags(event: Dict[str, Any]) -> Tuple[int, int]:
+    """Return (syn, rst) indicators for an event."""
+    tcp = event.get("tcp") or {}
+    syn = bool(tcp.get("syn"))
+    rst = bool(tcp.get("rst"))
+    flags = tcp.get("tcp_flags")
+    if isinstance(flags, str):
+        try:
+            bits = int(flags, 16)
+            syn = syn or bool(bits & _TCP_SYN)
+            rst = rst or bool(bits & _TCP_RST)
+        except ValueError:
+            pass
+    return int(syn), int(rst)
+
+
+def _traffic(event: Dict[str, Any]) -> Tuple[float, float, float]:
+    """Return (bytes_out, bytes_in, packets) from a flow or netflow record."""
+    flow = event.get("flow")
+    if flow:
+        bytes_out = flow.get("bytes_toserver", 0) or 0
+        bytes_in = flow.get("bytes_toclient", 0) or 0
+        pkts = (flow.get("pkts_toserver", 0) or 0) + (flow.get("pkts_toclient", 0) or 0)
+        return float(bytes_out), float(bytes_in), float(pkts)
+    netflow = event.get("netflow") or {}
+    return float(netflow.get("bytes", 0) or 0), 0.0, float(netflow.get("pkts", 0) or 0)
+
+
+def is_flow_event(event: Dict[str, Any]) -> bool:
+    """Check whether an EVE event carries flow data the engine can use."""
+    return event.get("event_type") in FLOW_EVENT_TYPES and "src_ip" in event and "dest_ip" in event
+
+
+class FlowWindowEngine:
+    """Per-host and per-5-tuple sliding-window state fed by flow events."""
+
+    def __init__(
+        self,
+        window_seconds: float = 10.0,
+        n_buckets: int = 10,
+        max_hosts: int = 100000,
+        max_flows: int = 200000,
+        idle_timeout: float = 300.0,
+        max_distinct: int = 1024
+    ):
+        """
+        Initialize the engine.
+
+        Args:
+            window_seconds: Sliding window length
+            n_buckets: Ring buffer buckets per window (resolution = window / buckets)
+            max_hosts: Maximum tracked hosts (least recently seen are evicted)
+            max_flows: Maximum tracked 5-tuples (least recently seen are evicted)
+            idle_timeout: Seconds of stream time after which an idle key is expired
+            max_distinct: Distinct values tracked per bucket per counter
+        """
+        if window_seconds <= 0 or n_buckets < 1:
+            raise ValueError("window_seconds and n_buckets must be positive")
+
+        self.window_seconds = window_seconds
+        self.n_buckets = n_buckets
+        self.bucket_width = window_seconds / n_buckets
+        self.max_hosts = max_hosts
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.max_distinct = max_distinct
+
+        # Host distinct counters: 0 = dst ports, 1 = dst hosts (as source), 2 = src hosts (as destination)
+        self._hosts: "OrderedDict[str, _Window]" = OrderedDict()
+        self._flows: "OrderedDict[Tuple, _Window]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stream_time = 0.0
+        self.events = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def _slot(self, ts: float) -> int:
+        return int(ts // self.bucket_width)
+
+    def _touch(self, table: OrderedDict, key: Any, slot: int, n_metrics: int, n_distinct: int, ts: float) -> _Window:
+        """Get or create a key's window and mark it most recently seen."""
+        window = table.get(key)
+        if window is None:
+            window = table[key] = _Window(self.n_buckets, n_metrics, n_distinct, slot)
+        else:
+            table.move_to_end(key)
+        window.last_seen = max(window.last_seen, ts)
+        return window
+
+    def _expire(self, table: OrderedDict, max_size: int):
+        """Drop idle keys from the LRU end, then enforce the size bound."""
+        cutoff = self._stream_time - self.idle_timeout
+        while table:
+            key, window = next(iter(table.items()))
+            if window.last_seen >= cutoff:
+                break
+            table.popitem(last=False)
+            self.expired += 1
+        while len(table) > max_size:
+            table.popitem(last=False)
+            self.evicted += 1
+
+    @staticmethod
+    def _flow_key(event: Dict[str, Any]) -> Tuple:
+        return (
+            str(event.get("proto", "")).lower(),
+            event.get("src_ip"),
+            event.get("src_port", 0),
+            event.get("dest_ip"),
+            event.get("dest_port", 0),
+        )
+
+    def update(self, event: Dict[str, Any]) -> Dict[str, float]:
+        """
+        Fold a flow/netflow event into the windows.
+
+        Returns:
+            Window features for the event after the update
+        """
+        ts = _event_time(event)
+        slot = self._slot(ts)
+        src, dst = event["src_ip"], event["dest_ip"]
+        bytes_out, bytes_in, pkts = _traffic(event)
+        syn, rst = _tcp_flags(event)
+
+        with self._lock:
+            self.events += 1
+            self._stream_time = max(self._stream_time, ts)
+
+            src_window = self._touch(self._hosts, src, slot, len(_HOST_METRICS), 3, ts)
+            src_window.add(slot, (1, 0, bytes_out, bytes_in, syn, rst))
+            src_window.add_distinct(0, event.get("dest_port", 0), self.max_distinct)
+            src_window.add_distinct(1, dst, self.max_distinct)
+
+            dst_window = self._touch(self._hosts, dst, slot, len(_HOST_METRICS), 3, ts)
+            dst_window.add(slot, (0, 1, bytes_in, bytes_out, 0, 0))
+            dst_window.add_distinct(2, src, self.max_distinct)
+
+            flow_window = self._touch(self._flows, self._flow_key(event), slot, len(_FLOW_METRICS), 0, ts)
+            flow_window.add(slot, (1, bytes_out + bytes_in, pkts))
+
+            features = self._features(src_window, dst_window, flow_window)
+
+            self._expire(self._hosts, self.max_hosts)
+            self._expire(self._flows, self.max_flows)
+        return features
+
+    def features_for(self, event: Dict[str, Any]) -> Dict[str, float]:
+        """Current window features for an event's hosts and 5-tuple, without updating state."""
+        slot = self._slot(self._stream_time)
+        with self._lock:
+            src_window = self._hosts.get(event.get("src_ip"))
+            dst_window = self._hosts.get(event.get("dest_ip"))
+            flow_window = self._flows.get(self._flow_key(event))
+            for window in (src_window, dst_window, flow_window):
+                if window is not None:
+                    window.advance(slot)
+            return self._features(src_window, dst_window, flow_window)
+
+    @staticmethod
+    def _features(src: Optional[_Window], dst: Optional[_Window], flow: Optional[_Window]) -> Dict[str, float]:
+        """Build the feature dictionary from window totals (O(1))."""
+        src_totals = src.totals if src is not None else [0.0] * len(_HOST_METRICS)
+        dst_totals = dst.totals if dst is not None else [0.0] * len(_HOST_METRICS)
+        flow_totals = flow.totals if flow is not None else [0.0] * len(_FLOW_METRICS)
+        conns = src_totals[_OUT_CONNS]
+        return {
+            "win_src_conn_count": conns,
+            "win_src_distinct_dst_ports": float(len(src.distinct[0])) if src is not None else 0.0,
+            "win_src_distinct_dst_hosts": float(len(src.distinct[1])) if src is not None else 0.0,
+            "win_src_bytes_out": src_totals[_BYTES_OUT],
+            "win_src_bytes_in": src_totals[_BYTES_IN],
+            "win_src_byte_ratio": src_totals[_BYTES_OUT] / (src_totals[_BYTES_IN] + 1.0),
+            "win_src_syn_rate": src_totals[_SYN] / conns if conns else 0.0,
+            "win_src_rst_rate": src_totals[_RST] / conns if conns else 0.0,
+            "win_dst_conn_count": dst_totals[_IN_CONNS],
+            "win_dst_distinct_src_hosts": float(len(dst.distinct[2])) if dst is not None else 0.0,
+            "win_flow_count": flow_totals[_FLOWS],
+            "win_flow_bytes": flow_totals[_BYTES],
+            "win_flow_pkts": flow_totals[_PKTS],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Return table sizes and counters."""
+        with self._lock:
+            return {
+                "window_seconds": self.window_seconds,
+                "buckets": self.n_buckets,
+                "hosts": len(self._hosts),
+                "flows": len(self._flows),
+                "max_hosts": self.max_hosts,
+                "max_flows": self.max_flows,
+                "events": self.events,
+                "expired": self.expired,
+                "evicted": self.evicted,
+            }
+
+
+# Global engine instance (only created when flow features are enabled)
+_flow_engine: Optional[FlowWindowEngine] = None
+
+
+def flow_features_enabled() -> bool:
+    """Check whether window features are enabled (ML_FLOW_FEATURES)."""
+    return os.getenv("ML_FLOW_FEATURES", "false").lower() in ("1", "true", "yes")
+
+
+def create_flow_feature_engine() -> Optional[FlowWindowEngine]:
+    """
+    Create a flow window engine from the environment settings, or None if disabled.
+
+    Replayed traffic (PCAP captures, flow-export imports) gets its own
+    engine per job, so historical flows neither disturb the live windows
+    nor mix with another job's timeline.
+    """
+    if not flow_features_enabled():
+        return None
+    return FlowWindowEngine(
+        window_seconds=float(os.getenv("ML_FLOW_WINDOW_SECONDS", "10")),
+        n_buckets=int(os.getenv("ML_FLOW_WINDOW_BUCKETS", "10")),
+        max_hosts=int(os.getenv("ML_FLOW_MAX_HOSTS", "100000")),
+        max_flows=int(os.getenv("ML_FLOW_MAX_FLOWS", "200000")),
+        idle_timeout=float(os.getenv("ML_FLOW_IDLE_TIMEOUT", "300")),
+        max_distinct=int(os.getenv("ML_FLOW_MAX_DISTINCT", "1024"))
+    )
+
+
+def get_flow_feature_engine() -> Optional[FlowWindowEngine]:
+    """Get or create the global (live traffic) flow window engine, or None if disabled."""
+    global _flow_engine
+    if _flow_engine is None:
+        _flow_engine = create_flow_feature_engine()
+    return _flow_engine
@@ -1,59 +1,625 @@
 """
 ML model loader for joblib serialized models.
+
+Models are versioned. A model file named ``<name>@<version>.joblib`` in the
+models directory is version ``<version>`` of model ``<name>``; a legacy
+``<name>.joblib`` file is treated as version "1". Each model name has an
+active version pointer that is swapped atomically once a new version has
+been loaded and warmed up, so requests already holding the previous version
+finish on it.
+
+When memory mapping is enabled, each model file is converted once into an
+uncompressed joblib cache and loaded with ``mmap_mode='r'``, so read-only
+NumPy arrays are shared across worker processes through the page cache.
+
+The default model is loaded at startup; any other model in the models
+directory is loaded lazily on first use. Resident versions are kept in
+least-recently-used order and evicted when their total size exceeds the
+configured memory budget; the default model is pinned.
+
+Explicit activations (deployments and rollbacks) are written to an active
+version pointer file in the models directory. Every worker process reads it
+at startup and re-reads it periodically, so a switch made through one worker
+reaches the others and survives a restart.
+
+When enabled (ML_COMPILE_TREES), supported sklearn tree ensembles are also
+compiled into NumPy node tables at load time (see tree_compiler). The
+compiled evaluator is verified against the native model during warm-up and
+used for small batches, where sklearn's per-call overhead dominates; larger
+batches use the native model. The node tables are private to each worker
+process, so compilation is off by default: it roughly doubles the memory of
+a tree model that is otherwise shared through the memory-mapped cache.
 """
+import json
 import os
+import re
+import threading
 import joblib
-from typing import Optional, Dict, Any
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
 from pathlib import Path
 
 from app.config import settings
+from app.utils.model_memory import estimate_model_bytes, mapped_file_usage
+from app.utils.prediction_cache import PredictionCache
+from app.utils.tree_compiler import CompiledTreeEnsemble, compile_tree_model
+
+VERSION_SEPARATOR = "@"
+LEGACY_VERSION = "1"
+MODEL_EXTENSIONS = (".joblib", ".pkl")
+MMAP_CACHE_DIR = ".mmap_cache"
+# Active version pointer per model name, shared by all worker processes
+ACTIVE_VERSIONS_FILE = "active_versions.json"
+# Feature names (column order) a model trained by the training service was fitted on
+TRAINED_FEATURES_ATTR = "trained_feature_names_"
+_VALID_PART = re.compile(r"^[A-Za-z0-9_.\-]+$")
+
+
+def parse_model_ref(model_ref: str) -> Tuple[str, Optional[str]]:
+    """
+    Split a model reference into name and version.
+    
+    "intrusion@3" -> ("intrusion", "3"); "intrusion" -> ("intrusion", None)
+    """
+    if VERSION_SEPARATOR in model_ref:
+        name, version = model_ref.split(VERSION_SEPARATOR, 1)
+        return name, version or None
+    return model_ref, None
+
+
+def format_model_ref(name: str, version: str) -> str:
+    """Build the "name@version" reference for a model version."""
+    return f"{name}{VERSION_SEPARATOR}{version}"
+
+
+def model_ref_query(model_name: str) -> Any:
+    """
+    MongoDB condition on a stored ``model_name`` (detections store "name@version").
+    
+    "intrusion" matches every version of the model, including legacy records
+    stored under the bare name; "intrusion@3" matches that version only.
+    """
+    name, version = parse_model_ref(model_name)
+    if version is not None:
+        return model_name
+    return {"$regex": f"^{re.escape(name)}({re.escape(VERSION_SEPARATOR)}|$)"}
+
+
+def is_valid_model_part(value: str) -> bool:
+    """Check that a model name or version is safe to use in a file name."""
+    return bool(value) and bool(_VALID_PART.match(value)) and value not in (".", "..")
+
+
+def model_feature_names(model: Any) -> Optional[List[str]]:
+    """Column names a model was fitted on, or None if it does not record them."""
+    names = getattr(model, TRAINED_FEATURES_ATTR, None)
+    if names is None:
+        names = getattr(model, "feature_names_in_", None)
+    return [str(name) for name in names] if names is not None else None
+
+
+def _version_sort_key(version: str):
+    """Order numeric versions numerically and place other labels after them."""
+    return (0, int(version), "") if version.isdigit() else (1, 0, version)
+
+
+class ModelVersion:
+    """A loaded, ready-to-serve version of a model."""
+    
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        model: Any,
+        path: Optional[str] = None,
+        mmap_path: Optional[str] = None,
+        compiled: Optional[CompiledTreeEnsemble] = None
+    ):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.path = path
+        self.mmap_path = mmap_path
+        self.compiled = compiled
+        self.feature_names = model_feature_names(model)
+        self._feature_index = {name: i for i, name in enumerate(self.feature_names or ())}
+        self.loaded_at = datetime.utcnow()
+        self.last_used = self.loaded_at
+        self.memory = estimate_model_bytes((model, compiled))
+    
+    @property
+    def size_bytes(self) -> int:
+        """Array memory held by this version, counted against the memory budget."""
+        return self.memory["private_bytes"] + self.memory["mapped_bytes"]
+    
+    @property
+    def ref(self) -> str:
+        """The "name@version" reference of this model version."""
+        return format_model_ref(self.name, self.version)
+    
+    def align(self, features: np.ndarray, feature_order: Optional[List[str]]) -> np.ndarray:
+        """
+        Reorder feature columns into the layout the model was fitted on.
+        
+        Args:
+            features: 2-D feature array whose columns follow ``feature_order``
+            feature_order: Column names of ``features`` (None: already aligned)
+        
+        Returns:
+            Array with one column per model feature; features the model does
+            not know are dropped and missing ones are 0.0
+        """
+        if self.feature_names is None or feature_order is None or list(feature_order) == self.feature_names:
+            return features
+        aligned = np.zeros((features.shape[0], len(self.feature_names)), dtype=features.dtype)
+        for column, name in enumerate(feature_order):
+            index = self._feature_index.get(name)
+            if index is not None:
+                aligned[:, index] = features[:, column]
+        return aligned
 
 
 class MLModelLoader:
-    """Load and manage ML models from joblib files."""
+    """Load and manage versioned ML models from joblib files."""
     
-    def __init__(self, models_dir: str = "models"):
+    def __init__(
+        self,
+        models_dir: str = "models",
+        warmup_rows: int = 64,
+        use_mmap: bool = True,
+        memory_budget_bytes: int = 0,
+        prediction_cache: Optional[PredictionCache] = None,
+        compile_trees: bool = False,
+        compiled_max_batch: int = 256
+    ):
         """
         Initialize model loader.
         
         Args:
             models_dir: Directory containing model files
+            warmup_rows: Size of the synthetic batch used to warm up new versions
+            use_mmap: Load models memory-mapped from an uncompressed cache
+            memory_budget_bytes: Evict least-recently-used versions above this size (0 = unlimited)
+            prediction_cache: Optional per-row cache of results in front of predict() and predict_batch()
+            compile_trees: Compile supported tree ensembles into NumPy node tables
+            compiled_max_batch: Largest batch routed to the compiled evaluator
         """
         self.models_dir = Path(models_dir)
-        self.models: Dict[str, Any] = {}
+        self.warmup_rows = warmup_rows
+        self.use_mmap = use_mmap
+        self.memory_budget_bytes = memory_budget_bytes
+        self.prediction_cache = prediction_cache
+        self.compile_trees = compile_trees
+        self.compiled_max_batch = compiled_max_batch
+        # Resident versions keyed by "name@version", least recently used first
+        self.models: "OrderedDict[str, ModelVersion]" = OrderedDict()
+        # Active version pointer per model name
+        self.active_versions: Dict[str, str] = {}
+        # Previously active versions per model name (most recent last)
+        self.version_history: Dict[str, List[str]] = {}
+        # Deployment status keyed by "name@version"
+        self.deployments: Dict[str, Dict[str, Any]] = {}
         self.default_model_name: Optional[str] = None
+        # Model names whose active version is never evicted
+        self.pinned: set = set()
+        # In-progress loads keyed by "name@version", shared by concurrent callers
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+    
+    def model_path(self, model_name: str, version: str) -> Path:
+        """Path where a given model version is stored."""
+        return self.models_dir / f"{format_model_ref(model_name, version)}.joblib"
+    
+    def find_model_file(self, model_name: str, version: str) -> Optional[Path]:
+        """Locate the file of a model version on disk."""
+        for ext in MODEL_EXTENSIONS:
+            candidate = self.models_dir / f"{format_model_ref(model_name, version)}{ext}"
+            if candidate.exists():
+                return candidate
+        if version == LEGACY_VERSION:
+            for ext in MODEL_EXTENSIONS:
+                candidate = self.models_dir / f"{model_name}{ext}"
+                if candidate.exists():
+                    return candidate
+        return None
+    
+    def available_versions(self, model_name: str) -> List[str]:
+        """List versions of a model that exist on disk, oldest first."""
+        versions = set()
+        if self.models_dir.exists():
+            for path in self.models_dir.iterdir():
+                if path.suffix not in MODEL_EXTENSIONS:
+                    continue
+                name, version = parse_model_ref(path.stem)
+                if name == model_name:
+                    versions.add(version or LEGACY_VERSION)
+        return sorted(versions, key=_version_sort_key)
+    
+    def catalog(self) -> Dict[str, List[str]]:
+        """List every model on disk with its versions, oldest first."""
+        catalog: Dict[str, set] = {}
+        if self.models_dir.exists():
+            for path in self.models_dir.iterdir():
+                if path.suffix not in MODEL_EXTENSIONS:
+                    continue
+                name, version = parse_model_ref(path.stem)
+                catalog.setdefault(name, set()).add(version or LEGACY_VERSION)
+        return {
+            name: sorted(versions, key=_version_sort_key)
+            for name, versions in sorted(catalog.items())
+        }
+    
+    def next_version(self, model_name: str) -> str:
+        """Return the next numeric version label for a model."""
+        numeric = [int(v) for v in self.available_versions(model_name) if v.isdigit()]
+        return str(max(numeric) + 1) if numeric else LEGACY_VERSION
+    
+    def _resolve_ref(self, model_name: Optional[str]) -> Tuple[str, str]:
+        """Resolve a (possibly unversioned) reference to a concrete name and version."""
+        if model_name is None:
+            model_name = self.default_model_name
+        
+        if model_name is None:
+            # Try to use first available model
+            if self.active_versions:
+                model_name = next(iter(self.active_versions))
+            else:
+                raise ValueError("No model loaded and no default model specified")
+        
+        name, version = parse_model_ref(model_name)
+        if version is None:
+            version = self.active_versions.get(name)
+        if version is None:
+            # Not used yet: serve the latest version on disk
+            versions = self.available_versions(name)
+            if not versions:
+                raise ValueError(f"Model {name} not found in {self.models_dir}")
+            version = versions[-1]
+        return name, version
+    
+    def _get_or_load(self, model_name: str, version: str, model_path: Optional[str] = None) -> ModelVersion:
+        """
+        Return a resident model version, loading it if necessary.
+        
+        Concurrent callers asking for the same version while it loads wait
+        for the single in-progress load instead of deserializing it again.
+        """
+        ref = format_model_ref(model_name, version)
+        with self._lock:
+            model_version = self.models.get(ref)
+            if model_version is not None:
+                return model_version
+            future = self._loading.get(ref)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[ref] = future
+        
+        if not owner:
+            return future.result()
+        
+        try:
+            model_version = self._load_version(model_name, version, model_path)
+            self._admit(model_version)
+            future.set_result(model_version)
+            print(f"✓ Loaded ML model: {ref}")
+            return model_version
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._loading.pop(ref, None)
+    
+    def _admit(self, model_version: ModelVersion, activate: bool = False):
+        """Make a loaded version resident, optionally activating it, then enforce the budget."""
+        with self._lock:
+            self.models[model_version.ref] = model_version
+            self.models.move_to_end(model_version.ref)
+            if activate or model_version.name not in self.active_versions:
+                self._activate(model_version)
+            self._evict_if_needed(protect=model_version.ref)
+    
+    def _evict_if_needed(self, protect: Optional[str] = None):
+        """Evict least-recently-used versions until resident size fits the budget."""
+        if self.memory_budget_bytes <= 0:
+            return
+        
+        with self._lock:
+            total = sum(mv.size_bytes for mv in self.models.values())
+            for ref, mv in list(self.models.items()):
+                if total <= self.memory_budget_bytes:
+                    break
+                if ref == protect:
+                    continue
+                if mv.name in self.pinned and self.active_versions.get(mv.name) == mv.version:
+                    continue
+                # Requests holding this version keep their reference; the
+                # next lookup reloads it from disk
+                del self.models[ref]
+                total -= mv.size_bytes
+                print(f"✓ Evicted ML model: {ref}")
+    
+    def _load_version(self, model_name: str, version: str, model_path: Optional[str] = None) -> ModelVersion:
+        """Deserialize and warm up a model version without activating it."""
+        if model_path is None:
+            model_file = self.find_model_file(model_name, version)
+            if model_file is None:
+                raise FileNotFoundError(f"Model file not found: {format_model_ref(model_name, version)}")
+            model_path = str(model_file)
+        
+        mmap_path = None
+        try:
+            if self.use_mmap:
+                mmap_path = str(self._ensure_mmap_cache(Path(model_path)))
+                model = joblib.load(mmap_path, mmap_mode="r")
+            else:
+                model = joblib.load(model_path)
+        except Exception as e:
+            raise Exception(f"Failed to load model {model_name}: {str(e)}")
+        
+        self._warm_up(model)
+        compiled = self._compile(model_name, model) if self.compile_trees else None
+        return ModelVersion(model_name, version, model, model_path, mmap_path, compiled)
+    
+    def _compile(self, model_name: str, model: Any) -> Optional[CompiledTreeEnsemble]:
+        """
+        Compile a tree ensemble and verify it against the native model.
+        
+        Returns None (native evaluation) if the model is not a supported tree
+        ensemble or the compiled probabilities do not match sklearn's.
+        """
+        try:
+            compiled = compile_tree_model(model)
+            if compiled is None:
+                return None
+            
+            rng = np.random.default_rng(1)
+            batch = rng.random((max(self.warmup_rows, 16), compiled.n_features_in_), dtype=np.float32)
+            if not np.allclose(compiled.predict_proba(batch), model.predict_proba(batch), rtol=0, atol=1e-9):
+                print(f"⚠ Compiled evaluator mismatch for ML model {model_name}; using native predict")
+                return None
+            return compiled
+        except Exception as e:
+            print(f"⚠ Failed to compile ML model {model_name}: {e}")
+            return None
+    
+    def _ensure_mmap_cache(self, model_path: Path) -> Path:
+        """
+        Return an uncompressed joblib copy of a model file suitable for mmap.
+        
+        Compressed joblib files and plain pickles cannot be memory-mapped, so
+        every source file is re-dumped once with compress=0. The cache is
+        rebuilt when the source file is newer, and written via a temporary
+        file so workers converting concurrently never see a partial cache.
+        """
+        cache_dir = self.models_dir / MMAP_CACHE_DIR
+        cache_path = cache_dir / model_path.name
+        if cache_path.exists() and cache_path.stat().st_mtime >= model_path.stat().st_mtime:
+            return cache_path.resolve()
+        
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_dir / f"{model_path.name}.{os.getpid()}.tmp"
+        try:
+            joblib.dump(joblib.load(str(model_path)), str(tmp_path), compress=0)
+            os.replace(tmp_path, cache_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        print(f"✓ Built mmap cache for ML model file: {model_path.name}")
+        return cache_path.resolve()
+    
+    def _warm_up(self, model: Any):
+        """
+        Run a synthetic batch through a freshly loaded model.
+        
+        This pays one-off costs (lazy allocations, thread pool start-up,
+        page faults on the model arrays) before the model takes live traffic.
+        """
+        n_features = getattr(model, "n_features_in_", None)
+        if not n_features or self.warmup_rows <= 0:
+            return
+        
+        rng = np.random.default_rng(0)
+        batch = rng.random((self.warmup_rows, int(n_features)), dtype=np.float32)
+        model.predict(batch)
+        if hasattr(model, "predict_proba"):
+            model.predict_proba(batch)
+    
+    def _activate(self, model_version: ModelVersion):
+        """Atomically point a model name at a loaded version."""
+        with self._lock:
+            name = model_version.name
+            self.models[model_version.ref] = model_version
+            self.models.move_to_end(model_version.ref)
+            previous = self.active_versions.get(name)
+            if previous == model_version.version:
+                return
+            
+            history = self.version_history.setdefault(name, [])
+            if previous is not None:
+                if previous in history:
+                    history.remove(previous)
+                history.append(previous)
+            if model_version.version in history:
+                history.remove(model_version.version)
+            
+            # Single assignment: readers see either the old or the new version
+            self.active_versions[name] = model_version.version
+            if self.prediction_cache is not None:
+                self.prediction_cache.invalidate_model(name)
+            
+            # Keep the active and the most recent previous version resident;
+            # requests still holding older versions keep their own reference.
+            keep = {model_version.version}
+            if history:
+                keep.add(history[-1])
+            for ref in [r for r, mv in self.models.items() if mv.name == name and mv.version not in keep]:
+                del self.models[ref]
+            
+            print(f"✓ Activated ML model: {model_version.ref}")
     
     def load_model(self, model_name: str, model_path: Optional[str] = None) -> Any:
         """
         Load a model from a joblib file.
         
         Args:
-            model_name: Name identifier for the model
+            model_name: Name identifier for the model, optionally "name@version"
             model_path: Path to the model file (if None, looks in models_dir)
         
         Returns:
             Loaded model object
         """
-        if model_name in self.models:
-            return self.models[model_name]
+        name, version = parse_model_ref(model_name)
+        if version is None:
+            version = self.active_versions.get(name)
+            if version is None:
+                versions = self.available_versions(name)
+                version = versions[-1] if versions else LEGACY_VERSION
         
-        if model_path is None:
-            # Look for model in models directory
-            model_file = self.models_dir / f"{model_name}.joblib"
-            if not model_file.exists():
-                # Try with .pkl extension
-                model_file = self.models_dir / f"{model_name}.pkl"
-            if not model_file.exists():
-                raise FileNotFoundError(f"Model file not found: {model_name}")
-            model_path = str(model_file)
+        return self._get_or_load(name, version, model_path).model
+    
+    def deploy_model(self, model_name: str, version: str, model_path: Optional[str] = None, activate: bool = True):
+        """
+        Load, warm up and activate a new model version.
+        
+        Intended to run in the background. The currently active version keeps
+        serving until the swap; if loading or warm-up fails it stays active.
+        With activate=False the version is only made resident (status
+        "loaded"), e.g. to evaluate it as a shadow challenger.
+        """
+        ref = format_model_ref(model_name, version)
+        self.deployments[ref] = {"status": "loading", "started_at": datetime.utcnow(), "error": None}
         
         try:
-            model = joblib.load(model_path)
-            self.models[model_name] = model
-            print(f"✓ Loaded ML model: {model_name}")
-            return model
+            model_version = self._load_version(model_name, version, model_path)
+            self._admit(model_version, activate=activate)
+            if activate:
+                self._save_active_version(model_name)
+            self.deployments[ref].update(status="active" if activate else "loaded", finished_at=datetime.utcnow())
         except Exception as e:
-            raise Exception(f"Failed to load model {model_name}: {str(e)}")
+            self.deployments[ref].update(status="failed", finished_at=datetime.utcnow(), error=str(e))
+            print(f"⚠ Failed to deploy ML model {ref}: {e}")
+    
+    def rollback(self, model_name: str, version: Optional[str] = None) -> str:
+        """
+        Re-activate a previous version of a model.
+        
+        Args:
+            model_name: Model name
+            version: Version to roll back to (defaults to the previously active one)
+        
+        Returns:
+            The version that is now active
+        """
+        name, ref_version = parse_model_ref(model_name)
+        version = version or ref_version
+        
+        if version is None:
+            history = self.version_history.get(name)
+            if not history:
+                raise ValueError(f"No previous version of model {name} to roll back to")
+            version = history[-1]
+        
+        model_version = self._get_or_load(name, version)
+        self._admit(model_version, activate=True)
+        self._save_active_version(name)
+        return version
+    
+    def _read_active_versions(self) -> Dict[str, Dict[str, Any]]:
+        """Read the shared active version pointers ({name: {"version", "history"}})."""
+        path = self.models_dir / ACTIVE_VERSIONS_FILE
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                pointers = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠ Could not read active ML model versions from {path}: {e}")
+            return {}
+        return pointers if isinstance(pointers, dict) else {}
+    
+    def _save_active_version(self, model_name: str):
+        """Record a model's active version in the shared pointer file."""
+        path = self.models_dir / ACTIVE_VERSIONS_FILE
+        with self._lock:
+            version = self.active_versions.get(model_name)
+            if version is None:
+                return
+            pointers = self._read_active_versions()
+            pointers[model_name] = {"version": version, "history": list(self.version_history.get(model_name, []))}
+            # Written under a per-process name and renamed, so readers never see a partial file
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            try:
+                self.models_dir.mkdir(parents=True, exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(pointers, f, indent=2)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠ Could not save active version of ML model {model_name}: {e}")
+    
+    def sync_active_versions(self) -> List[str]:
+        """
+        Apply active versions recorded by other worker processes (or before a restart).
+        
+        A model with a resident version is swapped to the recorded version
+        once it has been loaded and warmed up; for any other model only the
+        pointer is set and the version is loaded on first use.
+        
+        Returns:
+            References of the versions that became active
+        """
+        changed = []
+        for name, entry in self._read_active_versions().items():
+            version = entry.get("version") if isinstance(entry, dict) else None
+            if not version or self.active_versions.get(name) == version:
+                continue
+            if self.find_model_file(name, version) is None:
+                print(f"⚠ Active version {format_model_ref(name, version)} of ML model not found; ignoring it")
+                continue
+            
+            with self._lock:
+                resident = any(mv.name == name for mv in self.models.values())
+            try:
+                if resident:
+                    self._admit(self._get_or_load(name, version), activate=True)
+                else:
+                    with self._lock:
+                        self.active_versions[name] = version
+                        if self.prediction_cache is not None:
+                            self.prediction_cache.invalidate_model(name)
+            except Exception as e:
+                print(f"⚠ Failed to activate ML model {format_model_ref(name, version)}: {e}")
+                continue
+            with self._lock:
+                self.version_history[name] = [str(v) for v in entry.get("history", []) if v != version]
+            changed.append(format_model_ref(name, version))
+        return changed
+    
+    def get_model_version(self, model_name: Optional[str] = None) -> ModelVersion:
+        """
+        Get a loaded model version.
+        
+        Args:
+            model_name: "name" (active version), "name@version", or None for the default
+        
+        Returns:
+            ModelVersion; callers should hold on to it for the whole request
+        """
+        name, version = self._resolve_ref(model_name)
+        ref = format_model_ref(name, version)
+        model_version = self.models.get(ref)
+        if model_version is None:
+            model_version = self._get_or_load(name, version)
+        
+        model_version.last_used = datetime.utcnow()
+        with self._lock:
+            if ref in self.models:
+                self.models.move_to_end(ref)
+        return model_version
     
     def get_model(self, model_name: Optional[str] = None) -> Any:
         """
@@ -65,73 +631,207 @@ class MLModelLoader:
         Returns:
             Model object
         """
-        if model_name is None:
-            model_name = self.default_model_name
-        
-        if model_name is None:
-            # Try to use first available model
-            if self.models:
-                model_name = list(self.models.keys())[0]
-            else:
-                raise ValueError("No model loaded and no default model specified")
-        
-        if model_name not in self.models:
-            raise ValueError(f"Model {model_name} not loaded. Call load_model() first.")
-        
-        return self.models[model_name]
+        return self.get_model_version(model_name).model
     
     def set_default_model(self, model_name: str):
-        """Set the default model to use."""
-        if model_name not in self.models:
-            raise ValueError(f"Model {model_name} not loaded")
-        self.default_model_name = model_name
+        """Set the default model to use and pin it in memory."""
+        name, _ = parse_model_ref(model_name)
+        if name not in self.active_versions and not self.available_versions(name):
+            raise ValueError(f"Model {model_name} not found")
+        with self._lock:
+            if self.default_model_name is not None:
+                self.pinned.discard(self.default_model_name)
+            self.default_model_name = name
+            self.pinned.add(name)
     
     def list_models(self) -> list:
-        """List all loaded models."""
-        return list(self.models.keys())
+        """List all available model names, loaded or on disk."""
+        names = list(self.catalog())
+        return names + [name for name in self.active_versions if name not in names]
+    
+    def resident_bytes(self) -> int:
+        """Total size of all resident model versions."""
+        return sum(mv.size_bytes for mv in list(self.models.values()))
     
-    def predict(self, features: Any, model_name: Optional[str] = None) -> tuple:
+    def describe_models(self) -> List[Dict[str, Any]]:
+        """Describe available models: versions, loaded state, size, last use and memory."""
+        resident = list(self.models.values())
+        mapped = mapped_file_usage(mv.mmap_path for mv in resident if mv.mmap_path)
+        catalog = self.catalog()
+        
+        described = []
+        for name in self.list_models():
+            active = self.active_versions.get(name)
+            loaded = {mv.version: mv for mv in resident if mv.name == name}
+            all_versions = sorted(set(catalog.get(name, [])) | set(loaded), key=_version_sort_key)
+            
+            versions = []
+            for version in all_versions:
+                mv = loaded.get(version)
+                entry = {"version": version, "loaded": mv is not None}
+                if mv is not None:
+                    entry.update(
+                        size_bytes=mv.size_bytes,
+                        loaded_at=mv.loaded_at,
+                        last_used=mv.last_used,
+                        memory=self._memory_report(mv, mapped.get(mv.mmap_path))
+                    )
+                versions.append(entry)
+            
+            described.append({
+                "name": name,
+                "active_version": active,
+                "model_ref": format_model_ref(name, active) if active else None,
+                "loaded": bool(loaded),
+                "pinned": name in self.pinned,
+                "versions": versions,
+                "previous_versions": list(self.version_history.get(name, [])),
+            })
+        return described
+    
+    @staticmethod
+    def _memory_report(model_version: ModelVersion, mapped: Optional[Dict[str, int]]) -> Dict[str, Any]:
+        """Combine array accounting with live page-level usage of the mmap file."""
+        report = {
+            "mmap": model_version.mmap_path is not None,
+            "compiled": model_version.compiled is not None,
+            "private_array_bytes": model_version.memory["private_bytes"],
+            "mapped_array_bytes": model_version.memory["mapped_bytes"],
+        }
+        if mapped is not None:
+            report.update(
+                mapped_rss_bytes=mapped["rss_bytes"],
+                mapped_shared_bytes=mapped["shared_bytes"],
+                mapped_private_bytes=mapped["private_bytes"]
+            )
+        return report
+    
+    def predict(
+        self,
+        features: Any,
+        model_name: Optional[str] = None,
+        feature_order: Optional[List[str]] = None
+    ) -> tuple:
         """
         Make a prediction using the specified model.
         
         Args:
             features: Feature vector/array for prediction
             model_name: Name of model to use (uses default if None)
+            feature_order: Feature names of the columns, used to align them
+                to the names the model was trained on
         
         Returns:
             Tuple of (prediction, confidence/probability)
         """
-        model = self.get_model(model_name)
+        model_version = self.get_model_version(model_name)
         
         # Ensure features is a numpy array
-        import numpy as np
         if not isinstance(features, np.ndarray):
             features = np.array(features)
         
         # Reshape if needed (for single sample)
         if len(features.shape) == 1:
             features = features.reshape(1, -1)
+        features = model_version.align(features, feature_order)
+        
+        cache_key = None
+        if self.prediction_cache is not None:
+            cache_key = self.prediction_cache.make_key(model_version.name, model_version.version, features)
+            cached = self.prediction_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        predictions, confidences = self._predict_rows(model_version, features)
+        prediction, confidence = predictions[0], float(confidences[0])
+        
+        if cache_key is not None:
+            self.prediction_cache.put(cache_key, (prediction, confidence))
+        
+        return prediction, confidence
+    
+    def predict_batch(
+        self,
+        features: Any,
+        model_name: Optional[str] = None,
+        feature_order: Optional[List[str]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Make predictions for a batch of feature vectors.
+        
+        With the prediction cache enabled, each row is looked up and stored
+        under the same key as a single-row predict(); only the rows that
+        miss are sent to the model.
+        
+        Args:
+            features: 2-D feature array, one row per sample
+            model_name: Name of model to use (uses default if None)
+            feature_order: Feature names of the columns, used to align them
+                to the names the model was trained on
+        
+        Returns:
+            Tuple of (predictions, confidences) arrays
+        """
+        model_version = self.get_model_version(model_name)
+        features = np.asarray(features)
+        if features.ndim == 1:
+            features = features.reshape(1, -1)
+        features = model_version.align(features, feature_order)
+        if self.prediction_cache is None:
+            return self._predict_rows(model_version, features)
+        
+        cache = self.prediction_cache
+        keys = [cache.make_key(model_version.name, model_version.version, features[i:i + 1]) for i in range(len(features))]
+        cached = [cache.get(key) for key in keys]
+        misses = [i for i, result in enumerate(cached) if result is None]
+        if len(misses) == len(keys):
+            predictions, confidences = self._predict_rows(model_version, features)
+            for key, prediction, confidence in zip(keys, predictions, confidences):
+                cache.put(key, (prediction, float(confidence)))
+            return predictions, confidences
+        
+        if misses:
+            predictions, confidences = self._predict_rows(model_version, features[misses])
+            for i, prediction, confidence in zip(misses, predictions, confidences):
+                cached[i] = (prediction, float(confidence))
+                cache.put(keys[i], cached[i])
+        return (
+            np.array([prediction for prediction, _ in cached]),
+            np.array([confidence for _, confidence in cached], dtype=np.float64)
+        )
+    
+    def _predict_rows(self, model_version: ModelVersion, features: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Predict labels and confidences for a 2-D feature array."""
+        compiled = model_version.compiled
+        if compiled is not None and features.shape[0] <= self.compiled_max_batch and not np.isnan(features).any():
+            # Small batch: one vectorized traversal gives both label and confidence
+            proba = compiled.predict_proba(features)
+            best = np.argmax(proba, axis=1)
+            return compiled.classes_.take(best), proba[np.arange(len(best)), best]
+        
+        model = model_version.model
         
         # Make prediction
-        prediction = model.predict(features)[0]
+        predictions = model.predict(features)
         
         # Try to get prediction probability/confidence
-        confidence = 0.5  # Default confidence
+        confidences = np.full(features.shape[0], 0.5)  # Default confidence
         if hasattr(model, "predict_proba"):
             try:
-                proba = model.predict_proba(features)[0]
-                confidence = float(max(proba))  # Use max probability as confidence
+                proba = model.predict_proba(features)
+                confidences = proba.max(axis=1)  # Use max probability as confidence
             except:
                 pass
         elif hasattr(model, "decision_function"):
             try:
-                decision = model.decision_function(features)[0]
-                # Normalize decision function to 0-1 range (simple sigmoid approximation)
-                confidence = float(1 / (1 + np.exp(-decision)))
+                decision = model.decision_function(features)
+                if decision.ndim == 1:
+                    # Normalize decision function to 0-1 range (simple sigmoid approximation)
+                    confidences = 1 / (1 + np.exp(-decision))
             except:
                 pass
         
-        return prediction, confidence
+        return predictions, confidences
 
 
 # Global model loader instance
@@ -143,29 +843,63 @@ def get_model_loader() -> MLModelLoader:
     global _model_loader
     if _model_loader is None:
         models_dir = os.getenv("ML_MODELS_DIR", "models")
-        _model_loader = MLModelLoader(models_dir=models_dir)
+        warmup_rows = int(os.getenv("ML_WARMUP_ROWS", "64"))
+        use_mmap = os.getenv("ML_MODEL_MMAP", "true").lower() in ("1", "true", "yes")
+        memory_budget_mb = int(os.getenv("ML_MODEL_MEMORY_BUDGET_MB", "0"))
+        cache_size = int(os.getenv("ML_PREDICTION_CACHE_SIZE", "0"))
+        prediction_cache = None
+        if cache_size > 0:
+            prediction_cache = PredictionCache(
+                max_entries=cache_size,
+                ttl_seconds=float(os.getenv("ML_PREDICTION_CACHE_TTL", "300"))
+            )
+        _model_loader = MLModelLoader(
+            models_dir=models_dir,
+            warmup_rows=warmup_rows,
+            use_mmap=use_mmap,
+            memory_budget_bytes=memory_budget_mb * 1024 * 1024,
+            prediction_cache=prediction_cache,
+            compile_trees=os.getenv("ML_COMPILE_TREES", "false").lower() in ("1", "true", "yes"),
+            compiled_max_batch=int(os.getenv("ML_COMPILED_MAX_BATCH", "256"))
+        )
     return _model_loader
 
 
 def initialize_models():
-    """Initialize default models on startup."""
+    """
+    Register and load the default model on startup.
+    
+    The default model is pinned and loaded (and warmed up) before the first
+    request; with ML_LAZY_DEFAULT_MODEL enabled it is loaded on first use,
+    like every other model.
+    """
     loader = get_model_loader()
+    # Versions activated before the restart (or by other workers) stay active
+    for ref in loader.sync_active_versions():
+        print(f"✓ Restored active ML model version: {ref}")
     
-    # Try to load default model if it exists
     default_model = os.getenv("ML_DEFAULT_MODEL", "threat_detection")
-    models_dir = os.getenv("ML_MODELS_DIR", "models")
-    
-    model_path = Path(models_dir) / f"{default_model}.joblib"
-    if not model_path.exists():
-        model_path = Path(models_dir) / f"{default_model}.pkl"
+    if not loader.available_versions(default_model):
+        print(f"⚠ Default ML model {default_model} not found in {loader.models_dir}. ML features will be limited.")
+        return
     
-    if model_path.exists():
-        try:
-            loader.load_model(default_model, str(model_path))
-            loader.set_default_model(default_model)
-            print(f"✓ Initialized default ML model: {default_model}")
-        except Exception as e:
-            print(f"⚠ Failed to load default ML model: {e}")
-    else:
-        print(f"⚠ Default ML model not found at {model_path}. ML features will be limited.")
+    try:
+        loader.set_default_model(default_model)
+        if os.getenv("ML_LAZY_DEFAULT_MODEL", "false").lower() not in ("1", "true", "yes"):
+            loader.get_model_version(default_model)
+        print(f"✓ Initialized default ML model: {default_model}")
+    except Exception as e:
+        print(f"⚠ Failed to load default ML model: {e}")
+
+
+# Shared thread pool for model evaluation off the event loop
+_inference_executor: Optional[ThreadPoolExecutor] = None
+
 
+def get_inference_executor() -> ThreadPoolExecutor:
+    """Get or create the thread pool used to run model inference."""
+    global _inference_executor
+    if _inference_executor is None:
+        workers = int(os.getenv("ML_INFERENCE_WORKERS", str(min(8, os.cpu_count() or 1))))
+        _inference_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ml-inference")
+    return _inference_executor
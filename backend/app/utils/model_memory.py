@@ -0,0 +1,125 @@
+"""
+Memory accounting for loaded ML models.
+
+Two views are provided:
+- estimate_model_bytes walks a model's object graph and sums the NumPy
+  arrays it owns, split into private heap arrays and file-backed memmaps.
+- mapped_file_usage reads /proc/self/smaps to report how much of each
+  memory-mapped model file is resident in this process and how much of
+  that is shared with other processes through the page cache.
+"""
+from typing import Any, Dict, Iterable
+
+import numpy as np
+
+_MAX_DEPTH = 64
+
+
+def _is_file_backed(array: np.ndarray) -> bool:
+    """Check whether an array (or the array it views) is a np.memmap."""
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        base = array.base
+        array = base if isinstance(base, np.ndarray) else None
+    return False
+
+
+def _children(obj: Any):
+    """Yield the objects referenced by obj that may hold arrays."""
+    if isinstance(obj, dict):
+        yield from obj.values()
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        yield from obj
+    elif hasattr(obj, "__dict__"):
+        yield from vars(obj).values()
+    elif hasattr(obj, "__getstate__"):
+        # Extension types such as sklearn's Cython Tree expose their
+        # arrays through __getstate__ rather than __dict__
+        try:
+            state = obj.__getstate__()
+        except Exception:
+            return
+        if isinstance(state, dict):
+            yield from state.values()
+
+
+def estimate_model_bytes(model: Any) -> Dict[str, int]:
+    """
+    Sum the NumPy array memory referenced by a model.
+
+    Returns:
+        Dictionary with private_bytes (heap arrays owned by this process)
+        and mapped_bytes (arrays backed by a memory-mapped file)
+    """
+    private_bytes = 0
+    mapped_bytes = 0
+    # Keep visited objects alive: __getstate__ returns temporaries whose
+    # ids would otherwise be reused and wrongly treated as already seen
+    seen: Dict[int, Any] = {}
+    stack = [(model, 0)]
+
+    while stack:
+        obj, depth = stack.pop()
+        if id(obj) in seen or depth > _MAX_DEPTH:
+            continue
+        seen[id(obj)] = obj
+
+        if isinstance(obj, np.ndarray):
+            if obj.dtype == object:
+                stack.extend((child, depth + 1) for child in obj.ravel())
+            elif _is_file_backed(obj):
+                mapped_bytes += obj.nbytes
+            else:
+                private_bytes += obj.nbytes
+            continue
+
+        if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            continue
+
+        stack.extend((child, depth + 1) for child in _children(obj))
+
+    return {"private_bytes": private_bytes, "mapped_bytes": mapped_bytes}
+
+
+def mapped_file_usage(paths: Iterable[str]) -> Dict[str, Dict[str, int]]:
+    """
+    Report resident and shared memory of memory-mapped files in this process.
+
+    Args:
+        paths: Absolute paths of mapped files to report on
+
+    Returns:
+        Mapping of path to {"rss_bytes", "shared_bytes", "private_bytes"};
+        empty if /proc/self/smaps is not available (non-Linux platforms)
+    """
+    wanted = set(paths)
+    usage = {path: {"rss_bytes": 0, "shared_bytes": 0, "private_bytes": 0} for path in wanted}
+    if not wanted:
+        return usage
+
+    try:
+        with open("/proc/self/smaps", "r") as f:
+            current = None
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if "-" in fields[0] and not fields[0].endswith(":"):
+                    # Mapping header: address perms offset dev inode [path]
+                    path = line.split(None, 5)[5].strip() if len(fields) >= 6 else None
+                    current = usage.get(path)
+                    continue
+                if current is None or len(fields) < 2 or not fields[1].isdigit():
+                    continue
+                key, value = fields[0], int(fields[1]) * 1024
+                if key == "Rss:":
+                    current["rss_bytes"] += value
+                elif key in ("Shared_Clean:", "Shared_Dirty:"):
+                    current["shared_bytes"] += value
+                elif key in ("Private_Clean:", "Private_Dirty:"):
+                    current["private_bytes"] += value
+    except OSError:
+        return {}
+
+    return usage
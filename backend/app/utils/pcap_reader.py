@@ -0,0 +1,545 @@
+"""
+Memory-mapped PCAP/PCAPNG reader with flow reconstruction.
+
+The capture is split into chunks on record/block boundaries by walking only
+the record headers (plan_chunks). Each chunk is parsed independently,
+usually in a worker process (parse_chunk): packets are decoded in place from
+the memory map with struct.unpack_from, without copying packet data, and
+aggregated into a per-chunk flow table. FlowTable merges chunk results in
+file order and releases flows that have gone idle, so memory stays bounded
+by the number of concurrently active flows rather than the capture size.
+
+Flows are emitted as Suricata EVE ``flow`` records (flow_record), so they
+feed the same feature extraction and inference path as live Suricata data.
+
+Supported: libpcap (micro/nanosecond, either byte order) and pcapng
+(SHB/IDB/EPB/SPB/PB blocks, per-interface link type and timestamp
+resolution); Ethernet (with 802.1Q/802.1ad tags), Linux cooked (SLL/SLL2),
+BSD loopback and raw IP link types; IPv4, IPv6 (extension headers and
+fragments), TCP, UDP and SCTP ports.
+"""
+import mmap
+import socket
+import struct
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB_MAGIC = b"\x0a\x0d\x0d\x0a"
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+_PCAP_HEADER_LEN = 24
+_PCAP_RECORD_LEN = 16
+
+# pcapng block types
+_SHB = 0x0A0D0D0A
+_IDB = 0x00000001
+_PB = 0x00000002
+_SPB = 0x00000003
+_EPB = 0x00000006
+_IF_TSRESOL = 9
+
+# Link types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+_RAW_LINKTYPES = (LINKTYPE_RAW, 12, 14, LINKTYPE_IPV4, LINKTYPE_IPV6)
+
+_ETH_IPV4 = 0x0800
+_ETH_IPV6 = 0x86DD
+_ETH_VLAN = (0x8100, 0x88A8, 0x9100)
+
+_PROTO_TCP = 6
+_PROTO_UDP = 17
+_PROTO_SCTP = 132
+_PORT_PROTOS = (_PROTO_TCP, _PROTO_UDP, _PROTO_SCTP)
+_IPV6_EXT_HEADERS = (0, 43, 60)
+_IPV6_FRAGMENT = 44
+PROTO_NAMES = {1: "ICMP", 6: "TCP", 17: "UDP", 58: "IPv6-ICMP", 132: "SCTP"}
+
+_TCP_FIN = 0x01
+_TCP_SYN = 0x02
+_TCP_RST = 0x04
+
+# Flow segment layout (lists, mutated in place for speed)
+(FIRST_TS, LAST_TS, A_PKTS, A_BYTES, B_PKTS, B_BYTES,
+ TCP_FLAGS, SYN_COUNT, RST_COUNT, FIN_COUNT, A_INITIATED) = range(11)
+
+_U16 = struct.Struct(">H")
+_HH = struct.Struct(">HH")
+
+# Interface = (link type, timestamp scale in seconds)
+Interface = Tuple[int, float]
+
+
+class CaptureChunk(NamedTuple):
+    """A byte range of a capture that starts and ends on record boundaries."""
+    start: int
+    end: int
+    endian: str
+    interfaces: Tuple[Interface, ...]
+
+
+def sniff_format(header: bytes) -> Optional[str]:
+    """Return "pcap", "pcapng" or None from the first bytes of a file."""
+    if header[:4] in PCAP_MAGICS:
+        return "pcap"
+    if header[:4] == PCAPNG_SHB_MAGIC:
+        return "pcapng"
+    return None
+
+
+def _open_map(path: str) -> Tuple[Any, mmap.mmap]:
+    """Open a file read-only and memory-map it."""
+    f = open(path, "rb")
+    try:
+        return f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except Exception:
+        f.close()
+        raise
+
+
+def _pcapng_interface(buf, off: int, block_len: int, endian: str) -> Interface:
+    """Read link type and timestamp resolution from an Interface Description Block."""
+    linktype = struct.unpack_from(endian + "H", buf, off + 8)[0]
+    scale = 1e-6
+    opt = off + 16
+    end = off + block_len - 4
+    while opt + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", buf, opt)
+        if code == 0:
+            break
+        if code == _IF_TSRESOL and length >= 1:
+            resol = buf[opt + 4]
+            scale = 2.0 ** -(resol & 0x7F) if resol & 0x80 else 10.0 ** -resol
+        opt += 4 + ((length + 3) & ~3)
+    return linktype, scale
+
+
+def _pcapng_section_endian(buf, off: int) -> str:
+    """Byte order of a pcapng section from its Section Header Block."""
+    return "<" if struct.unpack_from("<I", buf, off + 8)[0] == PCAPNG_BYTE_ORDER_MAGIC else ">"
+
+
+def plan_chunks(path: str, chunk_bytes: int = 16 * 1024 * 1024) -> Tuple[str, List[CaptureChunk]]:
+    """
+    Split a capture into chunks of roughly chunk_bytes on record boundaries.
+
+    Only record/block headers are read. A truncated final record ends the
+    last chunk.
+
+    Returns:
+        (format, chunks)
+
+    Raises:
+        ValueError: If the file is not a pcap or pcapng capture
+    """
+    f, buf = _open_map(path)
+    try:
+        fmt = sniff_format(buf[:4])
+        if fmt == "pcap":
+            return fmt, _plan_pcap(buf, chunk_bytes)
+        if fmt == "pcapng":
+            return fmt, _plan_pcapng(buf, chunk_bytes)
+        raise ValueError("Not a pcap or pcapng capture")
+    finally:
+        buf.close()
+        f.close()
+
+
+def _plan_pcap(buf, chunk_bytes: int) -> List[CaptureChunk]:
+    if len(buf) < _PCAP_HEADER_LEN:
+        raise ValueError("Truncated pcap header")
+    endian, scale = PCAP_MAGICS[buf[:4]]
+    linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+    interfaces = ((linktype, scale),)
+    caplen_at = struct.Struct(endian + "I").unpack_from
+
+    size = len(buf)
+    chunks = []
+    start = off = _PCAP_HEADER_LEN
+    while off + _PCAP_RECORD_LEN <= size:
+        next_off = off + _PCAP_RECORD_LEN + caplen_at(buf, off + 8)[0]
+        if next_off > size:
+            break
+        off = next_off
+        if off - start >= chunk_bytes:
+            chunks.append(CaptureChunk(start, off, endian, interfaces))
+            start = off
+    if off > start:
+        chunks.append(CaptureChunk(start, off, endian, interfaces))
+    return chunks
+
+
+def _plan_pcapng(buf, chunk_bytes: int) -> List[CaptureChunk]:
+    size = len(buf)
+    chunks = []
+    endian = "<"
+    interfaces: List[Interface] = []
+    start = off = 0
+    start_endian, start_interfaces = endian, ()
+
+    while off + 12 <= size:
+        if buf[off:off + 4] == PCAPNG_SHB_MAGIC:
+            endian = _pcapng_section_endian(buf, off)
+        block_type, block_len = struct.unpack_from(endian + "II", buf, off)
+        if block_len < 12 or off + block_len > size:
+            break
+        if block_type == _SHB:
+            interfaces = []
+        elif block_type == _IDB:
+            interfaces.append(_pcapng_interface(buf, off, block_len, endian))
+        off += block_len
+        if off - start >= chunk_bytes:
+            chunks.append(CaptureChunk(start, off, start_endian, start_interfaces))
+            start = off
+            start_endian, start_interfaces = endian, tuple(interfaces)
+    if off > start:
+        chunks.append(CaptureChunk(start, off, start_endian, start_interfaces))
+    return chunks
+
+
+def _decode(buf, off: int, caplen: int, linktype: int):
+    """
+    Decode one packet in place.
+
+    Returns:
+        (proto, src, sport, dst, dport, ip_len, tcp_flags) or None if the
+        packet is not IPv4/IPv6 or is truncated
+    """
+    end = off + caplen
+    if linktype == LINKTYPE_ETHERNET:
+        ethertype = _U16.unpack_from(buf, off + 12)[0]
+        l3 = off + 14
+        while ethertype in _ETH_VLAN:
+            ethertype = _U16.unpack_from(buf, l3 + 2)[0]
+            l3 += 4
+    elif linktype == LINKTYPE_LINUX_SLL:
+        ethertype = _U16.unpack_from(buf, off + 14)[0]
+        l3 = off + 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        ethertype = _U16.unpack_from(buf, off)[0]
+        l3 = off + 20
+    elif linktype in _RAW_LINKTYPES or linktype == LINKTYPE_NULL:
+        l3 = off + 4 if linktype == LINKTYPE_NULL else off
+        version = buf[l3] >> 4
+        ethertype = _ETH_IPV4 if version == 4 else _ETH_IPV6 if version == 6 else 0
+    else:
+        return None
+
+    if ethertype == _ETH_IPV4:
+        if l3 + 20 > end:
+            return None
+        ihl = (buf[l3] & 0x0F) * 4
+        ip_len = _U16.unpack_from(buf, l3 + 2)[0]
+        fragment_offset = _U16.unpack_from(buf, l3 + 6)[0] & 0x1FFF
+        proto = buf[l3 + 9]
+        src = bytes(buf[l3 + 12:l3 + 16])
+        dst = bytes(buf[l3 + 16:l3 + 20])
+        l4 = l3 + ihl
+        has_ports = fragment_offset == 0
+    elif ethertype == _ETH_IPV6:
+        if l3 + 40 > end:
+            return None
+        ip_len = _U16.unpack_from(buf, l3 + 4)[0] + 40
+        proto = buf[l3 + 6]
+        src = bytes(buf[l3 + 8:l3 + 24])
+        dst = bytes(buf[l3 + 24:l3 + 40])
+        l4 = l3 + 40
+        has_ports = True
+        while proto in _IPV6_EXT_HEADERS or proto == _IPV6_FRAGMENT:
+            if l4 + 8 > end:
+                return None
+            if proto == _IPV6_FRAGMENT:
+                has_ports = (_U16.unpack_from(buf, l4 + 2)[0] >> 3) == 0
+                proto = buf[l4]
+                l4 += 8
+            else:
+                proto, l4 = buf[l4], l4 + (buf[l4 + 1] + 1) * 8
+    else:
+        return None
+
+    sport = dport = flags = 0
+    if has_ports and proto in _PORT_PROTOS and l4 + 4 <= end:
+        sport, dport = _HH.unpack_from(buf, l4)
+        if proto == _PROTO_TCP and l4 + 14 <= end:
+            flags = buf[l4 + 13]
+    return proto, src, sport, dst, dport, ip_len, flags
+
+
+def _add_packet(flows: Dict[tuple, list], ts: float, packet, idle_timeout: float):
+    """Fold a decoded packet into a flow table keyed by canonical 5-tuple."""
+    proto, src, sport, dst, dport, ip_len, flags = packet
+    forward = (src, sport) <= (dst, dport)
+    key = (proto, src, sport, dst, dport) if forward else (proto, dst, dport, src, sport)
+
+    segments = flows.get(key)
+    if segments is None:
+        segments = flows[key] = []
+    seg = segments[-1] if segments else None
+    if seg is None or ts - seg[LAST_TS] > idle_timeout:
+        seg = [ts, ts, 0, 0, 0, 0, 0, 0, 0, 0, forward]
+        segments.append(seg)
+    elif ts > seg[LAST_TS]:
+        seg[LAST_TS] = ts
+    elif ts < seg[FIRST_TS]:
+        seg[FIRST_TS] = ts
+
+    if forward:
+        seg[A_PKTS] += 1
+        seg[A_BYTES] += ip_len
+    else:
+        seg[B_PKTS] += 1
+        seg[B_BYTES] += ip_len
+    if flags:
+        seg[TCP_FLAGS] |= flags
+        if flags & _TCP_SYN:
+            seg[SYN_COUNT] += 1
+        if flags & _TCP_RST:
+            seg[RST_COUNT] += 1
+        if flags & _TCP_FIN:
+            seg[FIN_COUNT] += 1
+
+
+def parse_chunk(path: str, fmt: str, chunk: CaptureChunk, idle_timeout: float = 120.0) -> Dict[str, Any]:
+    """
+    Parse one chunk of a capture into flow segments (runs in a worker process).
+
+    Returns:
+        Dictionary with flows ({canonical_key: [segment, ...]}), packets,
+        bytes, undecoded, first_ts and last_ts
+    """
+    f, buf = _open_map(path)
+    flows: Dict[tuple, list] = {}
+    stats = {"packets": 0, "bytes": 0, "undecoded": 0, "first_ts": None, "last_ts": None}
+    view = memoryview(buf)
+    try:
+        if fmt == "pcap":
+            records = _iter_pcap(view, chunk)
+        else:
+            records = _iter_pcapng(view, chunk)
+
+        first_ts = last_ts = None
+        for ts, data_off, caplen, linktype in records:
+            stats["packets"] += 1
+            stats["bytes"] += caplen
+            if first_ts is None or ts < first_ts:
+                first_ts = ts
+            if last_ts is None or ts > last_ts:
+                last_ts = ts
+            try:
+                packet = _decode(view, data_off, caplen, linktype)
+            except (struct.error, IndexError):
+                packet = None
+            if packet is None:
+                stats["undecoded"] += 1
+                continue
+            _add_packet(flows, ts, packet, idle_timeout)
+        stats["first_ts"], stats["last_ts"] = first_ts, last_ts
+    finally:
+        view.release()
+        buf.close()
+        f.close()
+
+    stats["flows"] = flows
+    return stats
+
+
+def _iter_pcap(buf, chunk: CaptureChunk):
+    """Yield (ts, data_offset, caplen, linktype) for libpcap records in a chunk."""
+    linktype, scale = chunk.interfaces[0]
+    record = struct.Struct(chunk.endian + "IIII")
+    off = chunk.start
+    while off + _PCAP_RECORD_LEN <= chunk.end:
+        ts_sec, ts_frac, caplen, _ = record.unpack_from(buf, off)
+        yield ts_sec + ts_frac * scale, off + _PCAP_RECORD_LEN, caplen, linktype
+        off += _PCAP_RECORD_LEN + caplen
+
+
+def _iter_pcapng(buf, chunk: CaptureChunk):
+    """Yield (ts, data_offset, caplen, linktype) for pcapng packet blocks in a chunk."""
+    endian = chunk.endian
+    interfaces = list(chunk.interfaces)
+    off = chunk.start
+    last_ts = 0.0
+    while off + 12 <= chunk.end:
+        if buf[off:off + 4] == PCAPNG_SHB_MAGIC:
+            endian = _pcapng_section_endian(buf, off)
+        block_type, block_len = struct.unpack_from(endian + "II", buf, off)
+        if block_len < 12:
+            break
+
+        if block_type == _EPB:
+            if_id, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", buf, off + 8)
+            if if_id < len(interfaces):
+                linktype, scale = interfaces[if_id]
+                last_ts = ((ts_high << 32) | ts_low) * scale
+                yield last_ts, off + 28, caplen, linktype
+        elif block_type == _SPB:
+            if interfaces:
+                original_len = struct.unpack_from(endian + "I", buf, off + 8)[0]
+                yield last_ts, off + 12, min(original_len, block_len - 16), interfaces[0][0]
+        elif block_type == _PB:
+            if_id = struct.unpack_from(endian + "H", buf, off + 8)[0]
+            ts_high, ts_low, caplen = struct.unpack_from(endian + "III", buf, off + 12)
+            if if_id < len(interfaces):
+                linktype, scale = interfaces[if_id]
+                last_ts = ((ts_high << 32) | ts_low) * scale
+                yield last_ts, off + 28, caplen, linktype
+        elif block_type == _SHB:
+            interfaces = []
+        elif block_type == _IDB:
+            interfaces.append(_pcapng_interface(buf, off, block_len, endian))
+        off += block_len
+
+
+def _merge_segment(into: list, seg: list):
+    """Combine two segments of the same flow."""
+    if seg[FIRST_TS] < into[FIRST_TS]:
+        into[FIRST_TS] = seg[FIRST_TS]
+        into[A_INITIATED] = seg[A_INITIATED]
+    if seg[LAST_TS] > into[LAST_TS]:
+        into[LAST_TS] = seg[LAST_TS]
+    for field in (A_PKTS, A_BYTES, B_PKTS, B_BYTES, SYN_COUNT, RST_COUNT, FIN_COUNT):
+        into[field] += seg[field]
+    into[TCP_FLAGS] |= seg[TCP_FLAGS]
+
+
+class FlowTable:
+    """Merges per-chunk flow segments and releases flows once they go idle."""
+
+    def __init__(self, idle_timeout: float = 120.0, max_active_flows: int = 500000):
+        """
+        Initialize the table.
+
+        Args:
+            idle_timeout: Gap after which packets of the same 5-tuple start a new flow
+            max_active_flows: Flows held before the least recently active are released early
+        """
+        self.idle_timeout = idle_timeout
+        self.max_active_flows = max_active_flows
+        self._flows: Dict[tuple, list] = {}
+        self.active = 0
+
+    def merge(self, chunk_flows: Dict[tuple, list]):
+        """Merge a chunk's segments (chunks must be merged in file order)."""
+        for key, segments in chunk_flows.items():
+            existing = self._flows.get(key)
+            if existing is None:
+                self._flows[key] = segments
+                self.active += len(segments)
+                continue
+            for seg in segments:
+                last = existing[-1]
+                if seg[FIRST_TS] - last[LAST_TS] <= self.idle_timeout:
+                    _merge_segment(last, seg)
+                else:
+                    existing.append(seg)
+                    self.active += 1
+
+    def pop_idle(self, now: float) -> List[Tuple[tuple, list]]:
+        """
+        Release flows that cannot be extended by packets at or after ``now``.
+
+        Also releases the least recently active flows if more than
+        max_active_flows are held.
+        """
+        cutoff = now - self.idle_timeout
+        released = []
+        for key in list(self._flows):
+            segments = self._flows[key]
+            keep = [seg for seg in segments if seg[LAST_TS] >= cutoff]
+            if len(keep) != len(segments):
+                released.extend((key, seg) for seg in segments if seg[LAST_TS] < cutoff)
+                if keep:
+                    self._flows[key] = keep
+                else:
+                    del self._flows[key]
+
+        self.active -= len(released)
+        if self.active > self.max_active_flows:
+            released.extend(self._pop_oldest(self.active - self.max_active_flows))
+        return released
+
+    def _pop_oldest(self, count: int) -> List[Tuple[tuple, list]]:
+        """Release the ``count`` least recently active flows."""
+        candidates = sorted(
+            ((seg[LAST_TS], key) for key, segments in self._flows.items() for seg in segments[:1]),
+            key=lambda item: item[0]
+        )[:count]
+        released = []
+        for _, key in candidates:
+            segments = self._flows[key]
+            released.append((key, segments.pop(0)))
+            if not segments:
+                del self._flows[key]
+        self.active -= len(released)
+        return released
+
+    def drain(self) -> List[Tuple[tuple, list]]:
+        """Release every remaining flow."""
+        released = [(key, seg) for key, segments in self._flows.items() for seg in segments]
+        self._flows = {}
+        self.active = 0
+        return released
+
+
+def _ip_to_str(address: bytes) -> str:
+    return socket.inet_ntop(socket.AF_INET if len(address) == 4 else socket.AF_INET6, address)
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def flow_record(key: tuple, seg: list) -> Dict[str, Any]:
+    """Build a Suricata EVE-style flow record, oriented from the initiator."""
+    proto, a_ip, a_port, b_ip, b_port = key
+    if seg[A_INITIATED]:
+        src, sport, dst, dport = a_ip, a_port, b_ip, b_port
+        to_server = (seg[A_PKTS], seg[A_BYTES])
+        to_client = (seg[B_PKTS], seg[B_BYTES])
+    else:
+        src, sport, dst, dport = b_ip, b_port, a_ip, a_port
+        to_server = (seg[B_PKTS], seg[B_BYTES])
+        to_client = (seg[A_PKTS], seg[A_BYTES])
+
+    record = {
+        "event_type": "flow",
+        "timestamp": _iso(seg[FIRST_TS]),
+        "src_ip": _ip_to_str(src),
+        "src_port": sport,
+        "dest_ip": _ip_to_str(dst),
+        "dest_port": dport,
+        "proto": PROTO_NAMES.get(proto, str(proto)),
+        "flow": {
+            "pkts_toserver": to_server[0],
+            "pkts_toclient": to_client[0],
+            "bytes_toserver": to_server[1],
+            "bytes_toclient": to_client[1],
+            "start": _iso(seg[FIRST_TS]),
+            "end": _iso(seg[LAST_TS]),
+            "age": int(seg[LAST_TS] - seg[FIRST_TS]),
+        },
+    }
+    if proto == _PROTO_TCP:
+        flags = seg[TCP_FLAGS]
+        record["tcp"] = {
+            "tcp_flags": f"{flags:02x}",
+            "syn": bool(flags & _TCP_SYN),
+            "fin": bool(flags & _TCP_FIN),
+            "rst": bool(flags & _TCP_RST),
+            "syn_count": seg[SYN_COUNT],
+            "rst_count": seg[RST_COUNT],
+            "fin_count": seg[FIN_COUNT],
+        }
+    return record
@@ -0,0 +1,322 @@
+"""
+Streaming threshold / match rule engine.
+
+Rules are stored as documents and compiled into a predicate (a tuple of
+per-condition closures over dotted field paths) plus, optionally, a
+windowed count. Each ingested record is run through the compiled rules for
+its record type:
+
+- A rule without a threshold fires on every matching record
+  (e.g. "any critical log from firewall").
+- A rule with a threshold keeps, per group (the value of ``group_by``),
+  the times of its last ``count`` matches. It fires when ``count`` matches
+  fall within ``window_seconds`` (e.g. "50 failed logins from one source in
+  60 s"), then starts the group over. The deque never holds more than
+  ``count`` entries, and groups are bounded per rule (least recently seen
+  are dropped).
+
+Every evaluation is timed with perf_counter_ns, so expensive rules show up
+in stats().
+
+Rules run on the ingest path, so user-supplied ``regex`` patterns are
+bounded: patterns longer than ALERT_RULES_REGEX_MAX_LENGTH or with nested
+quantifiers (``(a+)+``, the usual catastrophic-backtracking shape) are
+rejected, and only the first ALERT_RULES_REGEX_MAX_INPUT characters of a
+field are searched.
+"""
+import operator
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+RECORD_TYPES = ("log", "suricata_event", "any")
+
+_COMPARISONS = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+
+OPERATORS = ("eq", "ne", "in", "not_in", "contains", "regex", "exists") + tuple(_COMPARISONS)
+
+_MISSING = object()
+
+# A quantified group that itself contains a quantifier, e.g. (a+)+ or (\w*x)*
+_NESTED_QUANTIFIER = re.compile(r"\((?:[^()\\]|\\.)*[+*}](?:[^()\\]|\\.)*\)[+*{]")
+
+
+def regex_max_input() -> int:
+    """Characters of a field that regex conditions search."""
+    return int(os.getenv("ALERT_RULES_REGEX_MAX_INPUT", "4096"))
+
+
+def check_regex(field: str, pattern: str):
+    """
+    Reject regex patterns that could stall ingest.
+
+    Raises:
+        ValueError: If the pattern is too long or nests quantifiers
+    """
+    max_length = int(os.getenv("ALERT_RULES_REGEX_MAX_LENGTH", "256"))
+    if len(pattern) > max_length:
+        raise ValueError(f"Regex for {field} is longer than {max_length} characters")
+    if _NESTED_QUANTIFIER.search(pattern):
+        raise ValueError(f"Regex for {field} nests quantifiers, which can backtrack catastrophically")
+
+
+def _getter(path: str) -> Callable[[Dict[str, Any]], Any]:
+    """Compile a dotted field path into a lookup function."""
+    parts = tuple(path.split("."))
+    if len(parts) == 1:
+        key = parts[0]
+        return lambda record: record.get(key, _MISSING)
+
+    def get(record: Dict[str, Any]) -> Any:
+        value: Any = record
+        for part in parts:
+            if not isinstance(value, dict):
+                return _MISSING
+            value = value.get(part, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+    return get
+
+
+def compile_condition(condition: Dict[str, Any]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    Compile one {field, op, value} condition into a predicate.
+
+    Raises:
+        ValueError: If the operator is unknown or the value does not fit it
+    """
+    field = condition.get("field")
+    op = condition.get("op", "eq")
+    value = condition.get("value")
+    if not field:
+        raise ValueError("Condition needs a field")
+    get = _getter(field)
+
+    if op == "eq":
+        return lambda record: get(record) == value
+    if op == "ne":
+        return lambda record: get(record) != value
+    if op in ("in", "not_in"):
+        if not isinstance(value, list):
+            raise ValueError(f"'{op}' on {field} needs a list value")
+        members = frozenset(value) if all(isinstance(v, (str, int, float, bool)) for v in value) else tuple(value)
+        if op == "in":
+            return lambda record: get(record) in members
+        return lambda record: get(record) not in members
+    if op == "contains":
+        needle = str(value).lower()
+
+        def contains(record: Dict[str, Any]) -> bool:
+            actual = get(record)
+            return isinstance(actual, str) and needle in actual.lower()
+        return contains
+    if op == "regex":
+        check_regex(field, str(value))
+        try:
+            pattern = re.compile(str(value))
+        except re.error as e:
+            raise ValueError(f"Invalid regex for {field}: {e}")
+        max_input = regex_max_input()
+
+        def matches(record: Dict[str, Any]) -> bool:
+            actual = get(record)
+            return isinstance(actual, str) and pattern.search(actual, 0, max_input) is not None
+        return matches
+    if op == "exists":
+        wanted = bool(value) if value is not None else True
+        return lambda record: (get(record) not in (_MISSING, None)) == wanted
+    if op in _COMPARISONS:
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            raise ValueError(f"'{op}' on {field} needs a numeric value")
+        compare = _COMPARISONS[op]
+
+        def numeric(record: Dict[str, Any]) -> bool:
+            actual = get(record)
+            return isinstance(actual, (int, float)) and not isinstance(actual, bool) and compare(actual, value)
+        return numeric
+    raise ValueError(f"Unknown operator '{op}' (allowed: {', '.join(OPERATORS)})")
+
+
+class CompiledRule:
+    """A rule compiled for evaluation, with its window state and cost counters."""
+
+    def __init__(self, rule: Dict[str, Any], max_groups: int = 10000):
+        """
+        Compile a rule document.
+
+        Raises:
+            ValueError: If a condition or the threshold is invalid
+        """
+        self.id = str(rule["_id"])
+        self.version = rule.get("updated_at")
+        self.name = rule["name"]
+        self.record_type = rule.get("record_type", "log")
+        if self.record_type not in RECORD_TYPES:
+            raise ValueError(f"Unknown record type: {self.record_type}")
+        self.severity = rule.get("severity", "medium")
+        self.alert_type = rule.get("alert_type", "rule")
+        self.title = rule.get("title") or f"Rule: {self.name}"
+        self.predicates = tuple(compile_condition(c) for c in rule.get("conditions") or [])
+        if not self.predicates:
+            # Would fire on every record
+            raise ValueError("Rule needs at least one condition")
+
+        threshold = rule.get("threshold")
+        self.count = int(threshold["count"]) if threshold else 1
+        self.window_seconds = float(threshold.get("window_seconds", 60)) if threshold else 0.0
+        self.group_by = threshold.get("group_by") if threshold else None
+        if self.count < 1 or (threshold and self.window_seconds <= 0):
+            raise ValueError("Threshold needs count >= 1 and window_seconds > 0")
+        self._group_of = _getter(self.group_by) if self.group_by else None
+        self.max_groups = max_groups
+        # group -> deque of (time, record id), at most `count` entries
+        self._windows: "OrderedDict[Any, deque]" = OrderedDict()
+
+        self.evaluations = 0
+        self.matches = 0
+        self.fired = 0
+        self.cost_ns = 0
+        self.max_cost_ns = 0
+
+    def evaluate(self, record: Dict[str, Any], record_id: Optional[str], now: float) -> Optional[Dict[str, Any]]:
+        """
+        Evaluate the rule on one record.
+
+        Returns:
+            A firing (group, count, record ids) or None
+        """
+        started = time.perf_counter_ns()
+        try:
+            self.evaluations += 1
+            for predicate in self.predicates:
+                if not predicate(record):
+                    return None
+            self.matches += 1
+            if self.count == 1 and self._group_of is None:
+                self.fired += 1
+                return {"group": None, "count": 1, "record_ids": [record_id] if record_id else []}
+
+            group = self._group_of(record) if self._group_of is not None else None
+            if group is _MISSING:
+                group = None
+            group = group if isinstance(group, (str, int, float, bool, type(None))) else str(group)
+            window = self._windows.get(group)
+            if window is None:
+                window = self._windows[group] = deque(maxlen=self.count)
+                while len(self._windows) > self.max_groups:
+                    self._windows.popitem(last=False)
+            else:
+                self._windows.move_to_end(group)
+            window.append((now, record_id))
+            if len(window) < self.count or now - window[0][0] > self.window_seconds:
+                return None
+            record_ids = [rid for _, rid in window if rid]
+            window.clear()
+            self.fired += 1
+            return {"group": group, "count": self.count, "record_ids": record_ids}
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            self.cost_ns += elapsed
+            if elapsed > self.max_cost_ns:
+                self.max_cost_ns = elapsed
+
+    def stats(self) -> Dict[str, Any]:
+        """Return match counts and evaluation cost of the rule."""
+        return {
+            "rule_id": self.id,
+            "name": self.name,
+            "record_type": self.record_type,
+            "evaluations": self.evaluations,
+            "matches": self.matches,
+            "fired": self.fired,
+            "groups": len(self._windows),
+            "total_cost_ms": self.cost_ns / 1e6,
+            "mean_cost_us": self.cost_ns / self.evaluations / 1e3 if self.evaluations else 0.0,
+            "max_cost_us": self.max_cost_ns / 1e3,
+        }
+
+
+class RuleEngine:
+    """Compiled rules indexed by record type."""
+
+    def __init__(self, max_groups: int = 10000):
+        self.max_groups = max_groups
+        self._rules: Dict[str, CompiledRule] = {}
+        self._by_type: Dict[str, Tuple[CompiledRule, ...]] = {}
+        self.load_errors: Dict[str, str] = {}
+
+    def load(self, rules: List[Dict[str, Any]]):
+        """
+        Replace the rule set, keeping window state and counters of unchanged rules.
+
+        Rules that fail to compile are skipped and reported in load_errors.
+        """
+        compiled: Dict[str, CompiledRule] = {}
+        errors: Dict[str, str] = {}
+        for rule in rules:
+            rule_id = str(rule["_id"])
+            previous = self._rules.get(rule_id)
+            if previous is not None and previous.version == rule.get("updated_at"):
+                compiled[rule_id] = previous
+                continue
+            try:
+                compiled_rule = CompiledRule(rule, max_groups=self.max_groups)
+            except (ValueError, KeyError, TypeError) as e:
+                errors[rule_id] = str(e)
+                continue
+            compiled[rule_id] = compiled_rule
+        self._rules = compiled
+        self.load_errors = errors
+        self._by_type = {
+            record_type: tuple(r for r in compiled.values() if r.record_type in (record_type, "any"))
+            for record_type in ("log", "suricata_event")
+        }
+
+    def evaluate(
+        self,
+        record_type: str,
+        record: Dict[str, Any],
+        record_id: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> List[Tuple[CompiledRule, Dict[str, Any]]]:
+        """Run a record through the rules of its type and return the firings."""
+        rules = self._by_type.get(record_type)
+        if not rules:
+            return []
+        now = time.time() if now is None else now
+        firings = []
+        for rule in rules:
+            firing = rule.evaluate(record, record_id, now)
+            if firing is not None:
+                firings.append((rule, firing))
+        return firings
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-rule statistics, most expensive first."""
+        rules = sorted((rule.stats() for rule in self._rules.values()), key=lambda s: s["total_cost_ms"], reverse=True)
+        return {
+            "rules": len(self._rules),
+            "total_cost_ms": sum(s["total_cost_ms"] for s in rules),
+            "load_errors": self.load_errors,
+            "per_rule": rules,
+        }
+
+
+# Global engine instance
+_rule_engine: Optional[RuleEngine] = None
+
+
+def get_rule_engine() -> RuleEngine:
+    """Get or create the global rule engine."""
+    global _rule_engine
+    if _rule_engine is None:
+        _rule_engine = RuleEngine(max_groups=int(os.getenv("ALERT_RULES_MAX_GROUPS", "10000")))
+    return _rule_engine
@@ -0,0 +1,497 @@
+"""
+Sigma rule compilation and candidate indexing.
+
+A Sigma rule's detection section is compiled into plain Python closures:
+
+- Every field condition becomes one matcher. Plain equality values go into
+  a frozenset of lowercased strings. Wildcard, contains, startswith and
+  endswith values are merged into one compiled regex per field. The re,
+  cidr, gt/gte/lt/lte and exists modifiers have dedicated matchers; re
+  patterns get the same limits as alert rule regex conditions (see
+  rule_engine).
+- The condition expression (and / or / not, parentheses, "1 of x*",
+  "all of them") is parsed once into nested closures.
+
+While compiling, each rule also works out the fields an event must carry
+for it to match at all (its required fields). SigmaIndex buckets rules by
+one logsource value and by their most selective required field. A log is
+tested only against the rules in buckets its logsource tokens and fields
+select, plus the few rules that have no requirement.
+
+Logs are matched on a flat view of the log. It holds the top-level fields
+(source, log_type, severity, message) and the metadata keys, with nested
+metadata flattened into dotted names. Keyword selections search the
+message. The logsource product, service and category are matched against
+the log's source, log_type and metadata product/service/category.
+"""
+import fnmatch
+import ipaddress
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import yaml
+
+from app.utils.rule_engine import check_regex, regex_max_input
+
+LEVEL_SEVERITY = {
+    "informational": "low",
+    "low": "low",
+    "medium": "medium",
+    "high": "high",
+    "critical": "critical",
+}
+
+SUPPORTED_MODIFIERS = frozenset(("contains", "startswith", "endswith", "all", "re", "cidr", "gt", "gte", "lt", "lte", "exists"))
+
+_LOGSOURCE_KEYS = ("service", "category", "product")
+_RESERVED_DETECTION_KEYS = ("condition", "timeframe")
+
+
+class SigmaError(ValueError):
+    """A Sigma rule that cannot be parsed or compiled."""
+
+
+class SigmaEvent:
+    """A log flattened for matching, with lowercased string values."""
+    __slots__ = ("values", "lower", "logsource")
+
+    def __init__(self, log: Dict[str, Any]):
+        values: Dict[str, Any] = {}
+        _flatten("", log.get("metadata") or {}, values)
+        for field in ("source", "log_type", "severity", "message"):
+            if log.get(field) is not None:
+                values[field] = log[field]
+        self.values = values
+        self.lower = {
+            field: (value.lower() if isinstance(value, str) else str(value).lower())
+            for field, value in values.items()
+            if value is not None and not isinstance(value, (dict, list))
+        }
+        metadata = log.get("metadata") or {}
+        self.logsource = frozenset(
+            str(value).lower()
+            for value in (log.get("source"), log.get("log_type"), metadata.get("product"),
+                          metadata.get("service"), metadata.get("category"))
+            if value
+        )
+
+
+def _flatten(prefix: str, value: Dict[str, Any], out: Dict[str, Any]):
+    for key, item in value.items():
+        name = f"{prefix}{key}"
+        if isinstance(item, dict):
+            _flatten(f"{name}.", item, out)
+        else:
+            out[name] = item
+
+
+Matcher = Callable[[SigmaEvent], bool]
+
+
+def _wildcard_pattern(value: str) -> Tuple[str, bool]:
+    """Translate a Sigma string (``*``, ``?``, backslash escapes) to a regex body."""
+    parts = []
+    has_wildcard = False
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char == "\\" and i + 1 < len(value) and value[i + 1] in "*?\\":
+            parts.append(re.escape(value[i + 1]))
+            i += 2
+            continue
+        if char == "*":
+            parts.append(".*")
+            has_wildcard = True
+        elif char == "?":
+            parts.append(".")
+            has_wildcard = True
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return "".join(parts), has_wildcard
+
+
+def _string_matcher(field: str, values: List[Any], mode: str, match_all: bool) -> Matcher:
+    """Matcher for (wildcard) string values with contains / startswith / endswith / equality."""
+    exact = set()
+    fragments = []
+    for value in values:
+        text = str(value).lower()
+        body, has_wildcard = _wildcard_pattern(text)
+        if mode == "eq" and not has_wildcard:
+            exact.add(text)
+        elif mode == "contains":
+            fragments.append(f"(?:{body})")
+        elif mode == "startswith":
+            fragments.append(f"\\A(?:{body})")
+        elif mode == "endswith":
+            fragments.append(f"(?:{body})\\Z")
+        else:
+            fragments.append(f"\\A(?:{body})\\Z")
+
+    if match_all:
+        checks: List[Callable[[str], bool]] = [lambda s, v=v: s == v for v in exact]
+        checks.extend(re.compile(f, re.DOTALL).search for f in fragments)
+
+        def all_match(event: SigmaEvent) -> bool:
+            actual = event.lower.get(field)
+            return actual is not None and all(check(actual) for check in checks)
+        return all_match
+
+    exact_set = frozenset(exact)
+    regex = re.compile("|".join(fragments), re.DOTALL) if fragments else None
+    if regex is None:
+        return lambda event: event.lower.get(field) in exact_set
+    if not exact_set:
+        def regex_match(event: SigmaEvent) -> bool:
+            actual = event.lower.get(field)
+            return actual is not None and regex.search(actual) is not None
+        return regex_match
+
+    def any_match(event: SigmaEvent) -> bool:
+        actual = event.lower.get(field)
+        return actual is not None and (actual in exact_set or regex.search(actual) is not None)
+    return any_match
+
+
+def _compile_field(spec: str, raw_values: Any) -> Tuple[Matcher, Optional[str]]:
+    """
+    Compile one ``field|modifier...: value(s)`` condition.
+
+    Returns:
+        (matcher, field the event must have, or None if the condition can match without it)
+    """
+    field, *modifiers = spec.split("|")
+    unknown = [m for m in modifiers if m not in SUPPORTED_MODIFIERS]
+    if unknown:
+        raise SigmaError(f"Unsupported modifier(s) on {field}: {', '.join(unknown)}")
+    mods = set(modifiers)
+    values = raw_values if isinstance(raw_values, list) else [raw_values]
+    match_all = "all" in mods
+
+    if "exists" in mods:
+        wanted = bool(values[0])
+        return (lambda event: (event.values.get(field) is not None) == wanted), (field if wanted else None)
+
+    nullable = any(v is None for v in values)
+    values = [v for v in values if v is not None]
+    if not values:
+        return (lambda event: event.values.get(field) is None), None
+
+    if "re" in mods:
+        try:
+            for v in values:
+                check_regex(field, str(v))
+            patterns = [re.compile(str(v)) for v in values]
+        except re.error as e:
+            raise SigmaError(f"Invalid regex on {field}: {e}")
+        except ValueError as e:
+            raise SigmaError(str(e))
+        combine = all if match_all else any
+        max_input = regex_max_input()
+
+        def regex_match(event: SigmaEvent) -> bool:
+            actual = event.values.get(field)
+            return actual is not None and combine(p.search(str(actual), 0, max_input) is not None for p in patterns)
+        matcher: Matcher = regex_match
+    elif "cidr" in mods:
+        try:
+            networks = [ipaddress.ip_network(str(v), strict=False) for v in values]
+        except ValueError as e:
+            raise SigmaError(f"Invalid CIDR on {field}: {e}")
+
+        def cidr_match(event: SigmaEvent) -> bool:
+            try:
+                address = ipaddress.ip_address(str(event.values.get(field)))
+            except ValueError:
+                return False
+            return any(address.version == n.version and address in n for n in networks)
+        matcher = cidr_match
+    elif mods & {"gt", "gte", "lt", "lte"}:
+        op = next(m for m in ("gt", "gte", "lt", "lte") if m in mods)
+        try:
+            bound = float(values[0])
+        except (TypeError, ValueError):
+            raise SigmaError(f"'{op}' on {field} needs a number")
+        compare = {"gt": float.__gt__, "gte": float.__ge__, "lt": float.__lt__, "lte": float.__le__}[op]
+
+        def numeric_match(event: SigmaEvent) -> bool:
+            try:
+                return compare(float(event.values.get(field)), bound)
+            except (TypeError, ValueError):
+                return False
+        matcher = numeric_match
+    else:
+        mode = next((m for m in ("contains", "startswith", "endswith") if m in mods), "eq")
+        matcher = _string_matcher(field, values, mode, match_all)
+
+    if nullable:
+        return (lambda event: event.values.get(field) is None or matcher(event)), None
+    return matcher, field
+
+
+def _compile_keywords(values: List[Any]) -> Tuple[Matcher, FrozenSet[str]]:
+    """Keyword selections: any keyword contained in the message."""
+    matcher = _string_matcher("message", values, "contains", False)
+    return matcher, frozenset(("message",))
+
+
+def _compile_selection(name: str, selection: Any) -> Tuple[Matcher, FrozenSet[str]]:
+    """Compile a named selection into (matcher, required fields)."""
+    if isinstance(selection, dict):
+        compiled = [_compile_field(str(spec), values) for spec, values in selection.items()]
+        matchers = tuple(m for m, _ in compiled)
+        required = frozenset(f for _, f in compiled if f)
+        if len(matchers) == 1:
+            return matchers[0], required
+        return (lambda event: all(m(event) for m in matchers)), required
+    if isinstance(selection, list):
+        if selection and all(isinstance(item, dict) for item in selection):
+            compiled = [_compile_selection(name, item) for item in selection]
+            matchers = tuple(m for m, _ in compiled)
+            required = frozenset.intersection(*(r for _, r in compiled))
+            return (lambda event: any(m(event) for m in matchers)), required
+        if all(not isinstance(item, (dict, list)) for item in selection):
+            return _compile_keywords(selection)
+    if isinstance(selection, (str, int, float)):
+        return _compile_keywords([selection])
+    raise SigmaError(f"Unsupported selection '{name}'")
+
+
+_TOKEN = re.compile(r"\s*(\(|\)|[^\s()]+)")
+
+
+class _ConditionParser:
+    """Recursive-descent parser for Sigma condition expressions."""
+
+    def __init__(self, condition: str, selections: Dict[str, Tuple[Matcher, FrozenSet[str]]]):
+        if "|" in condition:
+            raise SigmaError("Aggregation conditions (| count() ...) are not supported")
+        self.tokens = _TOKEN.findall(condition)
+        self.pos = 0
+        self.selections = selections
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _take(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise SigmaError("Unexpected end of condition")
+        self.pos += 1
+        return token
+
+    def parse(self) -> Tuple[Matcher, FrozenSet[str]]:
+        result = self._or()
+        if self._peek() is not None:
+            raise SigmaError(f"Unexpected '{self._peek()}' in condition")
+        return result
+
+    def _or(self):
+        parts = [self._and()]
+        while self._peek() is not None and self._peek().lower() == "or":
+            self._take()
+            parts.append(self._and())
+        if len(parts) == 1:
+            return parts[0]
+        matchers = tuple(m for m, _ in parts)
+        return (lambda event: any(m(event) for m in matchers)), frozenset.intersection(*(r for _, r in parts))
+
+    def _and(self):
+        parts = [self._not()]
+        while self._peek() is not None and self._peek().lower() == "and":
+            self._take()
+            parts.append(self._not())
+        if len(parts) == 1:
+            return parts[0]
+        matchers = tuple(m for m, _ in parts)
+        return (lambda event: all(m(event) for m in matchers)), frozenset().union(*(r for _, r in parts))
+
+    def _not(self):
+        if self._peek() is not None and self._peek().lower() == "not":
+            self._take()
+            inner, _ = self._not()
+            return (lambda event: not inner(event)), frozenset()
+        return self._atom()
+
+    def _atom(self):
+        token = self._take()
+        if token == "(":
+            result = self._or()
+            if self._take() != ")":
+                raise SigmaError("Missing ')' in condition")
+            return result
+        if token.lower() in ("1", "any", "all") and self._peek() is not None and self._peek().lower() == "of":
+            self._take()
+            target = self._take()
+            if target.lower() == "them":
+                names = [name for name in self.selections if not name.startswith("_")]
+            else:
+                names = [name for name in self.selections if fnmatch.fnmatchcase(name, target)]
+            if not names:
+                raise SigmaError(f"No selections match '{target}'")
+            parts = [self.selections[name] for name in names]
+            matchers = tuple(m for m, _ in parts)
+            if token.lower() == "all":
+                return (lambda event: all(m(event) for m in matchers)), frozenset().union(*(r for _, r in parts))
+            return (lambda event: any(m(event) for m in matchers)), frozenset.intersection(*(r for _, r in parts))
+        if token not in self.selections:
+            raise SigmaError(f"Unknown selection '{token}' in condition")
+        return self.selections[token]
+
+
+class SigmaRule:
+    """A compiled Sigma rule."""
+    __slots__ = ("key", "sigma_id", "title", "description", "level", "severity", "tags",
+                 "logsource", "index_source", "required", "match", "version", "matches")
+
+    def __init__(self, document: Dict[str, Any], key: Optional[str] = None, version: Any = None):
+        """
+        Compile a parsed Sigma rule.
+
+        Raises:
+            SigmaError: If the rule uses unsupported syntax
+        """
+        if not isinstance(document, dict):
+            raise SigmaError("A Sigma rule must be a mapping")
+        detection = document.get("detection")
+        if not isinstance(detection, dict) or "condition" not in detection:
+            raise SigmaError("Rule has no detection condition")
+        title = document.get("title")
+        if not title:
+            raise SigmaError("Rule has no title")
+
+        self.key = key
+        self.version = version
+        self.sigma_id = document.get("id")
+        self.title = str(title)
+        self.description = document.get("description")
+        self.level = str(document.get("level") or "medium").lower()
+        self.severity = LEVEL_SEVERITY.get(self.level, "medium")
+        self.tags = list(document.get("tags") or [])
+        self.matches = 0
+
+        logsource = document.get("logsource") or {}
+        self.logsource = frozenset(str(logsource[k]).lower() for k in _LOGSOURCE_KEYS if logsource.get(k))
+        self.index_source = next((str(logsource[k]).lower() for k in _LOGSOURCE_KEYS if logsource.get(k)), None)
+
+        selections = {
+            str(name): _compile_selection(str(name), selection)
+            for name, selection in detection.items()
+            if name not in _RESERVED_DETECTION_KEYS
+        }
+        conditions = detection["condition"]
+        if isinstance(conditions, str):
+            conditions = [conditions]
+        compiled = [_ConditionParser(str(c), selections).parse() for c in conditions]
+        if len(compiled) == 1:
+            self.match, self.required = compiled[0]
+        else:
+            matchers = tuple(m for m, _ in compiled)
+            self.match = lambda event: any(m(event) for m in matchers)
+            self.required = frozenset.intersection(*(r for _, r in compiled))
+
+
+def parse_sigma_yaml(text: str) -> List[Dict[str, Any]]:
+    """
+    Parse one or more Sigma rules from YAML (documents separated by ``---``).
+
+    Raises:
+        SigmaError: If the YAML is invalid
+    """
+    try:
+        return [doc for doc in yaml.safe_load_all(text) if doc is not None]
+    except yaml.YAMLError as e:
+        raise SigmaError(f"Invalid YAML: {e}")
+
+
+class SigmaIndex:
+    """Compiled Sigma rules bucketed by logsource value and required field."""
+
+    def __init__(self):
+        # logsource value (None = any) -> required field (None = none) -> rules
+        self._index: Dict[Optional[str], Dict[Optional[str], List[SigmaRule]]] = {}
+        self.rules: Dict[str, SigmaRule] = {}
+
+        self.events = 0
+        self.candidates = 0
+        self.matched = 0
+        self.cost_ns = 0
+
+    def build(self, rules: Iterable[SigmaRule]):
+        """Replace the indexed rule set."""
+        rules = list(rules)
+        frequency = Counter(field for rule in rules for field in rule.required)
+        index: Dict[Optional[str], Dict[Optional[str], List[SigmaRule]]] = {}
+        for rule in rules:
+            # The least common required field splits the rules most finely
+            field = min(rule.required, key=lambda f: (frequency[f], f)) if rule.required else None
+            index.setdefault(rule.index_source, {}).setdefault(field, []).append(rule)
+        self._index = index
+        self.rules = {rule.key: rule for rule in rules}
+
+    def candidates_for(self, event: SigmaEvent) -> List[SigmaRule]:
+        """Rules whose logsource bucket and required-field bucket the event selects."""
+        found: List[SigmaRule] = []
+        fields = event.values
+        for source in (None, *event.logsource):
+            by_field = self._index.get(source)
+            if by_field is None:
+                continue
+            if len(by_field) <= len(fields):
+                for field, rules in by_field.items():
+                    if field is None or fields.get(field) is not None:
+                        found.extend(rules)
+            else:
+                found.extend(by_field.get(None, ()))
+                for field, value in fields.items():
+                    if value is not None:
+                        found.extend(by_field.get(field, ()))
+        return found
+
+    def match(self, log: Dict[str, Any]) -> List[SigmaRule]:
+        """Rules matching a log."""
+        started = time.perf_counter_ns()
+        event = SigmaEvent(log)
+        candidates = self.candidates_for(event)
+        matched = [
+            rule for rule in candidates
+            if rule.logsource <= event.logsource and rule.match(event)
+        ]
+        for rule in matched:
+            rule.matches += 1
+        self.events += 1
+        self.candidates += len(candidates)
+        self.matched += len(matched)
+        self.cost_ns += time.perf_counter_ns() - started
+        return matched
+
+    def stats(self) -> Dict[str, Any]:
+        """Return rule, bucket and throughput counters."""
+        return {
+            "rules": len(self.rules),
+            "buckets": sum(len(by_field) for by_field in self._index.values()),
+            "events": self.events,
+            "mean_candidates": self.candidates / self.events if self.events else 0.0,
+            "matches": self.matched,
+            "mean_cost_us": self.cost_ns / self.events / 1e3 if self.events else 0.0,
+            "top_rules": sorted(
+                ({"title": r.title, "sigma_id": r.sigma_id, "matches": r.matches} for r in self.rules.values() if r.matches),
+                key=lambda r: r["matches"],
+                reverse=True
+            )[:20],
+        }
+
+
+# Global index instance
+_sigma_index: Optional[SigmaIndex] = None
+
+
+def get_sigma_index() -> SigmaIndex:
+    """Get or create the global Sigma rule index."""
+    global _sigma_index
+    if _sigma_index is None:
+        _sigma_index = SigmaIndex()
+    return _sigma_index
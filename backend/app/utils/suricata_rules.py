@@ -0,0 +1,240 @@
+"""
+Suricata rule parser.
+
+Parses signatures of the form
+
+    action protocol src_addr src_port direction dst_addr dst_port (options)
+
+into the fields the rule store indexes: action and header, sid/gid/rev,
+msg, classtype, priority, references, metadata and content matches, plus
+the full ordered option list. Parsing is syntactic (it does not validate
+keyword semantics the way Suricata does), but it rejects anything Suricata
+would reject for its structure: unknown actions or directions, a malformed
+header, unterminated options, and a missing or non-numeric sid.
+
+RuleStreamParser splits ruleset text that arrives in chunks into rules,
+joining backslash-continued lines and treating ``# alert ...`` lines (as
+shipped in ET Open for disabled rules) as disabled rules.
+"""
+import hashlib
+import re
+from typing import Any, Dict, List, Tuple
+
+ACTIONS = frozenset(("alert", "pass", "drop", "reject", "rejectsrc", "rejectdst", "rejectboth", "config"))
+DIRECTIONS = frozenset(("->", "<>", "=>"))
+
+# name[: value]; where value runs to the first unescaped ';'. The value is
+# matched as an unrolled loop so malformed input cannot backtrack exponentially.
+_OPTION = re.compile(r"\s*([A-Za-z0-9_.\-]+)\s*(?::([^;\\]*(?:\\.[^;\\]*)*))?;")
+_OPTIONS_BODY = re.compile(r"(?:\s*[A-Za-z0-9_.\-]+\s*(?::[^;\\]*(?:\\.[^;\\]*)*)?;)*\s*")
+_UNESCAPE = re.compile(r"\\(.)")
+_INT_OPTIONS = frozenset(("sid", "gid", "rev", "priority"))
+# Options copied into their own fields; the rest are only kept in ``options``
+_INDEXED_OPTIONS = _INT_OPTIONS | {"msg", "classtype", "reference", "metadata", "content"}
+# A commented-out line that looks like a rule ("#alert ..." / "# drop ...")
+_DISABLED_RULE = re.compile(r"#+\s*(?=(?:%s)\s)" % "|".join(sorted(ACTIONS)))
+
+
+# (line number, rule text, enabled, parsed fields)
+ParsedLine = Tuple[int, str, bool, Dict[str, Any]]
+
+
+class SuricataRuleError(ValueError):
+    """A rule that cannot be parsed."""
+
+
+def _unquote(value: str) -> str:
+    """Strip surrounding quotes and undo backslash escapes."""
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        value = value[1:-1]
+    return _UNESCAPE.sub(r"\1", value) if "\\" in value else value
+
+
+def _int_option(name: str, value: str) -> int:
+    if not value.strip().isdigit():
+        raise SuricataRuleError(f"{name} must be a non-negative integer, got {value!r}")
+    return int(value)
+
+
+def _split_header(header: str) -> List[str]:
+    """Split the rule header on whitespace, keeping bracketed address/port lists together."""
+    tokens: List[str] = []
+    depth = 0
+    for part in header.split():
+        if depth:
+            tokens[-1] += part
+        else:
+            tokens.append(part)
+        depth += part.count("[") - part.count("]")
+        if depth < 0:
+            raise SuricataRuleError("Unbalanced ']' in rule header")
+    if depth:
+        raise SuricataRuleError("Unbalanced '[' in rule header")
+    return tokens
+
+
+def _parse_metadata(value: str, metadata: Dict[str, List[str]]):
+    """Fold ``key value, key value`` metadata into key -> values."""
+    for entry in value.split(","):
+        key, _, entry_value = entry.strip().partition(" ")
+        if not key:
+            continue
+        if "." in key or key[0] == "$":
+            # Stored as document field names, which must not contain '.' or start with '$'
+            key = key.replace(".", "_").lstrip("$") or "_"
+        metadata.setdefault(key, []).append(entry_value.strip())
+
+
+def parse_rule(text: str) -> Dict[str, Any]:
+    """
+    Parse a single Suricata rule.
+
+    Args:
+        text: The rule (continuation lines already joined)
+
+    Returns:
+        Parsed fields: action, protocol, src_addr, src_port, direction,
+        dst_addr, dst_port, sid, gid, rev, msg, classtype, priority,
+        references, metadata, contents and options (ordered (name, value)
+        pairs, value "" for options without one)
+
+    Raises:
+        SuricataRuleError: If the rule is malformed
+    """
+    text = text.strip()
+    open_paren = text.find("(")
+    if open_paren < 0 or not text.endswith(")"):
+        raise SuricataRuleError("Rule options must be enclosed in parentheses")
+
+    header = _split_header(text[:open_paren])
+    if not header or header[0] not in ACTIONS:
+        raise SuricataRuleError(f"Unknown rule action: {header[0] if header else ''!r}")
+    if len(header) != 7:
+        raise SuricataRuleError(f"Rule header needs 7 fields (action protocol src sport dir dst dport), got {len(header)}")
+    action, protocol, src_addr, src_port, direction, dst_addr, dst_port = header
+    if direction not in DIRECTIONS:
+        raise SuricataRuleError(f"Unknown rule direction: {direction!r}")
+
+    body = text[open_paren + 1:-1]
+    if body.strip() and not body.rstrip().endswith(";"):
+        # The last option's ';' is optional
+        body = body.rstrip() + ";"
+    if _OPTIONS_BODY.fullmatch(body) is None:
+        # Locate the first option that does not parse
+        position = 0
+        match = _OPTION.match(body)
+        while match is not None:
+            position = match.end()
+            match = _OPTION.match(body, position)
+        raise SuricataRuleError(f"Malformed rule option near {body[position:position + 40].strip()!r}")
+    # Flag options (no value) have an empty value
+    options: List[Tuple[str, str]] = [(name, value.strip()) for name, value in _OPTION.findall(body)]
+
+    rule: Dict[str, Any] = {
+        "action": action,
+        "protocol": protocol,
+        "src_addr": src_addr,
+        "src_port": src_port,
+        "direction": direction,
+        "dst_addr": dst_addr,
+        "dst_port": dst_port,
+        "sid": None,
+        "gid": 1,
+        "rev": 1,
+        "msg": None,
+        "classtype": None,
+        "priority": None,
+        "references": [],
+        "metadata": {},
+        "contents": [],
+        "options": options,
+    }
+    for name, value in options:
+        if name not in _INDEXED_OPTIONS:
+            continue
+        if name in _INT_OPTIONS:
+            rule[name] = _int_option(name, value)
+        elif name == "msg":
+            rule["msg"] = _unquote(value)
+        elif name == "classtype":
+            rule["classtype"] = value or None
+        elif name == "reference" and value:
+            rule["references"].append(value)
+        elif name == "metadata" and value:
+            _parse_metadata(value, rule["metadata"])
+        elif name == "content":
+            if not value:
+                raise SuricataRuleError("content needs a value")
+            rule["contents"].append(value[0] + _unquote(value[1:]) if value.startswith("!") else _unquote(value))
+    if rule["sid"] is None:
+        raise SuricataRuleError("Rule has no sid")
+    return rule
+
+
+def rule_hash(text: str, enabled: bool) -> str:
+    """Hash of a rule's text and state, used to skip unchanged rules on re-import."""
+    return hashlib.sha1(f"{int(enabled)}{text}".encode("utf-8")).hexdigest()
+
+
+class RuleStreamParser:
+    """Incremental ruleset parser fed text chunks of any size."""
+
+    def __init__(self):
+        self._partial = ""
+        self._continued: List[str] = []
+        self._continued_from = 0
+        self.line_number = 0
+
+    def feed(self, text: str) -> Tuple[List[ParsedLine], List[Dict[str, Any]]]:
+        """
+        Parse the complete lines in ``text``; a trailing partial line waits for the next chunk.
+
+        Returns:
+            (parsed rules as (line number, rule text, enabled, fields) tuples,
+            parse errors as {"line", "error", "rule"} dicts)
+        """
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self) -> Tuple[List[ParsedLine], List[Dict[str, Any]]]:
+        """Parse whatever is left after the last chunk."""
+        lines = [self._partial]
+        self._partial = ""
+        if self._continued:
+            # A dangling continuation ends the last rule
+            lines.append("")
+        return self._parse_lines(lines)
+
+    def _parse_lines(self, lines: List[str]) -> Tuple[List[ParsedLine], List[Dict[str, Any]]]:
+        rules: List[ParsedLine] = []
+        errors: List[Dict[str, Any]] = []
+        for line in lines:
+            self.line_number += 1
+            stripped = line.strip()
+            if stripped.endswith("\\"):
+                if not self._continued:
+                    self._continued_from = self.line_number
+                self._continued.append(stripped[:-1])
+                continue
+            line_number = self.line_number
+            if self._continued:
+                stripped = " ".join(self._continued + [stripped]).strip()
+                self._continued = []
+                line_number = self._continued_from
+            if not stripped:
+                continue
+            enabled = True
+            if stripped.startswith("#"):
+                match = _DISABLED_RULE.match(stripped)
+                if match is None:
+                    continue
+                stripped = stripped[match.end():]
+                enabled = False
+            try:
+                rules.append((line_number, stripped, enabled, parse_rule(stripped)))
+            except SuricataRuleError as e:
+                # Commented-out text that only resembles a rule is just a comment
+                if enabled:
+                    errors.append({"line": line_number, "error": str(e), "rule": stripped[:200]})
+        return rules, errors
@@ -0,0 +1,185 @@
+"""
+Pure-NumPy evaluator for fitted sklearn tree ensembles.
+
+sklearn's per-call overhead (input validation, joblib dispatch over trees,
+per-tree Python calls) dominates latency for small batches. compile_tree_model
+flattens every tree's ``tree_`` arrays into one set of contiguous node tables
+and evaluates a whole batch level by level with vectorized gathers, visiting
+all trees at once.
+
+Supported: DecisionTreeClassifier, RandomForestClassifier,
+ExtraTreesClassifier and GradientBoostingClassifier with single-output
+targets. Anything else returns None and callers keep using the native model.
+"""
+from typing import Any, List, Optional
+
+import numpy as np
+from scipy.special import expit, softmax
+from sklearn.ensemble import ExtraTreesClassifier, GradientBoostingClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+_LEAF = -1
+
+
+class CompiledTreeEnsemble:
+    """Flattened node tables for a tree ensemble with predict/predict_proba."""
+
+    def __init__(
+        self,
+        trees: List[Any],
+        classes: np.ndarray,
+        n_features: int,
+        kind: str,
+        tree_outputs: Optional[np.ndarray] = None,
+        init_raw: Optional[np.ndarray] = None,
+        learning_rate: float = 1.0,
+        exponential_loss: bool = False
+    ):
+        """
+        Build node tables from sklearn ``Tree`` objects.
+
+        Args:
+            trees: Fitted ``tree_`` objects
+            classes: Class labels of the estimator
+            n_features: Number of input features
+            kind: "average" (forests, averaged class probabilities) or
+                "boosting" (gradient boosting, summed raw scores)
+            tree_outputs: For boosting, the raw-score column each tree adds to
+            init_raw: For boosting, the constant initial raw score
+            learning_rate: For boosting, the shrinkage applied to each tree
+            exponential_loss: For boosting, use the exponential-loss link
+        """
+        self.classes_ = classes
+        self.n_features_in_ = n_features
+        self.kind = kind
+        self.n_trees = len(trees)
+        self.learning_rate = learning_rate
+        self.exponential_loss = exponential_loss
+        self.init_raw = init_raw
+        self.tree_outputs = tree_outputs
+
+        node_counts = np.array([tree.node_count for tree in trees], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(node_counts)[:-1]])
+        self.roots = offsets.astype(np.intp)
+        self.max_depth = int(max(tree.max_depth for tree in trees))
+
+        feature, threshold, right, values = [], [], [], []
+        for tree, offset in zip(trees, offsets):
+            is_leaf = tree.children_left == _LEAF
+            node_ids = np.arange(tree.node_count)
+            # sklearn builds trees depth-first, so a left child always
+            # directly follows its parent and only right children are stored
+            if not np.array_equal(tree.children_left[~is_leaf], node_ids[~is_leaf] + 1):
+                raise ValueError("Unsupported tree layout")
+            # Leaves compare false against -inf and point right at
+            # themselves, so extra traversal levels are no-ops
+            right.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, -np.inf, tree.threshold))
+
+            if kind == "average":
+                value = tree.value[:, 0, :].astype(np.float64)
+                normalizer = value.sum(axis=1, keepdims=True)
+                normalizer[normalizer == 0.0] = 1.0
+                values.append(value / normalizer)
+            else:
+                values.append(tree.value[:, 0, 0].astype(np.float64))
+
+        self.feature = np.ascontiguousarray(np.concatenate(feature), dtype=np.intp)
+        self.threshold = np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64)
+        self.right = np.ascontiguousarray(np.concatenate(right), dtype=np.intp)
+        self.values = np.ascontiguousarray(np.concatenate(values))
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the global leaf index reached in every tree, shape (n_samples, n_trees)."""
+        # sklearn evaluates trees on float32 input against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        flat = X.ravel()
+        row_offsets = (np.arange(X.shape[0], dtype=np.intp) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees)).copy()
+
+        for _ in range(self.max_depth):
+            thresholds = self.threshold.take(nodes)
+            if np.isneginf(thresholds).all():
+                break  # every tree has reached a leaf
+            go_left = flat.take(row_offsets + self.feature.take(nodes)) <= thresholds
+            nodes = np.where(go_left, nodes + 1, self.right.take(nodes))
+        return nodes
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Class probabilities, matching the native estimator."""
+        leaves = self.apply(X)
+
+        if self.kind == "average":
+            return self.values[leaves].sum(axis=1) / self.n_trees
+
+        contributions = self.values[leaves] * self.learning_rate
+        raw = np.tile(self.init_raw, (leaves.shape[0], 1))
+        for column in range(raw.shape[1]):
+            raw[:, column] += contributions[:, self.tree_outputs == column].sum(axis=1)
+
+        if raw.shape[1] == 1:
+            positive = expit(2.0 * raw[:, 0] if self.exponential_loss else raw[:, 0])
+            return np.column_stack([1.0 - positive, positive])
+        return softmax(raw, axis=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Predicted class labels."""
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def _is_single_output(model: Any) -> bool:
+    """Check that a model predicts a single target."""
+    return getattr(model, "n_outputs_", 1) == 1
+
+
+def compile_tree_model(model: Any) -> Optional[CompiledTreeEnsemble]:
+    """
+    Compile a fitted sklearn tree model into node tables.
+
+    Returns:
+        CompiledTreeEnsemble, or None if the model type or configuration is
+        not supported
+    """
+    if not hasattr(model, "n_features_in_") or not _is_single_output(model):
+        return None
+    n_features = int(model.n_features_in_)
+
+    try:
+        return _compile(model, n_features)
+    except ValueError:
+        return None
+
+
+def _compile(model: Any, n_features: int) -> Optional[CompiledTreeEnsemble]:
+    """Build node tables for a supported estimator type."""
+    if isinstance(model, DecisionTreeClassifier):
+        return CompiledTreeEnsemble([model.tree_], model.classes_, n_features, kind="average")
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        return CompiledTreeEnsemble(trees, model.classes_, n_features, kind="average")
+
+    if isinstance(model, GradientBoostingClassifier):
+        init = getattr(model, "init_", None)
+        if init != "zero" and type(init).__name__ != "DummyClassifier":
+            # A custom init estimator makes the initial score input-dependent
+            return None
+
+        # With a prior or zero init the initial raw score is the same for every row
+        init_raw = model._raw_predict_init(np.zeros((1, n_features), dtype=np.float32))[0]
+        estimators = model.estimators_
+        trees = [estimators[i, k].tree_ for i in range(estimators.shape[0]) for k in range(estimators.shape[1])]
+        tree_outputs = np.tile(np.arange(estimators.shape[1]), estimators.shape[0])
+        return CompiledTreeEnsemble(
+            trees,
+            model.classes_,
+            n_features,
+            kind="boosting",
+            tree_outputs=tree_outputs,
+            init_raw=np.asarray(init_raw, dtype=np.float64),
+            learning_rate=float(model.learning_rate),
+            exponential_loss=getattr(model, "loss", None) == "exponential"
+        )
+
+    return None
@@ -0,0 +1,83 @@
+"""
+Benchmark Sigma matching throughput with the candidate index against a full scan.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sigma_matcher
+"""
+import random
+import time
+
+from app.utils.sigma import SigmaEvent, SigmaIndex, SigmaRule
+
+RULE_COUNTS = (1000, 5000)
+N_LOGS = 20000
+SERVICES = [f"svc{i}" for i in range(25)]
+FIELDS = [f"field{i}" for i in range(300)]
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+
+
+def _make_rule(rng: random.Random, number: int) -> SigmaRule:
+    """A synthetic rule: two selections over random fields, mixed modifiers."""
+    fields = rng.sample(FIELDS, 3)
+    selection = {
+        f"{fields[0]}|contains": [rng.choice(WORDS) for _ in range(2)] + [f"-{rng.randint(0, 20)}"],
+        fields[1]: [f"{rng.choice(WORDS)}-{rng.randint(0, 20)}", f"{rng.choice(WORDS)}*"],
+    }
+    document = {
+        "title": f"rule {number}",
+        "level": rng.choice(["low", "medium", "high"]),
+        "logsource": {"service": rng.choice(SERVICES)} if rng.random() < 0.9 else {"product": "linux"},
+        "detection": {
+            "selection": selection,
+            "filter": {f"{fields[2]}|startswith": "internal"},
+            "condition": "selection and not filter",
+        },
+    }
+    return SigmaRule(document, key=str(number))
+
+
+def _make_log(rng: random.Random) -> dict:
+    fields = rng.sample(FIELDS, 12)
+    return {
+        "source": rng.choice(SERVICES),
+        "log_type": "linux",
+        "severity": "info",
+        "message": " ".join(rng.choices(WORDS, k=8)),
+        "metadata": {field: f"{rng.choice(WORDS)}-{rng.randint(0, 20)}" for field in fields},
+    }
+
+
+def _full_scan(rules, log):
+    event = SigmaEvent(log)
+    return [rule for rule in rules if rule.logsource <= event.logsource and rule.match(event)]
+
+
+def main():
+    rng = random.Random(0)
+    logs = [_make_log(rng) for _ in range(N_LOGS)]
+
+    print(f"{'rules':>6}{'compile s':>11}{'scan logs/s':>14}{'indexed logs/s':>16}{'candidates':>12}{'matches':>9}{'speedup':>9}")
+    for count in RULE_COUNTS:
+        started = time.perf_counter()
+        rules = [_make_rule(rng, number) for number in range(count)]
+        index = SigmaIndex()
+        index.build(rules)
+        compile_seconds = time.perf_counter() - started
+
+        sample = logs[:2000]
+        started = time.perf_counter()
+        scan_matches = [len(_full_scan(rules, log)) for log in sample]
+        scan_rate = len(sample) / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        indexed_matches = [len(index.match(log)) for log in logs]
+        indexed_rate = len(logs) / (time.perf_counter() - started)
+        assert indexed_matches[:len(sample)] == scan_matches
+
+        mean_candidates = index.stats()["mean_candidates"]
+        print(f"{count:>6}{compile_seconds:>11.2f}{scan_rate:>14.0f}{indexed_rate:>16.0f}"
+              f"{mean_candidates:>12.1f}{sum(indexed_matches):>9}{indexed_rate / scan_rate:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
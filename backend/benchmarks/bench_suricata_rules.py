@@ -0,0 +1,67 @@
+"""
+Benchmark Suricata ruleset parsing at ET Open scale.
+
+Generates a synthetic 40k-rule ruleset shaped like ET Open (a tenth of it
+commented out), gzips it and times streaming it through the parser in
+1 MB chunks, the way POST /suricata/rules/import reads uploads.
+
+Run from the backend directory:
+    python -m benchmarks.bench_suricata_rules
+"""
+import gzip
+import random
+import time
+import zlib
+
+from app.utils.suricata_rules import RuleStreamParser
+
+N_RULES = 40000
+CHUNK_BYTES = 1024 * 1024
+CLASSTYPES = ["trojan-activity", "policy-violation", "bad-unknown", "attempted-admin", "web-application-attack"]
+PROTOCOLS = ["tcp", "udp", "http", "dns", "tls"]
+WORDS = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+
+
+def _make_rule(rng: random.Random, sid: int) -> str:
+    words = " ".join(rng.choice(WORDS) for _ in range(4))
+    contents = "".join(
+        f'content:"{rng.choice(WORDS)}|{rng.randint(0, 255):02x}|"; nocase; distance:0; '
+        for _ in range(rng.randint(1, 4))
+    )
+    rule = (
+        f"alert {rng.choice(PROTOCOLS)} $HOME_NET any -> $EXTERNAL_NET [80,443,8080] "
+        f'(msg:"ET MALWARE {words}"; flow:established,to_server; {contents}'
+        f"reference:url,example.com/{sid}; classtype:{rng.choice(CLASSTYPES)}; sid:{sid}; rev:{rng.randint(1, 9)}; "
+        "metadata:affected_product Windows_XP_Vista_7_8_10_Server_32_64_Bit, attack_target Client_Endpoint, "
+        "created_at 2019_01_01, deployment Perimeter, signature_severity Major, updated_at 2024_06_01;)"
+    )
+    return f"# {rule}" if rng.random() < 0.1 else rule
+
+
+def main():
+    rng = random.Random(7)
+    lines = ["# Synthetic ruleset", ""]
+    lines.extend(_make_rule(rng, 2000000 + i) for i in range(N_RULES))
+    text = "\n".join(lines) + "\n"
+    compressed = gzip.compress(text.encode("utf-8"))
+    print(f"{N_RULES} rules, {len(text) / 1e6:.1f} MB text, {len(compressed) / 1e6:.1f} MB gzipped")
+
+    started = time.perf_counter()
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    parser = RuleStreamParser()
+    parsed = errors = disabled = 0
+    for offset in range(0, len(compressed), CHUNK_BYTES):
+        data = decompressor.decompress(compressed[offset:offset + CHUNK_BYTES])
+        rules, parse_errors = parser.feed(data.decode("utf-8"))
+        parsed += len(rules)
+        disabled += sum(1 for rule in rules if not rule[2])
+        errors += len(parse_errors)
+    rules, parse_errors = parser.close()
+    parsed += len(rules)
+    errors += len(parse_errors)
+    elapsed = time.perf_counter() - started
+    print(f"parsed={parsed} disabled={disabled} errors={errors} in {elapsed:.2f}s ({parsed / elapsed:,.0f} rules/s)")
+
+
+if __name__ == "__main__":
+    main()
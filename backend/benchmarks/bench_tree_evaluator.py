@@ -0,0 +1,57 @@
+"""
+Benchmark the compiled NumPy tree evaluator against native predict_proba.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tree_evaluator
+"""
+import time
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+from app.utils.tree_compiler import compile_tree_model
+
+BATCH_SIZES = (1, 64, 4096)
+N_FEATURES = 12
+
+
+def _time_per_call(fn, X, min_seconds: float = 0.5) -> float:
+    """Average wall time of fn(X) in seconds over at least min_seconds."""
+    fn(X)  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn(X)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main():
+    rng = np.random.default_rng(0)
+    X_train = rng.random((20000, N_FEATURES), dtype=np.float32)
+    y_train = (X_train[:, 0] + X_train[:, 1] * X_train[:, 2] > 0.7).astype(int)
+
+    models = {
+        "RandomForest(100, max_depth=12)": RandomForestClassifier(n_estimators=100, max_depth=12, random_state=0),
+        "RandomForest(100, unbounded)": RandomForestClassifier(n_estimators=100, random_state=0),
+        "GradientBoosting(100)": GradientBoostingClassifier(n_estimators=100, random_state=0),
+    }
+
+    print(f"{'model':<34}{'batch':>7}{'native ms':>12}{'compiled ms':>13}{'speedup':>9}")
+    for label, model in models.items():
+        model.fit(X_train, y_train)
+        compiled = compile_tree_model(model)
+
+        for batch_size in BATCH_SIZES:
+            X = rng.random((batch_size, N_FEATURES), dtype=np.float32)
+            assert np.allclose(model.predict_proba(X), compiled.predict_proba(X), rtol=0, atol=1e-9)
+
+            native = _time_per_call(model.predict_proba, X)
+            fast = _time_per_call(compiled.predict_proba, X)
+            print(f"{label:<34}{batch_size:>7}{native * 1e3:>12.3f}{fast * 1e3:>13.3f}{native / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
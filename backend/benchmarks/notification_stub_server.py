@@ -0,0 +1,103 @@
+"""
+Stub notification destination for exercising the alert notification dispatcher.
+
+Accepts POSTed alert batches, optionally failing a share of them or
+answering slowly, and prints what it received every few seconds. Run from
+the backend directory:
+    python -m benchmarks.notification_stub_server --port 9099 --fail-rate 0.2
+
+then start the API with
+    NOTIFY_DESTINATIONS=stub=http://127.0.0.1:9099/alerts
+
+and watch GET /api/alerts/notifications/stats. --down-seconds makes the
+stub refuse every request for a while after startup, which opens the
+destination's circuit breaker and shows it recover.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+        self.alerts = 0
+        self.alert_ids = set()
+
+
+def _make_handler(args: argparse.Namespace, counters: _Counters, started: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if args.latency_ms:
+                time.sleep(args.latency_ms / 1000.0)
+            down = time.monotonic() - started < args.down_seconds
+            fail = down or random.random() < args.fail_rate
+            with counters.lock:
+                counters.requests += 1
+                if fail:
+                    counters.failed += 1
+                else:
+                    alerts = json.loads(body).get("alerts", [])
+                    counters.alerts += len(alerts)
+                    counters.alert_ids.update(alert.get("id") for alert in alerts)
+            status = 503 if down else (args.status if fail else 200)
+            self.send_response(status)
+            if fail and args.retry_after is not None:
+                self.send_header("Retry-After", str(args.retry_after))
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"ok": false}' if fail else b'{"ok": true}')
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def _report(counters: _Counters, interval: float):
+    last = 0
+    while True:
+        time.sleep(interval)
+        with counters.lock:
+            received = counters.alerts
+            print(
+                f"requests={counters.requests} failed={counters.failed} "
+                f"alerts={received} unique={len(counters.alert_ids)} "
+                f"rate={(received - last) / interval:.0f}/s",
+                flush=True
+            )
+            last = received
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9099)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests answered with --status")
+    parser.add_argument("--status", type=int, default=500, help="Status code of failed requests")
+    parser.add_argument("--retry-after", type=int, default=None, help="Retry-After seconds sent with failures")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before every response")
+    parser.add_argument("--down-seconds", type=float, default=0.0, help="Answer 503 to everything for this long")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    counters = _Counters()
+    server = ThreadingHTTPServer((args.host, args.port), _make_handler(args, counters, time.monotonic()))
+    threading.Thread(target=_report, args=(counters, args.report_interval), daemon=True).start()
+    print(f"Stub notification destination on http://{args.host}:{args.port}/alerts")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Model filters on stored detections.
+
+Detections store ``model_name`` as "name@version"; filtering by the bare
+name must still return them. Runs on an in-memory MongoDB
+(mongomock-motor); run from the backend directory:
+    python -m pytest tests
+"""
+import asyncio
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import app.database
+from app.models.ml_detection import MLDetectionInDB
+from app.services.ml_service import get_detections
+from app.services.training_service import _detection_query
+
+
+@pytest.fixture
+def detections_db(monkeypatch):
+    """Point the app at an in-memory database holding detections of several models."""
+    db = mongomock_motor.AsyncMongoMockClient()["detection_filter_test"]
+    monkeypatch.setattr(app.database, "db", db)
+    documents = [
+        MLDetectionInDB("intrusion", 0.9, "attack", {"x": 1.0}, model_name).to_dict()
+        for model_name in ("intrusion", "intrusion@1", "intrusion@2", "intrusion_v2@1")
+    ]
+    asyncio.run(db.ml_detections.insert_many(documents))
+    return db
+
+
+def _models(detections):
+    return sorted(det["model_name"] for det in detections)
+
+
+def test_bare_model_name_matches_every_version(detections_db):
+    detections = asyncio.run(get_detections(model_name="intrusion"))
+    assert _models(detections) == ["intrusion", "intrusion@1", "intrusion@2"]
+
+
+def test_model_ref_matches_one_version(detections_db):
+    detections = asyncio.run(get_detections(model_name="intrusion@2"))
+    assert _models(detections) == ["intrusion@2"]
+
+
+def test_training_source_model_matches_every_version(detections_db):
+    query = _detection_query({"estimator": "mini_batch_kmeans", "filters": {"source_model": "intrusion"}})
+    cursor = detections_db.ml_detections.find(query)
+    assert _models(asyncio.run(cursor.to_list(length=None))) == ["intrusion", "intrusion@1", "intrusion@2"]
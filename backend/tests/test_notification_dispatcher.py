@@ -0,0 +1,189 @@
+"""
+NotificationDispatcher against the stub destination in benchmarks/.
+
+Each test starts benchmarks/notification_stub_server.py on a free port with
+--down-seconds, so the destination answers 503 for a while and then 200,
+and runs the dispatcher (with its background sender) on an in-memory
+MongoDB (mongomock-motor). Needs pytest and mongomock-motor; run from the
+backend directory:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip("httpx")
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import app.database
+from app.services.notification_service import OUTBOX_COLLECTION, NotificationDispatcher
+from app.utils.circuit_breaker import CLOSED
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def stub_server():
+    """Start the stub destination; returns a function taking --down-seconds and giving its URL."""
+    processes = []
+
+    def start(down_seconds: float) -> str:
+        port = _free_port()
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "benchmarks.notification_stub_server",
+                "--port", str(port),
+                "--down-seconds", str(down_seconds),
+                "--report-interval", "3600"
+            ],
+            cwd=BACKEND_DIR,
+            stdout=subprocess.DEVNULL
+        )
+        processes.append(process)
+        deadline = time.monotonic() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                return f"http://127.0.0.1:{port}/alerts"
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError("Stub notification server did not start")
+                time.sleep(0.05)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=5)
+
+
+@pytest.fixture
+def outbox_db(monkeypatch):
+    """Point the app at an in-memory database."""
+    monkeypatch.setattr(app.database, "db", mongomock_motor.AsyncMongoMockClient()["notification_test"])
+    _patch_mongomock_bulk_write(monkeypatch)
+    return app.database.db
+
+
+def _patch_mongomock_bulk_write(monkeypatch):
+    """
+    mongomock's bulk_write predates the ``sort`` argument newer pymongo
+    passes from UpdateOne; apply UpdateOne operations one by one instead.
+    """
+    import mongomock.collection
+    from pymongo import UpdateOne
+
+    collection = mongomock.collection.Collection
+    probe = mongomock.MongoClient()["probe"]["probe"]
+    try:
+        probe.bulk_write([UpdateOne({"_id": 1}, {"$set": {"x": 1}})])
+        return
+    except TypeError:
+        pass
+
+    def bulk_write(self, requests, ordered=True, **kwargs):
+        modified = 0
+        for request in requests:
+            modified += self.update_one(request._filter, request._doc, upsert=request._upsert).modified_count
+        return type("BulkWriteResult", (), {"modified_count": modified})()
+
+    monkeypatch.setattr(collection, "bulk_write", bulk_write)
+
+
+def _alert(number: int) -> dict:
+    return {"id": f"alert-{number}", "title": f"Alert {number}", "severity": "high", "created_at": datetime.utcnow()}
+
+
+async def _wait_for(condition, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while not await condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the dispatcher")
+        await asyncio.sleep(0.05)
+
+
+def test_failed_batches_are_retried_until_delivered(stub_server, outbox_db):
+    url = stub_server(down_seconds=1.5)
+
+    async def scenario():
+        dispatcher = NotificationDispatcher(
+            [("stub", url)],
+            batch_size=10,
+            backoff_base=0.2,
+            backoff_max=0.5,
+            poll_interval=0.05,
+            breaker_threshold=1000
+        )
+        await dispatcher.start()
+        try:
+            for number in range(3):
+                await dispatcher.enqueue(_alert(number))
+
+            async def outbox_empty():
+                return await outbox_db[OUTBOX_COLLECTION].count_documents({}) == 0
+            await _wait_for(outbox_empty)
+        finally:
+            await dispatcher.stop()
+        return dispatcher.destinations["stub"]
+
+    destination = asyncio.run(scenario())
+    assert destination.delivered == 3
+    assert destination.failed_batches >= 1
+    assert destination.retried >= 3
+    assert destination.dead == 0
+    assert destination.last_error == "HTTP 503"
+
+
+def test_breaker_opens_and_a_successful_probe_closes_it(stub_server, outbox_db):
+    url = stub_server(down_seconds=2.0)
+
+    async def scenario():
+        dispatcher = NotificationDispatcher(
+            [("stub", url)],
+            batch_size=1,
+            concurrency=1,
+            max_attempts=1000,
+            backoff_base=0.05,
+            backoff_max=0.1,
+            poll_interval=0.05,
+            breaker_threshold=2,
+            breaker_reset_seconds=0.5
+        )
+        destination = dispatcher.destinations["stub"]
+        await dispatcher.start()
+        try:
+            for number in range(3):
+                await dispatcher.enqueue(_alert(number))
+
+            async def breaker_opened():
+                return destination.breaker.opens >= 1
+            await _wait_for(breaker_opened)
+            # While open, rounds skip the destination instead of sending
+            requests_when_opened = destination.batches
+
+            async def outbox_empty():
+                return await outbox_db[OUTBOX_COLLECTION].count_documents({}) == 0
+            await _wait_for(outbox_empty)
+        finally:
+            await dispatcher.stop()
+        return destination, requests_when_opened
+
+    destination, requests_when_opened = asyncio.run(scenario())
+    breaker = destination.breaker
+    assert breaker.rejected >= 1
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+    assert destination.delivered == 3
+    # The stub was down for 2 s but the breaker limited sending to a probe per 0.5 s
+    assert destination.batches - requests_when_opened <= 3 + 2 * breaker.opens